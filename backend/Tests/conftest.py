@@ -0,0 +1,8 @@
+import os
+
+# Run the API against the in-process Firebase stand-in so tests need no credentials or network
+os.environ.setdefault("FIREBASE_BACKEND", "memory")
+# Tests build education content from the bundled file, not a snapshot left by an earlier run
+os.environ.setdefault("EDUCATION_SNAPSHOT_PATH", "")
+# ...and with an empty market data cache, without writing a snapshot of it
+os.environ.setdefault("MARKET_CACHE_SNAPSHOT_PATH", "")
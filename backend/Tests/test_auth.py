@@ -1,5 +1,6 @@
 from fastapi.testclient import TestClient
 from stocksage_api.main import app
+from stocksage_api.routes.auth import get_current_user, get_current_user_strict
 from unittest.mock import patch
 import uuid
 
@@ -25,6 +26,11 @@ mock_profile = {
     }
 }
 
+# Depends() binds get_current_user when the routes are declared, so patching the
+# module attribute alone never reaches them; override the dependencies as well
+app.dependency_overrides[get_current_user] = lambda: mock_token_data
+app.dependency_overrides[get_current_user_strict] = lambda: mock_token_data
+
 def test_register_user():
     response = client.post("/api/auth/register", json={
         "email": "testuser@example.com",
@@ -39,7 +45,7 @@ def test_register_user():
         assert "profile" in data
 
 @patch("stocksage_api.routes.auth.get_current_user", return_value=mock_token_data)
-@patch("stocksage_api.services.firebase_service.firebase_service.get_user_profile", return_value=mock_profile)
+@patch("stocksage_api.services.async_firebase_service.async_firebase_service.get_user_profile", return_value=mock_profile)
 def test_get_profile(mock_get_user_profile, mock_get_current_user):
     response = client.get("/api/auth/profile", headers={
         "Authorization": "Bearer FAKE.TOKEN.HERE"
@@ -48,9 +54,9 @@ def test_get_profile(mock_get_user_profile, mock_get_current_user):
     assert response.json()["email"] == "testuser@example.com"
 
 @patch("stocksage_api.routes.auth.get_current_user", return_value=mock_token_data)
-@patch("stocksage_api.services.firebase_service.firebase_service.update_user_profile")
-@patch("stocksage_api.services.firebase_service.firebase_service.get_user_profile", return_value=mock_profile)
-@patch("stocksage_api.services.firebase_service.firebase_service.update_user")
+@patch("stocksage_api.services.async_firebase_service.async_firebase_service.update_user_profile")
+@patch("stocksage_api.services.async_firebase_service.async_firebase_service.get_user_profile", return_value=mock_profile)
+@patch("stocksage_api.services.async_firebase_service.async_firebase_service.update_user")
 def test_update_profile(mock_update_user, mock_get_user_profile, mock_update_user_profile, mock_get_current_user):
     updated_name = "Updated Test User"
     response = client.put("/api/auth/profile", headers={
@@ -62,7 +68,7 @@ def test_update_profile(mock_update_user, mock_get_user_profile, mock_update_use
     assert response.json()["name"] == updated_name
 
 @patch("stocksage_api.routes.auth.get_current_user", return_value=mock_token_data)
-@patch("stocksage_api.services.firebase_service.firebase_service.delete_user_profile")
+@patch("stocksage_api.services.async_firebase_service.async_firebase_service.delete_user_profile")
 def test_delete_profile(mock_delete_user_profile, mock_get_current_user):
     response = client.delete("/api/auth/profile", headers={
         "Authorization": "Bearer FAKE.TOKEN.HERE"
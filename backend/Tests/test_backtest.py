@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from stocksage_api.services.backtest import run_backtest, moving_average, relative_strength_index
+
+dates = np.arange("2023-01-02", "2024-01-02", dtype="datetime64[D]")
+rng = np.random.default_rng(42)
+closes = 100 * np.cumprod(1 + rng.normal(0.0005, 0.02, size=(len(dates), 3)), axis=0)
+symbols = ["AAPL", "MSFT", "GOOGL"]
+
+def test_buy_and_hold_matches_price_growth():
+    result = run_backtest(dates, symbols, closes, "buy_and_hold", {}, 9000.0)
+    expected = 3000.0 * (closes[-1] / closes[0]).sum()
+    assert result["final_value"] == pytest.approx(expected, rel=1e-6)
+    assert len(result["equity_curve"]) == len(dates)
+    assert len(result["trades"]) == 3
+    assert all(trade["type"] == "buy" for trade in result["trades"])
+
+def test_daily_rebalance_matches_mean_return():
+    result = run_backtest(dates, symbols, closes, "rebalance", {"rebalance_days": 1}, 10000.0)
+    daily = (closes[1:] / closes[:-1] - 1).mean(axis=1)
+    assert result["final_value"] == pytest.approx(10000.0 * np.prod(1 + daily), rel=1e-6)
+
+def test_sma_crossover_trades_on_signal_changes():
+    result = run_backtest(
+        dates, symbols, closes, "sma_crossover", {"short_window": 5, "long_window": 20}, 10000.0, 0.001
+    )
+    metrics = result["metrics"]
+    assert metrics["max_drawdown"] <= 0
+    assert result["trades"]
+    assert result["trades"][0]["date"] > str(dates[19])
+
+def test_rsi_strategy_runs():
+    result = run_backtest(dates, symbols, closes, "rsi", {"rsi_period": 14, "rsi_lower": 40, "rsi_upper": 60}, 10000.0)
+    assert set(result["metrics"]) == {"total_return", "cagr", "volatility", "sharpe_ratio", "max_drawdown"}
+
+def test_invalid_parameters_rejected():
+    with pytest.raises(ValueError):
+        run_backtest(dates, symbols, closes, "sma_crossover", {"short_window": 50, "long_window": 20})
+    with pytest.raises(ValueError):
+        run_backtest(dates, symbols, closes, "momentum", {})
+
+def test_indicators():
+    prices = np.arange(1, 11, dtype=float)[:, None]
+    assert moving_average(prices, 3)[2:, 0] == pytest.approx(np.arange(2, 10))
+    assert np.isnan(moving_average(prices, 3)[:2]).all()
+    assert relative_strength_index(prices, 3)[-1, 0] == 100.0
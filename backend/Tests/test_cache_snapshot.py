@@ -0,0 +1,150 @@
+import asyncio
+import os
+import pickle
+import stat
+import time
+import zlib
+
+import numpy as np
+import pytest
+
+from stocksage_api.config import paths
+from stocksage_api.services import cache_snapshot, market_cache, shared_cache as shared_cache_tier
+from stocksage_api.services.cache_snapshot import CacheSnapshots
+from stocksage_api.services.metrics import cache_requests
+from stocksage_api.services.shared_cache import SharedCache
+
+
+@pytest.fixture
+def empty_cache(monkeypatch):
+    """A cache with nothing in it, as after a restart"""
+    monkeypatch.setattr(market_cache, "cache", {})
+    monkeypatch.setattr(market_cache, "cache_expiry", {})
+    monkeypatch.setattr(shared_cache_tier, "shared_cache", None)
+
+
+def cache_entry(key, value, expires_in):
+    market_cache.cache[key] = value
+    market_cache.cache_expiry[key] = time.time() + expires_in
+
+
+def restart():
+    market_cache.cache.clear()
+    market_cache.cache_expiry.clear()
+
+
+def test_restored_entries_keep_their_age(tmp_path, empty_cache):
+    path = str(tmp_path / "market-cache.snapshot")
+    cache_entry("stock:AAPL", {"symbol": "AAPL", "price": 175.5}, expires_in=120)
+    cache_entry("stock:TSLA", {"symbol": "TSLA", "price": 180.0}, expires_in=-60)
+    cache_entry("stock:OLD", {"symbol": "OLD"}, expires_in=-2 * 24 * 3600)
+    expires_at = market_cache.cache_expiry["stock:AAPL"]
+    assert CacheSnapshots(path).save() == 2
+
+    restart()
+    snapshots = CacheSnapshots(path)
+    assert snapshots.restore() == 2
+    assert market_cache.cache_expiry["stock:AAPL"] == expires_at
+    assert "stock:OLD" not in market_cache.cache
+    # Only the expired entry is queued for refreshing; restoring again is a no-op
+    assert snapshots.expired == ["stock:TSLA"]
+    assert snapshots.restore() == 0
+
+    before = cache_requests.value("stock", "hit")
+
+    def fetch():
+        raise AssertionError("should not fetch")
+
+    assert market_cache.get_cached_or_fetch("stock:AAPL", fetch)["price"] == 175.5
+    assert cache_requests.value("stock", "hit") == before + 1
+    # An expired entry backs up a failed fetch
+    assert market_cache.get_cached_or_fetch("stock:TSLA", lambda: 1 / 0)["price"] == 180.0
+
+
+def test_snapshot_format_is_versioned(tmp_path, empty_cache):
+    path = tmp_path / "market-cache.snapshot"
+    data = cache_snapshot.encode([("price:MSFT", 1.0, 2.0, 328.79)], saved_at=3.0)
+    assert data[:4] == b"SSMC"
+    assert cache_snapshot.decode(data) == (3.0, [("price:MSFT", 1.0, 2.0, 328.79)])
+
+    newer = data[:4] + (cache_snapshot.FORMAT_VERSION + 1).to_bytes(2, "little") + data[6:]
+    with pytest.raises(ValueError, match="format version"):
+        cache_snapshot.decode(newer)
+    path.write_bytes(newer)
+    assert CacheSnapshots(str(path)).restore() == 0
+
+    path.write_bytes(b"not a snapshot")
+    assert CacheSnapshots(str(path)).restore() == 0
+    assert market_cache.cache == {}
+
+
+def test_snapshots_are_private_and_never_unpickled(tmp_path, empty_cache, monkeypatch):
+    monkeypatch.setattr(paths, "STOCKSAGE_DATA_DIR", str(tmp_path / "data"))
+    cache_entry("closes:AAPL:2024-01-01:2024-02-01", (np.array(["2024-01-02"], dtype="datetime64[D]"),
+                                                       np.array([185.64])), expires_in=60)
+    snapshots = CacheSnapshots(None)
+    assert snapshots.save() == 1
+    assert os.path.dirname(snapshots.path) == str(tmp_path / "data")
+    assert stat.S_IMODE(os.stat(snapshots.path).st_mode) == 0o600
+    restart()
+    assert CacheSnapshots(None).restore() == 1
+    dates, closes = market_cache.cache["closes:AAPL:2024-01-01:2024-02-01"]
+    assert closes.tolist() == [185.64]
+
+    # A pickled body is rejected, not loaded
+    entries = [("stock:AAPL", 1.0, 2.0, {"price": 1.0})]
+    pickled = cache_snapshot.HEADER.pack(b"SSMC", cache_snapshot.FORMAT_VERSION, 3.0, 1) + zlib.compress(pickle.dumps(entries))
+    with pytest.raises(ValueError):
+        cache_snapshot.decode(pickled)
+
+    # So is a snapshot another user could have written
+    planted = tmp_path / "planted.snapshot"
+    planted.write_bytes(cache_snapshot.encode(entries, saved_at=time.time()))
+    planted.chmod(0o666)
+    restart()
+    assert CacheSnapshots(str(planted)).restore() == 0
+
+
+def test_expired_entries_are_refreshed_in_the_background(tmp_path, empty_cache, monkeypatch):
+    path = str(tmp_path / "market-cache.snapshot")
+    cache_entry("stock:AAPL", {"price": 170.0}, expires_in=-60)
+    cache_entry("price:MSFT", 300.0, expires_in=-60)
+    cache_entry("price:NVDA", 400.0, expires_in=-60)
+    cache_entry("unknown:X", 1, expires_in=-60)
+    CacheSnapshots(path).save()
+    restart()
+
+    requested = []
+
+    def fetch_many(keys):
+        requested.append(sorted(keys))
+        return {key: 500.0 for key in keys}
+
+    monkeypatch.setitem(market_cache.refreshers, "stock", (lambda key: {"price": 175.5}, None))
+    monkeypatch.setitem(market_cache.refreshers, "price", (None, fetch_many))
+    snapshots = CacheSnapshots(path)
+    snapshots.restore()
+    assert asyncio.run(snapshots.refresh_expired()) == 3
+
+    assert requested == [["price:MSFT", "price:NVDA"]]
+    assert market_cache.cache["stock:AAPL"] == {"price": 175.5}
+    assert market_cache.cache_expiry["price:MSFT"] > time.time()
+    # Keys without a refresher stay expired until requested
+    assert market_cache.cache_expiry["unknown:X"] < time.time()
+
+
+def test_snapshot_includes_entries_fetched_by_other_workers(tmp_path, empty_cache, monkeypatch):
+    store = SharedCache(str(tmp_path / "market-cache.sqlite3"))
+    monkeypatch.setattr(shared_cache_tier, "shared_cache", store)
+    now = time.time()
+    store.put_if_newer("company:AAPL", {"name": "Apple Inc."}, now - 10, now + 290)
+    cache_entry("stock:AAPL", {"price": 175.5}, expires_in=200)
+
+    path = str(tmp_path / "market-cache.snapshot")
+    assert CacheSnapshots(path).save() == 2
+    restart()
+    store.clear()
+    assert CacheSnapshots(path).restore() == 2
+    assert market_cache.cache["company:AAPL"] == {"name": "Apple Inc."}
+    # Restored into the shared tier for workers started without the snapshot
+    assert store.get("stock:AAPL")[0] == {"price": 175.5}
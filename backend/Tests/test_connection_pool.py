@@ -0,0 +1,120 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from stocksage_api.services.connection_pool import CountingTransport, PooledHTTPAdapter, mount_pooled_adapter, pool_stats
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    connections = 0
+
+    def setup(self):
+        super().setup()
+        KeepAliveHandler.connections += 1
+
+    def do_GET(self):
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    KeepAliveHandler.connections = 0
+    yield f"http://127.0.0.1:{server.server_port}/data.json"
+    server.shutdown()
+
+
+def test_connections_are_reused_and_counted(server_url):
+    session = requests.Session()
+    adapter = mount_pooled_adapter(session, "test")
+
+    for _ in range(5):
+        assert session.get(server_url).json() == {"ok": True}
+
+    stats = adapter.snapshot()
+    assert KeepAliveHandler.connections == 1
+    assert stats["requests"] == 5
+    assert stats["new_connections"] == 1
+    assert stats["in_use"] == 0
+    assert stats["idle"] == 1
+    assert pool_stats()["test"] == stats
+
+
+def exhausted_pool(block: bool):
+    session = requests.Session()
+    adapter = PooledHTTPAdapter()
+    adapter._pool_maxsize = 1
+    adapter.init_poolmanager(adapter._pool_connections, 1, block=block)
+    session.mount("http://", adapter)
+    return session, adapter
+
+
+def test_exhausted_pool_counts_overflow(server_url):
+    session, adapter = exhausted_pool(block=False)
+    first = session.get(server_url, stream=True)
+    second = session.get(server_url, stream=True)
+    assert adapter.snapshot()["in_use"] == 2
+    first.close()
+    second.close()
+
+    stats = adapter.snapshot()
+    # A non-blocking pool never waits; it opens a connection it does not keep
+    assert stats["waits"] == 0 and stats["overflow"] == 1
+    assert stats["new_connections"] == 2
+    assert stats["in_use"] == 0
+
+
+def test_blocking_pool_counts_waits(server_url):
+    session, adapter = exhausted_pool(block=True)
+    first = session.get(server_url, stream=True)
+    second = threading.Thread(target=lambda: session.get(server_url).close())
+    second.start()
+    second.join(0.2)
+    assert second.is_alive()
+    # Reading the body hands the connection to the waiting request
+    assert first.json() == {"ok": True}
+    second.join(5)
+
+    stats = adapter.snapshot()
+    assert stats["waits"] == 1 and stats["overflow"] == 0
+    assert stats["new_connections"] == 1
+
+
+def test_mounting_keeps_the_session_retry_policy():
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(max_retries=Retry(total=3, backoff_factor=0.5)))
+    adapter = mount_pooled_adapter(session, "retries")
+    assert adapter.max_retries.total == 3 and adapter.max_retries.backoff_factor == 0.5
+    assert session.get_adapter("http://example.com") is adapter
+
+
+def test_async_transport_counts_connections_and_waits(server_url):
+    transport = CountingTransport(httpx.AsyncHTTPTransport(limits=httpx.Limits(max_connections=1)), max_connections=1)
+
+    async def run():
+        async with httpx.AsyncClient(transport=transport) as client:
+            responses = await asyncio.gather(*(client.get(server_url) for _ in range(3)))
+            assert all(response.json() == {"ok": True} for response in responses)
+
+    asyncio.run(run())
+    stats = transport.snapshot()
+    assert stats["requests"] == 3
+    # One connection, reused by the two requests that waited for it
+    assert stats["new_connections"] == 1 and stats["waits"] == 2
+    assert stats["in_use"] == 0 and stats["max_size"] == 1
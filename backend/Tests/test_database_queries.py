@@ -0,0 +1,116 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from stocksage_api.config.database_indexes import build_rules, database_indexes, is_indexed
+from stocksage_api.services.async_firebase_service import AsyncFirebaseService
+from stocksage_api.services.firebase_service import FirebaseService
+
+
+@pytest.fixture
+def firebase():
+    service = FirebaseService(backend="memory")
+    service.memory_db.set("portfolios", {
+        f"p{i:02d}": {"user_id": "u1" if i % 3 else "u2", "name": f"Portfolio {i}"} for i in range(10)
+    })
+    return service
+
+
+def test_rules_file_matches_index_table():
+    rules_path = os.path.join(os.path.dirname(__file__), "..", "database.rules.json")
+    with open(rules_path) as rules_file:
+        assert json.load(rules_file) == build_rules()
+
+
+def test_index_lookup_matches_wildcards():
+    assert is_indexed("portfolios", "user_id")
+    assert is_indexed("/snapshots/p1/", "timestamp")
+    assert not is_indexed("snapshots", "timestamp")
+    assert not is_indexed("portfolios", "name", database_indexes)
+
+
+def test_unindexed_child_queries_are_rejected(firebase):
+    assert list(firebase.query_data("portfolios", order_by="user_id", equal_to="u2")) == ["p00", "p03", "p06", "p09"]
+    with pytest.raises(ValueError, match="Index not defined"):
+        firebase.memory_db.query("portfolios", order_by="name")
+    assert firebase.query_data("portfolios", order_by="name") is None
+
+
+def test_shallow_keys_and_pages(firebase):
+    assert firebase.get_keys("portfolios") == [f"p{i:02d}" for i in range(10)]
+    assert firebase.get_keys("missing") == []
+
+    pages, cursor = [], None
+    while True:
+        page = firebase.query_page("portfolios", limit=4, after=cursor)
+        pages.append(list(page["items"]))
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert pages == [["p00", "p01", "p02", "p03"], ["p04", "p05", "p06", "p07"], ["p08", "p09"]]
+
+
+def test_async_queries_match(firebase):
+    async def scenario():
+        service = AsyncFirebaseService(firebase)
+        try:
+            keys = await service.get_keys("portfolios")
+            page = await service.query_page("portfolios", limit=3, after="p03")
+            owned = await service.query_data("portfolios", order_by="user_id", equal_to="u2")
+            rejected = await service.query_data("portfolios", order_by="name")
+            return keys, page, owned, rejected
+        finally:
+            await service.aclose()
+
+    keys, page, owned, rejected = asyncio.run(scenario())
+    assert keys == firebase.get_keys("portfolios")
+    assert list(page["items"]) == ["p04", "p05", "p06"] and page["next_cursor"] == "p06"
+    assert list(owned) == ["p00", "p03", "p06", "p09"]
+    assert rejected is None
+
+
+def test_async_calls_wait_for_one_initialization_off_the_event_loop(monkeypatch):
+    from stocksage_api.services import firebase_service as firebase_module
+
+    created = []
+
+    def create_service():
+        created.append(threading.get_ident())
+        time.sleep(0.1)
+        if len(created) == 1:
+            raise ValueError("credentials not found")
+        return FirebaseService(backend="memory")
+
+    monkeypatch.setattr(firebase_module, "FirebaseService", create_service)
+    lazy = firebase_module.LazyFirebaseService()
+
+    async def scenario():
+        service = AsyncFirebaseService(lazy)
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while not lazy.initialized:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        try:
+            # The first initialization fails for everyone waiting on it
+            failed = await asyncio.gather(service.get_keys("users"), service.ready(), return_exceptions=True)
+            results = await asyncio.gather(
+                service.set_data("users/u1", {"name": "Ada"}), service.get_keys("users"), tick()
+            )
+            return failed, results, ticks
+        finally:
+            await service.aclose()
+
+    failed, results, ticks = asyncio.run(scenario())
+    assert isinstance(failed[1], ValueError)
+    assert len(created) == 2 and threading.get_ident() not in created
+    assert results[1] in ([], ["u1"])
+    # The event loop kept running while the service was created
+    assert ticks >= 5
@@ -1,3 +1,4 @@
+import pytest
 from fastapi.testclient import TestClient
 from stocksage_api.main import app
 
@@ -30,3 +31,122 @@ def test_get_trading_tips():
     data = response.json()
     assert isinstance(data, list)
     assert all("title" in tip and "content" in tip for tip in data)
+
+def test_term_lookup_is_normalized():
+    response = client.get("/api/education/terms/Market-Cap")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["term"] == "market cap"
+    # P/E ratio links to market cap, so the graph links back
+    assert "P/E ratio" in data["related_terms"]
+
+def test_filter_by_category():
+    tips = client.get("/api/education/tips", params={"category": "strategy"}).json()
+    assert tips and all(tip["category"] == "strategy" for tip in tips)
+    terms = client.get("/api/education/terms", params={"category": "valuation"}).json()
+    assert {term["term"] for term in terms} == {"market cap", "P/E ratio"}
+    assert "strategy" in client.get("/api/education/categories").json()["tips"]
+
+def test_search_ranks_terms_and_tips():
+    response = client.get("/api/education/search", params={"q": "volatility"})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert results[0] == {**results[0], "type": "term", "id": "volatility"}
+    assert any(result["type"] == "tip" for result in results)
+
+    # Every word must match, and the last one may be a prefix
+    results = client.get("/api/education/search", params={"q": "quarterly divid"}).json()["results"]
+    assert [result["id"] for result in results] == ["dividend"]
+    results = client.get("/api/education/search", params={"q": "volatility", "type": "tip", "category": "strategy"}).json()["results"]
+    assert results and all(result["type"] == "tip" and result["category"] == "strategy" for result in results)
+    assert client.get("/api/education/search", params={"q": "cryptocurrency"}).json()["count"] == 0
+
+def test_reload_swaps_index(tmp_path):
+    from stocksage_api.services.education import EducationContent
+
+    content_file = tmp_path / "education.json"
+    content_file.write_text('{"stock_terms": [{"term": "ETF", "definition": "An exchange-traded fund.", "related_terms": ["index fund"]}], "trading_tips": []}')
+    content = EducationContent(str(content_file))
+    assert content.index.get_term("etf")["related_terms"] == ["index fund"]
+
+    content_file.write_text('{"stock_terms": [{"term": "ETF"}], "trading_tips": []}')
+    with pytest.raises(ValueError):
+        content.reload()
+    assert content.index.get_term("etf") is not None
+
+    content_file.write_text('{"stock_terms": [{"term": "Index Fund", "definition": "A fund tracking an index."}], "trading_tips": []}')
+    assert content.reload()["terms"] == 1
+    assert content.index.get_term("etf") is None
+    assert content.index.search("tracking")[0]["title"] == "Index Fund"
+
+def test_reload_requires_admin():
+    assert client.post("/api/education/reload").status_code in (401, 403)
+
+def test_content_follows_database_and_persists_snapshot(tmp_path):
+    from stocksage_api.services.education import EducationContent
+    from stocksage_api.services.firebase_service import FirebaseService
+    from stocksage_api.services.stream_hub import StreamHub
+
+    content_file = tmp_path / "education.json"
+    content_file.write_text('{"stock_terms": [{"term": "ETF", "definition": "An exchange-traded fund."}], '
+                            '"trading_tips": [{"id": "tip1", "title": "Diversify", "content": "Spread your risk."}]}')
+    snapshot_file = tmp_path / "snapshot.json"
+    firebase = FirebaseService(backend="memory")
+    firebase.memory_db.set("stock_terms", {"etf": {"term": "ETF", "definition": "A fund traded on an exchange."}})
+    hub = StreamHub(firebase, prefixes=[])
+
+    content = EducationContent(str(content_file), str(snapshot_file), rebuild_delay=0)
+    content.start_stream(hub)
+    # /stock_terms comes from the database; /trading_tips does not exist there, so the bundled tips stay
+    assert content.index.get_term("etf")["definition"] == "A fund traded on an exchange."
+    assert content.index.tips_by_id["tip1"]["title"] == "Diversify"
+
+    firebase.memory_db.set("stock_terms/bond", {"term": "Bond", "definition": "A loan to a company or government.",
+                                               "related_terms": ["ETF"]})
+    firebase.memory_db.set("stock_terms/etf/definition", "An exchange-traded fund.")
+    # An invalid record is skipped instead of blocking later updates
+    firebase.memory_db.set("stock_terms/broken", {"term": "Broken"})
+    assert content.index.get_term("etf") == {
+        "term": "ETF", "definition": "An exchange-traded fund.", "example": "", "category": None, "related_terms": ["Bond"]
+    }
+    assert content.index.search("loan")[0]["title"] == "Bond"
+    status = content.status()
+    assert status["source"] == "firebase" and status["mirrored_collections"] == ["stock_terms"]
+    version = status["version"]
+    content.stop_stream()
+    hub.close()
+
+    # A restart serves the saved snapshot before any database connection
+    restarted = EducationContent(str(content_file), str(snapshot_file))
+    assert restarted.index.get_term("bond") is not None
+    assert (restarted.status()["source"], restarted.status()["version"]) == ("snapshot", version)
+
+    # A snapshot other users could have written is not trusted
+    snapshot_file.chmod(0o666)
+    assert EducationContent(str(content_file), str(snapshot_file)).status()["source"] == "file"
+    snapshot_file.chmod(0o600)
+
+    # A changed content file (a redeploy) invalidates the snapshot
+    content_file.write_text('{"stock_terms": [{"term": "Stock", "definition": "A share of a company."}], "trading_tips": []}')
+    redeployed = EducationContent(str(content_file), str(snapshot_file))
+    assert redeployed.index.get_term("bond") is None and redeployed.status()["source"] == "file"
+
+def test_content_changes_are_coalesced(tmp_path):
+    from stocksage_api.services.education import EducationContent
+    from stocksage_api.services.firebase_service import FirebaseService
+    from stocksage_api.services.stream_hub import StreamHub
+
+    content_file = tmp_path / "education.json"
+    content_file.write_text('{"stock_terms": [], "trading_tips": []}')
+    firebase = FirebaseService(backend="memory")
+    hub = StreamHub(firebase, prefixes=[])
+    content = EducationContent(str(content_file), "", rebuild_delay=60)
+    content.start_stream(hub)
+    for i in range(20):
+        firebase.memory_db.set(f"trading_tips/tip{i}", {"title": f"Tip {i}", "content": "Be patient."})
+    # Still serving the previous index until the pending rebuild runs
+    assert content.index.tips == [] and content.status()["pending_version"] is not None
+    rebuilds = content.rebuilds
+    content.stop_stream()
+    hub.close()
+    assert content.rebuilds == rebuilds + 1 and len(content.index.tips) == 20
@@ -0,0 +1,59 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+
+from stocksage_api import main
+from stocksage_api.main import app
+
+
+def test_health_reports_ready_after_startup_checks():
+    with TestClient(app) as client:
+        response = client.get("/api/health")
+        deadline = time.time() + 10
+        while response.status_code == 503 and time.time() < deadline:
+            assert response.json()["ready"] is False
+            time.sleep(0.02)
+            response = client.get("/api/health")
+
+    data = response.json()
+    assert response.status_code == 200
+    assert data["ready"] is True and data["status"] == "healthy"
+    assert data["services"] == {"firebase": "up", "yfinance": "up"}
+    assert all("duration_ms" in check for check in data["startup"].values())
+
+
+def test_failed_firebase_check_is_retried_before_streams_start(monkeypatch):
+    attempts = []
+    started = []
+
+    async def verify_firebase():
+        attempts.append(time.monotonic())
+        if len(attempts) < 3:
+            raise ConnectionError("database unreachable")
+
+    async def start(name):
+        started.append(name)
+
+    async def supervise():
+        started.append("supervisor")
+
+    async def scenario():
+        app = SimpleNamespace(state=SimpleNamespace(stream_supervisor=None))
+        await main.warm_up(app)
+        await app.state.stream_supervisor
+        return dict(main.startup_status)
+
+    monkeypatch.setattr(main, "STARTUP_RETRY_DELAY", 0.01)
+    monkeypatch.setattr(main, "verify_firebase", verify_firebase)
+    monkeypatch.setattr(main, "import_yfinance", lambda: start("yfinance"))
+    monkeypatch.setattr(main.async_firebase_service, "start_profile_stream", lambda: start("profiles"))
+    monkeypatch.setattr(main, "start_education_stream", lambda: start("education"))
+    monkeypatch.setattr(main.async_firebase_service.stream_hub, "supervise", supervise)
+    status = asyncio.run(scenario())
+
+    assert len(attempts) == 3 and status["firebase"]["status"] == "up"
+    # The second retry waits twice as long as the first
+    assert attempts[2] - attempts[1] >= 2 * 0.01
+    assert started == ["yfinance", "profiles", "education", "supervisor"]
@@ -0,0 +1,84 @@
+import pytest
+from stocksage_api.services.ledger import TransactionLedger, sequence_key, parse_sequence_key
+from stocksage_api.services.portfolio import Portfolio
+
+class FakeDatabase:
+    """Minimal ordered-query stand-in for FirebaseService"""
+    def __init__(self):
+        self.data = {}
+        self.queries = 0
+
+    def write(self, updates):
+        for path, value in updates.items():
+            self.data[path] = value
+
+    def query_data(self, path, order_by="$key", start_at=None, end_at=None, limit_to_first=None, limit_to_last=None):
+        self.queries += 1
+        prefix = path + "/"
+        children = {k[len(prefix):]: v for k, v in self.data.items() if k.startswith(prefix)}
+        sort_key = (lambda item: item[0]) if order_by == "$key" else (lambda item: item[1][order_by])
+        items = [item for item in sorted(children.items(), key=sort_key)
+                 if (start_at is None or sort_key(item) >= start_at) and (end_at is None or sort_key(item) <= end_at)]
+        if limit_to_first is not None:
+            items = items[:limit_to_first]
+        if limit_to_last is not None:
+            items = items[-limit_to_last:]
+        return dict(items)
+
+def trade(portfolio, ledger, database, side, symbol, quantity, price, timestamp):
+    portfolio.apply_trade(side, symbol, quantity, price)
+    entry = {"portfolio_id": portfolio.id, "symbol": symbol, "type": side,
+             "quantity": quantity, "price": price, "timestamp": timestamp}
+    database.write(ledger.append_updates(portfolio, entry))
+
+@pytest.fixture
+def history():
+    database = FakeDatabase()
+    ledger = TransactionLedger(database, snapshot_interval=5)
+    portfolio = Portfolio(id="p1", user_id="u1", name="Test", initial_balance=100000.0,
+                          current_balance=100000.0, start_date="2024-01-01", created_at=0)
+    for i in range(1, 24):
+        trade(portfolio, ledger, database, "buy" if i % 3 else "sell", "AAPL", 1, 100.0 + i, i * 1000)
+    return database, ledger, portfolio
+
+def test_sequence_keys_sort_in_order():
+    assert sequence_key(9) < sequence_key(10) < sequence_key(100)
+    assert parse_sequence_key(sequence_key(42)) == 42
+    with pytest.raises(ValueError):
+        parse_sequence_key("42")
+
+def test_snapshots_every_interval(history):
+    database, _, _ = history
+    snapshots = [path for path in database.data if path.startswith("snapshots/")]
+    assert len(snapshots) == 4
+
+def test_state_at_replays_only_tail(history):
+    database, ledger, portfolio = history
+    database.queries = 0
+    state = ledger.state_at(portfolio, 23 * 1000)
+    assert state.version == portfolio.version
+    assert state.current_balance == pytest.approx(portfolio.current_balance)
+    assert state.positions["AAPL"].quantity == portfolio.positions["AAPL"].quantity
+    assert state.realized_pnl == pytest.approx(portfolio.realized_pnl)
+    assert database.queries == 2
+
+def test_state_at_past_time(history):
+    _, ledger, portfolio = history
+    state = ledger.state_at(portfolio, 7 * 1000 + 500)
+    assert state.version == 7
+    assert state.positions["AAPL"].quantity == 3
+    assert ledger.state_at(portfolio, 0).current_balance == 100000.0
+
+def test_pagination_by_key(history):
+    _, ledger, _ = history
+    first = ledger.page("p1", limit=10)
+    assert [tx["seq"] for tx in first["transactions"]] == list(range(23, 13, -1))
+    second = ledger.page("p1", limit=10, before=first["next_cursor"])
+    third = ledger.page("p1", limit=10, before=second["next_cursor"])
+    assert [tx["seq"] for tx in third["transactions"]] == [3, 2, 1]
+    assert third["next_cursor"] is None
+
+def test_pagination_before_first_entry_is_empty(history):
+    _, ledger, _ = history
+    for before in ("s0000000001", "s0000000000"):
+        assert ledger.page("p1", limit=10, before=before) == {"transactions": [], "next_cursor": None}
@@ -0,0 +1,68 @@
+import json
+import logging
+import queue
+import sys
+
+from stocksage_api.config.logging_config import DuplicateFilter, JsonFormatter, NonBlockingQueueHandler
+from stocksage_api.services import tracing
+
+
+def record(message, *args, level=logging.WARNING, name="stocksage_api.routes.public_stocks"):
+    return logging.LogRecord(name, level, __file__, 1, message, args, None)
+
+
+def test_duplicate_warnings_are_suppressed_within_the_interval():
+    duplicates = DuplicateFilter(interval=60)
+    assert duplicates.filter(record("Failed to get real data for %s", "AAPL"))
+    assert not duplicates.filter(record("Failed to get real data for %s", "AAPL"))
+    assert not duplicates.filter(record("Failed to get real data for AAPL"))
+    # Different messages and INFO records are not limited
+    assert duplicates.filter(record("Failed to get real data for %s", "MSFT"))
+    assert duplicates.filter(record("Using expired cache", level=logging.INFO))
+    assert duplicates.filter(record("Using expired cache", level=logging.INFO))
+    assert duplicates.suppressed_total == 2
+
+    # Once the interval has passed the next one is written with the count
+    duplicates._seen[("stocksage_api.routes.public_stocks", logging.WARNING, "Failed to get real data for AAPL")][0] -= 61
+    again = record("Failed to get real data for %s", "AAPL")
+    assert duplicates.filter(again)
+    assert again.getMessage() == "Failed to get real data for AAPL (repeated 2 more times in the last 60s)"
+
+
+def test_duplicate_filter_tracks_a_bounded_number_of_messages():
+    duplicates = DuplicateFilter(interval=60, max_tracked=3)
+    for i in range(10):
+        duplicates.filter(record(f"warning {i}"))
+    assert len(duplicates._seen) == 3
+
+
+def test_queue_handler_prepares_records_and_drops_when_full():
+    log_queue = queue.Queue(maxsize=2)
+    handler = NonBlockingQueueHandler(log_queue)
+    try:
+        raise ValueError("bad symbol")
+    except ValueError:
+        failing = logging.LogRecord("x", logging.ERROR, __file__, 1, "Lookup of %s failed", ("AAPL",), sys.exc_info())
+    handler.handle(failing)
+    handler.handle(record("second"))
+    handler.handle(record("third"))
+
+    queued = log_queue.get_nowait()
+    assert queued.msg == "Lookup of AAPL failed" and queued.args is None
+    assert queued.exc_info is None and "ValueError: bad symbol" in queued.exc_text
+    assert handler.dropped == 1
+
+
+def test_json_formatter_includes_trace_id_and_exception():
+    handler = NonBlockingQueueHandler(queue.Queue())
+    trace = tracing.Trace("4bf92f3577b34da6a3ce929d0e0e4736")
+    with tracing.Span(trace, "GET /x", "http"):
+        prepared = handler.prepare(record("Quote for %s unavailable", "TSLA"))
+    prepared.exc_text = "Traceback ..."
+
+    entry = json.loads(JsonFormatter().format(prepared))
+    assert entry["message"] == "Quote for TSLA unavailable"
+    assert entry["level"] == "WARNING" and entry["logger"] == "stocksage_api.routes.public_stocks"
+    assert entry["trace_id"] == "4bf92f3577b34da6a3ce929d0e0e4736"
+    assert entry["exception"] == "Traceback ..."
+    assert entry["timestamp"].endswith("+00:00")
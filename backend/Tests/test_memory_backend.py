@@ -0,0 +1,123 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from stocksage_api.services.memory_backend import MemoryAuth, MemoryDatabase, MemoryQuery
+
+
+@pytest.fixture
+def database():
+    return MemoryDatabase(latency_ms=0)
+
+
+def test_tree_reads_and_writes(database):
+    database.set("users/u1", {"name": "Ada", "preferences": {"theme": "dark"}})
+    database.update("users/u1", {"name": "Ada L.", "preferences/theme": "light"})
+    key = database.push("transactions/p1", {"symbol": "AAPL"})
+
+    assert database.get("users/u1") == {"name": "Ada L.", "preferences": {"theme": "light"}}
+    assert database.get("transactions/p1") == {key: {"symbol": "AAPL"}}
+    assert database.get("users", shallow=True) == {"u1": True}
+
+    # Deleting the last child removes empty parents
+    database.delete("transactions/p1/" + key)
+    assert database.get("transactions") is None
+    database.update("", {"users/u1/name": None, "users/u2/name": "Alan"})
+    assert database.get("users") == {"u1": {"preferences": {"theme": "light"}}, "u2": {"name": "Alan"}}
+
+
+def test_push_keys_are_chronological(database):
+    keys = [database.generate_key() for _ in range(200)]
+    assert keys == sorted(keys) and len(set(keys)) == 200
+
+
+def test_ordered_queries(database):
+    database.set("portfolios", {
+        "p1": {"user_id": "u2", "value": 30},
+        "p2": {"user_id": "u1", "value": 10},
+        "p3": {"user_id": "u1", "value": 20},
+        "10": {"user_id": "u3"},
+        "9": {"user_id": "u3"},
+    })
+    assert list(database.query("portfolios", order_by="$key")) == ["9", "10", "p1", "p2", "p3"]
+    assert list(database.query("portfolios", order_by="user_id", start_at="u1", end_at="u1")) == ["p2", "p3"]
+    assert list(database.query("portfolios", order_by="value", limit_to_last=2)) == ["p3", "p1"]
+    assert list(database.query("portfolios", order_by="$key", start_at="p2", limit_to_first=1)) == ["p2"]
+    assert database.query("portfolios", order_by="user_id", start_at="u9") is None
+
+
+def test_pyrebase_facade_builds_queries_in_place(database):
+    rtdb = MemoryQuery(database)
+    rtdb.child("scores").set({"a": 3, "b": 1, "c": 2})
+    # Like Pyrebase, every call changes the one builder and a request clears it
+    ordered = rtdb.child("scores").order_by_value()
+    assert ordered is rtdb and rtdb.path == "scores"
+    assert list(ordered.limit_to_first(2).get().val()) == ["b", "c"]
+    assert rtdb.path == "" and rtdb.build_query == {}
+    assert rtdb.child("scores").get().val() == {"a": 3, "b": 1, "c": 2}
+    assert rtdb.child("scores").shallow().get().val() == {"a": True, "b": True, "c": True}
+
+    # ...so two callers sharing a builder run their paths together
+    rtdb.child("scores")
+    assert rtdb.child("scores").get().val() is None
+
+
+def test_streams_receive_puts_and_patches(database):
+    database.set("users/u1", {"name": "Ada"})
+    events = []
+    stream = database.stream("users", events.append)
+
+    database.update("users/u1", {"name": "Ada L."})
+    database.set("users/u2/name", "Alan")
+    database.update("", {"users/u3": {"name": "Grace"}, "portfolios/p1": {"name": "Growth"}})
+    database.set("users", None)
+    stream.close()
+    database.set("users/u4", {"name": "Edsger"})
+
+    assert events == [
+        {"event": "put", "path": "/", "data": {"u1": {"name": "Ada"}}},
+        {"event": "patch", "path": "/u1", "data": {"name": "Ada L."}},
+        {"event": "put", "path": "/u2/name", "data": "Alan"},
+        {"event": "put", "path": "/u3", "data": {"name": "Grace"}},
+        {"event": "put", "path": "/", "data": None},
+    ]
+
+
+def test_latency_is_injected():
+    database = MemoryDatabase(latency_ms=20)
+    start = time.perf_counter()
+    MemoryQuery(database).child("users").get()
+    assert time.perf_counter() - start >= 0.02
+
+
+def test_rest_transport(database):
+    async def scenario():
+        async with httpx.AsyncClient(base_url="http://memory.localhost", transport=database.transport()) as client:
+            await client.put("/users/u1.json", json={"name": "Ada", "age": 36})
+            await client.patch("/users/u1.json", json={"age": 37})
+            pushed = (await client.post("/logs.json", json={"event": "login"})).json()
+            query = await client.get("/users.json", params={"orderBy": '"age"', "startAt": "30"})
+            return pushed, query.json(), (await client.delete("/users/u1.json")).json()
+
+    pushed, queried, deleted = asyncio.run(scenario())
+    assert database.get(f"logs/{pushed['name']}") == {"event": "login"}
+    assert queried == {"u1": {"name": "Ada", "age": 37}}
+    assert deleted is None and database.get("users") is None
+
+
+def test_auth_tokens():
+    memory_auth = MemoryAuth("demo")
+    user = memory_auth.create_user(email="ada@example.com", password="secret", display_name="Ada")
+    token = memory_auth.sign_in_with_email_and_password("ada@example.com", "secret")["idToken"]
+
+    claims = memory_auth.verify_id_token(token, check_revoked=True)
+    assert claims["uid"] == user.uid and claims["email"] == "ada@example.com"
+
+    memory_auth.revoke_refresh_tokens(user.uid)
+    assert memory_auth.verify_id_token(token)["uid"] == user.uid
+    with pytest.raises(Exception, match="revoked"):
+        memory_auth.verify_id_token(token, check_revoked=True)
+    with pytest.raises(ValueError):
+        memory_auth.sign_in_with_email_and_password("ada@example.com", "wrong")
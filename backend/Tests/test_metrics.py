@@ -0,0 +1,71 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from stocksage_api.main import app
+from stocksage_api.services import market_cache
+from stocksage_api.services.metrics import MetricsRegistry, cache_requests, cache_evictions, track_upstream, upstream_requests
+
+client = TestClient(app)
+
+
+def test_registry_renders_prometheus_text():
+    registry = MetricsRegistry()
+    requests = registry.counter("demo_requests_total", "Requests", ("route",))
+    latency = registry.histogram("demo_latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0))
+    requests.inc('/say "hi"')
+    requests.inc('/say "hi"', amount=2)
+    for value in (0.05, 0.5, 5.0):
+        latency.observe(value, "/a")
+    registry.collector("demo_entries", "Entries", "gauge", lambda: [("", {"cache": "x"}, 7)])
+
+    lines = registry.render().splitlines()
+    assert "# TYPE demo_requests_total counter" in lines
+    assert 'demo_requests_total{route="/say \\"hi\\""} 3' in lines
+    # Buckets are cumulative and end with +Inf
+    assert 'demo_latency_seconds_bucket{route="/a",le="0.1"} 1' in lines
+    assert 'demo_latency_seconds_bucket{route="/a",le="1"} 2' in lines
+    assert 'demo_latency_seconds_bucket{route="/a",le="+Inf"} 3' in lines
+    assert 'demo_latency_seconds_count{route="/a"} 3' in lines
+    assert 'demo_entries{cache="x"} 7' in lines
+    with pytest.raises(ValueError):
+        registry.counter("demo_requests_total", "Again")
+
+
+def test_requests_are_recorded_by_route_template():
+    client.get("/api/education/terms/stock")
+    client.get("/api/education/terms/dividend")
+    client.get("/api/education/terms/not-a-term")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    lines = response.text.splitlines()
+    ok = [line for line in lines if line.startswith(
+        'stocksage_http_requests_total{method="GET",route="/api/education/terms/{term}",status="200"}')]
+    assert ok and int(ok[0].split()[-1]) >= 2
+    assert any('route="/api/education/terms/{term}",status="404"' in line for line in lines)
+    assert any(line.startswith("stocksage_http_requests_in_flight") for line in lines)
+
+
+def test_cache_and_upstream_counters():
+    key = "metrics-test:AAPL"
+    market_cache.cache.pop(key, None)
+    before = {result: cache_requests.value("metrics-test", result) for result in ("hit", "miss", "stale")}
+
+    assert market_cache.get_cached_or_fetch(key, lambda: 1) == 1
+    assert market_cache.get_cached_or_fetch(key, lambda: 2) == 1
+    market_cache.cache_expiry[key] = 0
+
+    def failing_fetch():
+        with track_upstream("metrics-test", "info"):
+            raise RuntimeError("upstream down")
+
+    # An expired entry is still served when the refresh fails
+    assert market_cache.get_cached_or_fetch(key, failing_fetch) == 1
+    assert market_cache.get_cached_or_fetch(key, lambda: 3) == 3
+
+    assert cache_requests.value("metrics-test", "hit") - before["hit"] == 1
+    assert cache_requests.value("metrics-test", "miss") - before["miss"] == 2
+    assert cache_requests.value("metrics-test", "stale") - before["stale"] == 1
+    assert cache_evictions.value("metrics-test") == 1
+    assert upstream_requests.value("metrics-test", "info", "error") == 1
+    market_cache.cache.pop(key, None)
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+from stocksage_api.services.monte_carlo import chunk_sizes, checkpoint_days, simulate_chunk, summarize
+
+rng = np.random.default_rng(3)
+history = rng.normal(0.0004, 0.01, 500)
+
+def run(n_paths, horizon, method, seed):
+    streams = np.random.SeedSequence(seed).spawn(len(chunk_sizes(n_paths, horizon, 100000)))
+    return np.vstack([
+        simulate_chunk(history, size, horizon, method, stream)
+        for size, stream in zip(chunk_sizes(n_paths, horizon, 100000), streams)
+    ])
+
+def test_chunking_bounds_memory():
+    sizes = chunk_sizes(100000, 252, 2_500_000)
+    assert sum(sizes) == 100000
+    assert max(sizes) * 252 <= 2_500_000
+    assert checkpoint_days(252)[-1] == 252 and len(checkpoint_days(252)) <= 64
+    assert list(checkpoint_days(5)) == [1, 2, 3, 4, 5]
+
+def test_same_seed_is_reproducible():
+    assert np.array_equal(run(2000, 50, "bootstrap", 1), run(2000, 50, "bootstrap", 1))
+    assert not np.array_equal(run(2000, 50, "bootstrap", 1), run(2000, 50, "bootstrap", 2))
+
+@pytest.mark.parametrize("method", ["bootstrap", "gbm"])
+def test_median_growth_matches_history(method):
+    growth = run(20000, 252, method, 0)
+    expected = np.exp(np.log1p(history).mean() * 252)
+    assert np.median(growth[:, -1]) == pytest.approx(expected, rel=0.02)
+
+def test_summary_bands_are_ordered():
+    summary = summarize(run(5000, 100, "gbm", 0), 100, 10000.0, target_value=10500.0)
+    assert summary["bands"][0]["p50"] == 10000.0
+    last = summary["bands"][-1]
+    assert last["day"] == 100
+    assert last["p5"] < last["p25"] < last["p50"] < last["p75"] < last["p95"]
+    assert 0 <= summary["probability_of_target"] <= 1
+    with pytest.raises(ValueError):
+        simulate_chunk(history, 10, 10, "heston", np.random.SeedSequence(0))
@@ -0,0 +1,201 @@
+import pytest
+from stocksage_api.services.portfolio import Portfolio, TradeError
+
+def make_portfolio():
+    return Portfolio(
+        id="p1",
+        user_id="u1",
+        name="Test Portfolio",
+        initial_balance=10000.0,
+        current_balance=10000.0,
+        start_date="2024-01-01",
+        created_at=1712234567890
+    )
+
+def test_buy_updates_cash_and_average_cost():
+    portfolio = make_portfolio()
+    portfolio.apply_trade("buy", "AAPL", 10, 100.0)
+    position = portfolio.apply_trade("buy", "AAPL", 10, 120.0)
+    assert position.quantity == 20
+    assert position.average_buy_price == pytest.approx(110.0)
+    assert portfolio.current_balance == pytest.approx(7800.0)
+    assert portfolio.version == 2
+
+def test_sell_realizes_pnl_and_closes_position():
+    portfolio = make_portfolio()
+    portfolio.apply_trade("buy", "AAPL", 10, 100.0)
+    portfolio.apply_trade("sell", "AAPL", 4, 150.0)
+    assert portfolio.realized_pnl == pytest.approx(200.0)
+    assert portfolio.positions["AAPL"].average_buy_price == pytest.approx(100.0)
+    position = portfolio.apply_trade("sell", "AAPL", 6, 90.0)
+    assert position.quantity == 0
+    assert "AAPL" not in portfolio.positions
+    assert portfolio.current_balance == pytest.approx(10000.0 + 200.0 - 60.0)
+
+def test_invalid_trades_rejected():
+    portfolio = make_portfolio()
+    with pytest.raises(TradeError):
+        portfolio.apply_trade("buy", "AAPL", 1000, 100.0)
+    with pytest.raises(TradeError):
+        portfolio.apply_trade("sell", "AAPL", 1, 100.0)
+    assert portfolio.current_balance == 10000.0
+    assert portfolio.version == 0
+
+def test_valuation_and_round_trip():
+    portfolio = make_portfolio()
+    portfolio.apply_trade("buy", "AAPL", 10, 100.0)
+    portfolio.apply_trade("buy", "MSFT", 5, 200.0)
+    valuation = portfolio.valuation({"AAPL": 110.0})
+    assert valuation["market_value"] == pytest.approx(1100.0 + 1000.0)
+    assert valuation["unrealized_pnl"] == pytest.approx(100.0)
+    assert valuation["total_value"] == pytest.approx(10100.0)
+
+    positions = {symbol: p.to_record() for symbol, p in portfolio.positions.items()}
+    restored = Portfolio.from_records(portfolio.to_record(), positions)
+    assert restored == portfolio
+
+def test_trades_never_execute_at_mock_prices(monkeypatch):
+    from stocksage_api.services import market_cache, market_data
+    from stocksage_api.services.firebase_service import FirebaseService
+    from stocksage_api.services.portfolio_service import PortfolioEngine
+
+    monkeypatch.setattr(market_cache, "cache", {})
+    monkeypatch.setattr(market_cache, "cache_expiry", {})
+    # yfinance has no quote for AAPL, which the mock data does have a price for
+    monkeypatch.setattr(market_data, "_download_last_closes", lambda keys: {})
+    engine = PortfolioEngine(FirebaseService(backend="memory"))
+    portfolio = engine.create_portfolio("u1", "Test", 10000.0)
+
+    assert market_data.get_latest_prices(["AAPL"]) == {"AAPL": 175.34}
+    with pytest.raises(TradeError):
+        engine.execute_trade(portfolio.id, "u1", "buy", "AAPL", 1)
+    assert engine.get_portfolio(portfolio.id, "u1").current_balance == 10000.0
+
+    monkeypatch.setattr(market_data, "_download_last_closes", lambda keys: {"price:AAPL": 180.0})
+    assert engine.execute_trade(portfolio.id, "u1", "buy", "AAPL", 1)["price"] == 180.0
+
+def test_trades_from_other_processes_are_never_overwritten(monkeypatch):
+    from stocksage_api.services import market_cache, market_data, portfolio_service
+    from stocksage_api.services.firebase_service import FirebaseService
+    from stocksage_api.services.portfolio_service import PortfolioEngine
+
+    monkeypatch.setattr(market_cache, "cache", {})
+    monkeypatch.setattr(market_cache, "cache_expiry", {})
+    monkeypatch.setattr(market_data, "_download_last_closes", lambda keys: {"price:AAPL": 100.0})
+    monkeypatch.setattr(portfolio_service, "TRADE_RETRY_DELAY", 0)
+    firebase = FirebaseService(backend="memory")
+    # Two workers, each with its own copy of the portfolio
+    first, second = PortfolioEngine(firebase), PortfolioEngine(firebase)
+    portfolio = first.create_portfolio("u1", "Test", 10000.0)
+    second.get_portfolio(portfolio.id, "u1")
+
+    first.execute_trade(portfolio.id, "u1", "buy", "AAPL", 10)
+    # The second worker's copy is stale, so its write is refused and retried on the stored state
+    second.execute_trade(portfolio.id, "u1", "buy", "AAPL", 5)
+    stored = firebase.get_data(f"portfolios/{portfolio.id}")
+    assert stored["current_balance"] == 8500.0 and stored["version"] == 2
+    assert "pending_trade" not in stored
+    assert firebase.get_data(f"positions/{portfolio.id}/AAPL")["quantity"] == 15
+    assert [tx["seq"] for tx in first.get_transactions(portfolio.id, "u1")["transactions"]] == [2, 1]
+
+    # With several workers nothing is served from a per-process copy
+    monkeypatch.setenv("API_WORKERS", "2")
+    assert first.get_portfolio(portfolio.id, "u1").current_balance == 8500.0
+    assert [p.version for p in first.list_portfolios("u1")] == [2]
+
+def test_trade_left_unwritten_by_a_stopped_process_is_finished(monkeypatch):
+    from stocksage_api.services import portfolio_service
+    from stocksage_api.services.firebase_service import FirebaseService
+    from stocksage_api.services.portfolio_service import PortfolioConflictError, PortfolioEngine
+
+    firebase = FirebaseService(backend="memory")
+    engine = PortfolioEngine(firebase)
+    portfolio = engine.create_portfolio("u1", "Test", 10000.0)
+    # The process stopped after committing the trade, before writing its position and ledger entry
+    monkeypatch.setattr(firebase, "multi_path_update", lambda updates: 1 / 0)
+    engine._trade(engine.get_portfolio(portfolio.id, "u1"), "buy", "AAPL", 10, 100.0)
+    monkeypatch.undo()
+
+    # Readers already see it; other trades wait for it to be written
+    reader = PortfolioEngine(firebase)
+    assert reader.get_portfolio(portfolio.id, "u1").positions["AAPL"].quantity == 10
+    with pytest.raises(PortfolioConflictError):
+        reader._trade(reader.get_portfolio(portfolio.id, "u1"), "sell", "AAPL", 5, 100.0)
+    assert firebase.get_data(f"positions/{portfolio.id}") is None
+
+    monkeypatch.setattr(portfolio_service, "TRADE_CLAIM_TIMEOUT", -1)
+    loaded = PortfolioEngine(firebase).get_portfolio(portfolio.id, "u1")
+    assert loaded.version == 1 and loaded.current_balance == 9000.0
+    assert "pending_trade" not in firebase.get_data(f"portfolios/{portfolio.id}")
+    assert firebase.get_data(f"positions/{portfolio.id}/AAPL")["quantity"] == 10
+    assert firebase.get_data(f"transactions/{portfolio.id}/s0000000001")["price"] == 100.0
+
+def test_trades_on_other_portfolios_do_not_wait_for_a_slow_one(monkeypatch):
+    import threading
+    from stocksage_api.services import market_cache, market_data
+    from stocksage_api.services.firebase_service import FirebaseService
+    from stocksage_api.services.portfolio_service import PortfolioEngine
+
+    monkeypatch.setattr(market_cache, "cache", {})
+    monkeypatch.setattr(market_cache, "cache_expiry", {})
+    monkeypatch.setattr(market_data, "_download_last_closes", lambda keys: {"price:AAPL": 100.0})
+    firebase = FirebaseService(backend="memory")
+    engine = PortfolioEngine(firebase)
+    slow, fast = engine.create_portfolio("u1", "Slow", 10000.0), engine.create_portfolio("u1", "Fast", 10000.0)
+
+    # The slow portfolio's commit stalls until the other trade has finished
+    released = threading.Event()
+    transaction = firebase.transaction
+    def stalled_transaction(path, update):
+        if slow.id in path:
+            released.wait(5)
+        return transaction(path, update)
+    monkeypatch.setattr(firebase, "transaction", stalled_transaction)
+
+    stalled = threading.Thread(target=engine.execute_trade, args=(slow.id, "u1", "buy", "AAPL", 1))
+    stalled.start()
+    other = threading.Thread(target=engine.execute_trade, args=(fast.id, "u1", "buy", "AAPL", 1))
+    other.start()
+    other.join(2)
+    finished_first = not other.is_alive()
+    released.set()
+    stalled.join()
+    other.join()
+
+    assert finished_first
+    assert [engine.get_portfolio(p.id, "u1").version for p in (slow, fast)] == [1, 1]
+
+def test_concurrent_engine_calls_keep_their_own_paths(monkeypatch):
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from stocksage_api.services import market_cache, market_data
+    from stocksage_api.services.firebase_service import FirebaseService
+    from stocksage_api.services.memory_backend import MemoryQuery
+    from stocksage_api.services.portfolio_service import PortfolioEngine
+
+    monkeypatch.setattr(market_cache, "cache", {})
+    monkeypatch.setattr(market_cache, "cache_expiry", {})
+    monkeypatch.setattr(market_data, "_download_last_closes", lambda keys: {"price:AAPL": 100.0})
+    # Let other threads run between building a query and sending it, as they may with Pyrebase
+    child = MemoryQuery.child
+    def preempted_child(self, *args):
+        query = child(self, *args)
+        time.sleep(0.001)
+        return query
+    monkeypatch.setattr(MemoryQuery, "child", preempted_child)
+    firebase = FirebaseService(backend="memory")
+    engine = PortfolioEngine(firebase)
+
+    def trade(user_id):
+        portfolio = engine.create_portfolio(user_id, "Test", 10000.0)
+        for _ in range(3):
+            engine.execute_trade(portfolio.id, user_id, "buy", "AAPL", 1)
+        return portfolio.id
+
+    with ThreadPoolExecutor(8) as pool:
+        portfolio_ids = list(pool.map(trade, [f"u{i}" for i in range(8)]))
+
+    assert set(firebase.memory_db.get("", shallow=True)) == {"portfolios", "positions", "transactions"}
+    for portfolio_id in portfolio_ids:
+        assert firebase.get_data(f"portfolios/{portfolio_id}")["current_balance"] == 9700.0
+        assert firebase.get_data(f"positions/{portfolio_id}/AAPL")["quantity"] == 3
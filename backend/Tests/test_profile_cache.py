@@ -0,0 +1,50 @@
+import time
+
+from stocksage_api.services.profile_cache import ProfileCache
+
+
+def test_reads_return_copies_and_count_hits():
+    cache = ProfileCache(max_size=10, ttl=60)
+    assert cache.get("u1") is None
+    cache.put("u1", {"name": "Ada", "preferences": {"theme": "dark"}})
+
+    profile = cache.get("u1")
+    profile["preferences"]["theme"] = "light"
+    assert cache.get("u1")["preferences"]["theme"] == "dark"
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_ratio"]) == (2, 1, 0.6667)
+
+
+def test_fill_is_discarded_after_concurrent_invalidation():
+    cache = ProfileCache()
+    version = cache.version
+    cache.handle_event({"event": "put", "path": "/u1/name", "data": "Grace"})
+    cache.fill("u1", {"name": "Ada"}, version)
+    assert cache.get("u1") is None
+
+    cache.fill("u1", {"name": "Grace"}, cache.version)
+    assert cache.get("u1") == {"name": "Grace"}
+
+
+def test_stream_events_update_or_invalidate():
+    cache = ProfileCache()
+    cache.put("u1", {"name": "Ada", "email": "ada@example.com"})
+    cache.put("u2", {"name": "Alan"})
+
+    cache.handle_event({"event": "patch", "path": "/u1",
+                        "data": {"name": "Ada L.", "updated_at": time.time() * 1000 - 50}})
+    profile = cache.get("u1")
+    assert (profile["name"], profile["email"]) == ("Ada L.", "ada@example.com")
+    assert cache.stats()["last_invalidation_lag_ms"] >= 50
+
+    cache.handle_event({"event": "put", "path": "/u1/preferences/theme", "data": "light"})
+    assert cache.get("u1") is None
+
+    cache.handle_event({"event": "put", "path": "/u2", "data": None})
+    assert cache.get("u2") is None
+
+    cache.put("u3", {"name": "Edsger"})
+    cache.handle_event({"event": "put", "path": "/", "data": {"u3": {"name": "Edsger"}}})
+    assert cache.get("u3") is None
+    assert cache.stats()["invalidations"] == 3
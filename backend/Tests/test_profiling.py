@@ -0,0 +1,121 @@
+import asyncio
+import time
+import uuid
+
+import fastapi.routing
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from stocksage_api.main import app
+from stocksage_api.routes.auth import get_current_admin
+from stocksage_api.services import profiling
+from stocksage_api.services.firebase_service import firebase_service
+from stocksage_api.services.metrics import track_upstream
+from stocksage_api.services.profiling import ProfilingMiddleware, RequestProfile, profile_store
+
+client = TestClient(app)
+
+
+def sign_in(admin: bool) -> str:
+    email = f"profiler-{uuid.uuid4().hex[:8]}@example.com"
+    user = firebase_service.create_user(email, "secret123")
+    if admin:
+        firebase_service.set_custom_user_claims(user.uid, {"admin": True})
+    return firebase_service.sign_in_with_email_password(email, "secret123")["idToken"]
+
+
+def test_admin_header_returns_server_timing_and_stores_profile():
+    token = sign_in(admin=True)
+    response = client.get("/api/education/terms/stock", headers={"X-Profile": "1", "Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    timing = response.headers["server-timing"]
+    assert timing.startswith("total;dur=")
+    assert "validation;dur=" in timing and "endpoint;dur=" in timing and "serialization;dur=" in timing
+    # Timed by the routes themselves; FastAPI's own functions are left alone
+    for name in ("solve_dependencies", "run_endpoint_function", "serialize_response"):
+        assert not hasattr(getattr(fastapi.routing, name), "__wrapped__")
+
+    profile_id = response.headers["x-profile-id"]
+    # The admin endpoints' own dependency is overridden, as test_auth replaces the strict token check
+    app.dependency_overrides[get_current_admin] = lambda: {"uid": "admin", "admin": True}
+    try:
+        listed = client.get("/api/admin/profiles").json()["profiles"]
+        assert listed[0]["id"] == profile_id and listed[0]["route"] == "/api/education/terms/{term}"
+        assert listed[0]["reason"] == "header" and listed[0]["status"] == 200
+
+        detail = client.get(f"/api/admin/profiles/{profile_id}").json()
+        assert set(detail["spans_ms"]) >= {"validation", "endpoint", "serialization"}
+        collapsed = client.get(f"/api/admin/profiles/{profile_id}?format=collapsed")
+        assert collapsed.status_code == 200 and "attachment" in collapsed.headers["content-disposition"]
+        assert client.get("/api/admin/profiles/missing").status_code == 404
+    finally:
+        del app.dependency_overrides[get_current_admin]
+
+
+def test_header_is_ignored_without_an_admin_token():
+    before = len(profile_store.list())
+    for headers in ({"X-Profile": "1"}, {"X-Profile": "1", "Authorization": f"Bearer {sign_in(admin=False)}"}):
+        response = client.get("/api/education/terms/stock", headers=headers)
+        assert response.status_code == 200
+        assert "server-timing" not in response.headers and "x-profile-id" not in response.headers
+    assert len(profile_store.list()) == before
+    assert profiling.active is False
+
+
+def test_only_admin_tokens_cost_a_revocation_lookup(monkeypatch):
+    admin_auth = firebase_service.get().admin_auth
+    verify = admin_auth.verify_id_token
+    revocation_checks = []
+
+    def recording_verify(id_token, check_revoked=False, **kwargs):
+        revocation_checks.append(check_revoked)
+        return verify(id_token, check_revoked=check_revoked, **kwargs)
+
+    monkeypatch.setattr(admin_auth, "verify_id_token", recording_verify)
+    headers = {"X-Profile": "1", "Authorization": f"Bearer {sign_in(admin=False)}"}
+    for _ in range(3):
+        assert "x-profile-id" not in client.get("/api/education/terms/stock", headers=headers).headers
+    # Verified once, then answered from the token cache
+    assert revocation_checks == [False]
+
+    revocation_checks.clear()
+    headers = {"X-Profile": "1", "Authorization": f"Bearer {sign_in(admin=True)}"}
+    assert "x-profile-id" in client.get("/api/education/terms/stock", headers=headers).headers
+    assert revocation_checks == [False, True]
+
+
+def test_sampled_requests_record_upstream_spans_and_stacks():
+    demo = FastAPI()
+
+    @demo.get("/slow")
+    async def slow():
+        with track_upstream("yfinance", "info"):
+            await asyncio.to_thread(time.sleep, 0.02)
+        deadline = time.perf_counter() + 0.05
+        while time.perf_counter() < deadline:  # busy on the event loop, so the sampler sees it
+            pass
+        return {"ok": True}
+
+    async def deny(token):
+        return False
+
+    demo.add_middleware(ProfilingMiddleware, authorize=deny, sample_rate=1.0)
+    response = TestClient(demo).get("/slow")
+    # Sampled profiles are kept for download but never exposed in the response
+    assert "server-timing" not in response.headers
+
+    profile = next(p for p in profile_store.list() if p["path"] == "/slow")
+    assert profile["reason"] == "sample"
+    assert profile["spans_ms"]["yfinance"] >= 20
+    assert profile["samples"] > 0
+    stored = profile_store.get(profile["id"])
+    assert any("slow (test_profiling.py" in stack for stack in stored.samples)
+
+
+def test_record_span_is_a_no_op_without_a_profile():
+    profiling.record_span("yfinance", 1.0)
+    profile = RequestProfile("GET", "/x", "header")
+    profile.add("firebase", 0.004)
+    profile.add("firebase", 0.002)
+    assert profile.spans["firebase"] == 0.006
+    assert 'firebase;dur=6.0;desc="2 calls"' in profile.server_timing()
@@ -0,0 +1,62 @@
+import asyncio
+import numpy as np
+import pytest
+from stocksage_api.services.risk import portfolio_risk
+
+rng = np.random.default_rng(7)
+benchmark = 100 * np.cumprod(1 + rng.normal(0.0003, 0.01, 500))
+closes = np.column_stack([
+    benchmark * 2,                                          # moves exactly with the benchmark
+    100 * np.cumprod(1 + rng.normal(0.0005, 0.02, 500)),    # independent stock
+])
+
+def test_beta_of_benchmark_tracker_is_one():
+    metrics = portfolio_risk(closes, benchmark, np.array([1.0, 0.0]))
+    assert metrics["beta"][0] == pytest.approx(1.0)
+    assert metrics["volatility"][0] == pytest.approx(
+        np.std(benchmark[1:] / benchmark[:-1] - 1, ddof=1) * np.sqrt(252)
+    )
+
+def test_cash_reduces_risk_proportionally():
+    metrics = portfolio_risk(closes, benchmark, np.array([[1.0, 0.0], [0.5, 0.0], [0.0, 0.0]]))
+    assert metrics["volatility"][1] == pytest.approx(metrics["volatility"][0] / 2)
+    assert metrics["historical_var"][2] == 0 and metrics["max_drawdown"][2] == 0
+
+def test_var_ordering():
+    metrics = portfolio_risk(closes, benchmark, np.array([0.5, 0.5]), confidence=0.95)
+    assert 0 < metrics["historical_var"][0] <= metrics["historical_cvar"][0]
+    assert 0 < metrics["parametric_var"][0] < metrics["parametric_cvar"][0]
+    stricter = portfolio_risk(closes, benchmark, np.array([0.5, 0.5]), confidence=0.99)
+    assert stricter["historical_var"][0] >= metrics["historical_var"][0]
+    assert -1 < metrics["max_drawdown"][0] < 0
+
+def test_repeated_risk_request_skips_the_price_load(monkeypatch):
+    from stocksage_api.services import portfolio_service
+    from stocksage_api.services.firebase_service import FirebaseService
+    from stocksage_api.services.market_data import PriceMatrix
+    from stocksage_api.services.portfolio import Portfolio
+
+    loads = []
+
+    def load_price_matrix(symbols, start, end):
+        loads.append(symbols)
+        dates = np.arange("2024-01-01", "2024-01-06", dtype="datetime64[D]")
+        return PriceMatrix(dates, symbols, np.column_stack([closes[:5, 0], benchmark[:5]]))
+
+    monkeypatch.setattr(portfolio_service, "load_price_matrix", load_price_matrix)
+    engine = portfolio_service.PortfolioEngine(FirebaseService(backend="memory"))
+    portfolio = Portfolio(id="p1", user_id="u1", name="Test", initial_balance=1000.0,
+                          current_balance=1000.0, start_date="2024-01-01", created_at=0)
+    portfolio.apply_trade("buy", "AAPL", 1, 100.0)
+
+    first = asyncio.run(engine.risk(portfolio))
+    assert asyncio.run(engine.risk(portfolio)) == first
+    assert loads == [["AAPL", "SPY"]]
+    # A trade changes the portfolio version, so its risk is computed again
+    portfolio.apply_trade("buy", "AAPL", 1, 100.0)
+    second = asyncio.run(engine.risk(portfolio))
+    assert len(loads) == 2
+
+    # Memoized answers never touch the lock guarding the portfolios, which trades take
+    engine._lock = None
+    assert asyncio.run(engine.risk(portfolio)) == second
@@ -0,0 +1,127 @@
+import multiprocessing
+import os
+import pickle
+import stat
+import time
+
+import numpy as np
+import pytest
+
+from stocksage_api.config import paths
+from stocksage_api.services import cache_codec, market_cache, shared_cache as shared_cache_tier
+from stocksage_api.services.metrics import cache_requests
+from stocksage_api.services.shared_cache import SharedCache
+
+
+@pytest.fixture
+def shared(tmp_path, monkeypatch):
+    """A shared tier standing in for the one other workers write to"""
+    store = SharedCache(str(tmp_path / "market-cache.sqlite3"))
+    monkeypatch.setattr(shared_cache_tier, "shared_cache", store)
+    return store
+
+
+def test_put_if_newer_keeps_the_freshest_value(tmp_path):
+    store = SharedCache(str(tmp_path / "cache.sqlite3"))
+    assert store.put_if_newer("stock:AAPL", {"price": 1}, fetched_at=100, expires_at=400) is None
+    assert store.put_if_newer("stock:AAPL", {"price": 2}, fetched_at=200, expires_at=500) is None
+    # An older fetch loses and is handed the stored value instead
+    assert store.put_if_newer("stock:AAPL", {"price": 0}, fetched_at=150, expires_at=450) == ({"price": 2}, 200, 500)
+    assert store.get("stock:AAPL") == ({"price": 2}, 200, 500)
+    assert store.get("stock:MSFT") is None
+
+    store.put_if_newer("stock:OLD", 1, fetched_at=0, expires_at=10)
+    assert store.prune(now=10 + store.stale_ttl + 1) == 1
+    assert store.stats()["entries"] == 1
+
+
+def test_values_are_stored_without_pickle():
+    closes = (np.array(["2024-01-02", "2024-01-03"], dtype="datetime64[D]"), np.array([185.64, 184.25]))
+    value = {"symbol": "AAPL", "history": [{"date": "2024-01-02", "price": 185.64}], "closes": closes}
+    decoded = cache_codec.loads(cache_codec.dumps(value))
+    assert decoded["history"] == value["history"]
+    assert isinstance(decoded["closes"], tuple)
+    assert np.array_equal(decoded["closes"][0], closes[0]) and np.array_equal(decoded["closes"][1], closes[1])
+
+    with pytest.raises(TypeError):
+        cache_codec.dumps({"when": object()})
+    with pytest.raises(ValueError):
+        cache_codec.loads(pickle.dumps({"price": 1.0}))
+
+
+def test_cache_files_are_private(tmp_path, monkeypatch):
+    monkeypatch.setattr(paths, "STOCKSAGE_DATA_DIR", str(tmp_path / "data"))
+    path = shared_cache_tier.default_path(8000)
+    SharedCache(path)
+    assert stat.S_IMODE(os.stat(tmp_path / "data").st_mode) == 0o700
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+    # A file other users can write to may have been planted, so it is not opened
+    planted = tmp_path / "planted.sqlite3"
+    planted.touch()
+    planted.chmod(0o666)
+    with pytest.raises(PermissionError):
+        SharedCache(str(planted))
+
+
+def _write_from_child(path):
+    SharedCache(path).put_if_newer("price:MSFT", 328.79, fetched_at=time.time(), expires_at=time.time() + 60)
+
+
+def test_entries_are_visible_across_processes(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    store = SharedCache(path)
+    store.get("price:MSFT")  # open this process's connection before forking
+    child = multiprocessing.get_context("fork").Process(target=_write_from_child, args=(path,))
+    child.start()
+    child.join(10)
+    assert child.exitcode == 0
+    assert store.get("price:MSFT")[0] == 328.79
+
+
+def test_fetch_by_another_worker_is_served_without_refetching(shared):
+    key = "shared-test:AAPL"
+    market_cache.cache.pop(key, None)
+    shared.put_if_newer(key, {"symbol": "AAPL"}, time.time(), time.time() + 60)
+    before = cache_requests.value("shared-test", "shared_hit")
+
+    def fetch():
+        raise AssertionError("should not fetch")
+
+    assert market_cache.get_cached_or_fetch(key, fetch) == {"symbol": "AAPL"}
+    assert cache_requests.value("shared-test", "shared_hit") == before + 1
+    # Now also in this worker's own cache
+    assert market_cache.get_cached_or_fetch(key, fetch) == {"symbol": "AAPL"}
+
+
+def test_fetched_data_is_shared_and_stale_entries_back_up_failures(shared):
+    key = "shared-test:MSFT"
+    market_cache.cache.pop(key, None)
+    assert market_cache.get_cached_or_fetch(key, lambda: {"price": 328.79}) == {"price": 328.79}
+    value, fetched_at, expires_at = shared.get(key)
+    assert value == {"price": 328.79} and expires_at == pytest.approx(fetched_at + market_cache.CACHE_DURATION, abs=1)
+
+    # Another worker with nothing cached locally falls back to the expired shared entry
+    market_cache.cache.pop(key, None)
+    shared.put_if_newer(key, {"price": 300.0}, time.time(), time.time() - 1)
+
+    def failing_fetch():
+        raise RuntimeError("yfinance down")
+
+    assert market_cache.get_cached_or_fetch(key, failing_fetch) == {"price": 300.0}
+
+
+def test_batch_lookups_use_the_shared_tier(shared):
+    keys = ["shared-test:price:A", "shared-test:price:B"]
+    for key in keys:
+        market_cache.cache.pop(key, None)
+    shared.put_if_newer(keys[0], 10.0, time.time(), time.time() + 60)
+    requested = []
+
+    def fetch_many(missing):
+        requested.extend(missing)
+        return {key: 20.0 for key in missing}
+
+    assert market_cache.get_cached_or_fetch_many(keys, fetch_many) == {keys[0]: 10.0, keys[1]: 20.0}
+    assert requested == [keys[1]]
+    assert shared.get(keys[1])[0] == 20.0
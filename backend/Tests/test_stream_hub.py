@@ -0,0 +1,159 @@
+import asyncio
+
+from stocksage_api.services.firebase_service import FirebaseService
+from stocksage_api.services.stream_hub import StreamHub
+
+
+class CountingFirebase:
+    """Memory-backed FirebaseService that counts upstream streams"""
+
+    def __init__(self):
+        self.service = FirebaseService(backend="memory")
+        self.memory_db = self.service.memory_db
+        self.opened = 0
+
+    def stream_data(self, path, callback):
+        self.opened += 1
+        return self.service.stream_data(path, callback)
+
+
+async def drain(subscription):
+    """Events already queued for a subscription"""
+    await asyncio.sleep(0)
+    events = []
+    while (event := await subscription.get(timeout=0.01)) is not None:
+        events.append(event)
+    return events
+
+
+def test_one_upstream_fans_out_to_subscribers():
+    firebase = CountingFirebase()
+    firebase.memory_db.set("portfolios", {"p1": {"name": "Growth", "cash": 100}, "p2": {"name": "Income"}})
+
+    async def scenario():
+        hub = StreamHub(firebase, prefixes=["portfolios"])
+        first = hub.subscribe("portfolios/p1")
+        second = hub.subscribe(["portfolios/p1/cash", "portfolios/p2"])
+        firebase.memory_db.update("portfolios/p1", {"cash": 50})
+        firebase.memory_db.set("portfolios/p2/name", "Dividends")
+        events = await drain(first), await drain(second)
+        stats = hub.stats()
+        hub.close()
+        return events, stats
+
+    (first, second), stats = asyncio.run(scenario())
+    assert firebase.opened == 1 and stats["upstreams"][0]["subscribers"] == 2
+    assert [(e["path"], e["data"]) for e in first] == [("/", {"name": "Growth", "cash": 100}), ("/cash", 50)]
+    # The queued initial cash value was superseded by the newer put before it was read
+    assert [(e["stream_id"], e["path"], e["data"]) for e in second] == [
+        ("/portfolios/p2", "/", {"name": "Income"}),
+        ("/portfolios/p1/cash", "/", 50),
+        ("/portfolios/p2", "/name", "Dividends"),
+    ]
+
+
+def test_overflow_policies():
+    firebase = CountingFirebase()
+
+    async def scenario():
+        hub = StreamHub(firebase, prefixes=["prices"])
+        oldest = hub.subscribe("prices", max_queue=3, policy="drop_oldest")
+        newest = hub.subscribe("prices", max_queue=3, policy="drop_newest")
+        coalesce = hub.subscribe("prices", max_queue=3, policy="coalesce")
+        for i in range(5):
+            firebase.memory_db.set("prices/AAPL", 100 + i)
+        firebase.memory_db.set("prices/MSFT", 300)
+        results = [await drain(subscription) for subscription in (oldest, newest, coalesce)]
+        hub.close()
+        return results, coalesce.stats()
+
+    (oldest, newest, coalesce), stats = asyncio.run(scenario())
+    assert [e["data"] for e in oldest] == [103, 104, 300]
+    assert [e["data"] for e in newest] == [None, 100, 101]
+    # Repeated puts to one path collapse to the latest value
+    assert [(e["path"], e["data"]) for e in coalesce] == [("/", None), ("/AAPL", 104), ("/MSFT", 300)]
+    assert stats["coalesced"] == 4 and stats["dropped"] == 0
+
+
+def test_coalesce_overflow_resyncs_from_snapshot():
+    firebase = CountingFirebase()
+
+    async def scenario():
+        hub = StreamHub(firebase, prefixes=["prices"])
+        subscription = hub.subscribe("prices", max_queue=2, policy="coalesce")
+        for symbol in ("AAPL", "MSFT", "GOOGL"):
+            firebase.memory_db.set(f"prices/{symbol}", 1)
+        events = await drain(subscription)
+        hub.close()
+        return events, subscription.stats()
+
+    events, stats = asyncio.run(scenario())
+    # The snapshot already holds GOOGL; its own event still follows and is harmless to replay
+    assert [(e["path"], e["data"]) for e in events] == [("/", {"AAPL": 1, "MSFT": 1, "GOOGL": 1}), ("/GOOGL", 1)]
+    assert stats["resyncs"] == 1
+
+
+def test_reconnect_resumes_with_only_missed_changes():
+    firebase = CountingFirebase()
+    firebase.memory_db.set("users", {"u1": {"name": "Ada"}, "u2": {"name": "Alan"}})
+    received = []
+
+    hub = StreamHub(firebase, prefixes=["users"])
+    hub.listen("users", received.append)
+    upstream = hub._upstreams[("users",)]
+    upstream.stream.callback({"event": "cancel", "path": "/", "data": None})
+
+    # Changes made while the stream is down are not seen by the old stream
+    firebase.memory_db.set("users/u2/name", "Alan T.")
+    firebase.memory_db.set("users/u3", {"name": "Grace"})
+    assert len(received) == 1
+
+    hub.check_upstreams()
+    assert firebase.opened == 2 and hub.stats()["upstreams"][0]["reconnects"] == 1
+    assert [(e["path"], e["data"]) for e in received[1:]] == [("/u2/name", "Alan T."), ("/u3", {"name": "Grace"})]
+
+    firebase.memory_db.set("users/u1/name", "Ada L.")
+    assert received[-1]["path"] == "/u1/name"
+    hub.close()
+
+
+def test_snapshots_are_not_changed_by_later_writes():
+    firebase = CountingFirebase()
+    firebase.memory_db.set("portfolios/p1", {"name": "Growth", "cash": 100})
+
+    async def scenario():
+        hub = StreamHub(firebase, prefixes=["portfolios"])
+        first = hub.subscribe("portfolios/p1")
+        snapshot = (await drain(first))[0]["data"]
+        firebase.memory_db.update("portfolios/p1", {"cash": 50})
+        second = hub.subscribe("portfolios/p1")
+        events = await drain(second)
+        hub.close()
+        return snapshot, events
+
+    snapshot, events = asyncio.run(scenario())
+    assert snapshot == {"name": "Growth", "cash": 100}
+    assert [e["data"] for e in events] == [{"name": "Growth", "cash": 50}]
+
+
+def test_upstreams_cover_only_the_subscribed_subtree():
+    firebase = CountingFirebase()
+    firebase.memory_db.set("portfolios", {"p1": {"name": "Growth", "cash": 100}, "p2": {"name": "Income"}})
+
+    async def scenario():
+        hub = StreamHub(firebase, prefixes=[])
+        first = hub.subscribe("portfolios/p1")
+        second = hub.subscribe("portfolios/p1/cash")
+        await drain(first), await drain(second)
+        upstream = hub._upstreams[("portfolios", "p1")]
+        mirrored, upstreams = upstream.mirror, hub.stats()["upstreams"]
+        first.close()
+        second.close()
+        return mirrored, upstreams, hub.stats()["upstreams"]
+
+    mirrored, upstreams, after_close = asyncio.run(scenario())
+    # Other portfolios are neither downloaded nor kept
+    assert mirrored == {"name": "Growth", "cash": 100}
+    assert firebase.opened == 1
+    assert [(u["path"], u["subscribers"]) for u in upstreams] == [("/portfolios/p1", 2)]
+    assert after_close == []
@@ -0,0 +1,54 @@
+import time
+
+from stocksage_api.services.token_cache import TokenCache
+
+
+def claims(uid, expires_in=3600):
+    return {"uid": uid, "exp": int(time.time()) + expires_in}
+
+
+def test_hit_until_expiry_minus_skew():
+    cache = TokenCache(max_size=10, skew=30)
+    cache.put("token-a", claims("u1"))
+    assert cache.get("token-a")["uid"] == "u1"
+    assert cache.get("token-b") is None
+
+    # Tokens inside the skew window are never cached
+    cache.put("token-c", claims("u2", expires_in=10))
+    assert cache.get("token-c") is None
+    assert cache.stats() == {"size": 1, "hits": 1, "misses": 2}
+
+
+def test_expired_entries_are_dropped(monkeypatch):
+    cache = TokenCache(max_size=10, skew=30)
+    cache.put("token-a", claims("u1", expires_in=100))
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 71)
+    assert cache.get("token-a") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_lru_eviction_and_user_invalidation():
+    cache = TokenCache(max_size=2, skew=0)
+    cache.put("t1", claims("u1"))
+    cache.put("t2", claims("u2"))
+    cache.get("t1")
+    cache.put("t3", claims("u1"))
+    assert cache.get("t2") is None
+
+    assert cache.invalidate_user("u1") == 2
+    assert cache.get("t1") is None and cache.get("t3") is None
+
+
+def test_callers_get_their_own_copy_of_the_claims():
+    cache = TokenCache(max_size=10, skew=30)
+    verified = {**claims("u1"), "firebase": {"sign_in_provider": "password"}}
+    cache.put("token-a", verified)
+    verified["admin"] = True
+
+    first = cache.get("token-a")
+    first["uid"] = "someone-else"
+    first["firebase"]["sign_in_provider"] = "custom"
+    second = cache.get("token-a")
+    assert second["uid"] == "u1" and "admin" not in second
+    assert second["firebase"] == {"sign_in_provider": "password"}
@@ -0,0 +1,133 @@
+import json
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from stocksage_api.main import app
+from stocksage_api.routes.auth import get_current_admin
+from stocksage_api.routes.timed_route import TimedRoute
+from stocksage_api.services import market_cache, tracing
+from stocksage_api.services.metrics import track_upstream
+from stocksage_api.services.tracing import Trace, TraceBuffer, TraceExporter, TracingMiddleware
+
+client = TestClient(app)
+
+
+def demo_client(buffer: TraceBuffer) -> TestClient:
+    demo = FastAPI()
+    # Endpoint spans come from the route class the API's routers use
+    demo.router.route_class = TimedRoute
+
+    @demo.get("/quote/{symbol}")
+    async def quote(symbol: str):
+        def fetch():
+            with track_upstream("yfinance", "info"):
+                time.sleep(0.01)
+            return {"symbol": symbol}
+        return market_cache.get_cached_or_fetch(f"trace-test:{symbol}", fetch)
+
+    @demo.get("/fail")
+    async def fail():
+        with track_upstream("firebase", "get_data"):
+            raise RuntimeError("database down")
+
+    demo.add_middleware(TracingMiddleware, buffer=buffer)
+    return TestClient(demo, raise_server_exceptions=False)
+
+
+def test_spans_share_the_request_trace():
+    buffer = TraceBuffer(size=10)
+    demo = demo_client(buffer)
+    market_cache.cache.pop("trace-test:AAPL", None)
+    response = demo.get("/quote/AAPL")
+    trace = buffer.get(response.headers["x-trace-id"])
+
+    names = [span.name for span in trace.spans]
+    assert names == ["GET /quote/{symbol}", "handler quote", "cache trace-test", "yfinance info"]
+    root, handler, cache, upstream = trace.spans
+    assert handler.parent_id == root.span_id and cache.parent_id == handler.span_id
+    assert upstream.parent_id == cache.span_id and upstream.kind == tracing.CLIENT
+    assert cache.attributes["result"] == "miss"
+    assert root.attributes["http.route"] == "/quote/{symbol}" and root.attributes["http.status_code"] == 200
+    assert trace.breakdown()["yfinance"] >= 10
+
+    # A cache hit has no upstream span
+    trace = buffer.get(demo.get("/quote/AAPL").headers["x-trace-id"])
+    assert [span.name for span in trace.spans][-1] == "cache trace-test"
+    assert trace.spans[-1].attributes["result"] == "hit"
+
+
+def test_errors_and_incoming_traceparent():
+    buffer = TraceBuffer(size=10)
+    demo = demo_client(buffer)
+    trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+    response = demo.get("/fail", headers={"traceparent": f"00-{trace_id}-00f067aa0ba902b7-01"})
+    assert response.status_code == 500
+    trace = buffer.get(trace_id)
+    assert trace.spans[0].parent_id == "00f067aa0ba902b7"
+    assert trace.spans[0].error == "RuntimeError"
+    assert trace.spans[-1].name == "firebase get_data" and trace.spans[-1].error == "RuntimeError"
+
+
+def test_spans_outside_a_request_are_no_ops():
+    with tracing.span("cache anything", "cache") as span:
+        span.set("result", "hit")
+    assert span is tracing.NOOP_SPAN
+    assert tracing.current_trace_id() is None
+
+
+def test_buffer_is_bounded_and_reports_tail_breakdown():
+    buffer = TraceBuffer(size=3)
+    for ms in (5, 10, 20, 200):
+        trace = Trace()
+        trace.root = root = tracing.Span(trace, "GET /x", "http", tracing.SERVER, attributes={"http.route": "/x"})
+        root.start_ns = 0
+        root.end_ns = ms * 1_000_000
+        trace.spans.append(root)
+        upstream = tracing.Span(trace, "yfinance info", "yfinance", tracing.CLIENT, root.span_id)
+        upstream.start_ns, upstream.end_ns = 0, (ms - 4) * 1_000_000
+        trace.spans.append(upstream)
+        buffer.add(trace)
+
+    slowest = buffer.slowest(min_duration_ms=15)
+    assert [trace["duration_ms"] for trace in slowest] == [200, 20]
+    assert slowest[0]["slowest_span"] == {"name": "yfinance info", "duration_ms": 196}
+    breakdown = buffer.breakdown(route="/x", percentile=90)
+    assert breakdown["traces"] == 3 and breakdown["threshold_ms"] == 200
+    assert breakdown["tail"]["mean_component_ms"] == {"yfinance": 196, "http": 4}
+
+
+def test_exporter_writes_otlp_json_lines(tmp_path):
+    buffer = TraceBuffer(size=10)
+    demo = demo_client(buffer)
+    trace_id = demo.get("/quote/MSFT").headers["x-trace-id"]
+
+    path = tmp_path / "traces.jsonl"
+    exporter = TraceExporter(str(path))
+    exporter.export(buffer.get(trace_id))
+    exporter.close()
+
+    request = json.loads(path.read_text().splitlines()[0])
+    resource = request["resourceSpans"][0]
+    assert resource["resource"]["attributes"][0] == {"key": "service.name", "value": {"stringValue": "stocksage-api"}}
+    spans = resource["scopeSpans"][0]["spans"]
+    assert {span["traceId"] for span in spans} == {trace_id}
+    assert spans[0]["kind"] == tracing.SERVER and "parentSpanId" not in spans[0]
+    assert int(spans[0]["endTimeUnixNano"]) >= int(spans[0]["startTimeUnixNano"])
+    assert {"key": "http.status_code", "value": {"intValue": "200"}} in spans[0]["attributes"]
+
+
+def test_app_returns_trace_ids_and_admin_can_query_them():
+    trace_id = client.get("/api/education/terms/stock").headers["x-trace-id"]
+    app.dependency_overrides[get_current_admin] = lambda: {"uid": "admin", "admin": True}
+    try:
+        detail = client.get(f"/api/admin/traces/{trace_id}").json()
+        assert detail["route"] == "/api/education/terms/{term}"
+        assert [span["name"] for span in detail["spans"]][:2] == ["GET /api/education/terms/{term}", "handler get_stock_term"]
+        listed = client.get("/api/admin/traces", params={"route": "/api/education/terms/{term}"}).json()["traces"]
+        assert trace_id in [trace["trace_id"] for trace in listed]
+        assert client.get("/api/admin/traces/breakdown").json()["traces"] > 0
+        assert client.get("/api/admin/traces/missing").status_code == 404
+    finally:
+        del app.dependency_overrides[get_current_admin]
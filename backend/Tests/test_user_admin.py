@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from stocksage_api.main import app
+from stocksage_api.routes.auth import get_current_admin
+from stocksage_api.services.async_firebase_service import AsyncFirebaseService
+from stocksage_api.services.firebase_service import FirebaseService
+from stocksage_api.services.user_admin import UserAdmin
+
+
+def run_admin(scenario):
+    """Run scenario(admin, firebase) against a fresh in-memory backend"""
+    firebase = FirebaseService(backend="memory")
+
+    async def main():
+        service = AsyncFirebaseService(firebase)
+        try:
+            return await scenario(UserAdmin(service, hash_rounds=1000), firebase)
+        finally:
+            await service.aclose()
+
+    return asyncio.run(main())
+
+
+def test_import_reports_partial_failures():
+    async def scenario(admin, firebase):
+        firebase.create_user("taken@example.com", "secret1")
+        users = [{"email": f"student{i}@example.com", "password": f"pass-{i}", "name": f"Student {i}"} for i in range(5)]
+        users += [{"email": "STUDENT0@example.com", "password": "again1"}, {"email": "taken@example.com", "password": "secret2"}]
+        return await admin.import_users(users), firebase
+
+    report, firebase = run_admin(scenario)
+    assert (report["requested"], report["succeeded"], report["failed"]) == (7, 5, 2)
+    assert report["results"][5]["error"] == "Duplicate email in request"
+    assert "already in use" in report["results"][6]["error"] and report["results"][6]["uid"] is None
+
+    uid = report["results"][2]["uid"]
+    assert firebase.get_data(f"users/{uid}")["name"] == "Student 2"
+    assert firebase.sign_in_with_email_password("student2@example.com", "pass-2")["localId"] == uid
+
+
+def test_lookup_disable_and_delete():
+    async def scenario(admin, firebase):
+        imported = await admin.import_users([{"email": f"u{i}@example.com", "password": "secret1"} for i in range(3)])
+        uids = [result["uid"] for result in imported["results"]]
+        found = await admin.lookup(uids[:2] + ["missing"], ["u2@example.com", "nobody@example.com"])
+        disabled = await admin.set_disabled(uids[:2] + ["missing"])
+        deleted = await admin.delete_users(uids[1:])
+        return uids, found, disabled, deleted, firebase
+
+    uids, found, disabled, deleted, firebase = run_admin(scenario)
+    assert sorted(user["uid"] for user in found["users"]) == sorted(uids)
+    assert found["not_found"] == [{"uid": "missing"}, {"email": "nobody@example.com"}]
+
+    assert disabled["succeeded"] == 2 and disabled["results"][2]["status"] == "failed"
+    assert firebase.get_user(uids[0]).disabled
+
+    assert deleted["succeeded"] == 2
+    assert firebase.get_data(f"users/{uids[0]}") is not None
+    assert firebase.get_data(f"users/{uids[1]}") is None and firebase.get_data(f"users/{uids[2]}") is None
+
+
+def test_admin_routes_require_admin_claim():
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(get_current_admin({"uid": "u1"}))
+    assert error.value.status_code == 403
+
+    app.dependency_overrides[get_current_admin] = lambda: {"uid": "admin", "admin": True}
+    try:
+        client = TestClient(app)
+        response = client.post("/api/admin/users/import", json={"users": [
+            {"email": "route-import@example.com", "password": "secret1"},
+            {"email": "not-an-email", "password": "secret1"},
+        ]})
+        assert response.status_code == 422
+        response = client.post("/api/admin/users/lookup", json={"uids": [], "emails": []})
+        assert response.status_code == 422
+        response = client.post("/api/admin/users/delete", json={"uids": ["does-not-exist"]})
+        assert response.status_code == 200 and response.json()["succeeded"] == 1
+    finally:
+        del app.dependency_overrides[get_current_admin]
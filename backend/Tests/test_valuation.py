@@ -0,0 +1,63 @@
+import time
+import numpy as np
+import pytest
+from stocksage_api.services.valuation import compare_portfolios, holdings_tensor, equity_curves
+
+dates = np.arange("2024-01-01", "2024-01-11", dtype="datetime64[D]")
+symbols = ["AAPL", "MSFT"]
+closes = np.column_stack([np.linspace(100, 109, 10), np.linspace(200, 191, 10)])
+benchmark = np.linspace(400, 418, 10)
+
+def ms(day):
+    return int(np.datetime64(day, "ms").astype(np.int64))
+
+def entry(day, side, symbol, quantity, price):
+    return {"timestamp": ms(day), "type": side, "symbol": symbol, "quantity": quantity, "price": price}
+
+portfolios = [
+    {"id": "p1", "name": "Apple", "initial_balance": 1000.0,
+     "entries": [entry("2024-01-03", "buy", "AAPL", 5, 102.0)]},
+    {"id": "p2", "name": "Mixed", "initial_balance": 2000.0,
+     "entries": [entry("2023-12-15", "buy", "MSFT", 4, 210.0),
+                 entry("2024-01-05", "sell", "MSFT", 2, 196.0),
+                 entry("2024-01-05", "buy", "AAPL", 1, 104.0)]},
+    {"id": "p3", "name": "Cash", "initial_balance": 500.0, "entries": []},
+]
+
+def test_holdings_accumulate_by_trade_date():
+    holdings = holdings_tensor(dates, symbols, portfolios)
+    shares, cash = holdings["shares"], holdings["cash"]
+    assert shares[0, 1, 0] == 0 and shares[0, 2, 0] == 5
+    assert cash[0, -1] == pytest.approx(1000 - 510)
+    assert shares[1, 0, 1] == 4 and shares[1, 4, 1] == 2 and shares[1, 4, 0] == 1
+    assert cash[1, 4] == pytest.approx(2000 - 840 + 392 - 104)
+
+def test_equity_curves_match_manual_valuation():
+    holdings = holdings_tensor(dates, symbols, portfolios)
+    values = equity_curves(closes, holdings["shares"], holdings["cash"])
+    assert values[0, -1] == pytest.approx(490 + 5 * closes[-1, 0])
+    assert values[2] == pytest.approx(np.full(10, 500.0))
+
+def test_compare_reports_benchmark_relative_metrics():
+    result = compare_portfolios(dates, symbols, closes, "SPY", benchmark, portfolios)
+    assert result["benchmark"]["total_return"] == pytest.approx(418 / 400 - 1)
+    cash_only = result["portfolios"][2]["metrics"]
+    assert cash_only["beta"] == 0 and cash_only["volatility"] == 0
+    assert cash_only["excess_return"] == pytest.approx(-(418 / 400 - 1))
+    assert len(result["portfolios"][0]["equity_curve"]) == len(dates)
+
+def test_twenty_portfolios_over_a_year_is_fast():
+    year = np.arange("2023-01-01", "2024-01-01", dtype="datetime64[D]")
+    rng = np.random.default_rng(0)
+    names = [f"S{i}" for i in range(30)]
+    prices = 100 * np.cumprod(1 + rng.normal(0, 0.01, (len(year), 30)), axis=0)
+    many = [
+        {"id": f"p{p}", "initial_balance": 1e6, "entries": [
+            entry(str(year[rng.integers(len(year))]), "buy", names[rng.integers(30)], 1, 100.0)
+            for _ in range(200)
+        ]}
+        for p in range(20)
+    ]
+    start = time.perf_counter()
+    compare_portfolios(year, names, prices, "SPY", prices[:, 0], many)
+    assert time.perf_counter() - start < 1.0
@@ -0,0 +1,108 @@
+import asyncio
+
+from stocksage_api.services.async_firebase_service import AsyncFirebaseService
+from stocksage_api.services.firebase_service import FirebaseService
+from stocksage_api.services.write_batch import WriteBatch, WriteBehindBuffer
+
+
+def test_batch_flattens_writes_into_one_update():
+    keys = iter(["k1", "k2"])
+    batch = WriteBatch(generate_key=lambda: next(keys))
+    batch.set("portfolios/p1/current_balance", 900.0)
+    batch.update("users/u1", {"name": "Ada", "preferences": {"theme": "dark"}})
+    key = batch.push("transactions/p1", {"symbol": "AAPL"})
+    batch.delete("positions/p1/MSFT")
+
+    assert key == "k1"
+    assert len(batch) == 4
+    assert batch.updates == {
+        "portfolios/p1/current_balance": 900.0,
+        "users/u1/name": "Ada",
+        "users/u1/preferences": {"theme": "dark"},
+        "transactions/p1/k1": {"symbol": "AAPL"},
+        "positions/p1/MSFT": None,
+    }
+
+
+def test_batch_never_lists_overlapping_paths():
+    batch = WriteBatch()
+    batch.set("users/u1", {"name": "Ada", "preferences": {"theme": "dark"}})
+    batch.set("users/u1/preferences/theme", "light")
+    batch.delete("users/u1/name")
+    assert batch.updates == {"users/u1": {"preferences": {"theme": "light"}}}
+
+    batch.set("users/u2/name", "Alan")
+    batch.set("users/u2/email", "alan@example.com")
+    batch.set("users/u2", {"name": "Grace"})
+    assert batch.updates["users/u2"] == {"name": "Grace"}
+    assert not any(path.startswith("users/u2/") for path in batch.updates)
+
+
+def test_write_behind_coalesces_repeated_updates():
+    flushed = []
+
+    async def flush(updates):
+        flushed.append(updates)
+
+    async def scenario():
+        buffer = WriteBehindBuffer(flush, window=0.01)
+        waiters = [buffer.update("users/u1", {"last_seen": i}) for i in range(20)]
+        waiters.append(buffer.update("users/u2", {"last_seen": 7}))
+        await asyncio.gather(*waiters)
+        return buffer.stats()
+
+    stats = asyncio.run(scenario())
+    assert flushed == [{"users/u1/last_seen": 19, "users/u2/last_seen": 7}]
+    assert stats["writes"] == 21 and stats["flushes"] == 1 and stats["round_trips_saved"] == 20
+
+
+def test_write_behind_failure_reaches_waiters_and_is_never_left_unretrieved():
+    async def flush(updates):
+        raise RuntimeError("database unavailable")
+
+    async def scenario():
+        buffer = WriteBehindBuffer(flush, window=0.01)
+        # One caller does not wait for its write
+        unawaited = buffer.update("users/u2", {"last_seen": 1})
+        try:
+            await buffer.update("users/u1", {"last_seen": 1})
+            raised = False
+        except RuntimeError:
+            raised = True
+        return raised, unawaited, buffer.stats()
+
+    raised, unawaited, stats = asyncio.run(scenario())
+    assert raised and stats["failures"] == 1
+    # The buffer logged the failure, so asyncio has no "exception was never retrieved" to report
+    assert not unawaited._log_traceback
+    assert isinstance(unawaited.exception(), RuntimeError)
+
+
+def test_profile_updates_share_a_round_trip_and_are_written_on_close():
+    firebase = FirebaseService(backend="memory")
+
+    async def scenario():
+        service = AsyncFirebaseService(firebase)
+        service.write_behind.window = 0.01
+        await asyncio.gather(
+            service.update_user_profile("u1", {"name": "Ada"}),
+            service.update_user_profile("u2", {"name": "Alan"}),
+            service.update_user_profile("u1", {"theme": "dark"}),
+        )
+        round_trips = service.round_trips
+        batch = service.batch()
+        batch.set("users/u4/name", "Edsger")
+        batch.set("users/u5/name", "Barbara")
+        await service.commit_batch(batch)
+        # A write still waiting for its window is flushed on shutdown
+        pending = service.write_behind.update("users/u3", {"name": "Grace"})
+        await service.aclose()
+        await pending
+        return round_trips, service.write_stats()
+
+    round_trips, stats = asyncio.run(scenario())
+    assert round_trips == 1
+    assert firebase.get_data("users/u1") == {"name": "Ada", "theme": "dark"}
+    assert firebase.get_data("users/u3") == {"name": "Grace"}
+    assert stats["write_behind"]["round_trips_saved"] == 2
+    assert stats["batch"] == {"writes": 2, "commits": 1, "round_trips_saved": 1}
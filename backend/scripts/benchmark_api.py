@@ -0,0 +1,362 @@
+"""Offline load test for the API.
+
+Runs the FastAPI app in-process against the in-memory Firebase backend and the
+market data stand-in (scripts/market_data_standin.py), drives a weighted mix of
+stock, search, history, profile and education requests at each concurrency
+level, and reports throughput and p50/p95/p99 latency per endpoint. A second,
+sequential pass under tracemalloc records the memory each endpoint allocates.
+
+Results are written as JSON; pass an earlier result with --compare to list
+regressions (the exit status is 1 when there are any).
+
+    python -m scripts.benchmark_api --mix mixed --concurrency 1 16 64 --duration 10
+    python -m scripts.benchmark_api --compare benchmark-results/<earlier>.json
+
+Requests and the app share one event loop, as they would under a single uvicorn
+worker, so blocking work inside a route shows up as latency on every endpoint.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import math
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Add the project root to path
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, BACKEND_DIR)
+
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmark-results")
+RESULT_FORMAT = 1
+
+SYMBOLS = ["AAPL", "MSFT", "GOOGL", "AMZN", "META", "TSLA", "NVDA", "JPM", "V", "JNJ"]
+SEARCH_QUERIES = ["AAPL", "msft", "nvda", "apple", "tesla", "coca cola", "bank"]
+HISTORY_DAYS = (7, 30, 90, 365)
+TERMS = ["stock", "dividend", "market cap", "Bull-Market", "P/E ratio", "volatility", "fake term"]
+EDUCATION_QUERIES = ["volatility", "dividend", "market", "risk", "long term", "divid"]
+
+# Endpoint name -> function(rng) returning (path, needs_auth)
+ENDPOINTS: Dict[str, Callable[[random.Random], Tuple[str, bool]]] = {
+    "stocks": lambda rng: ("/api/stocks", False),
+    "search": lambda rng: (f"/api/stocks/search?query={rng.choice(SEARCH_QUERIES)}", False),
+    "history": lambda rng: (f"/api/stocks/{rng.choice(SYMBOLS)}/history?days={rng.choice(HISTORY_DAYS)}", False),
+    "profile": lambda rng: ("/api/auth/profile", True),
+    "education_term": lambda rng: (f"/api/education/terms/{rng.choice(TERMS)}", False),
+    "education_search": lambda rng: (f"/api/education/search?q={rng.choice(EDUCATION_QUERIES)}", False),
+    "education_tips": lambda rng: ("/api/education/tips", False),
+}
+
+# Relative request weights for each traffic mix
+MIXES: Dict[str, Dict[str, int]] = {
+    "browse": {"stocks": 30, "search": 25, "history": 30, "profile": 5, "education_term": 5, "education_search": 5},
+    "learn": {"education_term": 35, "education_search": 35, "education_tips": 15, "profile": 10, "stocks": 5},
+    "mixed": {"stocks": 15, "search": 15, "history": 20, "profile": 20,
+              "education_term": 10, "education_search": 15, "education_tips": 5},
+}
+
+# Expected non-2xx answers (unknown glossary terms are part of the mix)
+EXPECTED_STATUS = {"education_term": (200, 404)}
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(pct / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    values = sorted(latencies)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "throughput_rps": round(len(values) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(statistics.fmean(values) * 1000, 2) if values else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p95_ms": round(percentile(values, 95) * 1000, 2),
+        "p99_ms": round(percentile(values, 99) * 1000, 2),
+        "max_ms": round(values[-1] * 1000, 2) if values else 0.0,
+    }
+
+
+def git_revision() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=BACKEND_DIR,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+        return {"commit": commit, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+class LoadRunner:
+    def __init__(self, client, tokens: List[str], mix: Dict[str, int], seed: int):
+        self.client = client
+        self.tokens = tokens
+        self.names = list(mix)
+        self.weights = [mix[name] for name in self.names]
+        self.seed = seed
+
+    async def request(self, name: str, rng: random.Random) -> Tuple[float, bool]:
+        path, needs_auth = ENDPOINTS[name](rng)
+        headers = {"Authorization": f"Bearer {rng.choice(self.tokens)}"} if needs_auth else None
+        start = time.perf_counter()
+        response = await self.client.get(path, headers=headers)
+        elapsed = time.perf_counter() - start
+        ok = response.status_code in EXPECTED_STATUS.get(name, (200,))
+        return elapsed, ok
+
+    async def run(self, concurrency: int, duration: float) -> Dict[str, Any]:
+        """Keep `concurrency` clients busy for `duration` seconds"""
+        latencies: Dict[str, List[float]] = defaultdict(list)
+        errors: Dict[str, int] = defaultdict(int)
+        deadline = time.perf_counter() + duration
+
+        async def client_loop(worker: int) -> None:
+            rng = random.Random(self.seed * 1000 + worker)
+            while time.perf_counter() < deadline:
+                name = rng.choices(self.names, self.weights)[0]
+                try:
+                    elapsed, ok = await self.request(name, rng)
+                except Exception:
+                    errors[name] += 1
+                    continue
+                latencies[name].append(elapsed)
+                if not ok:
+                    errors[name] += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(worker) for worker in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+        all_latencies = [latency for values in latencies.values() for latency in values]
+        return {
+            "concurrency": concurrency,
+            "duration_s": round(elapsed, 2),
+            **summarize(all_latencies, sum(errors.values()), elapsed),
+            "endpoints": {name: summarize(latencies[name], errors[name], elapsed) for name in self.names},
+        }
+
+    async def measure_memory(self, requests: int) -> Dict[str, Dict[str, float]]:
+        """Peak and retained Python heap growth for `requests` sequential calls to each endpoint"""
+        results = {}
+        tracemalloc.start()
+        try:
+            for name in self.names:
+                rng = random.Random(self.seed)
+                gc.collect()
+                tracemalloc.reset_peak()
+                baseline, _ = tracemalloc.get_traced_memory()
+                for _ in range(requests):
+                    await self.request(name, rng)
+                gc.collect()
+                current, peak = tracemalloc.get_traced_memory()
+                results[name] = {
+                    "peak_kib": round((peak - baseline) / 1024, 1),
+                    "retained_kib": round((current - baseline) / 1024, 1),
+                    "requests": requests,
+                }
+        finally:
+            tracemalloc.stop()
+        return results
+
+
+async def create_users(client, count: int) -> List[str]:
+    """Register benchmark users and sign them in for ID tokens"""
+    from stocksage_api.services.firebase_service import firebase_service
+
+    tokens = []
+    for index in range(count):
+        email = f"bench-user{index}@example.com"
+        response = await client.post("/api/auth/register", json={"email": email, "password": "bench-pass-1", "name": f"Bench {index}"})
+        if response.status_code not in (201, 400):
+            raise RuntimeError(f"Registering {email} failed: {response.text}")
+        tokens.append(firebase_service.sign_in_with_email_password(email, "bench-pass-1")["idToken"])
+    return tokens
+
+
+async def wait_until_ready(client, timeout: float = 60) -> None:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if (await client.get("/api/health")).status_code == 200:
+            return
+        await asyncio.sleep(0.05)
+    raise RuntimeError("The API did not become ready")
+
+
+async def run_benchmark(args) -> Dict[str, Any]:
+    import httpx
+    from scripts import market_data_standin
+    from stocksage_api.main import app
+
+    mix = MIXES[args.mix]
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            await wait_until_ready(client)
+            tokens = await create_users(client, args.users)
+            runner = LoadRunner(client, tokens, mix, args.seed)
+
+            # Fill the market data and profile caches the way a running server would have
+            await runner.run(concurrency=max(args.concurrency), duration=args.warmup)
+
+            runs = []
+            for concurrency in args.concurrency:
+                run = await runner.run(concurrency, args.duration)
+                runs.append(run)
+                print_run(run)
+            memory = await runner.measure_memory(args.memory_requests)
+
+    return {
+        "format": RESULT_FORMAT,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "mix": args.mix,
+            "weights": mix,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "users": args.users,
+            "seed": args.seed,
+            "market_latency_ms": market_data_standin.MARKET_LATENCY_MS,
+            "rtdb_latency_ms": float(os.environ["RTDB_LATENCY_MS"]),
+        },
+        "runs": runs,
+        "memory": {
+            "max_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None,
+            "endpoints": memory,
+        },
+        "market_data_calls": dict(market_data_standin.calls),
+    }
+
+
+def print_run(run: Dict[str, Any]) -> None:
+    print(f"\nconcurrency {run['concurrency']}: {run['requests']} requests in {run['duration_s']} s, "
+          f"{run['throughput_rps']} req/s, {run['errors']} errors")
+    print(f"  {'endpoint':<18}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, stats in run["endpoints"].items():
+        print(f"  {name:<18}{stats['throughput_rps']:>9}{stats['p50_ms']:>10}{stats['p95_ms']:>10}"
+              f"{stats['p99_ms']:>10}{stats['errors']:>8}")
+
+
+def print_memory(memory: Dict[str, Any]) -> None:
+    print(f"\nmemory (max RSS {memory['max_rss_kib']} KiB)")
+    print(f"  {'endpoint':<18}{'peak KiB':>10}{'retained KiB':>14}")
+    for name, stats in memory["endpoints"].items():
+        print(f"  {name:<18}{stats['peak_kib']:>10}{stats['retained_kib']:>14}")
+
+
+def _change(current: float, previous: float) -> float:
+    return (current / previous - 1) * 100 if previous else 0.0
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Runs whose throughput fell, and endpoints whose p95 latency rose, by more than threshold percent.
+
+    Endpoints share one event loop, so per-endpoint throughput follows the run's total
+    and only the run total is compared.
+    """
+    regressions = []
+    baseline_runs = {run["concurrency"]: run for run in baseline.get("runs", [])}
+    print(f"\nCompared with {baseline.get('git', {}).get('commit') or 'baseline'}:")
+    for key in ("mix", "market_latency_ms", "rtdb_latency_ms"):
+        if baseline.get("config", {}).get(key) != current["config"][key]:
+            print(f"  ⚠️  {key} differs ({baseline.get('config', {}).get(key)} -> {current['config'][key]}), "
+                  f"results are not comparable")
+    for run in current["runs"]:
+        previous_run = baseline_runs.get(run["concurrency"])
+        if previous_run is None:
+            print(f"  No baseline run at concurrency {run['concurrency']}")
+            continue
+        rps_change = _change(run["throughput_rps"], previous_run["throughput_rps"])
+        flag = rps_change < -threshold
+        print(f"  {'❌' if flag else '✅'} c={run['concurrency']:<4} {'all':<18} "
+              f"{previous_run['throughput_rps']:>8} -> {run['throughput_rps']:>8} req/s ({rps_change:+.1f}%)")
+        if flag:
+            regressions.append(f"throughput at concurrency {run['concurrency']}")
+        for name, stats in run["endpoints"].items():
+            previous = previous_run["endpoints"].get(name)
+            if not previous or not previous["requests"] or not stats["requests"]:
+                continue
+            p95_change = _change(stats["p95_ms"], previous["p95_ms"])
+            flag = p95_change > threshold
+            print(f"  {'❌' if flag else '✅'} c={run['concurrency']:<4} {name:<18} "
+                  f"p95 {previous['p95_ms']:>8} -> {stats['p95_ms']:>8} ms ({p95_change:+.1f}%)")
+            if flag:
+                regressions.append(f"{name} p95 at concurrency {run['concurrency']}")
+    return regressions
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Offline load test for the StockSage API")
+    parser.add_argument("--mix", choices=sorted(MIXES), default="mixed", help="Traffic mix to replay")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64], help="Concurrent clients per run")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per concurrency level")
+    parser.add_argument("--warmup", type=float, default=2, help="Seconds of unrecorded traffic first")
+    parser.add_argument("--users", type=int, default=20, help="Signed-in users for profile requests")
+    parser.add_argument("--memory-requests", type=int, default=50, help="Requests per endpoint in the memory pass")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for the request sequence")
+    parser.add_argument("--rtdb-latency-ms", type=float, help="Simulated database round trip (default 20)")
+    parser.add_argument("--market-latency-ms", type=float, help="Simulated Yahoo Finance round trip (default 80)")
+    parser.add_argument("--output", help="Result file (default benchmark-results/<time>-<commit>.json)")
+    parser.add_argument("--compare", help="Earlier result file to compare against")
+    parser.add_argument("--threshold", type=float, default=10, help="Regression threshold in percent")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    # The stand-ins are configured before the app and its services are imported
+    os.environ["FIREBASE_BACKEND"] = "memory"
+    os.environ["EDUCATION_SNAPSHOT_PATH"] = ""
+    # Every run starts with an empty market data cache
+    os.environ["MARKET_CACHE_SNAPSHOT_PATH"] = ""
+    os.environ["RTDB_LATENCY_MS"] = str(args.rtdb_latency_ms if args.rtdb_latency_ms is not None
+                                        else os.getenv("RTDB_LATENCY_MS", 20))
+    if args.market_latency_ms is not None:
+        os.environ["MARKET_LATENCY_MS"] = str(args.market_latency_ms)
+    from scripts import market_data_standin
+    market_data_standin.install()
+    # httpx logs every request at INFO, which would dominate the client side of the measurement
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    result = asyncio.run(run_benchmark(args))
+    print_memory(result["memory"])
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{(result['git']['commit'] or 'nogit')[:8]}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as output_file:
+        json.dump(result, output_file, indent=2)
+    print(f"\n✅ Results saved to {output}")
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(result, json.load(baseline_file), args.threshold)
+        if regressions:
+            print(f"❌ {len(regressions)} regressions: {', '.join(regressions)}")
+            sys.exit(1)
+        print("✅ No regressions")
@@ -0,0 +1,71 @@
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+# Add the project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+CONCURRENCY_LEVELS = (1, 10, 50)
+REQUESTS_PER_LEVEL = 100
+TEST_PATH = "test_concurrency"
+
+try:
+    from stocksage_api.services.firebase_service import firebase_service
+    from stocksage_api.services.async_firebase_service import async_firebase_service
+
+    async def run_level(concurrency, read):
+        """Issue REQUESTS_PER_LEVEL reads with `concurrency` in flight; returns (seconds, latencies)"""
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def one():
+            async with semaphore:
+                start = time.perf_counter()
+                await read()
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(REQUESTS_PER_LEVEL)))
+        return time.perf_counter() - start, latencies
+
+    async def blocking_read():
+        # What the routes did before: a synchronous call inside a coroutine
+        firebase_service.get_data(TEST_PATH)
+
+    async def async_read():
+        await async_firebase_service.get_data(TEST_PATH)
+
+    def report(label, elapsed, latencies):
+        latencies = sorted(latencies)
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        print(f"  {label:<8} {REQUESTS_PER_LEVEL / elapsed:8.1f} req/s   "
+              f"median {statistics.median(latencies) * 1000:7.1f} ms   p95 {p95 * 1000:7.1f} ms")
+
+    async def main():
+        print("Seeding test data...")
+        await async_firebase_service.set_data(TEST_PATH, {"message": "Concurrency test", "value": 42})
+        print("✅ Test data written\n")
+
+        for concurrency in CONCURRENCY_LEVELS:
+            print(f"Concurrency {concurrency}:")
+            report("blocking", *await run_level(concurrency, blocking_read))
+            report("async", *await run_level(concurrency, async_read))
+            print()
+
+        await async_firebase_service.delete_data(TEST_PATH)
+        await async_firebase_service.aclose()
+
+    if __name__ == "__main__":
+        try:
+            asyncio.run(main())
+        except Exception as e:
+            print(f"❌ Concurrency test failed: {str(e)}")
+            sys.exit(1)
+
+except ImportError as e:
+    print(f"❌ Error importing modules: {str(e)}")
+    print("  Make sure you've installed the required dependencies:")
+    print("  pip install firebase-admin pyrebase4 httpx python-dotenv")
+    sys.exit(1)
@@ -0,0 +1,34 @@
+import json
+import os
+import sys
+
+# Add the project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from stocksage_api.config.database_indexes import build_rules
+
+RULES_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "database.rules.json"))
+
+
+def generate_rules(check: bool = False) -> bool:
+    """Write database.rules.json from the index table (or only compare with --check)"""
+    rendered = json.dumps(build_rules(), indent=2) + "\n"
+    current = open(RULES_PATH).read() if os.path.exists(RULES_PATH) else ""
+
+    if current == rendered:
+        print("✅ database.rules.json is up to date")
+        return True
+    if check:
+        print("❌ database.rules.json is out of date. Run 'python -m scripts.generate_database_rules'")
+        return False
+
+    with open(RULES_PATH, "w") as rules_file:
+        rules_file.write(rendered)
+    print(f"✅ Wrote index rules to {RULES_PATH}")
+    print("Deploy them with 'firebase deploy --only database' or paste them into the Firebase console")
+    return True
+
+
+if __name__ == "__main__":
+    success = generate_rules(check="--check" in sys.argv[1:])
+    sys.exit(0 if success else 1)
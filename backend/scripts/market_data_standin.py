@@ -0,0 +1,133 @@
+"""Offline stand-in for the parts of yfinance the API uses.
+
+install() registers it as the `yfinance` module, so the routes and services that
+import yfinance at their call sites get deterministic quotes and price history
+without network access. Every call sleeps for MARKET_LATENCY_MS (plus jitter)
+to approximate a Yahoo Finance round trip.
+"""
+import hashlib
+import os
+import random
+import sys
+import time
+import types
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+MARKET_LATENCY_MS = float(os.getenv("MARKET_LATENCY_MS", 80))
+MARKET_LATENCY_JITTER_MS = float(os.getenv("MARKET_LATENCY_JITTER_MS", 20))
+
+COMPANIES = {
+    "AAPL": ("Apple Inc.", "Technology"), "MSFT": ("Microsoft Corporation", "Technology"),
+    "GOOGL": ("Alphabet Inc.", "Communication Services"), "AMZN": ("Amazon.com, Inc.", "Consumer Cyclical"),
+    "META": ("Meta Platforms, Inc.", "Communication Services"), "TSLA": ("Tesla, Inc.", "Consumer Cyclical"),
+    "NVDA": ("NVIDIA Corporation", "Technology"), "JPM": ("JPMorgan Chase & Co.", "Financial Services"),
+    "V": ("Visa Inc.", "Financial Services"), "JNJ": ("Johnson & Johnson", "Healthcare"),
+    "WMT": ("Walmart Inc.", "Consumer Defensive"), "PG": ("The Procter & Gamble Company", "Consumer Defensive"),
+    "MA": ("Mastercard Incorporated", "Financial Services"), "DIS": ("The Walt Disney Company", "Communication Services"),
+    "NFLX": ("Netflix, Inc.", "Communication Services"), "KO": ("The Coca-Cola Company", "Consumer Defensive"),
+    "PEP": ("PepsiCo, Inc.", "Consumer Defensive"), "INTC": ("Intel Corporation", "Technology"),
+    "AMD": ("Advanced Micro Devices, Inc.", "Technology"), "XOM": ("Exxon Mobil Corporation", "Energy"),
+}
+
+calls = {"info": 0, "history": 0, "download": 0}
+
+
+def _wait() -> None:
+    delay = MARKET_LATENCY_MS + random.uniform(-MARKET_LATENCY_JITTER_MS, MARKET_LATENCY_JITTER_MS)
+    if delay > 0:
+        time.sleep(delay / 1000)
+
+
+def _seed(symbol: str) -> int:
+    return int.from_bytes(hashlib.sha256(symbol.encode()).digest()[:4], "big")
+
+
+def _closes(symbol: str, dates: pd.DatetimeIndex) -> np.ndarray:
+    """Random walk that is the same for a symbol and date on every run"""
+    rng = np.random.default_rng(_seed(symbol))
+    start = pd.Timestamp("2000-01-03")
+    steps = rng.normal(0.0004, 0.018, size=max((dates[-1] - start).days + 1, 1) if len(dates) else 1)
+    walk = (20 + _seed(symbol) % 400) * np.exp(np.cumsum(steps))
+    return walk[(dates - start).days]
+
+
+def _history(symbol: str, start, end) -> pd.DataFrame:
+    dates = pd.bdate_range(pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize() - timedelta(days=1))
+    if symbol not in COMPANIES or len(dates) == 0:
+        return pd.DataFrame(columns=["Open", "High", "Low", "Close", "Volume"])
+    closes = _closes(symbol, dates)
+    volumes = np.random.default_rng(_seed(symbol) + 1).integers(1_000_000, 90_000_000, size=len(dates))
+    return pd.DataFrame(
+        {"Open": closes, "High": closes * 1.01, "Low": closes * 0.99, "Close": closes, "Volume": volumes},
+        index=dates,
+    )
+
+
+class Ticker:
+    def __init__(self, symbol: str):
+        self.ticker = symbol.upper()
+
+    @property
+    def info(self):
+        calls["info"] += 1
+        _wait()
+        if self.ticker not in COMPANIES:
+            return {}
+        name, sector = COMPANIES[self.ticker]
+        today = pd.Timestamp(datetime.now().date())
+        last_two = _closes(self.ticker, pd.DatetimeIndex([today - timedelta(days=1), today]))
+        return {
+            "shortName": name,
+            "regularMarketPrice": round(float(last_two[1]), 2),
+            "regularMarketChangePercent": round(float(last_two[1] / last_two[0] - 1) * 100, 2),
+            "regularMarketVolume": 50_000_000,
+            "marketCap": int(last_two[1] * 5_000_000_000),
+            "trailingPE": 25.0,
+            "dividendYield": 0.005,
+            "longBusinessSummary": f"{name} is a company in the {sector} sector.",
+            "sector": sector,
+            "industry": sector,
+            "fullTimeEmployees": 100_000,
+            "city": "Springfield",
+            "state": "CA",
+            "website": "https://example.com",
+        }
+
+    def history(self, start=None, end=None, period=None, **kwargs):
+        calls["history"] += 1
+        _wait()
+        end = pd.Timestamp(end) if end is not None else pd.Timestamp(datetime.now())
+        start = pd.Timestamp(start) if start is not None else end - timedelta(days=30)
+        return _history(self.ticker, start, end)
+
+
+class Tickers:
+    def __init__(self, symbols: str):
+        self.tickers = {symbol.upper(): Ticker(symbol) for symbol in symbols.replace(",", " ").split()}
+
+
+def download(symbols, period: str = "5d", **kwargs) -> pd.DataFrame:
+    calls["download"] += 1
+    _wait()
+    symbols = [symbols] if isinstance(symbols, str) else list(symbols)
+    end = pd.Timestamp(datetime.now()) + timedelta(days=1)
+    closes = {symbol: _history(symbol, end - timedelta(days=7), end)["Close"] for symbol in symbols}
+    frame = pd.DataFrame(closes)
+    if frame.empty:
+        return pd.DataFrame()
+    frame.columns = pd.MultiIndex.from_product([["Close"], frame.columns])
+    return frame
+
+
+def install() -> types.ModuleType:
+    """Register the stand-in as `yfinance` (before anything imports the real one)"""
+    module = types.ModuleType("yfinance")
+    module.Ticker = Ticker
+    module.Tickers = Tickers
+    module.download = download
+    module.__version__ = "standin"
+    sys.modules["yfinance"] = module
+    return module
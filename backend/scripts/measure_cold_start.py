@@ -0,0 +1,56 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+RUNS = int(os.getenv("COLD_START_RUNS", 5))
+
+# Runs in a fresh interpreter so nothing is already imported or initialized
+PROBE = """
+import json, time
+start = time.perf_counter()
+from stocksage_api.main import app
+imported = time.perf_counter() - start
+
+from fastapi.testclient import TestClient
+with TestClient(app) as client:
+    serving = time.perf_counter() - start
+    health = client.get("/api/health").json()
+    # Older builds report no readiness flag; they only serve once fully started
+    while not health.get("ready", True) and time.perf_counter() - start < 60:
+        time.sleep(0.01)
+        health = client.get("/api/health").json()
+    ready = time.perf_counter() - start
+print(json.dumps({"import": imported, "serving": serving, "ready": ready}))
+"""
+
+
+def measure_once(env):
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=120
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "probe failed")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    env = dict(os.environ)
+    env.setdefault("FIREBASE_BACKEND", "memory")
+    # Approximate a remote database so startup round trips show up
+    env.setdefault("RTDB_LATENCY_MS", "150")
+
+    print(f"Cold start over {RUNS} runs (backend={env['FIREBASE_BACKEND']}, "
+          f"RTDB latency {env['RTDB_LATENCY_MS']} ms)")
+    try:
+        samples = [measure_once(env) for _ in range(RUNS)]
+    except Exception as e:
+        print(f"❌ Cold start measurement failed: {str(e)}")
+        sys.exit(1)
+
+    for phase, label in (("import", "import app"), ("serving", "accepting requests"), ("ready", "ready")):
+        values = [sample[phase] * 1000 for sample in samples]
+        print(f"  {label:<20} median {statistics.median(values):8.0f} ms   max {max(values):8.0f} ms")
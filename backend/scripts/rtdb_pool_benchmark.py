@@ -0,0 +1,103 @@
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Add the project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from stocksage_api.services.connection_pool import PooledHTTPAdapter, RTDB_POOL_MAXSIZE
+
+CONCURRENCY_LEVELS = (1, 8, 32)
+REQUESTS_PER_THREAD = 50
+# Stand-in for the TCP + TLS handshake cost paid on each new connection
+HANDSHAKE_SECONDS = float(os.getenv("BENCH_HANDSHAKE_MS", 20)) / 1000
+RESPONSE_SECONDS = float(os.getenv("BENCH_RESPONSE_MS", 2)) / 1000
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Minimal RTDB stand-in: keep-alive JSON responses with a per-connection setup delay"""
+    protocol_version = "HTTP/1.1"
+    wbufsize = -1
+    connections = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with StandInHandler.lock:
+            StandInHandler.connections += 1
+        time.sleep(HANDSHAKE_SECONDS)
+
+    def do_GET(self):
+        time.sleep(RESPONSE_SECONDS)
+        body = b'{"message": "Pool benchmark"}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run(session, url, concurrency):
+    """Latencies of concurrency x REQUESTS_PER_THREAD GETs through `session`"""
+    def worker():
+        latencies = []
+        for _ in range(REQUESTS_PER_THREAD):
+            start = time.perf_counter()
+            session.get(url).json()
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = [executor.submit(worker) for _ in range(concurrency)]
+        return [latency for result in results for latency in result.result()]
+
+
+def benchmark(label, make_session, url):
+    print(f"{label}:")
+    for concurrency in CONCURRENCY_LEVELS:
+        session = make_session()
+        before = StandInHandler.connections
+        start = time.perf_counter()
+        latencies = sorted(run(session, url, concurrency))
+        elapsed = time.perf_counter() - start
+        session.close()
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        print(f"  concurrency {concurrency:>3}: {len(latencies) / elapsed:8.1f} req/s   "
+              f"median {statistics.median(latencies) * 1000:6.1f} ms   p95 {p95 * 1000:6.1f} ms   "
+              f"connections opened {StandInHandler.connections - before}")
+
+
+def default_session():
+    # What Pyrebase mounts: a stock HTTPAdapter with 10 connections per host
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter())
+    return session
+
+
+def pooled_session():
+    session = requests.Session()
+    session.mount("http://", PooledHTTPAdapter())
+    return session
+
+
+if __name__ == "__main__":
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/test_pool.json"
+
+    print(f"RTDB stand-in at {url} (handshake {HANDSHAKE_SECONDS * 1000:.0f} ms, "
+          f"pool size {RTDB_POOL_MAXSIZE})\n")
+    benchmark("Default adapter", default_session, url)
+    benchmark("Pooled adapter", pooled_session, url)
+    server.shutdown()
@@ -0,0 +1,34 @@
+import json
+import os
+import sys
+
+# Add the project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from stocksage_api.services.education import EDUCATION_CONTENT_PATH, EducationIndex, content_collections
+from stocksage_api.services.firebase_service import firebase_service
+
+
+def seed_content(force: bool = False) -> bool:
+    """Upload the bundled education content to /stock_terms and /trading_tips (existing collections only with --force)"""
+    with open(EDUCATION_CONTENT_PATH, encoding="utf-8") as content_file:
+        content = json.load(content_file)
+    try:
+        EducationIndex(content)
+    except ValueError as e:
+        print(f"❌ {EDUCATION_CONTENT_PATH} is invalid: {str(e)}")
+        return False
+
+    for name, collection in content_collections(content).items():
+        if firebase_service.get_keys(name) and not force:
+            print(f"✅ /{name} already exists, skipping (use --force to overwrite it)")
+            continue
+        firebase_service.set_data(name, collection)
+        print(f"✅ Wrote {len(collection)} entries to /{name}")
+    print("Running API servers pick up the changes through their content streams")
+    return True
+
+
+if __name__ == "__main__":
+    success = seed_content(force="--force" in sys.argv[1:])
+    sys.exit(0 if success else 1)
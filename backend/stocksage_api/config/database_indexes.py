@@ -0,0 +1,33 @@
+from typing import Any, Dict, List
+
+# Realtime Database children the API orders or filters by, keyed by the path of the
+# list being queried ("$name" matches any key). The database rejects orderBy on an
+# unindexed child, so every order_by=<child> query needs an entry here.
+# database.rules.json is generated from this table with scripts/generate_database_rules.py
+database_indexes: Dict[str, List[str]] = {
+    "portfolios": ["user_id"],
+    "snapshots/$portfolio_id": ["timestamp"],
+}
+
+
+def build_rules(indexes: Dict[str, List[str]] = database_indexes) -> Dict[str, Any]:
+    """Security rules document declaring an .indexOn for every indexed path"""
+    rules: Dict[str, Any] = {}
+    for path, children in sorted(indexes.items()):
+        node = rules
+        for part in path.strip("/").split("/"):
+            node = node.setdefault(part, {})
+        node[".indexOn"] = sorted(children)
+    return {"rules": rules}
+
+
+def is_indexed(path: str, child: str, indexes: Dict[str, List[str]] = database_indexes) -> bool:
+    """Whether ordering the children of path by child is backed by an index"""
+    parts = [part for part in path.split("/") if part]
+    for pattern, children in indexes.items():
+        pattern_parts = pattern.strip("/").split("/")
+        if child in children and len(pattern_parts) == len(parts) and all(
+            expected.startswith("$") or expected == actual for expected, actual in zip(pattern_parts, parts)
+        ):
+            return True
+    return False
@@ -17,5 +17,8 @@ firebase_config = {
     "measurementId": os.getenv("FIREBASE_MEASUREMENT_ID"),
     
     # Additional keys for Firebase Admin SDK
-    "serviceAccount": os.getenv("GOOGLE_APPLICATION_CREDENTIALS", None)
+    "serviceAccount": os.getenv("GOOGLE_APPLICATION_CREDENTIALS", None),
+
+    # "firebase" for the real project, "memory" for the in-process stand-in
+    "backend": os.getenv("FIREBASE_BACKEND", "firebase")
 } 
\ No newline at end of file
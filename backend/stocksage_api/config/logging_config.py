@@ -0,0 +1,207 @@
+"""Logging set up as a queue-based pipeline.
+
+Loggers only put records on a bounded queue. A QueueListener thread formats them
+and writes to stderr and LOG_FILE, so no disk or terminal I/O happens on the
+event loop. A record is reduced to its final message on the calling thread (its
+arguments may change after the call) and dropped, not waited on, when the queue
+is full.
+
+- LOG_FORMAT=json writes one JSON object per line, including the request's
+  trace id when there is one
+- identical WARNING and ERROR messages are written once per
+  LOG_DUPLICATE_INTERVAL seconds; the next one written says how many were
+  suppressed in between
+- per-request INFO logging (routes, httpx, uvicorn access lines) is kept at
+  LOG_REQUEST_LEVEL, which defaults to WARNING when APP_ENV=production
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+from ..services.tracing import current_trace_id
+
+APP_ENV = os.getenv("APP_ENV", "development").lower()
+PRODUCTION = APP_ENV == "production"
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_REQUEST_LEVEL = os.getenv("LOG_REQUEST_LEVEL", "WARNING" if PRODUCTION else "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json" if PRODUCTION else "text").lower()
+# Empty disables the log file
+LOG_FILE = os.getenv("LOG_FILE", "api.log")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+# Seconds an identical warning is suppressed for after being written (0 disables)
+LOG_DUPLICATE_INTERVAL = float(os.getenv("LOG_DUPLICATE_INTERVAL", 60))
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+# Loggers that write once or more per request
+REQUEST_LOGGERS = ("stocksage_api.routes", "stocksage_api.services.market_cache", "httpx", "uvicorn.access")
+# Distinct messages tracked by the duplicate filter
+MAX_TRACKED_MESSAGES = 1024
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        trace_id = getattr(record, "trace_id", None)
+        if trace_id:
+            entry["trace_id"] = trace_id
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class DuplicateFilter(logging.Filter):
+    """Lets an identical WARNING or worse message through once per interval"""
+
+    def __init__(self, interval: float = LOG_DUPLICATE_INTERVAL, max_tracked: int = MAX_TRACKED_MESSAGES):
+        super().__init__()
+        self.interval = interval
+        self.max_tracked = max_tracked
+        self.suppressed_total = 0
+        # (logger, level, message) -> [time last written, suppressed since]
+        self._seen: "OrderedDict[tuple, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING or self.interval <= 0:
+            return True
+        key = (record.name, record.levelno, record.getMessage())
+        now = time.monotonic()
+        with self._lock:
+            seen = self._seen.get(key)
+            if seen is not None and now - seen[0] < self.interval:
+                seen[1] += 1
+                self.suppressed_total += 1
+                return False
+            suppressed = seen[1] if seen is not None else 0
+            self._seen[key] = [now, 0]
+            self._seen.move_to_end(key)
+            while len(self._seen) > self.max_tracked:
+                self._seen.popitem(last=False)
+        if suppressed:
+            record.msg = f"{record.getMessage()} (repeated {suppressed} more times in the last {self.interval:g}s)"
+            record.args = None
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Queues records without blocking, dropping them when the queue is full"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._exception_formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Keep only what the listener needs: the merged message and any traceback text.
+        # The record is changed in place as this is the only handler on the root logger
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self._exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        record.trace_id = current_trace_id()
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _formatter(fmt: str) -> logging.Formatter:
+    return JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT)
+
+
+_listener: Optional[QueueListener] = None
+queue_handler: Optional[NonBlockingQueueHandler] = None
+duplicate_filter: Optional[DuplicateFilter] = None
+
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT, log_file: str = LOG_FILE,
+                      request_level: str = LOG_REQUEST_LEVEL, queue_size: int = LOG_QUEUE_SIZE,
+                      duplicate_interval: float = LOG_DUPLICATE_INTERVAL) -> QueueListener:
+    """Route all logging through the queue and start the writer thread (once per process)"""
+    global _listener, queue_handler, duplicate_filter
+    if _listener is not None:
+        return _listener
+
+    formatter = _formatter(fmt)
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file, encoding="utf-8"))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    duplicate_filter = DuplicateFilter(duplicate_interval)
+    queue_handler.addFilter(duplicate_filter)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    # Only quieten the per-request loggers; a level set on them elsewhere is kept otherwise
+    if logging.getLevelName(request_level) > root.level:
+        for name in REQUEST_LOGGERS:
+            logging.getLogger(name).setLevel(request_level)
+    # uvicorn installs its own synchronous handlers; send its records through the queue instead
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=_restart_in_child)
+    return _listener
+
+
+def _restart_in_child() -> None:
+    """Threads do not survive fork: give a forked worker its own queue and writer thread"""
+    global _listener
+    if _listener is None or queue_handler is None:
+        return
+    log_queue: queue.Queue = queue.Queue(maxsize=queue_handler.queue.maxsize)
+    queue_handler.queue = log_queue
+    _listener = QueueListener(log_queue, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    """Write out the queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def stats() -> Dict[str, int]:
+    return {
+        "queued": queue_handler.queue.qsize() if queue_handler else 0,
+        "dropped": queue_handler.dropped if queue_handler else 0,
+        "suppressed_duplicates": duplicate_filter.suppressed_total if duplicate_filter else 0,
+    }
@@ -0,0 +1,41 @@
+"""Where the API keeps the files it writes and reads back across restarts.
+
+Market data caches and content snapshots are loaded with the API's privileges,
+so they live in a directory only the API's user can open instead of the
+shared temp directory, where any local user could create them first.
+"""
+import os
+import stat
+
+# Directory for caches and snapshots; created with owner-only permissions
+STOCKSAGE_DATA_DIR = os.getenv("STOCKSAGE_DATA_DIR") or os.path.join(
+    os.getenv("XDG_STATE_HOME") or os.path.join(os.path.expanduser("~"), ".local", "state"), "stocksage"
+)
+
+
+def check_private(path: str) -> None:
+    """Raise PermissionError if path exists but another user owns it or can write to it"""
+    if not hasattr(os, "getuid"):
+        return
+    try:
+        info = os.stat(path)
+    except FileNotFoundError:
+        return
+    if info.st_uid != os.getuid():
+        raise PermissionError(f"{path} is owned by another user")
+    if info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise PermissionError(f"{path} is writable by other users")
+
+
+def private_dir(path: str) -> str:
+    """Create path with owner-only permissions, or check an existing one belongs to this user"""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    check_private(path)
+    if hasattr(os, "getuid") and os.stat(path).st_mode & 0o077:
+        os.chmod(path, 0o700)
+    return path
+
+
+def data_path(name: str) -> str:
+    """Path of a file in the data directory, creating the directory if needed"""
+    return os.path.join(private_dir(STOCKSAGE_DATA_DIR), name)
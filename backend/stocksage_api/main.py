@@ -1,44 +1,164 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.openapi.docs import get_swagger_ui_html, get_redoc_html
 from fastapi.openapi.utils import get_openapi
+from contextlib import asynccontextmanager
 from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict
+import asyncio
+import importlib
+import os
 import sys
+import time
 import logging
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler("api.log")
-    ]
-)
+from .config.logging_config import configure_logging, stats as logging_stats
+
+# Configure logging: records are written to stderr and api.log by a background thread
+configure_logging()
 logger = logging.getLogger(__name__)
 
-# Try to import Firebase - if it fails, exit with error
+# Import the routes and services - Firebase itself is initialized in the background at startup
 try:
     from .routes import firebase_test
     from .routes import auth  # Import the auth routes
     from .routes import public_stocks  # Import the public stock routes
     from .routes import education  # Import the education routes
+    from .routes import backtest  # Import the backtesting routes
+    from .routes import portfolios  # Import the portfolio and trading routes
+    from .routes import admin  # Import the user administration routes
+    from .routes.timed_route import TimedRoute
     from .services.firebase_service import firebase_service
+    from .services.async_firebase_service import async_firebase_service
+    from .services.process_pool import shutdown_process_pool
+    from .services.education import education_content
+    from .services.metrics import MetricsMiddleware, registry as metrics_registry
+    from .services.profiling import PROFILING_ENABLED, ProfilingMiddleware
+    from .services import tracing
+    from .services import market_cache, shared_cache as shared_cache_tier
+    from .services.cache_snapshot import cache_snapshots, is_primary_worker
 except Exception as e:
-    logger.error(f"Failed to initialize Firebase: {str(e)}")
-    print(f"ERROR: Failed to initialize Firebase: {str(e)}")
-    print("Please set up Firebase credentials correctly.")
-    print("Run 'python -m scripts.check_firebase_setup' for diagnostic information.")
+    logger.error(f"Failed to import API modules: {str(e)}")
+    print(f"ERROR: Failed to import API modules: {str(e)}")
     sys.exit(1)
 
-# Import yfinance for use across the application
-try:
-    import yfinance as yf
-    logger.info("Successfully imported yfinance")
-except ImportError:
-    logger.error("Failed to import yfinance. Please install it with 'pip install yfinance'")
-    print("ERROR: Failed to import yfinance. Please install it with 'pip install yfinance'")
-    sys.exit(1)
+# Seconds before the Firebase startup check is retried, doubling after each failure up to the maximum
+STARTUP_RETRY_DELAY = float(os.getenv("STARTUP_RETRY_DELAY", 2))
+STARTUP_RETRY_MAX_DELAY = float(os.getenv("STARTUP_RETRY_MAX_DELAY", 60))
+
+# Startup state of each backing service, reported by /api/health
+startup_status: Dict[str, Dict[str, Any]] = {
+    "firebase": {"status": "starting"},
+    "yfinance": {"status": "starting"},
+}
+
+
+async def verify_firebase() -> None:
+    """Initialize Firebase off the event loop and check both clients can write and read"""
+    # Requests arriving meanwhile await the same initialization instead of starting their own
+    await async_firebase_service.ready()
+    timestamp = str(datetime.now())
+
+    # Test Admin SDK
+    admin_test_data = {"message": "API Startup Test (Admin SDK)", "timestamp": timestamp}
+    await async_firebase_service.admin_set_data("api_startup_test_admin", admin_test_data)
+    admin_result = await async_firebase_service.admin_get_data("api_startup_test_admin")
+
+    # Test the Realtime Database REST client
+    pyrebase_test_data = {"message": "API Startup Test (Pyrebase)", "timestamp": timestamp}
+    await async_firebase_service.set_data("api_startup_test_pyrebase", pyrebase_test_data)
+    pyrebase_result = await async_firebase_service.get_data("api_startup_test_pyrebase")
+
+    if not admin_result or admin_result.get("message") != "API Startup Test (Admin SDK)":
+        raise ValueError("Firebase Admin SDK connection test failed - unexpected response")
+    if not pyrebase_result or pyrebase_result.get("message") != "API Startup Test (Pyrebase)":
+        raise ValueError("Realtime Database connection test failed - unexpected response")
+
+
+async def import_yfinance() -> None:
+    """Import yfinance in a worker thread so the first market data request does not pay for it"""
+    await asyncio.to_thread(importlib.import_module, "yfinance")
+
+
+async def run_startup_check(name: str, check: Callable[[], Awaitable[None]]) -> bool:
+    """Run one startup check and record its outcome and duration"""
+    started = time.perf_counter()
+    try:
+        await check()
+    except Exception as e:
+        startup_status[name] = {"status": "down", "error": str(e)}
+        logger.error(f"Startup check for {name} failed: {str(e)}")
+        return False
+    startup_status[name] = {"status": "up", "duration_ms": round((time.perf_counter() - started) * 1000, 1)}
+    logger.info(f"Startup check for {name} passed")
+    return True
+
+
+async def start_education_stream() -> None:
+    """Keep education content in sync with /stock_terms and /trading_tips"""
+    try:
+        await asyncio.to_thread(education_content.start_stream, async_firebase_service.stream_hub)
+    except Exception as e:
+        # The local snapshot keeps being served without live updates
+        logger.warning(f"Failed to start education content stream: {str(e)}")
+
+
+async def wait_for_firebase() -> None:
+    """Run the Firebase startup check until it passes, backing off between attempts"""
+    delay = STARTUP_RETRY_DELAY
+    if await run_startup_check("firebase", verify_firebase):
+        return
+    print("Please check your Firebase credentials and configuration.")
+    print("Run 'python -m scripts.check_firebase_setup' for diagnostic information.")
+    while True:
+        logger.info(f"Retrying the Firebase startup check in {delay:g}s")
+        await asyncio.sleep(delay)
+        if await run_startup_check("firebase", verify_firebase):
+            return
+        delay = min(delay * 2, STARTUP_RETRY_MAX_DELAY)
+
+
+async def warm_up(app: FastAPI) -> None:
+    """Bring up the backing services after the server has started accepting requests"""
+    await asyncio.gather(
+        wait_for_firebase(),
+        run_startup_check("yfinance", import_yfinance),
+    )
+    # Keep cached profiles in sync with database changes
+    await async_firebase_service.start_profile_stream()
+    await start_education_stream()
+    # Reopen shared change streams that drop
+    app.state.stream_supervisor = asyncio.create_task(async_firebase_service.stream_hub.supervise())
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.stream_supervisor = None
+    app.state.cache_refresh = None
+    app.state.cache_snapshots = None
+    # Start with the market data cached before the last shutdown (already done before forking workers)
+    await asyncio.to_thread(cache_snapshots.restore)
+    # One process refreshes expired entries and writes the snapshot for all workers
+    snapshot_owner = is_primary_worker()
+    if snapshot_owner:
+        app.state.cache_refresh = asyncio.create_task(cache_snapshots.refresh_expired())
+        app.state.cache_snapshots = asyncio.create_task(cache_snapshots.save_periodically())
+    app.state.warm_up = asyncio.create_task(warm_up(app))
+    tracing.start_exporter()
+    yield
+    for task in (app.state.warm_up, app.state.stream_supervisor,
+                 app.state.cache_refresh, app.state.cache_snapshots):
+        if task is not None:
+            task.cancel()
+    if snapshot_owner:
+        await asyncio.to_thread(cache_snapshots.save)
+    # Stop compute worker processes and close pooled Firebase connections
+    shutdown_process_pool()
+    await asyncio.to_thread(education_content.stop_stream)
+    await async_firebase_service.aclose()
+    await asyncio.to_thread(tracing.shutdown)
+
 
 app = FastAPI(
     title="StockSage API",
@@ -70,7 +190,10 @@ Use the Authorize button in the top-right corner with your Firebase token to acc
     docs_url=None,  # We'll customize the docs endpoint
     redoc_url=None,  # We'll customize the redoc endpoint
     openapi_url="/api/openapi.json",
+    lifespan=lifespan,
 )
+# The app's own routes are timed for tracing and profiling like the routers' routes
+app.router.route_class = TimedRoute
 
 # Configure CORS
 app.add_middleware(
@@ -82,6 +205,59 @@ app.add_middleware(
     expose_headers=["Content-Disposition", "Content-Type", "Authorization"],
     max_age=600,  # Cache preflight requests for 10 minutes
 )
+# On-demand profiles (X-Profile header from an admin, or PROFILE_SAMPLE_RATE); left out entirely when disabled
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware, authorize=auth.is_admin_token)
+# One trace per request, returned as X-Trace-Id and kept for /api/admin/traces
+if tracing.TRACING_ENABLED:
+    app.add_middleware(tracing.TracingMiddleware)
+# Request counts and latency per route; outermost so it also times the CORS middleware
+app.add_middleware(MetricsMiddleware)
+
+
+def collect_cache_entries():
+    """Sizes of the caches owned by the services, read when /metrics is scraped"""
+    yield "", {"cache": "market_data"}, len(market_cache.cache)
+    if shared_cache_tier.shared_cache is not None:
+        yield "", {"cache": "market_data_shared"}, shared_cache_tier.shared_cache.stats()["entries"]
+    yield "", {"cache": "profile"}, async_firebase_service.profile_cache.stats()["size"]
+    # Reading the token cache must not initialize Firebase
+    if firebase_service.initialized:
+        yield "", {"cache": "token"}, firebase_service.token_cache.stats()["size"]
+
+
+def collect_cache_lookups():
+    profile = async_firebase_service.profile_cache.stats()
+    yield "", {"cache": "profile", "result": "hit"}, profile["hits"]
+    yield "", {"cache": "profile", "result": "miss"}, profile["misses"]
+    yield "", {"cache": "profile", "result": "invalidation"}, profile["invalidations"]
+    if firebase_service.initialized:
+        token = firebase_service.token_cache.stats()
+        yield "", {"cache": "token", "result": "hit"}, token["hits"]
+        yield "", {"cache": "token", "result": "miss"}, token["misses"]
+
+
+def collect_stream_stats():
+    upstreams = async_firebase_service.stream_hub.stats()["upstreams"]
+    yield "", {"state": "connected"}, sum(1 for upstream in upstreams if upstream["connected"])
+    yield "", {"state": "disconnected"}, sum(1 for upstream in upstreams if not upstream["connected"])
+
+
+metrics_registry.collector(
+    "stocksage_cache_entries", "Entries held by the in-process caches", "gauge", collect_cache_entries)
+metrics_registry.collector(
+    "stocksage_cache_lookups_total", "Profile and token cache lookups and invalidations", "counter", collect_cache_lookups)
+metrics_registry.collector(
+    "stocksage_stream_upstreams", "Shared Realtime Database streams by connection state", "gauge", collect_stream_stats)
+metrics_registry.collector(
+    "stocksage_log_records", "Log records waiting for the writer thread, dropped on a full queue, or suppressed as duplicates",
+    "gauge", lambda: [("", {"state": state}, value) for state, value in logging_stats().items()])
+metrics_registry.collector(
+    "stocksage_market_cache_snapshot_entries", "Market data cache entries in the last snapshot saved, restored at startup, and refreshed after restoring",
+    "gauge", lambda: [("", {"state": state}, cache_snapshots.stats()[f"{state}_entries"]) for state in ("saved", "restored", "refreshed")])
+metrics_registry.collector(
+    "stocksage_education_content_version", "Version of the education content being served", "gauge",
+    lambda: [("", {"source": education_content.source or "unloaded"}, education_content.index_version)])
 
 # Mock data for demonstration
 mock_stocks = [
@@ -92,39 +268,6 @@ mock_stocks = [
     {"symbol": "TSLA", "name": "Tesla, Inc.", "price": 193.57, "change": -2.67},
 ]
 
-# Verify Firebase connection at startup
-try:
-    # Test Firebase connections by writing and reading data
-    timestamp = str(datetime.now())
-    
-    # Test Admin SDK
-    admin_test_data = {"message": "API Startup Test (Admin SDK)", "timestamp": timestamp}
-    firebase_service.admin_set_data("api_startup_test_admin", admin_test_data)
-    admin_result = firebase_service.admin_get_data("api_startup_test_admin")
-    
-    # Test Pyrebase
-    pyrebase_test_data = {"message": "API Startup Test (Pyrebase)", "timestamp": timestamp}
-    firebase_service.set_data("api_startup_test_pyrebase", pyrebase_test_data)
-    pyrebase_result = firebase_service.get_data("api_startup_test_pyrebase")
-    
-    if not admin_result or admin_result.get("message") != "API Startup Test (Admin SDK)":
-        print("ERROR: Firebase Admin SDK connection test failed - unexpected response")
-        print("Please check your Firebase credentials and configuration.")
-        sys.exit(1)
-        
-    if not pyrebase_result or pyrebase_result.get("message") != "API Startup Test (Pyrebase)":
-        print("ERROR: Pyrebase connection test failed - unexpected response")
-        print("Please check your Firebase credentials and configuration.")
-        sys.exit(1)
-        
-    print("✅ Firebase connections verified successfully (Admin SDK and Pyrebase)")
-    logger.info("Firebase connections verified successfully")
-except Exception as e:
-    logger.error(f"Firebase connection test failed: {str(e)}")
-    print(f"ERROR: Firebase connection test failed: {str(e)}")
-    print("Please check your Firebase credentials and configuration.")
-    sys.exit(1)
-
 # Custom OpenAPI function to enhance documentation
 def custom_openapi():
     if app.openapi_schema:
@@ -154,8 +297,10 @@ def custom_openapi():
     # Apply security only to authenticated endpoints
     # This is a more precise approach - we'll explicitly set security for each path
     for path in openapi_schema["paths"]:
-        # Only secure auth routes except registration
-        if "/api/auth/" in path and not path.endswith(("/register", "/register/")):
+        # Only secure auth routes except registration, and portfolio routes
+        secured = "/api/auth/" in path and not path.endswith(("/register", "/register/"))
+        secured = secured or path == "/api/education/reload"
+        if secured or path.startswith(("/api/portfolios", "/api/admin")):
             for method in openapi_schema["paths"][path]:
                 if method.lower() in ["get", "post", "put", "delete", "patch"]:
                     # Add security requirement to this operation
@@ -174,6 +319,18 @@ def custom_openapi():
         {
             "name": "education",
             "description": "Stock market educational content and glossary"
+        },
+        {
+            "name": "portfolios",
+            "description": "Simulated portfolios, trading and performance"
+        },
+        {
+            "name": "backtesting",
+            "description": "Simulate trading strategies against historical prices"
+        },
+        {
+            "name": "admin",
+            "description": "Bulk user administration (requires the admin custom claim)"
         }
     ]
     
@@ -219,6 +376,9 @@ async def custom_redoc_html():
 app.include_router(auth.router)  # Add the auth router
 app.include_router(public_stocks.router)  # Add the public stocks router
 app.include_router(education.router)  # Add the education router
+app.include_router(portfolios.router)  # Add the portfolios router
+app.include_router(backtest.router)  # Add the backtesting router
+app.include_router(admin.router)  # Add the user administration router
 app.include_router(firebase_test.router)  # Add the firebase test router
 
 # Root endpoint with improved documentation links
@@ -236,24 +396,43 @@ async def root():
             "stocks": "/api/stocks",
             "stock_search": "/api/stocks/search?query={query}",
             "auth": "/api/auth",
-            "education": "/api/education"
+            "education": "/api/education",
+            "portfolios": "/api/portfolios",
+            "backtest": "/api/backtest",
+            "admin": "/api/admin"
         }
     }
 
-# Health check endpoint
+# Prometheus scrape endpoint
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+# Health check endpoint - reports 503 until every startup check has passed
 @app.get("/api/health")
 async def health_check():
-    return {
-        "status": "healthy",
+    states = [check["status"] for check in startup_status.values()]
+    ready = all(state == "up" for state in states)
+    content = {
+        "status": "healthy" if ready else "unhealthy" if "down" in states else "starting",
+        "ready": ready,
         "timestamp": datetime.now().isoformat(),
-        "services": {
-            "firebase": "up",
-            "yfinance": "up"
-        },
+        "services": {name: check["status"] for name, check in startup_status.items()},
+        "startup": startup_status,
         "api_version": app.version
     }
+    return JSONResponse(
+        content=content,
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE
+    )
 
 if __name__ == "__main__":
-    import uvicorn
-    logger.info("Starting StockSage API server")
-    uvicorn.run("stocksage_api.main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    from .server import API_HOST, API_PORT, API_WORKERS, run
+    if API_WORKERS > 1:
+        # Production: preload, then fork workers sharing the socket and the market data cache
+        logger.info(f"Starting StockSage API server with {API_WORKERS} workers")
+        run(app, host=API_HOST, port=API_PORT, workers=API_WORKERS)
+    else:
+        import uvicorn
+        logger.info("Starting StockSage API server")
+        uvicorn.run("stocksage_api.main:app", host=API_HOST, port=API_PORT, reload=True)
\ No newline at end of file
@@ -0,0 +1,191 @@
+from fastapi import APIRouter, HTTPException, Depends, Query, status
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, EmailStr, Field, model_validator
+from typing import List, Optional, Dict, Any, Literal
+import logging
+
+from .auth import get_current_admin, UserPreferences
+from ..services.user_admin import user_admin
+from ..services.profiling import profile_store
+from ..services.tracing import trace_buffer
+from .timed_route import TimedRoute
+
+logger = logging.getLogger(__name__)
+
+# Users per bulk request (one Admin SDK import or delete call)
+MAX_BULK_USERS = 1000
+
+router = APIRouter(
+    prefix="/api/admin",
+    tags=["admin"],
+    route_class=TimedRoute,
+    dependencies=[Depends(get_current_admin)],
+    responses={
+        403: {"description": "Administrator access required"}
+    }
+)
+
+# Models
+class ImportedUser(BaseModel):
+    """Account to create in a bulk import"""
+    email: EmailStr
+    password: str = Field(..., min_length=6, description="Initial password (stored as a PBKDF2 hash)")
+    name: Optional[str] = Field(None, max_length=100, description="Display name")
+    preferences: Optional[UserPreferences] = None
+    disabled: bool = Field(False, description="Create the account disabled")
+
+class BulkUserImport(BaseModel):
+    """Bulk import request"""
+    users: List[ImportedUser] = Field(..., min_length=1, max_length=MAX_BULK_USERS)
+
+class BulkUserLookup(BaseModel):
+    """Users to look up by uid and/or email"""
+    uids: List[str] = Field([], max_length=MAX_BULK_USERS)
+    emails: List[EmailStr] = Field([], max_length=MAX_BULK_USERS)
+
+    @model_validator(mode="after")
+    def check_not_empty(self):
+        if not self.uids and not self.emails:
+            raise ValueError("Provide at least one uid or email")
+        return self
+
+class BulkUserIds(BaseModel):
+    """Users to act on"""
+    uids: List[str] = Field(..., min_length=1, max_length=MAX_BULK_USERS)
+
+class BulkUserDisable(BulkUserIds):
+    """Users to disable or re-enable"""
+    disabled: bool = Field(True, description="False re-enables the accounts")
+
+class BulkUserDelete(BulkUserIds):
+    """Users to delete"""
+    delete_profiles: bool = Field(True, description="Also delete the users' /users profiles")
+
+class BulkUserResult(BaseModel):
+    """Outcome for one user"""
+    index: Optional[int] = Field(None, description="Position in the import request")
+    uid: Optional[str] = None
+    email: Optional[str] = None
+    status: Literal["ok", "failed"]
+    error: Optional[str] = None
+
+class BulkOperationResponse(BaseModel):
+    """Per-user outcome of a bulk operation"""
+    requested: int
+    succeeded: int
+    failed: int
+    results: List[BulkUserResult]
+
+class UserSummary(BaseModel):
+    """Account details"""
+    uid: str
+    email: Optional[str] = None
+    display_name: Optional[str] = None
+    disabled: bool
+    email_verified: bool
+    custom_claims: Optional[Dict[str, Any]] = None
+    created_at: Optional[int] = None
+    last_sign_in_at: Optional[int] = None
+
+class BulkLookupResponse(BaseModel):
+    """Accounts found and identifiers without an account"""
+    users: List[UserSummary]
+    not_found: List[Dict[str, str]]
+
+# Routes
+@router.post("/users/import", response_model=BulkOperationResponse, summary="Bulk import users",
+             description="Creates up to 1000 accounts with one Admin SDK import call and writes their profiles in a single batched update. Failures are reported per user.")
+async def import_users(request: BulkUserImport):
+    """Create many users at once"""
+    users = [
+        {**user.model_dump(exclude={"preferences"}),
+         "preferences": user.preferences.model_dump() if user.preferences else None}
+        for user in request.users
+    ]
+    try:
+        return await user_admin.import_users(users)
+    except Exception as e:
+        logger.error(f"Bulk user import failed: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to import users: {str(e)}"
+        )
+
+@router.post("/users/lookup", response_model=BulkLookupResponse, summary="Bulk look up users",
+             description="Returns account details for many uids and emails, fetched 100 identifiers per Admin SDK call.")
+async def lookup_users(request: BulkUserLookup):
+    """Look up many users at once"""
+    try:
+        return await user_admin.lookup(request.uids, request.emails)
+    except Exception as e:
+        logger.error(f"Bulk user lookup failed: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to look up users: {str(e)}"
+        )
+
+@router.post("/users/disable", response_model=BulkOperationResponse, summary="Bulk disable users",
+             description="Disables (or with `disabled: false` re-enables) many accounts in parallel. Failures are reported per user.")
+async def disable_users(request: BulkUserDisable):
+    """Disable or enable many users at once"""
+    return await user_admin.set_disabled(request.uids, request.disabled)
+
+@router.post("/users/delete", response_model=BulkOperationResponse, summary="Bulk delete users",
+             description="Deletes up to 1000 accounts with one Admin SDK call, then removes their profiles in a single batched update. Failures are reported per user.")
+async def delete_users(request: BulkUserDelete):
+    """Delete many users at once"""
+    return await user_admin.delete_users(request.uids, request.delete_profiles)
+
+@router.get("/profiles", summary="List request profiles",
+            description="Most recent request profiles, newest first: requests sent by an administrator with `X-Profile: 1` and those picked by PROFILE_SAMPLE_RATE.")
+async def list_profiles():
+    """Summaries of the stored request profiles"""
+    return {"profiles": profile_store.list()}
+
+@router.get("/profiles/{profile_id}", summary="Download a request profile",
+            description="Spans and stack samples of one profiled request. `format=collapsed` returns the samples as collapsed stacks for flame graph tools (flamegraph.pl, speedscope).")
+async def get_profile(profile_id: str, format: Literal["json", "collapsed"] = Query("json", description="json or collapsed")):
+    """One request profile"""
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Profile {profile_id} not found"
+        )
+    if format == "collapsed":
+        return PlainTextResponse(
+            profile.collapsed(),
+            headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.folded"'}
+        )
+    return profile.to_dict()
+
+@router.get("/traces", summary="List slow traces",
+            description="The slowest recent request traces (from the last TRACE_BUFFER_SIZE requests), each with its slowest span and the self time spent per component: http, handler, cache, auth, yfinance and firebase.")
+async def list_traces(
+    min_duration_ms: float = Query(0, ge=0, description="Only traces at least this slow"),
+    route: Optional[str] = Query(None, description="Route template, e.g. /api/stocks/{symbol}"),
+    limit: int = Query(20, ge=1, le=200, description="Maximum number of traces")
+):
+    """Slowest buffered traces first"""
+    return {"traces": trace_buffer.slowest(min_duration_ms, route, limit)}
+
+@router.get("/traces/breakdown", summary="Where tail latency goes",
+            description="Mean self time per component over all buffered traces and over the slowest ones (at or above the percentile), showing which dependency the slow requests spend their extra time in.")
+async def trace_breakdown(
+    route: Optional[str] = Query(None, description="Route template, e.g. /api/stocks/{symbol}"),
+    percentile: float = Query(95, gt=0, lt=100, description="Tail threshold percentile")
+):
+    """Component breakdown of all and tail traces"""
+    return trace_buffer.breakdown(route, percentile)
+
+@router.get("/traces/{trace_id}", summary="Get a trace",
+            description="All spans of one trace with their offsets, durations and attributes.")
+async def get_trace(trace_id: str):
+    """One buffered trace"""
+    trace = trace_buffer.get(trace_id)
+    if trace is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Trace {trace_id} not found"
+        )
+    return trace.to_dict()
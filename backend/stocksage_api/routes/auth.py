@@ -2,9 +2,14 @@ from fastapi import APIRouter, HTTPException, Depends, Security, Response, statu
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, EmailStr
 from typing import Optional, Dict, Any
-from ..services.firebase_service import firebase_service
+from ..services.async_firebase_service import async_firebase_service
+from .timed_route import TimedRoute
+import os
 import time
 
+# Look up revocation status on every request instead of trusting cached tokens (slower)
+AUTH_CHECK_REVOKED = os.getenv("AUTH_CHECK_REVOKED", "false").lower() == "true"
+
 # Create security scheme
 security = HTTPBearer(
     scheme_name="Bearer Authentication",
@@ -12,7 +17,7 @@ security = HTTPBearer(
     auto_error=True
 )
 
-router = APIRouter(prefix="/api/auth", tags=["authentication"])
+router = APIRouter(prefix="/api/auth", tags=["authentication"], route_class=TimedRoute)
 
 # Models
 class UserPreferences(BaseModel):
@@ -57,14 +62,13 @@ class TokenVerificationResponse(BaseModel):
     email: Optional[str] = None
 
 # Helper functions
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Security(security)):
-    """Verify the Firebase ID token and return the user"""
+async def _verify_credentials(credentials: HTTPAuthorizationCredentials, check_revoked: bool) -> Dict[str, Any]:
     try:
         # Get token from the credentials
         token = credentials.credentials
         
         # Verify the ID token
-        decoded_token = firebase_service.verify_id_token(token)
+        decoded_token = await async_firebase_service.verify_id_token(token, check_revoked=check_revoked)
         return decoded_token
     except Exception as e:
         raise HTTPException(
@@ -72,6 +76,38 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Security(
             detail=f"Invalid token: {str(e)}"
         )
 
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Security(security)):
+    """Verify the Firebase ID token and return the user"""
+    return await _verify_credentials(credentials, AUTH_CHECK_REVOKED)
+
+async def get_current_user_strict(credentials: HTTPAuthorizationCredentials = Security(security)):
+    """Verify the Firebase ID token, always checking that it has not been revoked"""
+    return await _verify_credentials(credentials, True)
+
+async def get_current_admin(current_user: Dict[str, Any] = Depends(get_current_user_strict)):
+    """Require a non-revoked token carrying the `admin` custom claim"""
+    if current_user.get("admin") is not True:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Administrator access required"
+        )
+    return current_user
+
+async def is_admin_token(token: str) -> bool:
+    """Whether a raw bearer token is a non-revoked admin token (for checks outside route dependencies)
+
+    The cached verification answers for every token without the `admin` claim, so only
+    admin tokens cost a revocation lookup.
+    """
+    try:
+        decoded_token = await async_firebase_service.verify_id_token(token)
+        if decoded_token.get("admin") is not True:
+            return False
+        decoded_token = await async_firebase_service.verify_id_token(token, check_revoked=True)
+    except Exception:
+        return False
+    return decoded_token.get("admin") is True
+
 # Routes
 @router.post("/register", status_code=status.HTTP_201_CREATED, response_model=RegistrationResponse,
             summary="Register new user",
@@ -84,7 +120,7 @@ async def register_user(user_data: UserRegistration):
     """
     try:
         # Create the user in Firebase Auth
-        new_user = firebase_service.create_user(
+        new_user = await async_firebase_service.create_user(
             email=user_data.email,
             password=user_data.password
         )
@@ -103,7 +139,7 @@ async def register_user(user_data: UserRegistration):
         }
         
         # Save user profile
-        firebase_service.create_user_profile(new_user.uid, user_profile)
+        await async_firebase_service.create_user_profile(new_user.uid, user_profile)
         
         return RegistrationResponse(
             message="User registered successfully", 
@@ -123,11 +159,11 @@ async def get_profile(current_user: Dict[str, Any] = Depends(get_current_user)):
     try:
         user_id = current_user.get("uid")
         # Get user profile from database
-        user_profile = firebase_service.get_user_profile(user_id)
+        user_profile = await async_firebase_service.get_user_profile(user_id)
         
         if not user_profile:
             # Get user details from Firebase Auth
-            auth_user = firebase_service.get_user(user_id)
+            auth_user = await async_firebase_service.get_user(user_id)
             
             # Create a basic profile if none exists
             user_profile = {
@@ -141,7 +177,7 @@ async def get_profile(current_user: Dict[str, Any] = Depends(get_current_user)):
                     "default_view": "dashboard"
                 }
             }
-            firebase_service.create_user_profile(user_id, user_profile)
+            await async_firebase_service.create_user_profile(user_id, user_profile)
         
         return user_profile
     except Exception as e:
@@ -160,7 +196,7 @@ async def update_profile(
     try:
         user_id = current_user.get("uid")
         # Get existing profile
-        existing_profile = firebase_service.get_user_profile(user_id) or {}
+        existing_profile = await async_firebase_service.get_user_profile(user_id) or {}
         
         # Ensure the profile has an id
         existing_profile["id"] = user_id
@@ -189,15 +225,16 @@ async def update_profile(
         existing_profile["updated_at"] = int(time.time() * 1000)  # Current time in milliseconds
         
         # Save updated profile
-        firebase_service.update_user_profile(user_id, existing_profile)
+        await async_firebase_service.update_user_profile(user_id, existing_profile)
         
-        # If email was updated, update it in Firebase Auth as well
+        # Mirror email and name changes to Firebase Auth in a single call
+        auth_updates = {}
         if "email" in update_data and update_data["email"] is not None:
-            firebase_service.update_user(user_id, email=update_data["email"])
-            
-        # If name was updated, update display_name in Firebase Auth as well
+            auth_updates["email"] = update_data["email"]
         if "name" in update_data and update_data["name"] is not None:
-            firebase_service.update_user(user_id, display_name=update_data["name"])
+            auth_updates["display_name"] = update_data["name"]
+        if auth_updates:
+            await async_firebase_service.update_user(user_id, **auth_updates)
         
         return existing_profile
     except Exception as e:
@@ -210,7 +247,7 @@ async def update_profile(
              summary="Delete user profile",
              description="Deletes the authenticated user's profile and optionally the Firebase Auth user. Requires a valid Firebase ID token.")
 async def delete_profile(
-    current_user: Dict[str, Any] = Depends(get_current_user), 
+    current_user: Dict[str, Any] = Depends(get_current_user_strict), 
     delete_auth: bool = False
 ):
     """Delete the user profile (and optionally the Firebase Auth user)"""
@@ -219,10 +256,10 @@ async def delete_profile(
         
         if delete_auth:
             # Delete both profile and auth user
-            firebase_service.delete_user_complete(user_id)
+            await async_firebase_service.delete_user_complete(user_id)
         else:
             # Delete only the user profile from the database
-            firebase_service.delete_user_profile(user_id)
+            await async_firebase_service.delete_user_profile(user_id)
             
         return Response(status_code=status.HTTP_204_NO_CONTENT)
     except Exception as e:
@@ -0,0 +1,121 @@
+from fastapi import APIRouter, HTTPException
+from typing import List, Optional, Literal
+from pydantic import BaseModel, Field
+from datetime import date, timedelta
+import asyncio
+import logging
+
+from ..services.backtest import run_backtest
+from ..services.market_data import load_price_matrix
+from ..services.process_pool import run_in_process_pool
+from .timed_route import TimedRoute
+
+logger = logging.getLogger(__name__)
+
+MAX_BACKTEST_SYMBOLS = 25
+MAX_BACKTEST_YEARS = 20
+
+class BacktestRequest(BaseModel):
+    strategy: Literal["buy_and_hold", "sma_crossover", "rsi", "rebalance"] = Field(
+        ..., description="Strategy to simulate"
+    )
+    symbols: List[str] = Field(
+        ..., min_length=1, max_length=MAX_BACKTEST_SYMBOLS, description="Stock ticker symbols to trade"
+    )
+    start_date: date = Field(..., description="First day of the backtest (YYYY-MM-DD)")
+    end_date: date = Field(..., description="Last day of the backtest (YYYY-MM-DD)")
+    initial_capital: float = Field(10000.0, gt=0, description="Starting cash in USD")
+    commission: float = Field(0.0, ge=0, le=0.05, description="Commission as a fraction of traded value")
+    short_window: int = Field(20, ge=1, le=250, description="Short moving average window (sma_crossover)")
+    long_window: int = Field(50, ge=2, le=400, description="Long moving average window (sma_crossover)")
+    rsi_period: int = Field(14, ge=2, le=100, description="RSI lookback period (rsi)")
+    rsi_lower: float = Field(30.0, description="Buy when RSI falls below this level (rsi)")
+    rsi_upper: float = Field(70.0, description="Sell when RSI rises above this level (rsi)")
+    rebalance_days: int = Field(21, ge=1, description="Trading days between rebalances (rebalance)")
+    weights: Optional[List[float]] = Field(
+        None, description="Target weight per symbol (buy_and_hold, rebalance); equal weights if omitted"
+    )
+
+class EquityPoint(BaseModel):
+    date: str = Field(..., description="Trading day date in YYYY-MM-DD format")
+    value: float = Field(..., description="Portfolio value at the close in USD")
+
+class BacktestTrade(BaseModel):
+    date: str = Field(..., description="Trading day the order was filled")
+    symbol: str = Field(..., description="Stock ticker symbol")
+    type: str = Field(..., description="buy or sell")
+    quantity: float = Field(..., description="Number of shares traded")
+    price: float = Field(..., description="Fill price (closing price) in USD")
+
+class BacktestMetrics(BaseModel):
+    total_return: float = Field(..., description="Total return over the period (0.1 = 10%)")
+    cagr: float = Field(..., description="Compound annual growth rate")
+    volatility: float = Field(..., description="Annualized volatility of daily returns")
+    sharpe_ratio: float = Field(..., description="Annualized Sharpe ratio (risk-free rate of 0)")
+    max_drawdown: float = Field(..., description="Largest peak-to-trough decline (-0.2 = -20%)")
+
+class BacktestResult(BaseModel):
+    strategy: str
+    symbols: List[str]
+    start_date: str
+    end_date: str
+    initial_capital: float
+    final_value: float
+    metrics: BacktestMetrics
+    equity_curve: List[EquityPoint]
+    trades: List[BacktestTrade]
+
+router = APIRouter(
+    prefix="/api/backtest",
+    tags=["backtesting"],
+    route_class=TimedRoute,
+    responses={
+        400: {"description": "Invalid strategy parameters or date range"},
+        404: {"description": "Price history not available"}
+    }
+)
+
+@router.post(
+    "",
+    response_model=BacktestResult,
+    summary="Backtest a trading strategy",
+    description="""
+    Simulate a trading strategy against historical daily prices.
+    Supported strategies are buy_and_hold, sma_crossover, rsi and periodic rebalance.
+    Returns the equity curve, the list of trades, and CAGR, Sharpe ratio and max drawdown.
+    """,
+    response_description="Backtest results"
+)
+async def backtest_strategy(request: BacktestRequest):
+    """Run a backtest in the compute process pool"""
+    if request.end_date <= request.start_date:
+        raise HTTPException(status_code=400, detail="end_date must be after start_date")
+    if request.end_date - request.start_date > timedelta(days=365 * MAX_BACKTEST_YEARS):
+        raise HTTPException(status_code=400, detail=f"Backtests are limited to {MAX_BACKTEST_YEARS} years")
+
+    symbols = list(dict.fromkeys(symbol.upper() for symbol in request.symbols))
+
+    try:
+        # Price lookups are network-bound, so keep them off the event loop
+        prices = await asyncio.to_thread(load_price_matrix, symbols, request.start_date, request.end_date)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    params = request.model_dump(exclude={"strategy", "symbols", "start_date", "end_date", "initial_capital", "commission"})
+
+    try:
+        return await run_in_process_pool(
+            run_backtest,
+            prices.dates,
+            prices.symbols,
+            prices.closes,
+            request.strategy,
+            params,
+            request.initial_capital,
+            request.commission
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Backtest failed for {symbols}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Backtest failed: {str(e)}")
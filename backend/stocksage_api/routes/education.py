@@ -1,115 +1,72 @@
-from fastapi import APIRouter, HTTPException
-from typing import List, Dict, Any
+from fastapi import APIRouter, HTTPException, Depends, Query, status
+from typing import List, Dict, Any, Literal, Optional
+import asyncio
+import logging
+
+from .auth import get_current_admin
+from ..services.education import education_content, EDUCATION_SEARCH_LIMIT
+from .timed_route import TimedRoute
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/api/education",
     tags=["education"],
+    route_class=TimedRoute,
     responses={
         404: {"description": "Educational content not found"}
     }
 )
 
-# Mock educational content
-stock_terms = [
-    {
-        "term": "stock",
-        "definition": "A stock (also known as equity) is a security that represents the ownership of a fraction of a corporation.",
-        "example": "Buying Apple (AAPL) stock means you own a small piece of Apple Inc."
-    },
-    {
-        "term": "dividend",
-        "definition": "A dividend is a distribution of a portion of a company's earnings, decided by the board of directors, to a class of its shareholders.",
-        "example": "Apple Inc. pays a quarterly dividend of $0.24 per share to its shareholders."
-    },
-    {
-        "term": "market cap",
-        "definition": "Market capitalization is the total value of a company's outstanding shares of stock, calculated by multiplying the stock's price by the total number of shares outstanding.",
-        "example": "With a stock price of $175 and about 16 billion shares, Apple has a market cap of approximately $2.8 trillion."
-    },
-    {
-        "term": "bull market",
-        "definition": "A bull market is a period of time in financial markets when the price of an asset or security rises continuously by 20% or more.",
-        "example": "The stock market was in a bull market from 2009 to 2020, with stock prices rising steadily over that period."
-    },
-    {
-        "term": "bear market",
-        "definition": "A bear market is when a market experiences prolonged price declines, typically by 20% or more from recent highs.",
-        "example": "The stock market entered a bear market in March 2020 when COVID-19 caused stock prices to drop more than 30%."
-    },
-    {
-        "term": "volatility",
-        "definition": "Volatility is a statistical measure of the dispersion of returns for a given security or market index, indicating how much the price fluctuates over time.",
-        "example": "Technology stocks often have higher volatility than utility stocks, meaning their prices tend to move up and down more dramatically."
-    },
-    {
-        "term": "P/E ratio",
-        "definition": "The price-to-earnings ratio (P/E ratio) is the ratio of a company's share price to its earnings per share, used to evaluate if a stock is overvalued or undervalued.",
-        "example": "A company with a stock price of $100 and earnings of $5 per share has a P/E ratio of 20."
-    }
-]
-
-trading_tips = [
-    {
-        "id": "tip1",
-        "title": "Diversify Your Portfolio",
-        "content": "Don't put all your eggs in one basket. Spread your investments across different sectors and asset classes to reduce risk.",
-        "category": "risk-management"
-    },
-    {
-        "id": "tip2",
-        "title": "Invest for the Long Term",
-        "content": "The stock market can be volatile in the short term, but historically has provided good returns over the long term.",
-        "category": "strategy"
-    },
-    {
-        "id": "tip3",
-        "title": "Understand What You're Buying",
-        "content": "Before investing in a company, research its business model, financial health, and growth prospects.",
-        "category": "research"
-    },
-    {
-        "id": "tip4",
-        "title": "Start Small and Consistent",
-        "content": "Begin with small investments and gradually increase your portfolio size as you gain experience and confidence.",
-        "category": "beginner"
-    },
-    {
-        "id": "tip5",
-        "title": "Use Dollar-Cost Averaging",
-        "content": "Invest a fixed amount at regular intervals regardless of market conditions to smooth out the impact of volatility.",
-        "category": "strategy"
-    }
-]
-
 @router.get("/terms", response_model=List[Dict[str, Any]])
-async def get_stock_terms():
+async def get_stock_terms(category: Optional[str] = Query(None, description="Only terms in this category")):
     """Get a list of stock market terms and definitions"""
-    return stock_terms
+    return education_content.index.list_terms(category)
 
 @router.get("/terms/{term}", response_model=Dict[str, Any])
 async def get_stock_term(term: str):
     """Get definition for a specific stock market term"""
-    for stock_term in stock_terms:
-        if stock_term["term"].lower() == term.lower():
-            # Add related terms
-            related = []
-            if term.lower() == "stock":
-                related = ["equity", "share", "security"]
-            elif term.lower() == "dividend":
-                related = ["yield", "payout ratio", "ex-dividend date"]
-            elif term.lower() == "market cap":
-                related = ["valuation", "enterprise value", "large cap", "small cap"]
-            elif term.lower() in ["bull market", "bear market"]:
-                related = ["market trend", "correction", "rally"]
-            
-            return {
-                **stock_term,
-                "related_terms": related
-            }
-    
-    raise HTTPException(status_code=404, detail=f"Term '{term}' not found")
+    stock_term = education_content.index.get_term(term)
+    if stock_term is None:
+        raise HTTPException(status_code=404, detail=f"Term '{term}' not found")
+    return stock_term
 
 @router.get("/tips", response_model=List[Dict[str, Any]])
-async def get_trading_tips():
+async def get_trading_tips(category: Optional[str] = Query(None, description="Only tips in this category")):
     """Get stock trading tips for beginners"""
-    return trading_tips
+    return education_content.index.list_tips(category)
+
+@router.get("/categories", response_model=Dict[str, List[str]])
+async def get_categories():
+    """Get the categories used by terms and tips"""
+    return education_content.index.categories()
+
+@router.get("/search", response_model=Dict[str, Any])
+async def search_content(
+    q: str = Query(..., min_length=1, max_length=200, description="Words to find in terms, definitions, examples and tips"),
+    type: Optional[Literal["term", "tip"]] = Query(None, description="Only return terms or only tips"),
+    category: Optional[str] = Query(None, description="Only results in this category"),
+    limit: int = Query(EDUCATION_SEARCH_LIMIT, ge=1, le=100, description="Maximum number of results")
+):
+    """Full-text search over the glossary and trading tips"""
+    results = education_content.index.search(q, kind=type, category=category, limit=limit)
+    return {"query": q, "count": len(results), "results": results}
+
+@router.get("/status", response_model=Dict[str, Any])
+async def get_content_status():
+    """Get the version and source of the education content being served"""
+    return education_content.status()
+
+@router.post("/reload", response_model=Dict[str, Any], dependencies=[Depends(get_current_admin)],
+             responses={403: {"description": "Administrator access required"}})
+async def reload_content():
+    """Rebuild the education indexes from the content file without restarting
+    (collections mirrored from the database keep their database content)"""
+    try:
+        return await asyncio.to_thread(education_content.reload)
+    except (OSError, ValueError) as e:
+        logger.error(f"Failed to reload education content: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to reload education content: {str(e)}"
+        )
@@ -1,8 +1,9 @@
 from fastapi import APIRouter, HTTPException
-from ..services.firebase_service import firebase_service
+from ..services.async_firebase_service import async_firebase_service
+from .timed_route import TimedRoute
 from datetime import datetime
 
-router = APIRouter(prefix="/firebase", tags=["firebase"])
+router = APIRouter(prefix="/firebase", tags=["firebase"], route_class=TimedRoute)
 
 @router.get("/test")
 async def test_firebase_connection():
@@ -14,18 +15,18 @@ async def test_firebase_connection():
             "message": "Hello from StockSage-AI! (Pyrebase)",
             "timestamp": timestamp
         }
-        firebase_service.set_data("test_pyrebase", pyrebase_test_data)
+        await async_firebase_service.set_data("test_pyrebase", pyrebase_test_data)
         
         # Test Admin SDK write operation
         admin_test_data = {
             "message": "Hello from StockSage-AI! (Admin SDK)",
             "timestamp": timestamp
         }
-        firebase_service.admin_set_data("test_admin", admin_test_data)
+        await async_firebase_service.admin_set_data("test_admin", admin_test_data)
         
         # Test read operations
-        pyrebase_result = firebase_service.get_data("test_pyrebase")
-        admin_result = firebase_service.admin_get_data("test_admin")
+        pyrebase_result = await async_firebase_service.get_data("test_pyrebase")
+        admin_result = await async_firebase_service.admin_get_data("test_admin")
         
         return {
             "status": "success",
@@ -34,4 +35,30 @@ async def test_firebase_connection():
             "admin_data": admin_result
         }
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Firebase connection failed: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Firebase connection failed: {str(e)}")
+
+@router.get("/pools")
+async def connection_pool_stats():
+    """Usage counters for the RTDB HTTP connection pools"""
+    return {
+        **(await async_firebase_service.ready()).pool_stats(),
+        "async": async_firebase_service.pool_stats()
+    }
+
+
+@router.get("/writes")
+async def write_stats():
+    """Writes merged into multi-path updates and the round trips that saved"""
+    return async_firebase_service.write_stats()
+
+
+@router.get("/profile-cache")
+async def profile_cache_stats():
+    """Hit ratio and invalidation lag of the user profile cache"""
+    return async_firebase_service.profile_cache.stats()
+
+
+@router.get("/streams")
+async def stream_hub_stats():
+    """Upstream change streams and subscriber queue counters"""
+    return async_firebase_service.stream_hub.stats()
@@ -0,0 +1,448 @@
+from fastapi import APIRouter, HTTPException, Depends, Path, Query, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Optional, Dict, Any, Literal
+from datetime import date
+import asyncio
+import json
+import logging
+import os
+
+from .auth import get_current_user
+from ..services.async_firebase_service import async_firebase_service
+from ..services.portfolio import TradeError
+from ..services.portfolio_service import portfolio_engine, PortfolioConflictError, PortfolioNotFoundError
+from .timed_route import TimedRoute
+
+logger = logging.getLogger(__name__)
+
+MAX_COMPARE_PORTFOLIOS = 20
+# Seconds between SSE comments that keep idle change streams open through proxies
+STREAM_KEEPALIVE_INTERVAL = float(os.getenv("STREAM_KEEPALIVE_INTERVAL", 15))
+
+router = APIRouter(
+    prefix="/api/portfolios",
+    tags=["portfolios"],
+    route_class=TimedRoute,
+    responses={
+        404: {"description": "Portfolio not found"}
+    }
+)
+
+# Models
+class PortfolioCreate(BaseModel):
+    """Portfolio creation model"""
+    name: str = Field(..., min_length=1, max_length=100, description="Portfolio name")
+    initial_balance: float = Field(10000.0, gt=0, description="Starting cash balance in USD")
+    start_date: Optional[date] = Field(None, description="Simulation start date (defaults to today)")
+
+class TradeRequest(BaseModel):
+    """Buy or sell order model"""
+    symbol: str = Field(..., min_length=1, max_length=10, description="Stock ticker symbol")
+    quantity: float = Field(..., gt=0, description="Number of shares to trade")
+
+class PortfolioResponse(BaseModel):
+    """Portfolio response model"""
+    id: str
+    user_id: str
+    name: str
+    start_date: str
+    initial_balance: float
+    current_balance: float
+    realized_pnl: float
+    created_at: int
+
+class PositionValue(BaseModel):
+    """Valued stock position"""
+    symbol: str
+    quantity: float
+    average_buy_price: float
+    current_price: float
+    market_value: float
+    unrealized_pnl: float
+
+class PortfolioPerformance(BaseModel):
+    """Portfolio valuation and gains/losses"""
+    portfolio_id: str
+    cash: float
+    market_value: float
+    total_value: float
+    cost_basis: float
+    unrealized_pnl: float
+    realized_pnl: float
+    total_return: float = Field(..., description="Return on the initial balance (0.1 = 10%)")
+    positions: List[PositionValue]
+    timestamp: int
+
+class PortfolioDetail(PortfolioResponse):
+    """Portfolio with valued positions"""
+    performance: PortfolioPerformance
+
+class TransactionResponse(BaseModel):
+    """Transaction ledger entry model"""
+    id: str = Field(..., description="Ledger key (also the pagination cursor)")
+    seq: int = Field(..., description="Ledger sequence number, starting at 1")
+    portfolio_id: str
+    symbol: str
+    type: str
+    quantity: float
+    price: float
+    timestamp: int
+
+class TransactionPage(BaseModel):
+    """A page of transactions, newest first"""
+    transactions: List[TransactionResponse]
+    next_cursor: Optional[str] = Field(None, description="Pass as `before` to fetch the next page")
+
+class PositionBalance(BaseModel):
+    """Position held at a point in time"""
+    symbol: str
+    quantity: float
+    average_buy_price: float
+
+class PortfolioBalance(BaseModel):
+    """Cash, positions and cost basis at a point in time"""
+    portfolio_id: str
+    as_of: int
+    seq: int = Field(..., description="Number of ledger entries applied")
+    cash: float
+    cost_basis: float
+    realized_pnl: float
+    positions: List[PositionBalance]
+
+class EquityPoint(BaseModel):
+    """Portfolio value at a close"""
+    date: str
+    value: float
+
+class ComparisonMetrics(BaseModel):
+    """Return and risk metrics relative to the benchmark"""
+    total_return: float
+    volatility: float = Field(..., description="Annualized volatility of daily returns")
+    max_drawdown: float
+    excess_return: float = Field(..., description="Total return minus the benchmark's total return")
+    beta: float
+    correlation: float
+    tracking_error: float = Field(..., description="Annualized volatility of returns in excess of the benchmark")
+    information_ratio: float
+
+class PortfolioComparisonItem(BaseModel):
+    """One portfolio in a comparison"""
+    portfolio_id: str
+    name: str
+    metrics: ComparisonMetrics
+    equity_curve: List[EquityPoint]
+
+class BenchmarkSummary(BaseModel):
+    """Benchmark performance over the comparison window"""
+    symbol: str
+    total_return: float
+    volatility: float
+    max_drawdown: float
+
+class PortfolioComparison(BaseModel):
+    """Side-by-side portfolio performance"""
+    start_date: str
+    end_date: str
+    benchmark: BenchmarkSummary
+    portfolios: List[PortfolioComparisonItem]
+
+class RiskMetrics(BaseModel):
+    """Risk of the current holdings over the lookback window"""
+    portfolio_id: str
+    as_of: str = Field(..., description="Date of the last daily bar used")
+    benchmark: str
+    lookback_days: int
+    confidence: float
+    portfolio_value: float
+    volatility: float = Field(..., description="Annualized volatility of daily returns")
+    beta: float = Field(..., description="Beta against the benchmark")
+    historical_var: float = Field(..., description="One-day historical Value at Risk (0.02 = 2% of value)")
+    historical_cvar: float = Field(..., description="One-day historical Conditional VaR (expected shortfall)")
+    parametric_var: float = Field(..., description="One-day normal (parametric) Value at Risk")
+    parametric_cvar: float = Field(..., description="One-day normal (parametric) Conditional VaR")
+    max_drawdown: float = Field(..., description="Largest peak-to-trough decline of the holdings over the window")
+
+class SimulationRequest(BaseModel):
+    """Monte Carlo projection parameters"""
+    horizon_days: int = Field(252, ge=1, le=1260, description="Number of trading days to project")
+    n_paths: int = Field(10000, ge=1000, le=100000, description="Number of simulated paths")
+    method: Literal["bootstrap", "gbm"] = Field(
+        "bootstrap", description="Resample historical daily returns, or use geometric Brownian motion fitted to them"
+    )
+    lookback_days: int = Field(730, ge=60, le=3650, description="Calendar days of history used to estimate returns")
+    seed: int = Field(0, ge=0, description="Random seed; identical requests with the same seed return cached results")
+    target_value: Optional[float] = Field(None, gt=0, description="Goal value used to report the probability of reaching it")
+
+class PercentileBand(BaseModel):
+    """Projected value percentiles on one day"""
+    day: int
+    p5: float
+    p25: float
+    p50: float
+    p75: float
+    p95: float
+
+class FinalValueSummary(BaseModel):
+    """Distribution of the projected value at the horizon"""
+    mean: float
+    p5: float
+    p25: float
+    p50: float
+    p75: float
+    p95: float
+
+class SimulationResult(BaseModel):
+    """Monte Carlo projection of portfolio value"""
+    portfolio_id: str
+    as_of: str = Field(..., description="Date of the last daily bar used")
+    method: str
+    horizon_days: int
+    n_paths: int
+    seed: int
+    initial_value: float
+    bands: List[PercentileBand]
+    final_value: FinalValueSummary
+    probability_of_loss: float
+    probability_of_target: Optional[float] = None
+
+def _portfolio_response(portfolio) -> Dict[str, Any]:
+    record = portfolio.to_record()
+    record.pop("version", None)
+    return record
+
+# The engine reads and writes Firebase and downloads prices synchronously, so every
+# call to it runs in a worker thread to keep the event loop free
+async def _get_portfolio(portfolio_id: str, user_id: str):
+    try:
+        return await asyncio.to_thread(portfolio_engine.get_portfolio, portfolio_id, user_id)
+    except PortfolioNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+
+# Routes
+@router.post("", status_code=status.HTTP_201_CREATED, response_model=PortfolioResponse,
+             summary="Create portfolio",
+             description="Creates a new simulated portfolio for the authenticated user, funded with the initial balance in cash.")
+async def create_portfolio(
+    portfolio_data: PortfolioCreate,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Create a new portfolio"""
+    try:
+        portfolio = await asyncio.to_thread(
+            portfolio_engine.create_portfolio,
+            current_user.get("uid"),
+            portfolio_data.name,
+            portfolio_data.initial_balance,
+            portfolio_data.start_date
+        )
+        return _portfolio_response(portfolio)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to create portfolio: {str(e)}"
+        )
+
+@router.get("", response_model=List[PortfolioResponse], summary="List portfolios",
+            description="Lists all portfolios owned by the authenticated user.")
+async def list_portfolios(current_user: Dict[str, Any] = Depends(get_current_user)):
+    """List the user's portfolios"""
+    try:
+        portfolios = await asyncio.to_thread(portfolio_engine.list_portfolios, current_user.get("uid"))
+        return [_portfolio_response(p) for p in portfolios]
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to list portfolios: {str(e)}"
+        )
+
+@router.get("/compare", response_model=PortfolioComparison, summary="Compare portfolios",
+            description="Compares the value over time, returns and benchmark-relative performance of several of the user's portfolios.")
+async def compare_portfolios(
+    ids: str = Query(..., description="Comma-separated portfolio IDs", examples=["id1,id2"]),
+    days: int = Query(365, ge=5, le=1825, description="Number of calendar days to compare"),
+    benchmark: str = Query("SPY", max_length=10, description="Benchmark index or ETF symbol"),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Compare portfolios against each other and a benchmark"""
+    portfolio_ids = list(dict.fromkeys(pid.strip() for pid in ids.split(",") if pid.strip()))
+    if not portfolio_ids or len(portfolio_ids) > MAX_COMPARE_PORTFOLIOS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Provide between 1 and {MAX_COMPARE_PORTFOLIOS} portfolio IDs"
+        )
+    try:
+        return await asyncio.to_thread(portfolio_engine.compare, portfolio_ids, current_user.get("uid"), days, benchmark)
+    except PortfolioNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+
+@router.get("/{portfolio_id}", response_model=PortfolioDetail, summary="Get portfolio details",
+            description="Returns the portfolio with its positions valued at the latest prices.")
+async def get_portfolio(
+    portfolio_id: str = Path(..., description="Portfolio ID"),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Get a portfolio with valued positions"""
+    portfolio = await _get_portfolio(portfolio_id, current_user.get("uid"))
+    performance = await asyncio.to_thread(portfolio_engine.valuation, portfolio)
+    return {**_portfolio_response(portfolio), "performance": performance}
+
+async def _trade(portfolio_id: str, side: str, trade: TradeRequest, user_id: str) -> Dict[str, Any]:
+    try:
+        return await asyncio.to_thread(
+            portfolio_engine.execute_trade, portfolio_id, user_id, side, trade.symbol, trade.quantity
+        )
+    except PortfolioNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except TradeError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except PortfolioConflictError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except Exception as e:
+        logger.error(f"Failed to {side} {trade.symbol} in portfolio {portfolio_id}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to execute trade: {str(e)}"
+        )
+
+@router.post("/{portfolio_id}/buy", response_model=TransactionResponse, summary="Buy stock",
+             description="Buys shares at the latest price using the portfolio's cash balance.")
+async def buy_stock(
+    trade: TradeRequest,
+    portfolio_id: str = Path(..., description="Portfolio ID"),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Buy shares"""
+    return await _trade(portfolio_id, "buy", trade, current_user.get("uid"))
+
+@router.post("/{portfolio_id}/sell", response_model=TransactionResponse, summary="Sell stock",
+             description="Sells shares of an existing position at the latest price.")
+async def sell_stock(
+    trade: TradeRequest,
+    portfolio_id: str = Path(..., description="Portfolio ID"),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Sell shares"""
+    return await _trade(portfolio_id, "sell", trade, current_user.get("uid"))
+
+@router.get("/{portfolio_id}/transactions", response_model=TransactionPage,
+            summary="Get transaction history",
+            description="Returns a page of the portfolio's transactions, newest first. Pass `next_cursor` as `before` to get the next page.")
+async def get_transactions(
+    portfolio_id: str = Path(..., description="Portfolio ID"),
+    limit: int = Query(50, ge=1, le=500, description="Maximum number of transactions to return"),
+    before: Optional[str] = Query(None, description="Only return transactions before this ledger key"),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Get transaction history"""
+    try:
+        return await asyncio.to_thread(
+            portfolio_engine.get_transactions, portfolio_id, current_user.get("uid"), limit, before
+        )
+    except PortfolioNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+@router.get("/{portfolio_id}/balance", response_model=PortfolioBalance,
+            summary="Get point-in-time balance",
+            description="Returns cash, positions and cost basis as they stood at `as_of`, rebuilt from the nearest ledger snapshot.")
+async def get_balance(
+    portfolio_id: str = Path(..., description="Portfolio ID"),
+    as_of: int = Query(..., ge=0, description="Point in time as a Unix timestamp in milliseconds"),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Get the balance at a point in time"""
+    try:
+        state = await asyncio.to_thread(portfolio_engine.get_state_at, portfolio_id, current_user.get("uid"), as_of)
+    except PortfolioNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    return {
+        "portfolio_id": portfolio_id,
+        "as_of": as_of,
+        "seq": state.version,
+        "cash": round(state.current_balance, 2),
+        "cost_basis": round(state.cost_basis, 2),
+        "realized_pnl": round(state.realized_pnl, 2),
+        "positions": [
+            {"symbol": p.symbol, "quantity": p.quantity, "average_buy_price": round(p.average_buy_price, 4)}
+            for p in state.positions.values()
+        ]
+    }
+
+@router.get("/{portfolio_id}/risk", response_model=RiskMetrics, summary="Get portfolio risk",
+            description="Returns volatility, beta, historical and parametric VaR/CVaR and max drawdown of the current holdings, computed from daily history.")
+async def get_risk(
+    portfolio_id: str = Path(..., description="Portfolio ID"),
+    days: int = Query(365, ge=30, le=1825, description="Lookback window in calendar days"),
+    benchmark: str = Query("SPY", max_length=10, description="Benchmark index or ETF symbol"),
+    confidence: float = Query(0.95, ge=0.5, le=0.999, description="VaR confidence level"),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Get risk analytics"""
+    portfolio = await _get_portfolio(portfolio_id, current_user.get("uid"))
+    try:
+        return await portfolio_engine.risk(portfolio, days, benchmark, confidence)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+
+@router.post("/{portfolio_id}/simulate", response_model=SimulationResult, summary="Simulate future portfolio value",
+             description="Runs a Monte Carlo projection of the current holdings using bootstrapped or GBM returns estimated from their history, and returns percentile bands.")
+async def simulate_portfolio(
+    simulation: SimulationRequest,
+    portfolio_id: str = Path(..., description="Portfolio ID"),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Project future portfolio value"""
+    portfolio = await _get_portfolio(portfolio_id, current_user.get("uid"))
+    try:
+        return await portfolio_engine.simulate(portfolio, **simulation.model_dump())
+    except TradeError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+
+@router.get("/{portfolio_id}/performance", response_model=PortfolioPerformance,
+            summary="Get portfolio performance",
+            description="Returns the portfolio's value, cost basis and realized/unrealized gains and losses, now or as of a past time.")
+async def get_performance(
+    portfolio_id: str = Path(..., description="Portfolio ID"),
+    as_of: Optional[int] = Query(None, ge=0, description="Value the portfolio as of this Unix timestamp in milliseconds"),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Calculate gains and losses"""
+    portfolio = await _get_portfolio(portfolio_id, current_user.get("uid"))
+    if as_of is not None:
+        return await asyncio.to_thread(portfolio_engine.historical_valuation, portfolio, as_of)
+    return await asyncio.to_thread(portfolio_engine.valuation, portfolio)
+
+@router.get("/{portfolio_id}/stream", summary="Stream portfolio changes",
+            response_class=StreamingResponse,
+            description="Server-sent events with every change to the portfolio record and its positions. "
+                        "Each stream starts with the current value of both (`path` \"/\"); `stream` names the "
+                        "database path an event belongs to.")
+async def stream_portfolio(
+    portfolio_id: str = Path(..., description="Portfolio ID"),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Stream portfolio and position changes"""
+    await _get_portfolio(portfolio_id, current_user.get("uid"))
+    subscription = async_firebase_service.stream_hub.subscribe(
+        [f"portfolios/{portfolio_id}", f"positions/{portfolio_id}"], policy="coalesce"
+    )
+
+    async def events():
+        try:
+            while not subscription.closed:
+                event = await subscription.get(timeout=STREAM_KEEPALIVE_INTERVAL)
+                if event is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                payload = {"stream": event["stream_id"], "path": event["path"], "data": event["data"]}
+                yield f"event: {event['event']}\ndata: {json.dumps(payload)}\n\n"
+        finally:
+            subscription.close()
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
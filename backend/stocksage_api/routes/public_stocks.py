@@ -3,12 +3,17 @@ from typing import List, Optional
 from pydantic import BaseModel, Field
 from datetime import datetime, timedelta
 import random
-import yfinance as yf
-import time
 import logging
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
+from ..services.market_cache import get_cached_or_fetch
+from ..services.market_data import (
+    company_info, fetch_company_data, fetch_history_data, fetch_stock_data, mock_stocks
+)
+from ..services.metrics import mock_fallbacks, track_upstream
+from .timed_route import TimedRoute
+
+# yfinance takes about half a second to import, so it is imported where it is used
+
 logger = logging.getLogger(__name__)
 
 # Create response models for better documentation
@@ -51,6 +56,7 @@ class StockRecommendation(BaseModel):
 router = APIRouter(
     prefix="/api/stocks",
     tags=["Stocks & Market Data"],
+    route_class=TimedRoute,
     responses={
         404: {"description": "Stock or data not found"},
         500: {"description": "Internal server error or API limitation"}
@@ -63,129 +69,6 @@ popular_stocks = [
     "JPM", "V", "WMT", "DIS", "NFLX", "PYPL", "INTC", "AMD"
 ]
 
-# Mock data for fallback when API fails
-mock_stocks = [
-    {"symbol": "AAPL", "name": "Apple Inc.", "price": 175.34, "change": 2.34},
-    {"symbol": "MSFT", "name": "Microsoft Corporation", "price": 328.79, "change": -1.23},
-    {"symbol": "GOOGL", "name": "Alphabet Inc.", "price": 142.56, "change": 0.78},
-    {"symbol": "AMZN", "name": "Amazon.com, Inc.", "price": 178.12, "change": 3.45},
-    {"symbol": "TSLA", "name": "Tesla, Inc.", "price": 193.57, "change": -2.67},
-]
-
-# Company information mock data for fallback
-company_info = {
-    "AAPL": {
-        "symbol": "AAPL",
-        "name": "Apple Inc.",
-        "description": "Apple Inc. designs, manufactures, and markets smartphones, personal computers, tablets, wearables, and accessories worldwide. The company offers iPhone, a line of smartphones...",
-        "sector": "Technology",
-        "industry": "Consumer Electronics",
-        "employees": 154000,
-        "headquarters": "Cupertino, California",
-        "founded": 1976,
-        "ceo": "Tim Cook",
-        "website": "https://www.apple.com"
-    },
-    "MSFT": {
-        "symbol": "MSFT",
-        "name": "Microsoft Corporation",
-        "description": "Microsoft Corporation develops, licenses, and supports software, services, devices, and solutions worldwide. The company operates in three segments: Productivity and Business Processes, Intelligent Cloud, and More Personal Computing...",
-        "sector": "Technology",
-        "industry": "Software—Infrastructure",
-        "employees": 181000,
-        "headquarters": "Redmond, Washington",
-        "founded": 1975,
-        "ceo": "Satya Nadella",
-        "website": "https://www.microsoft.com"
-    },
-    "GOOGL": {
-        "symbol": "GOOGL",
-        "name": "Alphabet Inc.",
-        "description": "Alphabet Inc. provides various products and platforms in the United States, Europe, the Middle East, Africa, the Asia-Pacific, Canada, and Latin America. It operates through Google Services, Google Cloud, and Other Bets segments...",
-        "sector": "Technology",
-        "industry": "Internet Content & Information",
-        "employees": 156000,
-        "headquarters": "Mountain View, California",
-        "founded": 1998,
-        "ceo": "Sundar Pichai",
-        "website": "https://www.abc.xyz"
-    },
-    "AMZN": {
-        "symbol": "AMZN",
-        "name": "Amazon.com, Inc.",
-        "description": "Amazon.com, Inc. engages in the retail sale of consumer products and subscriptions through online and physical stores in North America and internationally. It operates through three segments: North America, International, and Amazon Web Services (AWS)...",
-        "sector": "Consumer Cyclical",
-        "industry": "Internet Retail",
-        "employees": 1540000,
-        "headquarters": "Seattle, Washington",
-        "founded": 1994,
-        "ceo": "Andy Jassy",
-        "website": "https://www.amazon.com"
-    },
-    "TSLA": {
-        "symbol": "TSLA",
-        "name": "Tesla, Inc.",
-        "description": "Tesla, Inc. designs, develops, manufactures, leases, and sells electric vehicles, and energy generation and storage systems in the United States, China, and internationally...",
-        "sector": "Consumer Cyclical",
-        "industry": "Auto Manufacturers",
-        "employees": 127855,
-        "headquarters": "Austin, Texas",
-        "founded": 2003,
-        "ceo": "Elon Musk",
-        "website": "https://www.tesla.com"
-    }
-}
-
-# Cache configuration
-cache = {}
-cache_expiry = {}
-CACHE_DURATION = 300  # 5 minutes
-
-def get_cached_or_fetch(key, fetch_func):
-    """Get data from cache or fetch it"""
-    now = time.time()
-    if key in cache and cache_expiry.get(key, 0) > now:
-        return cache[key]
-    
-    try:
-        # Fetch fresh data
-        data = fetch_func()
-        cache[key] = data
-        cache_expiry[key] = now + CACHE_DURATION
-        return data
-    except Exception as e:
-        logger.error(f"Error fetching data for {key}: {str(e)}")
-        # If we have cached data but it's expired, still return it rather than failing
-        if key in cache:
-            logger.info(f"Using expired cache for {key}")
-            return cache[key]
-        raise e
-
-def fetch_stock_data(symbol: str):
-    """Fetch real stock data from yfinance"""
-    try:
-        ticker = yf.Ticker(symbol)
-        info = ticker.info
-        
-        # Check if essential data is available
-        if not info.get("shortName") and not info.get("regularMarketPrice"):
-            logger.warning(f"Incomplete data received for {symbol}")
-            raise ValueError(f"Incomplete data for {symbol}")
-            
-        return {
-            "symbol": symbol,
-            "name": info.get("shortName", "Unknown"),
-            "price": info.get("regularMarketPrice", info.get("currentPrice", 0)),
-            "change": info.get("regularMarketChangePercent", 0),
-            "volume": info.get("regularMarketVolume", 0),
-            "market_cap": info.get("marketCap", 0),
-            "pe_ratio": info.get("trailingPE", 0),
-            "dividend_yield": info.get("dividendYield", 0) * 100 if info.get("dividendYield") else 0
-        }
-    except Exception as e:
-        logger.error(f"Error fetching data for {symbol}: {str(e)}")
-        raise Exception(f"Could not fetch data for {symbol}: {str(e)}")
-
 # Get all available stocks
 @router.get(
     "", 
@@ -224,6 +107,7 @@ async def get_stocks():
             })
         except Exception as e:
             logger.warning(f"Failed to get real data for {symbol}, falling back to mock: {str(e)}")
+            mock_fallbacks.inc("stocks")
             # Fallback to mock data if available
             for mock in mock_stocks:
                 if mock["symbol"] == symbol:
@@ -238,6 +122,7 @@ async def get_stocks():
     # If we couldn't get any real data, return all mock stocks (but only their basic info)
     if not results:
         logger.warning("Returning all mock stocks as fallback")
+        mock_fallbacks.inc("stocks")
         return [{"symbol": s["symbol"], "name": s["name"], "price": s["price"], "change": s["change"]} 
                 for s in mock_stocks]
         
@@ -300,13 +185,16 @@ async def search_stocks(
                 # Continue to other search methods
         
         # Try to search multiple stocks with similar names/symbols
-        tickers = yf.Tickers(query)
+        import yfinance as yf
+        with track_upstream("yfinance", "tickers"):
+            tickers = yf.Tickers(query)
         results = []
         
         if hasattr(tickers, 'tickers'):
             for ticker_symbol, ticker_obj in tickers.tickers.items():
                 try:
-                    info = ticker_obj.info
+                    with track_upstream("yfinance", "info"):
+                        info = ticker_obj.info
                     if info and "shortName" in info:
                         results.append({
                             "symbol": ticker_symbol,
@@ -323,6 +211,7 @@ async def search_stocks(
             
         # Last resort: search our mock data
         logger.info(f"Falling back to mock data search for: {query}")
+        mock_fallbacks.inc("search")
         mock_results = [
             {"symbol": stock["symbol"], "name": stock["name"], "price": stock["price"], "change": stock["change"]}
             for stock in mock_stocks 
@@ -333,6 +222,7 @@ async def search_stocks(
         
     except Exception as e:
         logger.error(f"Search error for '{query}': {str(e)}")
+        mock_fallbacks.inc("search")
         # Return filtered mock data as fallback
         return [
             {"symbol": stock["symbol"], "name": stock["name"], "price": stock["price"], "change": stock["change"]}
@@ -395,6 +285,7 @@ async def get_stock(
         # Fall back to mock data if API fails
         for stock in mock_stocks:
             if stock["symbol"] == symbol.upper():
+                mock_fallbacks.inc("stock")
                 return {
                     **stock,
                     "volume": 78945612,
@@ -442,28 +333,9 @@ async def get_stock_history(
     
     cache_key = f"history:{symbol}:{days}"
     
-    def fetch_history():
-        ticker = yf.Ticker(symbol)
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=days)
-        
-        # Get historical data
-        history = ticker.history(start=start_date, end=end_date)
-        
-        # Format the response
-        result = []
-        for index, row in history.iterrows():
-            result.append({
-                "date": index.strftime("%Y-%m-%d"),
-                "price": round(float(row["Close"]), 2),
-                "volume": int(row["Volume"])
-            })
-        
-        return result
-    
     try:
         # Use cache to avoid hitting API limits
-        history_data = get_cached_or_fetch(cache_key, fetch_history)
+        history_data = get_cached_or_fetch(cache_key, lambda: fetch_history_data(symbol, days))
         
         if not history_data:
             raise ValueError("No historical data available")
@@ -472,6 +344,7 @@ async def get_stock_history(
         
     except Exception as e:
         logger.warning(f"Failed to get real history for {symbol}, using mock: {str(e)}")
+        mock_fallbacks.inc("history")
         
         # Generate mock historical data as fallback
         # Find current price from real data or mock data
@@ -550,35 +423,16 @@ async def get_company_info(
     symbol = symbol.upper()
     cache_key = f"company:{symbol}"
     
-    def fetch_company_info():
-        ticker = yf.Ticker(symbol)
-        info = ticker.info
-        
-        if not info or "shortName" not in info:
-            raise ValueError(f"No company info available for {symbol}")
-        
-        return {
-            "symbol": symbol,
-            "name": info.get("shortName", "Unknown"),
-            "description": info.get("longBusinessSummary", "No description available"),
-            "sector": info.get("sector", "Unknown"),
-            "industry": info.get("industry", "Unknown"),
-            "employees": info.get("fullTimeEmployees", 0),
-            "headquarters": f"{info.get('city', 'Unknown')}, {info.get('state', '')}",
-            "founded": info.get("startDate", "Unknown"),
-            "ceo": info.get("companyOfficers", [{}])[0].get("name", "Unknown") if info.get("companyOfficers") else "Unknown",
-            "website": info.get("website", "")
-        }
-    
     try:
         # Use cache to avoid hitting API limits
-        company_data = get_cached_or_fetch(cache_key, fetch_company_info)
+        company_data = get_cached_or_fetch(cache_key, lambda: fetch_company_data(symbol))
         return company_data
     except Exception as e:
         logger.warning(f"Failed to get real company info for {symbol}, using fallback: {str(e)}")
         
         # Try to use mock data as fallback
         if symbol in company_info:
+            mock_fallbacks.inc("company_info")
             return company_info[symbol]
         
         # If not in mock data, try to generate from stock information
@@ -588,6 +442,7 @@ async def get_company_info(
                 lambda: fetch_stock_data(symbol)
             )
             
+            mock_fallbacks.inc("company_info")
             return {
                 "symbol": symbol,
                 "name": stock_data.get("name", "Unknown"),
@@ -663,6 +518,7 @@ async def get_stock_recommendation(
         # Fall back to mock data
         for stock in mock_stocks:
             if stock["symbol"] == symbol:
+                mock_fallbacks.inc("recommendation")
                 sentiment = random.choice(["Buy", "Hold", "Sell"])
                 confidence = random.uniform(0.6, 0.95)
                 
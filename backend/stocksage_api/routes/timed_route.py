@@ -0,0 +1,45 @@
+"""Route class giving every endpoint a tracing span and profiled requests their phases.
+
+Every router is created with `route_class=TimedRoute`. The route wraps its
+endpoint, which then runs in a `handler {name}` span (services/tracing.py) and
+marks where it starts and ends, and its request handler, which splits a profiled
+request into validation, endpoint and serialization time (services/profiling.py).
+"""
+import functools
+import inspect
+from typing import Any, Callable
+
+from fastapi.routing import APIRoute
+
+from ..services import profiling, tracing
+
+
+def _timed_endpoint(endpoint: Callable[..., Any]) -> Callable[..., Any]:
+    # Streaming endpoints return before their body is produced, so they are left as they are
+    if inspect.isasyncgenfunction(endpoint) or inspect.isgeneratorfunction(endpoint):
+        return endpoint
+    name = f"handler {getattr(endpoint, '__name__', 'endpoint')}"
+
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def timed(*args, **kwargs):
+            with tracing.span(name, "handler"), profiling.endpoint_phase():
+                return await endpoint(*args, **kwargs)
+    else:
+        # FastAPI runs it in a worker thread, with the request's context variables
+        @functools.wraps(endpoint)
+        def timed(*args, **kwargs):
+            with tracing.span(name, "handler"), profiling.endpoint_phase():
+                return endpoint(*args, **kwargs)
+    return timed
+
+
+class TimedRoute(APIRoute):
+    """APIRoute whose endpoint and request handler are timed for tracing and profiling"""
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs: Any):
+        # functools.wraps keeps the signature FastAPI reads parameters and the response model from
+        super().__init__(path, _timed_endpoint(endpoint), **kwargs)
+
+    def get_route_handler(self):
+        return profiling.time_phases(super().get_route_handler())
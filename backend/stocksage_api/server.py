@@ -0,0 +1,159 @@
+"""Multi-worker production server.
+
+    python -m stocksage_api.server --workers 4
+
+The parent process imports the app and loads its read-only data (education
+index, market data cache snapshot, yfinance, pandas and numpy) once, freezes
+those objects out of the garbage collector, binds the listening socket and
+then forks the workers. The
+workers share those pages copy-on-write instead of each building its own copy,
+and accept connections from the shared socket. Market data fetched by any
+worker is shared with the others through the SQLite tier in
+services/shared_cache.py. The parent restarts workers that die and passes
+SIGINT/SIGTERM on to them.
+
+Platforms without fork (Windows) fall back to uvicorn's own worker processes,
+which start from scratch but still share the market data cache.
+"""
+import argparse
+import gc
+import importlib
+import logging
+import os
+import signal
+import sys
+import time
+from typing import Dict, Optional, Tuple
+
+import uvicorn
+
+from .services import shared_cache as shared_cache_tier
+
+logger = logging.getLogger(__name__)
+
+API_WORKERS = int(os.getenv("API_WORKERS", os.getenv("WEB_CONCURRENCY", 1)))
+API_HOST = os.getenv("API_HOST", "0.0.0.0")
+API_PORT = int(os.getenv("API_PORT", 8000))
+# A worker that dies sooner than this after starting is not restarted in a tight loop
+WORKER_RESTART_DELAY = 1.0
+
+
+def enable_shared_cache(port: int) -> None:
+    try:
+        path = os.getenv("MARKET_CACHE_PATH") or shared_cache_tier.default_path(port)
+    except OSError as e:
+        logger.error(f"No private data directory for the shared market data cache, caching per process: {str(e)}")
+        return
+    # Workers started by uvicorn (no fork) read the path from the environment
+    os.environ["MARKET_CACHE_PATH"] = path
+    if shared_cache_tier.shared_cache is None:
+        shared_cache_tier.enable(path)
+
+
+def preload() -> None:
+    """Load the data every worker reads but never changes, before forking"""
+    from .services.cache_snapshot import cache_snapshots
+    from .services.education import education_content
+    started = time.perf_counter()
+    education_content.index
+    # Restored market data is then shared by the workers too
+    cache_snapshots.restore()
+    try:
+        importlib.import_module("yfinance")
+    except Exception as e:
+        logger.warning(f"Could not preload yfinance: {str(e)}")
+    # Objects that exist now are never collected, so the collector does not touch
+    # (and copy) the shared pages in every worker
+    gc.collect()
+    gc.freeze()
+    logger.info(f"Preloaded shared data in {(time.perf_counter() - started) * 1000:.0f} ms "
+                f"({gc.get_freeze_count()} objects frozen)")
+
+
+def _serve_worker(app, config_kwargs: Dict, sock) -> None:
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, signal.SIG_DFL)
+    server = uvicorn.Server(uvicorn.Config(app, **config_kwargs))
+    server.run(sockets=[sock])
+
+
+def run(app=None, host: str = API_HOST, port: int = API_PORT, workers: int = API_WORKERS) -> None:
+    """Serve the API from `workers` processes sharing one socket and one market data cache"""
+    enable_shared_cache(port)
+    # Tells the workers that portfolios cannot be cached per process (services/portfolio_service.py)
+    os.environ["API_WORKERS"] = str(workers)
+    # log_config=None keeps the queue-based logging set up by the app
+    config_kwargs = {"host": host, "port": port, "log_config": None, "lifespan": "on"}
+
+    if not hasattr(os, "fork"):
+        uvicorn.run("stocksage_api.main:app", workers=workers, **config_kwargs)
+        return
+
+    if app is None:
+        from .main import app
+    preload()
+    sock = uvicorn.Config(app, **config_kwargs).bind_socket()
+    # pid -> (start time, worker id); a replacement takes over the id of the worker it replaces
+    children: Dict[int, Tuple[float, int]] = {}
+    stopping: Optional[int] = None
+
+    def start_worker(worker_id: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            # Worker 0 writes the market data cache snapshot (services/cache_snapshot.py)
+            os.environ["API_WORKER_ID"] = str(worker_id)
+            code = 0
+            try:
+                _serve_worker(app, config_kwargs, sock)
+            except BaseException:
+                logger.exception("Worker crashed")
+                code = 1
+            finally:
+                logging.shutdown()
+                os._exit(code)
+        children[pid] = (time.monotonic(), worker_id)
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = signum
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    for worker_id in range(workers):
+        start_worker(worker_id)
+    logger.info(f"Serving on http://{host}:{port} with {workers} workers (parent pid {os.getpid()})")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        child = children.pop(pid, None)
+        if child is None or stopping is not None:
+            continue
+        started, worker_id = child
+        logger.warning(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}, starting a replacement")
+        if time.monotonic() - started < WORKER_RESTART_DELAY:
+            time.sleep(WORKER_RESTART_DELAY)
+        start_worker(worker_id)
+    sock.close()
+    logger.info("All workers stopped")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run the StockSage API with several worker processes")
+    parser.add_argument("--workers", type=int, default=max(API_WORKERS, 2), help="Worker processes")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run(host=args.host, port=args.port, workers=args.workers)
+    sys.exit(0)
@@ -0,0 +1,399 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+if TYPE_CHECKING:
+    import httpx
+
+from . import tracing
+from .metrics import track_upstream
+from .profile_cache import ProfileCache
+from .stream_hub import StreamHub
+from .write_batch import WriteBatch, WriteBehindBuffer
+from .firebase_service import (
+    firebase_service, page_from_entries, FirebaseService, LazyFirebaseService, PathType, DataType, UserIdType, TokenType, UserRecord
+)
+
+logger = logging.getLogger(__name__)
+
+# Connection pool and executor sizing
+RTDB_MAX_CONNECTIONS = int(os.getenv("RTDB_MAX_CONNECTIONS", 100))
+RTDB_MAX_KEEPALIVE = int(os.getenv("RTDB_MAX_KEEPALIVE", 20))
+RTDB_TIMEOUT = float(os.getenv("RTDB_TIMEOUT", 10))
+FIREBASE_ADMIN_WORKERS = int(os.getenv("FIREBASE_ADMIN_WORKERS", 16))
+
+# Refresh the OAuth2 access token this many seconds before it expires
+TOKEN_REFRESH_MARGIN = 300
+
+
+class AsyncFirebaseService:
+    """Non-blocking variant of FirebaseService for use inside async route handlers.
+
+    Realtime Database reads and writes go straight to the RTDB REST API through a
+    pooled httpx.AsyncClient. Admin SDK and Pyrebase auth calls, which only have
+    blocking implementations, run on a bounded thread pool so a slow call never
+    blocks the event loop. Every call first awaits `ready()`, so the SDKs are never
+    initialized on the event loop.
+    """
+
+    def __init__(self, firebase: FirebaseService | LazyFirebaseService):
+        self.firebase = firebase
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._client: Optional["httpx.AsyncClient"] = None
+        self._transport = None
+        self._access_token: Optional[str] = None
+        self._token_expiry = 0.0
+        self._token_lock: Optional[asyncio.Lock] = None
+        self._ready: Optional[asyncio.Future] = None
+        self.round_trips = 0
+        self.batched_writes = 0
+        self.batch_commits = 0
+        self.profile_cache = ProfileCache()
+        # Profile updates from concurrent requests are merged when WRITE_BEHIND_WINDOW_MS is set
+        self.write_behind = WriteBehindBuffer(self.multi_path_update)
+        self.stream_hub = StreamHub(firebase)
+        self._profile_stream = None
+
+    # Plumbing
+    async def ready(self) -> FirebaseService:
+        """The initialized FirebaseService.
+
+        The first caller creates it on a worker thread and every other caller awaits the
+        same future. A failed initialization is retried by the next call.
+        """
+        firebase = self.firebase
+        if not isinstance(firebase, LazyFirebaseService):
+            return firebase
+        if firebase.initialized:
+            return firebase.get()
+        loop = asyncio.get_running_loop()
+        if self._ready is None or self._ready.get_loop() is not loop or (
+                self._ready.done() and self._ready.exception() is not None):
+            self._ready = loop.create_task(asyncio.to_thread(firebase.get))
+        return await asyncio.shield(self._ready)
+
+    @staticmethod
+    def _database_url(firebase: FirebaseService) -> str:
+        return (firebase.database_url or f"https://{firebase.project_id}.firebaseio.com").rstrip("/")
+
+    def _get_client(self, firebase: FirebaseService) -> "httpx.AsyncClient":
+        if self._client is None:
+            import httpx
+            from .connection_pool import CountingTransport
+            if firebase.memory_db:
+                transport = firebase.memory_db.transport()
+            else:
+                transport = httpx.AsyncHTTPTransport(limits=httpx.Limits(
+                    max_connections=RTDB_MAX_CONNECTIONS,
+                    max_keepalive_connections=RTDB_MAX_KEEPALIVE
+                ))
+            self._transport = CountingTransport(transport, RTDB_MAX_CONNECTIONS)
+            self._client = httpx.AsyncClient(
+                base_url=self._database_url(firebase),
+                transport=self._transport,
+                timeout=RTDB_TIMEOUT,
+            )
+        return self._client
+
+    async def _run_blocking(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run a blocking SDK call on the bounded executor"""
+        loop = asyncio.get_running_loop()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=FIREBASE_ADMIN_WORKERS, thread_name_prefix="firebase")
+        with track_upstream("firebase", getattr(func, "__name__", "call")):
+            return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    async def _call(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        """Run a FirebaseService method on the executor once the service is ready"""
+        firebase = await self.ready()
+        return await self._run_blocking(getattr(firebase, method), *args, **kwargs)
+
+    async def _get_access_token(self, firebase: FirebaseService) -> str:
+        """OAuth2 token for RTDB REST requests, refreshed off the event loop when near expiry"""
+        if self._access_token and time.time() < self._token_expiry:
+            return self._access_token
+        if self._token_lock is None:
+            self._token_lock = asyncio.Lock()
+        async with self._token_lock:
+            if not self._access_token or time.time() >= self._token_expiry:
+                credential = firebase.admin_app.credential
+                token_info = await self._run_blocking(credential.get_access_token)
+                expiry = token_info.expiry.timestamp() if token_info.expiry else time.time() + 3600
+                self._access_token = token_info.access_token
+                self._token_expiry = expiry - TOKEN_REFRESH_MARGIN
+        return self._access_token
+
+    async def _request(
+        self,
+        method: str,
+        path: PathType,
+        data: Any = None,
+        params: Optional[Dict[str, Any]] = None
+    ) -> Any:
+        firebase = await self.ready()
+        token = await self._get_access_token(firebase)
+        self.round_trips += 1
+        with track_upstream("firebase", f"rest_{method.lower()}"):
+            response = await self._get_client(firebase).request(
+                method,
+                f"/{path.strip('/')}.json",
+                content=json.dumps(data).encode("utf-8") if data is not None else None,
+                params=params,
+                headers={"Authorization": f"Bearer {token}", "content-type": "application/json; charset=UTF-8"},
+            )
+            response.raise_for_status()
+        return response.json() if response.content else None
+
+    def pool_stats(self) -> Dict[str, int]:
+        """Counters of the async client's connection pool, and requests sent"""
+        stats = self._transport.snapshot() if self._transport is not None else {"max_size": RTDB_MAX_CONNECTIONS}
+        return {**stats, "round_trips": self.round_trips}
+
+    def write_stats(self) -> Dict[str, Any]:
+        """Writes merged into multi-path updates by batches and the write-behind buffer"""
+        return {
+            "batch": {
+                "writes": self.batched_writes,
+                "commits": self.batch_commits,
+                "round_trips_saved": self.batched_writes - self.batch_commits,
+            },
+            "write_behind": self.write_behind.stats(),
+        }
+
+    async def aclose(self) -> None:
+        """Close pooled connections and the executor (called on application shutdown)"""
+        await self.write_behind.close()
+        self.stream_hub.close()
+        self._profile_stream = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    # Real-time database operations over REST
+    async def get_data(self, path: PathType) -> Optional[Dict[str, Any]]:
+        """Retrieve data from specified path"""
+        try:
+            return await self._request("GET", path)
+        except Exception as e:
+            logger.error(f"Network error while getting data from {path}: {str(e)}")
+            return None
+
+    async def query_data(
+        self,
+        path: PathType,
+        order_by: str = "$key",
+        start_at: Any = None,
+        end_at: Any = None,
+        limit_to_first: Optional[int] = None,
+        limit_to_last: Optional[int] = None,
+        equal_to: Any = None
+    ) -> Optional[Dict[str, Any]]:
+        """Retrieve an ordered range of children at path (results keep their order)"""
+        if equal_to is not None:
+            start_at = end_at = equal_to
+        params = {"orderBy": json.dumps(order_by)}
+        for name, value in (("startAt", start_at), ("endAt", end_at),
+                            ("limitToFirst", limit_to_first), ("limitToLast", limit_to_last)):
+            if value is not None:
+                params[name] = json.dumps(value)
+        try:
+            result = await self._request("GET", path, params=params)
+        except Exception as e:
+            logger.error(f"Network error while querying {path}: {str(e)}")
+            return None
+        if not result:
+            return None
+        # The REST API does not preserve order, so sort like Pyrebase does
+        if order_by == "$key":
+            items = sorted(result.items(), key=lambda item: item[0])
+        elif order_by == "$value":
+            items = sorted(result.items(), key=lambda item: item[1])
+        else:
+            items = sorted(result.items(), key=lambda item: (order_by in item[1], item[1].get(order_by, "")))
+        return dict(items)
+
+    async def get_keys(self, path: PathType) -> List[str]:
+        """Child keys at path without downloading their values (a shallow read)"""
+        try:
+            result = await self._request("GET", path, params={"shallow": "true"})
+        except Exception as e:
+            logger.error(f"Network error while listing keys at {path}: {str(e)}")
+            return []
+        return sorted(result) if isinstance(result, dict) else []
+
+    async def query_page(self, path: PathType, limit: int = 50, after: Optional[str] = None) -> Dict[str, Any]:
+        """One page of children in key order, starting after the `after` key"""
+        fetch = limit + 1 + (after is not None)
+        entries = await self.query_data(path, start_at=after, limit_to_first=fetch) or {}
+        return page_from_entries(entries, limit, after)
+
+    async def set_data(self, path: PathType, data: DataType) -> Any:
+        """Set data at specified path"""
+        return await self._request("PUT", path, data)
+
+    async def push_data(self, path: PathType, data: DataType) -> Any:
+        """Push data to specified path (generates unique key)"""
+        return await self._request("POST", path, data)
+
+    async def update_data(self, path: PathType, data: DataType) -> Any:
+        """Update data at specified path"""
+        return await self._request("PATCH", path, data)
+
+    async def delete_data(self, path: PathType) -> Any:
+        """Delete data at specified path"""
+        return await self._request("DELETE", path)
+
+    async def multi_path_update(self, updates: Dict[PathType, Any]) -> Any:
+        """Atomically write several paths in one request (a None value deletes the path)"""
+        return await self._request("PATCH", "", updates)
+
+    def batch(self) -> WriteBatch:
+        """Start a batch of writes to be applied atomically with commit_batch"""
+        # Keys are generated when pushing, by when earlier calls have initialized the service
+        return WriteBatch(generate_key=lambda: self.firebase.generate_key())
+
+    async def commit_batch(self, batch: WriteBatch) -> Any:
+        """Apply every write in the batch in one multi-path update"""
+        if not batch.updates:
+            return None
+        result = await self.multi_path_update(batch.updates)
+        self.batched_writes += len(batch)
+        self.batch_commits += 1
+        return result
+
+    # Admin SDK database operations
+    async def admin_get_data(self, path: PathType) -> Optional[Dict[str, Any]]:
+        return await self._call("admin_get_data", path)
+
+    async def admin_set_data(self, path: PathType, data: DataType) -> None:
+        return await self._call("admin_set_data", path, data)
+
+    async def admin_update_data(self, path: PathType, data: DataType) -> None:
+        return await self._call("admin_update_data", path, data)
+
+    async def admin_delete_data(self, path: PathType) -> None:
+        return await self._call("admin_delete_data", path)
+
+    # User Authentication Methods
+    async def create_user(self, email: str, password: str) -> UserRecord:
+        return await self._call("create_user", email, password)
+
+    async def get_user(self, user_id: UserIdType) -> UserRecord:
+        return await self._call("get_user", user_id)
+
+    async def get_user_by_email(self, email: str) -> UserRecord:
+        return await self._call("get_user_by_email", email)
+
+    async def update_user(self, user_id: UserIdType, **kwargs) -> UserRecord:
+        return await self._call("update_user", user_id, **kwargs)
+
+    async def disable_user(self, user_id: UserIdType) -> UserRecord:
+        return await self._call("disable_user", user_id)
+
+    async def enable_user(self, user_id: UserIdType) -> UserRecord:
+        return await self._call("enable_user", user_id)
+
+    async def delete_user(self, user_id: UserIdType) -> None:
+        return await self._call("delete_user", user_id)
+
+    async def set_custom_user_claims(self, user_id: UserIdType, custom_claims: Dict[str, Any]) -> None:
+        return await self._call("set_custom_user_claims", user_id, custom_claims)
+
+    async def get_users(self, uids: List[UserIdType] = (), emails: List[str] = ()) -> Any:
+        return await self._call("get_users", list(uids), list(emails))
+
+    async def import_users(self, users: List[Any], hash_alg: Any = None) -> Any:
+        return await self._call("import_users", users, hash_alg)
+
+    async def delete_users(self, user_ids: List[UserIdType]) -> Any:
+        return await self._call("delete_users", user_ids)
+
+    async def revoke_refresh_tokens(self, user_id: UserIdType) -> None:
+        return await self._call("revoke_refresh_tokens", user_id)
+
+    async def verify_id_token(self, id_token: TokenType, check_revoked: bool = False) -> Dict[str, Any]:
+        """Verify an ID token, answering cache hits without leaving the event loop"""
+        with tracing.span("auth verify_id_token", "auth", check_revoked=check_revoked) as span:
+            firebase = await self.ready()
+            if not check_revoked:
+                cached = firebase.token_cache.get(id_token)
+                span.set("cached", cached is not None)
+                if cached is not None:
+                    return cached
+            return await self._run_blocking(firebase.verify_id_token, id_token, check_revoked)
+
+    async def sign_in_with_email_password(self, email: str, password: str) -> Dict[str, Any]:
+        return await self._call("sign_in_with_email_password", email, password)
+
+    async def get_account_info(self, id_token: TokenType) -> Dict[str, Any]:
+        return await self._call("get_account_info", id_token)
+
+    async def refresh_token(self, refresh_token: str) -> Dict[str, Any]:
+        return await self._call("refresh_token", refresh_token)
+
+    # User Profile Methods
+    async def start_profile_stream(self) -> None:
+        """Listen for changes under `users` so cached profiles follow writes made elsewhere"""
+        try:
+            self._profile_stream = await self._run_blocking(
+                self.stream_hub.listen, "users", self.profile_cache.handle_event
+            )
+            logger.info("Profile cache listening for user profile changes")
+        except Exception as e:
+            # Without the stream, cached profiles still expire after the TTL
+            logger.warning(f"Failed to start profile change stream: {str(e)}")
+
+    async def get_user_profile(self, user_id: UserIdType) -> Optional[Dict[str, Any]]:
+        """Get a user profile, from the cache when possible"""
+        cached = self.profile_cache.get(user_id)
+        if cached is not None:
+            return cached
+        version = self.profile_cache.version
+        profile = await self.get_data(f"users/{user_id}")
+        if profile is not None:
+            self.profile_cache.fill(user_id, profile, version)
+        return profile
+
+    async def update_user_profile(self, user_id: UserIdType, data: DataType) -> Any:
+        """Update a user profile in the database and the cache"""
+        if self.write_behind.enabled:
+            await self.write_behind.update(f"users/{user_id}", data)
+            result = data
+        else:
+            result = await self.update_data(f"users/{user_id}", data)
+        self.profile_cache.merge(user_id, data)
+        return result
+
+    async def create_user_profile(self, user_id: UserIdType, data: DataType) -> Any:
+        """Create a new user profile in the database and the cache"""
+        result = await self.set_data(f"users/{user_id}", data)
+        self.profile_cache.put(user_id, data)
+        return result
+
+    async def delete_user_profile(self, user_id: UserIdType) -> Any:
+        """Delete a user profile from the database and the cache"""
+        result = await self.delete_data(f"users/{user_id}")
+        self.profile_cache.invalidate(user_id)
+        return result
+
+    async def delete_user_complete(self, user_id: UserIdType) -> None:
+        """Delete both the Firebase Auth user and user profile"""
+        try:
+            await self.delete_user_profile(user_id)
+            await self.delete_user(user_id)
+            logger.info(f"User {user_id} completely deleted")
+        except Exception as e:
+            logger.error(f"Error deleting user {user_id}: {str(e)}")
+            raise e
+
+
+# Create a singleton instance
+async_firebase_service = AsyncFirebaseService(firebase_service)
@@ -0,0 +1,244 @@
+"""Vectorized strategy backtesting engine.
+
+Every strategy is expressed as a (dates x symbols) matrix of target weights.
+The simulator holds shares between rebalance points and only trades when the
+target weights change, so the whole run is a handful of NumPy array operations
+across all symbols at once rather than a per-day Python loop.
+
+This module only depends on NumPy so it can run inside the compute process pool.
+"""
+from typing import Any, Dict, List
+
+import numpy as np
+
+STRATEGIES = ("buy_and_hold", "sma_crossover", "rsi", "rebalance")
+TRADING_DAYS_PER_YEAR = 252
+
+
+# Indicators
+def moving_average(closes: np.ndarray, window: int) -> np.ndarray:
+    """Simple moving average down each column (NaN until the window is full)"""
+    result = np.full(closes.shape, np.nan)
+    if window > closes.shape[0]:
+        return result
+    cumulative = np.cumsum(np.vstack([np.zeros((1, closes.shape[1])), closes]), axis=0)
+    result[window - 1:] = (cumulative[window:] - cumulative[:-window]) / window
+    return result
+
+
+def relative_strength_index(closes: np.ndarray, period: int) -> np.ndarray:
+    """RSI using simple averages of gains and losses over the period"""
+    changes = np.diff(closes, axis=0)
+    gains = moving_average(np.clip(changes, 0, None), period)
+    losses = moving_average(np.clip(-changes, 0, None), period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = 100 - 100 / (1 + gains / losses)
+    rsi = np.where(losses == 0, np.where(gains > 0, 100.0, 50.0), rsi)
+    rsi[np.isnan(gains)] = np.nan
+    # Changes start on the second bar, so the first bar has no RSI
+    return np.vstack([np.full((1, closes.shape[1]), np.nan), rsi])
+
+
+# Strategies -> target weights
+def _equal_weight(held: np.ndarray) -> np.ndarray:
+    """Spread capital equally across the symbols held on each day"""
+    held = held.astype(np.float64)
+    count = held.sum(axis=1, keepdims=True)
+    return np.divide(held, count, out=np.zeros_like(held), where=count > 0)
+
+
+def _fixed_weights(params: Dict[str, Any], n_symbols: int) -> np.ndarray:
+    weights = params.get("weights")
+    if not weights:
+        return np.full(n_symbols, 1.0 / n_symbols)
+    weights = np.asarray(weights, dtype=np.float64)
+    if weights.shape != (n_symbols,) or (weights < 0).any() or weights.sum() <= 0:
+        raise ValueError("weights must be one non-negative value per symbol")
+    return weights / weights.sum()
+
+
+def sma_crossover_weights(closes: np.ndarray, short_window: int, long_window: int) -> np.ndarray:
+    """Hold a symbol while its short moving average is above its long moving average"""
+    if short_window >= long_window:
+        raise ValueError("short_window must be smaller than long_window")
+    short_ma = moving_average(closes, short_window)
+    long_ma = moving_average(closes, long_window)
+    return _equal_weight(short_ma > long_ma)
+
+
+def rsi_weights(closes: np.ndarray, period: int, lower: float, upper: float) -> np.ndarray:
+    """Enter when RSI drops below `lower`, exit when it rises above `upper`"""
+    if not 0 < lower < upper < 100:
+        raise ValueError("RSI thresholds must satisfy 0 < lower < upper < 100")
+    rsi = relative_strength_index(closes, period)
+    # +1 on entry signals, -1 on exit signals, 0 otherwise; carry the last signal forward
+    events = np.where(rsi < lower, 1, np.where(rsi > upper, -1, 0))
+    rows = np.arange(closes.shape[0])[:, None]
+    last_event = np.where(events != 0, rows, 0)
+    np.maximum.accumulate(last_event, axis=0, out=last_event)
+    state = np.take_along_axis(events, last_event, axis=0)
+    return _equal_weight(state == 1)
+
+
+def target_weights(closes: np.ndarray, strategy: str, params: Dict[str, Any]) -> np.ndarray:
+    """Build the (dates x symbols) target weight matrix decided at each close"""
+    n_dates, n_symbols = closes.shape
+    if strategy == "sma_crossover":
+        return sma_crossover_weights(
+            closes, params.get("short_window", 20), params.get("long_window", 50)
+        )
+    if strategy == "rsi":
+        return rsi_weights(
+            closes, params.get("rsi_period", 14), params.get("rsi_lower", 30), params.get("rsi_upper", 70)
+        )
+    if strategy in ("buy_and_hold", "rebalance"):
+        return np.tile(_fixed_weights(params, n_symbols), (n_dates, 1))
+    raise ValueError(f"Unknown strategy '{strategy}'. Choose one of: {', '.join(STRATEGIES)}")
+
+
+def rebalance_mask(weights: np.ndarray, strategy: str, params: Dict[str, Any]) -> np.ndarray:
+    """Days on which the portfolio is traded back to its target weights"""
+    n_dates = weights.shape[0]
+    if strategy == "buy_and_hold":
+        mask = np.zeros(n_dates, dtype=bool)
+    elif strategy == "rebalance":
+        period = params.get("rebalance_days", 21)
+        if period < 1:
+            raise ValueError("rebalance_days must be at least 1")
+        mask = np.arange(n_dates) % period == 0
+    else:
+        mask = np.zeros(n_dates, dtype=bool)
+        mask[1:] = (weights[1:] != weights[:-1]).any(axis=1)
+    mask[0] = True
+    return mask
+
+
+# Simulation
+def simulate(
+    closes: np.ndarray,
+    weights: np.ndarray,
+    mask: np.ndarray,
+    initial_capital: float,
+    commission: float = 0.0
+) -> Dict[str, np.ndarray]:
+    """Simulate a share-holding portfolio that rebalances to `weights` on `mask` days.
+
+    Returns the equity curve plus the rebalance indices and the shares held
+    after each rebalance.
+    """
+    rebalance_idx = np.flatnonzero(mask)
+    segment_of_day = np.cumsum(mask) - 1
+    segment_weights = weights[rebalance_idx]                        # (k, m)
+    segment_cash = 1.0 - segment_weights.sum(axis=1)                # (k,)
+    anchor_prices = closes[rebalance_idx]                           # (k, m)
+
+    # Growth of each segment's starting equity on every day of that segment
+    relative = closes / anchor_prices[segment_of_day]
+    growth = segment_cash[segment_of_day] + np.einsum(
+        "ij,ij->i", relative, segment_weights[segment_of_day]
+    )
+
+    # Growth of segment k-1 up to the start of segment k, and the drifted weights at that point
+    boundary_relative = closes[rebalance_idx[1:]] / anchor_prices[:-1]
+    boundary_growth = segment_cash[:-1] + np.einsum(
+        "ij,ij->i", boundary_relative, segment_weights[:-1]
+    )
+    drifted = segment_weights[:-1] * boundary_relative / boundary_growth[:, None]
+    previous_weights = np.vstack([np.zeros((1, weights.shape[1])), drifted])
+    turnover = np.abs(segment_weights - previous_weights).sum(axis=1)
+
+    # Equity at the start of every segment, after paying commission on the turnover
+    carried = np.concatenate([[1.0], boundary_growth])
+    segment_equity = initial_capital * np.cumprod(carried * (1.0 - commission * turnover))
+    equity = segment_equity[segment_of_day] * growth
+
+    shares = segment_equity[:, None] * segment_weights / anchor_prices
+    return {"equity": equity, "rebalance_idx": rebalance_idx, "shares": shares}
+
+
+def compute_metrics(dates: np.ndarray, equity: np.ndarray) -> Dict[str, float]:
+    """Total return, CAGR, annualized volatility, Sharpe ratio and max drawdown"""
+    daily_returns = equity[1:] / equity[:-1] - 1.0
+    total_return = equity[-1] / equity[0] - 1.0
+    years = (dates[-1] - dates[0]).astype(np.int64) / 365.25
+    cagr = (equity[-1] / equity[0]) ** (1.0 / years) - 1.0 if years > 0 else 0.0
+
+    volatility = float(daily_returns.std(ddof=1)) if len(daily_returns) > 1 else 0.0
+    sharpe = (
+        float(daily_returns.mean()) / volatility * np.sqrt(TRADING_DAYS_PER_YEAR)
+        if volatility > 0 else 0.0
+    )
+    max_drawdown = float((equity / np.maximum.accumulate(equity) - 1.0).min())
+
+    return {
+        "total_return": round(float(total_return), 6),
+        "cagr": round(float(cagr), 6),
+        "volatility": round(volatility * np.sqrt(TRADING_DAYS_PER_YEAR), 6),
+        "sharpe_ratio": round(float(sharpe), 4),
+        "max_drawdown": round(max_drawdown, 6),
+    }
+
+
+def _trades(
+    dates: np.ndarray,
+    symbols: List[str],
+    closes: np.ndarray,
+    rebalance_idx: np.ndarray,
+    shares: np.ndarray
+) -> List[Dict[str, Any]]:
+    """Turn share changes at each rebalance into a trade list"""
+    previous = np.vstack([np.zeros((1, shares.shape[1])), shares[:-1]])
+    delta = shares - previous
+    segments, columns = np.nonzero(np.abs(delta) > 1e-9)
+    days = rebalance_idx[segments]
+    prices = closes[days, columns]
+    quantities = delta[segments, columns]
+    return [
+        {
+            "date": str(dates[day]),
+            "symbol": symbols[column],
+            "type": "buy" if quantity > 0 else "sell",
+            "quantity": round(float(abs(quantity)), 6),
+            "price": round(float(price), 4),
+        }
+        for day, column, quantity, price in zip(days, columns, quantities, prices)
+    ]
+
+
+def run_backtest(
+    dates: np.ndarray,
+    symbols: List[str],
+    closes: np.ndarray,
+    strategy: str,
+    params: Dict[str, Any],
+    initial_capital: float = 10000.0,
+    commission: float = 0.0
+) -> Dict[str, Any]:
+    """Backtest a strategy over aligned daily closes (dates x symbols)"""
+    if closes.shape[0] < 2:
+        raise ValueError("At least two trading days are required for a backtest")
+
+    signal_weights = target_weights(closes, strategy, params)
+    # Decisions made at one close are executed at the next close (no look-ahead)
+    weights = np.vstack([np.zeros((1, closes.shape[1])), signal_weights[:-1]])
+    if strategy in ("buy_and_hold", "rebalance"):
+        weights = signal_weights
+
+    mask = rebalance_mask(weights, strategy, params)
+    result = simulate(closes, weights, mask, initial_capital, commission)
+    equity = result["equity"]
+
+    return {
+        "strategy": strategy,
+        "symbols": symbols,
+        "start_date": str(dates[0]),
+        "end_date": str(dates[-1]),
+        "initial_capital": initial_capital,
+        "final_value": round(float(equity[-1]), 2),
+        "metrics": compute_metrics(dates, equity),
+        "equity_curve": [
+            {"date": str(day), "value": round(float(value), 2)}
+            for day, value in zip(dates, equity)
+        ],
+        "trades": _trades(dates, symbols, closes, result["rebalance_idx"], result["shares"]),
+    }
@@ -0,0 +1,81 @@
+"""Serialization of market data cache values for the files other processes read.
+
+Cached values are JSON-like quotes, histories and company details, plus
+tuples of numpy arrays for close histories. They are written as JSON, with
+arrays saved by np.save(allow_pickle=False) after it, so reading a cache file
+can never run code the way unpickling one can. Anything else is rejected with
+TypeError when it is written.
+
+Layout: header length, array count, the JSON header, then each array as its
+length followed by the .npy bytes.
+"""
+import io
+import json
+import struct
+from typing import Any, List
+
+import numpy as np
+
+PREFIX = struct.Struct("<II")
+ARRAY_LENGTH = struct.Struct("<Q")
+ARRAY_TAG = "__ndarray__"
+TUPLE_TAG = "__tuple__"
+
+
+def _encode(value: Any, arrays: List[np.ndarray]) -> Any:
+    if value is None or isinstance(value, (str, bool, int, float)):
+        return value
+    if isinstance(value, np.ndarray):
+        arrays.append(value)
+        return {ARRAY_TAG: len(arrays) - 1}
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, tuple):
+        return {TUPLE_TAG: [_encode(item, arrays) for item in value]}
+    if isinstance(value, list):
+        return [_encode(item, arrays) for item in value]
+    if isinstance(value, dict):
+        if not all(isinstance(key, str) for key in value) or ARRAY_TAG in value or TUPLE_TAG in value:
+            raise TypeError("cache dicts need string keys")
+        return {key: _encode(item, arrays) for key, item in value.items()}
+    raise TypeError(f"cannot cache {type(value).__name__} values")
+
+
+def _decode(value: Any, arrays: List[np.ndarray]) -> Any:
+    if isinstance(value, list):
+        return [_decode(item, arrays) for item in value]
+    if isinstance(value, dict):
+        if ARRAY_TAG in value:
+            return arrays[value[ARRAY_TAG]]
+        if TUPLE_TAG in value:
+            return tuple(_decode(item, arrays) for item in value[TUPLE_TAG])
+        return {key: _decode(item, arrays) for key, item in value.items()}
+    return value
+
+
+def dumps(value: Any) -> bytes:
+    arrays: List[np.ndarray] = []
+    header = json.dumps(_encode(value, arrays), separators=(",", ":"), allow_nan=True).encode()
+    parts = [PREFIX.pack(len(header), len(arrays)), header]
+    for array in arrays:
+        buffer = io.BytesIO()
+        np.save(buffer, array, allow_pickle=False)
+        parts += [ARRAY_LENGTH.pack(buffer.tell()), buffer.getvalue()]
+    return b"".join(parts)
+
+
+def loads(data: bytes) -> Any:
+    """Inverse of dumps; raises ValueError for malformed data"""
+    try:
+        header_length, count = PREFIX.unpack_from(data)
+        offset = PREFIX.size + header_length
+        header = json.loads(data[PREFIX.size:offset])
+        arrays = []
+        for _ in range(count):
+            (length,) = ARRAY_LENGTH.unpack_from(data, offset)
+            offset += ARRAY_LENGTH.size
+            arrays.append(np.load(io.BytesIO(data[offset:offset + length]), allow_pickle=False))
+            offset += length
+        return _decode(header, arrays)
+    except (struct.error, IndexError, KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"malformed cache value: {str(e)}")
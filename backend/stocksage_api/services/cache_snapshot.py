@@ -0,0 +1,239 @@
+"""Market data cache snapshots that survive restarts and deploys.
+
+Without them every restart starts with an empty cache: the first request for
+each quote, history and company profile waits on yfinance, and a deploy shows
+up as a burst of misses and upstream calls.
+
+- Every MARKET_CACHE_SNAPSHOT_INTERVAL seconds and at shutdown, the entries of
+  the market data cache (and of the shared tier in multi-worker mode) are
+  written to MARKET_CACHE_SNAPSHOT_PATH
+- At startup the snapshot is loaded back with each entry's original fetch and
+  expiry time, so entries that are still fresh are served as hits and none
+  lives longer than it would have without the restart
+- Entries that expired while the server was down are kept as the fallback for
+  failed fetches and re-fetched in the background, most recently fetched first
+
+The file is a fixed header (magic, format version, save time, entry count)
+followed by the zlib-compressed (key, fetched_at, expires_at, value) entries,
+each encoded by services/cache_codec.py and prefixed with its length. Nothing
+in it is unpickled, it lives in the API's private data directory by default,
+and a file another user owns or can write to is not loaded. A file with
+another magic or version is ignored, so a format change only costs one cold
+start. Writes go to a temporary file that replaces the snapshot, so a crash
+never leaves a torn file behind.
+"""
+import asyncio
+import logging
+import os
+import struct
+import tempfile
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..config.paths import check_private, data_path
+from . import cache_codec, market_cache, shared_cache as shared_cache_tier
+from . import market_data  # noqa: F401 - registers the refreshers
+
+logger = logging.getLogger(__name__)
+
+# Snapshot file (unset: market-cache.snapshot in the data directory; "" disables snapshots)
+MARKET_CACHE_SNAPSHOT_PATH = os.getenv("MARKET_CACHE_SNAPSHOT_PATH")
+# Seconds between periodic snapshots
+MARKET_CACHE_SNAPSHOT_INTERVAL = float(os.getenv("MARKET_CACHE_SNAPSHOT_INTERVAL", 300))
+# Entries that expired longer ago than this are neither saved nor restored
+MARKET_CACHE_SNAPSHOT_MAX_AGE = float(os.getenv("MARKET_CACHE_SNAPSHOT_MAX_AGE", 24 * 3600))
+# Background refreshes of expired entries running at once, and keys per refresh
+MARKET_CACHE_REFRESH_CONCURRENCY = int(os.getenv("MARKET_CACHE_REFRESH_CONCURRENCY", 4))
+REFRESH_BATCH_SIZE = 10
+
+MAGIC = b"SSMC"
+FORMAT_VERSION = 2
+# magic, format version, saved_at, entry count
+HEADER = struct.Struct("<4sHdI")
+ENTRY_LENGTH = struct.Struct("<I")
+
+SnapshotEntry = Tuple[str, float, float, Any]
+
+
+def encode(entries: List[SnapshotEntry], saved_at: float) -> bytes:
+    """Snapshot bytes for the entries; values the codec cannot store are left out"""
+    parts = []
+    for entry in entries:
+        try:
+            data = cache_codec.dumps(entry)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Leaving {entry[0]} out of the market data cache snapshot: {str(e)}")
+            continue
+        parts += [ENTRY_LENGTH.pack(len(data)), data]
+    body = zlib.compress(b"".join(parts))
+    return HEADER.pack(MAGIC, FORMAT_VERSION, saved_at, len(parts) // 2) + body
+
+
+def decode(data: bytes) -> Tuple[float, List[SnapshotEntry]]:
+    """(saved_at, entries) from a snapshot; raises ValueError for another format"""
+    if len(data) < HEADER.size:
+        raise ValueError("truncated header")
+    magic, version, saved_at, count = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("not a market data cache snapshot")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"format version {version}, expected {FORMAT_VERSION}")
+    try:
+        body = zlib.decompress(data[HEADER.size:])
+        entries = []
+        offset = 0
+        while offset < len(body):
+            (length,) = ENTRY_LENGTH.unpack_from(body, offset)
+            offset += ENTRY_LENGTH.size
+            key, fetched_at, expires_at, value = cache_codec.loads(body[offset:offset + length])
+            entries.append((key, fetched_at, expires_at, value))
+            offset += length
+    except (zlib.error, struct.error, TypeError, ValueError) as e:
+        raise ValueError(f"corrupt body: {str(e)}")
+    if len(entries) != count:
+        raise ValueError(f"{len(entries)} entries, header says {count}")
+    return saved_at, entries
+
+
+def is_primary_worker() -> bool:
+    """Whether this process owns the snapshot (the only process, or worker 0 of stocksage_api.server)"""
+    return os.getenv("API_WORKER_ID", "0") == "0"
+
+
+class CacheSnapshots:
+    """Saves the market data cache to disk and restores it at startup"""
+
+    def __init__(self, path: Optional[str] = MARKET_CACHE_SNAPSHOT_PATH, interval: float = MARKET_CACHE_SNAPSHOT_INTERVAL,
+                 max_age: float = MARKET_CACHE_SNAPSHOT_MAX_AGE,
+                 refresh_concurrency: int = MARKET_CACHE_REFRESH_CONCURRENCY):
+        self.path = path
+        self.interval = interval
+        self.max_age = max_age
+        self.refresh_concurrency = refresh_concurrency
+        self.restored = False
+        # Restored keys that had expired, waiting for refresh_expired
+        self.expired: List[str] = []
+        self.saved_at: Optional[float] = None
+        self.saved_entries = 0
+        self.restored_entries = 0
+        self.refreshed_entries = 0
+
+    def _file(self) -> str:
+        """The snapshot path ("" when disabled), creating the data directory for the default one"""
+        if self.path is None:
+            self.path = data_path("market-cache.snapshot")
+        return self.path
+
+    def collect(self, now: float) -> List[SnapshotEntry]:
+        """The newest entry for each key in this process's cache and the shared tier"""
+        # dict.copy() is atomic, so this is safe while the event loop keeps caching
+        cache = market_cache.cache.copy()
+        expiry = market_cache.cache_expiry.copy()
+        newest: Dict[str, SnapshotEntry] = {}
+        for key, value in cache.items():
+            expires_at = expiry.get(key, 0)
+            newest[key] = (key, expires_at - market_cache.CACHE_DURATION, expires_at, value)
+        store = shared_cache_tier.shared_cache
+        if store is not None:
+            for key, value, fetched_at, expires_at in store.entries():
+                if key not in newest or newest[key][2] < expires_at:
+                    newest[key] = (key, fetched_at, expires_at, value)
+        cutoff = now - self.max_age
+        return [entry for entry in newest.values() if entry[2] >= cutoff]
+
+    def save(self) -> int:
+        """Write the snapshot atomically; returns the number of entries saved"""
+        try:
+            if not self._file():
+                return 0
+            now = time.time()
+            entries = self.collect(now)
+            data = encode(entries, now)
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+            # NamedTemporaryFile creates the file readable only by this user
+            with tempfile.NamedTemporaryFile("wb", dir=directory, delete=False, suffix=".tmp") as tmp:
+                tmp.write(data)
+            os.replace(tmp.name, self.path)
+        except Exception as e:
+            logger.warning(f"Failed to save market data cache snapshot to {self.path}: {str(e)}")
+            return 0
+        self.saved_at = now
+        self.saved_entries = len(entries)
+        logger.info(f"Saved {len(entries)} market data cache entries ({len(data)} bytes) to {self.path}")
+        return len(entries)
+
+    def restore(self) -> int:
+        """Load the snapshot into the cache once per process; returns the number of entries restored"""
+        if self.restored:
+            return 0
+        self.restored = True
+        try:
+            if not self._file():
+                return 0
+            check_private(self.path)
+            with open(self.path, "rb") as f:
+                saved_at, entries = decode(f.read())
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring market data cache snapshot {self.path}: {str(e)}")
+            return 0
+
+        now = time.time()
+        cutoff = now - self.max_age
+        store = shared_cache_tier.shared_cache
+        expired = []
+        restored = 0
+        for key, fetched_at, expires_at, value in entries:
+            if expires_at < cutoff or market_cache.cache_expiry.get(key, 0) >= expires_at:
+                continue
+            market_cache.cache[key] = value
+            market_cache.cache_expiry[key] = expires_at
+            if store is not None:
+                store.put_if_newer(key, value, fetched_at, expires_at)
+            if expires_at <= now:
+                expired.append((fetched_at, key))
+            restored += 1
+        self.expired = [key for _, key in sorted(expired, reverse=True)]
+        self.restored_entries = restored
+        logger.info(f"Restored {restored} market data cache entries saved {now - saved_at:.0f}s ago "
+                    f"({restored - len(expired)} fresh, {len(expired)} to refresh)")
+        return restored
+
+    async def refresh_expired(self) -> int:
+        """Re-fetch the restored entries that had expired, a few batches at a time"""
+        keys, self.expired = self.expired, []
+        if not keys:
+            return 0
+        started = time.perf_counter()
+        semaphore = asyncio.Semaphore(max(1, self.refresh_concurrency))
+
+        async def refresh(batch: List[str]) -> int:
+            async with semaphore:
+                return await asyncio.to_thread(market_cache.refresh_cached, batch)
+
+        batches = [keys[i:i + REFRESH_BATCH_SIZE] for i in range(0, len(keys), REFRESH_BATCH_SIZE)]
+        refreshed = sum(await asyncio.gather(*(refresh(batch) for batch in batches)))
+        self.refreshed_entries += refreshed
+        logger.info(f"Refreshed {refreshed} of {len(keys)} expired market data cache entries "
+                    f"in {time.perf_counter() - started:.1f}s")
+        return refreshed
+
+    async def save_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await asyncio.to_thread(self.save)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "saved_at": self.saved_at,
+            "saved_entries": self.saved_entries,
+            "restored_entries": self.restored_entries,
+            "refreshed_entries": self.refreshed_entries,
+        }
+
+
+cache_snapshots = CacheSnapshots()
@@ -0,0 +1,214 @@
+"""Shared keep-alive HTTP connection pools for Realtime Database traffic.
+
+Pyrebase and the Admin SDK both talk to the database over `requests` sessions.
+Mounting a PooledHTTPAdapter on those sessions keeps TLS connections open
+between requests, sizes the pools from the environment and counts pool
+activity, so connection churn shows up in `pool_stats()` rather than as latency.
+The async REST client's httpx pool is counted by wrapping its transport in a
+CountingTransport.
+
+Connections are counted when they connect, waits when a request finds every
+connection busy in a pool that blocks, and overflow when a non-blocking pool
+opens a connection it will not keep.
+"""
+import os
+import threading
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# Connections kept per host, and the number of hosts with a pool
+RTDB_POOL_MAXSIZE = int(os.getenv("RTDB_POOL_MAXSIZE", 32))
+RTDB_POOL_HOSTS = int(os.getenv("RTDB_POOL_HOSTS", 4))
+# Block when every connection is busy instead of opening a throwaway one
+RTDB_POOL_BLOCK = os.getenv("RTDB_POOL_BLOCK", "false").lower() == "true"
+
+
+class PoolStats:
+    """Thread-safe counters for one adapter's connection pools"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+        self.waits = 0
+        self.overflow = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+
+    def checkout(self, waited: bool = False, overflow: bool = False) -> None:
+        with self._lock:
+            self.requests += 1
+            self.waits += waited
+            self.overflow += overflow
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+
+    def checkin(self) -> None:
+        with self._lock:
+            self.in_use = max(self.in_use - 1, 0)
+
+    def connection_opened(self) -> None:
+        with self._lock:
+            self.new_connections += 1
+
+    def as_dict(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "new_connections": self.new_connections,
+                "waits": self.waits,
+                "overflow": self.overflow,
+                "in_use": self.in_use,
+                "peak_in_use": self.peak_in_use,
+            }
+
+
+def _instrumented_pool(base: type, stats: PoolStats) -> type:
+    """Subclass of a urllib3 connection pool class that reports to `stats`"""
+
+    class CountedConnection(base.ConnectionCls):
+        # Also counts a kept-alive connection that has to reconnect after the server closed it
+        def connect(self):
+            stats.connection_opened()
+            super().connect()
+
+    class InstrumentedPool(base):
+        ConnectionCls = CountedConnection
+
+        def _get_conn(self, timeout=None):
+            # An empty queue means every connection is checked out: a blocking pool
+            # waits for one to come back, any other opens an extra one
+            busy = self.pool is not None and self.pool.empty()
+            conn = super()._get_conn(timeout)
+            stats.checkout(waited=busy and self.block, overflow=busy and not self.block)
+            return conn
+
+        def _put_conn(self, conn):
+            stats.checkin()
+            super()._put_conn(conn)
+
+    return InstrumentedPool
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter with environment-sized keep-alive pools and usage counters"""
+
+    def __init__(self, max_retries: Any = 0):
+        self.stats = PoolStats()
+        super().__init__(
+            pool_connections=RTDB_POOL_HOSTS,
+            pool_maxsize=RTDB_POOL_MAXSIZE,
+            pool_block=RTDB_POOL_BLOCK,
+            max_retries=max_retries,
+        )
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _instrumented_pool(HTTPConnectionPool, self.stats),
+            "https": _instrumented_pool(HTTPSConnectionPool, self.stats),
+        }
+
+    def idle_connections(self) -> int:
+        """Open connections currently parked in the pools"""
+        pools = self.poolmanager.pools
+        idle = 0
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is not None and pool.pool is not None:
+                idle += sum(1 for conn in list(pool.pool.queue) if conn is not None)
+        return idle
+
+    def snapshot(self) -> Dict[str, int]:
+        return {
+            **self.stats.as_dict(),
+            "idle": self.idle_connections(),
+            "max_size": self._pool_maxsize,
+        }
+
+
+_adapters: Dict[str, PooledHTTPAdapter] = {}
+
+
+def mount_pooled_adapter(session: requests.Session, name: str, max_retries: Any = None) -> PooledHTTPAdapter:
+    """Mount a PooledHTTPAdapter on `session` for http(s) and register it under `name`.
+
+    Unless `max_retries` is given, the adapter keeps the retry policy of the one it replaces.
+    """
+    if max_retries is None:
+        max_retries = session.get_adapter("https://").max_retries
+    adapter = PooledHTTPAdapter(max_retries=max_retries)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    _adapters[name] = adapter
+    return adapter
+
+
+class _CheckinStream(httpx.AsyncByteStream):
+    """Response body that hands its connection back to the counters when closed"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, checkin: Callable[[], None]):
+        self.stream = stream
+        self.checkin: Optional[Callable[[], None]] = checkin
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self.stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        if self.checkin is not None:
+            self.checkin()
+            self.checkin = None
+        await self.stream.aclose()
+
+
+class CountingTransport(httpx.AsyncBaseTransport):
+    """httpx transport wrapper counting requests, connections and waits for a free connection.
+
+    New connections are reported through httpcore's public `trace` request extension,
+    so nothing inside httpx's pool is read.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, max_connections: int):
+        self.transport = transport
+        self.max_connections = max_connections
+        self.stats = PoolStats()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        trace = request.extensions.get("trace")
+
+        async def count_connections(event: str, info: Dict[str, Any]) -> None:
+            if event == "connection.connect_tcp.complete":
+                self.stats.connection_opened()
+            if trace is not None:
+                await trace(event, info)
+
+        request.extensions["trace"] = count_connections
+        # httpx queues the request until a connection is free
+        self.stats.checkout(waited=self.stats.in_use >= self.max_connections)
+        try:
+            response = await self.transport.handle_async_request(request)
+        except BaseException:
+            self.stats.checkin()
+            raise
+        if response.is_closed:
+            # Built from content already in memory (MockTransport), so nothing holds a connection
+            self.stats.checkin()
+        else:
+            response.stream = _CheckinStream(response.stream, self.stats.checkin)
+        return response
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+    def snapshot(self) -> Dict[str, int]:
+        return {**self.stats.as_dict(), "max_size": self.max_connections}
+
+
+def pool_stats() -> Dict[str, Dict[str, int]]:
+    """Counters for every registered adapter"""
+    return {name: adapter.snapshot() for name, adapter in _adapters.items()}
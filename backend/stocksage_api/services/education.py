@@ -0,0 +1,492 @@
+"""Education content (glossary terms and trading tips) served from precomputed indexes.
+
+Content is a versioned in-memory snapshot of the Firebase collections
+/stock_terms and /trading_tips, compiled into an immutable EducationIndex: a
+normalized term map, category buckets, a related-terms graph and an inverted
+index over term names, definitions, examples and tip text. Requests only do
+dictionary lookups against the current index and never touch the network.
+
+- On a cold start the snapshot is read from local disk (EDUCATION_SNAPSHOT_PATH),
+  falling back to the bundled content file
+- Once Firebase is up, stream hub listeners apply every change to the snapshot;
+  bursts of changes are coalesced into one index rebuild, after which the new
+  index is swapped in and the snapshot is written back to disk
+- Collections that do not exist in Firebase keep the bundled content
+
+Readers never see a half-built index: rebuilds happen on a copy and are swapped
+in whole.
+"""
+import copy
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from ..config.paths import check_private, data_path
+from .stream_hub import assign_path, split_path
+
+logger = logging.getLogger(__name__)
+
+EDUCATION_CONTENT_PATH = os.getenv(
+    "EDUCATION_CONTENT_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "education.json"),
+)
+# Local copy of the latest content snapshot (unset: education-snapshot.json in the data directory; "" disables it)
+EDUCATION_SNAPSHOT_PATH = os.getenv("EDUCATION_SNAPSHOT_PATH")
+# Seconds to collect content changes before rebuilding the index
+EDUCATION_REBUILD_DELAY = float(os.getenv("EDUCATION_REBUILD_DELAY", 0.5))
+# Database collections holding education content, keyed by term or tip id
+EDUCATION_COLLECTIONS = ("stock_terms", "trading_tips")
+SNAPSHOT_FORMAT = 1
+# Default number of search results
+EDUCATION_SEARCH_LIMIT = 20
+
+# Relative weight of a token match in each field
+FIELD_WEIGHTS = {
+    "term": 3.0,
+    "title": 3.0,
+    "definition": 1.0,
+    "content": 1.0,
+    "example": 0.5,
+}
+STOP_WORDS = frozenset(
+    "a an and are as at be by for from has in is it its of on or that the this to when with".split()
+)
+# Bonus that puts the glossary entry named exactly like the query first
+EXACT_TERM_BOOST = 100.0
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_SEPARATOR_RE = re.compile(r"[\s_-]+")
+
+
+def normalize_term(term: str) -> str:
+    """Lookup key for a glossary term ("Market-Cap" and "market  cap" both give "market cap")"""
+    return _SEPARATOR_RE.sub(" ", term.casefold()).strip()
+
+
+def term_key(term: str) -> str:
+    """Database key for a glossary term ("P/E ratio" is stored under "p_e_ratio")"""
+    return re.sub(r"[^a-z0-9]+", "_", normalize_term(term)).strip("_")
+
+
+def content_collections(content: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Content file document ({"stock_terms": [...], "trading_tips": [...]}) keyed the way the database stores it"""
+    return {
+        "stock_terms": {term_key(entry.get("term") or ""): entry for entry in content.get("stock_terms") or []},
+        "trading_tips": {entry.get("id") or "": entry for entry in content.get("trading_tips") or []},
+    }
+
+
+def _entries(collection: Any, id_field: Optional[str] = None) -> List[Any]:
+    """Entries of a list, or of a keyed collection with the key filled in as id_field"""
+    if isinstance(collection, dict):
+        return [
+            {id_field: key, **entry} if id_field and isinstance(entry, dict) and not entry.get(id_field) else entry
+            for key, entry in collection.items()
+        ]
+    if isinstance(collection, list):
+        return collection
+    raise ValueError("stock_terms and trading_tips must be lists or keyed collections")
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in _TOKEN_RE.findall(text.casefold()) if token not in STOP_WORDS]
+
+
+class EducationIndex:
+    """Immutable, fully indexed snapshot of the education content.
+
+    Invalid entries raise ValueError, or with strict=False are logged and skipped
+    so one bad database record cannot block every other content update.
+    """
+
+    def __init__(self, content: Dict[str, Any], strict: bool = True):
+        self.strict = strict
+        terms = [entry for entry in _entries(content.get("stock_terms") or []) if self._check(
+            entry, ("term", "definition"), "Glossary entry is missing a term or definition")]
+        tips = [entry for entry in _entries(content.get("trading_tips") or [], "id") if self._check(
+            entry, ("id", "title", "content"), "Trading tip is missing an id, title or content")]
+
+        self.terms: List[Dict[str, Any]] = []
+        self.terms_by_key: Dict[str, Dict[str, Any]] = {}
+        for entry in terms:
+            key = normalize_term(entry["term"])
+            if key in self.terms_by_key:
+                self._invalid(f"Duplicate glossary term '{entry['term']}'")
+                continue
+            term = {
+                "term": entry["term"],
+                "definition": entry["definition"],
+                "example": entry.get("example", ""),
+                "category": entry.get("category"),
+            }
+            self.terms.append(term)
+            self.terms_by_key[key] = term
+
+        self.tips: List[Dict[str, Any]] = []
+        self.tips_by_id: Dict[str, Dict[str, Any]] = {}
+        for entry in tips:
+            if entry["id"] in self.tips_by_id:
+                self._invalid(f"Duplicate trading tip id '{entry['id']}'")
+                continue
+            tip = {
+                "id": entry["id"],
+                "title": entry["title"],
+                "content": entry["content"],
+                "category": entry.get("category"),
+            }
+            self.tips.append(tip)
+            self.tips_by_id[tip["id"]] = tip
+
+        self.terms_by_category = self._bucket(self.terms)
+        self.tips_by_category = self._bucket(self.tips)
+        self.related = self._related_graph(terms)
+        self._build_search_index()
+
+    def _invalid(self, message: str) -> None:
+        if self.strict:
+            raise ValueError(message)
+        logger.warning(f"Skipping education content: {message}")
+
+    def _check(self, entry: Any, fields: tuple, message: str) -> bool:
+        if isinstance(entry, dict) and all(entry.get(field) for field in fields):
+            return True
+        self._invalid(f"{message}: {entry}")
+        return False
+
+    @staticmethod
+    def _bucket(items: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+        buckets: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for item in items:
+            if item["category"]:
+                buckets[item["category"]].append(item)
+        return dict(buckets)
+
+    def _related_graph(self, terms: List[Dict[str, Any]]) -> Dict[str, List[str]]:
+        """Related terms per glossary key: the entry's own list plus every glossary term linking back to it"""
+        related: Dict[str, Dict[str, None]] = {key: {} for key in self.terms_by_key}
+        for entry in terms:
+            key = normalize_term(entry["term"])
+            if self.terms_by_key.get(key, {}).get("term") != entry["term"]:
+                continue  # a skipped duplicate
+            # The database stores lists as objects keyed "0", "1", ...
+            names = entry.get("related_terms") or []
+            for name in names.values() if isinstance(names, dict) else names:
+                related_key = normalize_term(name)
+                if related_key == key:
+                    continue
+                related[key].setdefault(name)
+                # Links between glossary entries go both ways
+                if related_key in related:
+                    related[related_key].setdefault(entry["term"])
+        return {key: list(names) for key, names in related.items()}
+
+    def _build_search_index(self) -> None:
+        documents = []
+        for key, term in self.terms_by_key.items():
+            documents.append((("term", key), term, ("term", "definition", "example")))
+        for tip in self.tips:
+            documents.append((("tip", tip["id"]), tip, ("title", "content")))
+
+        postings: Dict[str, Dict[tuple, float]] = defaultdict(dict)
+        for doc_id, document, fields in documents:
+            for field in fields:
+                for token in tokenize(document.get(field) or ""):
+                    postings[token][doc_id] = postings[token].get(doc_id, 0.0) + FIELD_WEIGHTS[field]
+
+        # Weight each posting by the token's inverse document frequency once, here
+        total = max(len(documents), 1)
+        self.postings: Dict[str, Dict[tuple, float]] = {
+            token: {doc_id: weight * math.log(1 + total / len(docs)) for doc_id, weight in docs.items()}
+            for token, docs in postings.items()
+        }
+        self.vocabulary: List[str] = sorted(self.postings)
+
+    def get_term(self, term: str) -> Optional[Dict[str, Any]]:
+        """Glossary entry with its related terms, or None"""
+        key = normalize_term(term)
+        entry = self.terms_by_key.get(key)
+        if entry is None:
+            return None
+        return {**entry, "related_terms": list(self.related[key])}
+
+    def list_terms(self, category: Optional[str] = None) -> List[Dict[str, Any]]:
+        return list(self.terms_by_category.get(category, []) if category else self.terms)
+
+    def list_tips(self, category: Optional[str] = None) -> List[Dict[str, Any]]:
+        return list(self.tips_by_category.get(category, []) if category else self.tips)
+
+    def categories(self) -> Dict[str, List[str]]:
+        return {"terms": sorted(self.terms_by_category), "tips": sorted(self.tips_by_category)}
+
+    def _token_postings(self, token: str, prefix: bool) -> Dict[tuple, float]:
+        if not prefix:
+            return self.postings.get(token, {})
+        # The last query token also matches longer words ("divid" finds "dividend")
+        matches: Dict[tuple, float] = {}
+        position = bisect_left(self.vocabulary, token)
+        while position < len(self.vocabulary) and self.vocabulary[position].startswith(token):
+            for doc_id, score in self.postings[self.vocabulary[position]].items():
+                matches[doc_id] = max(matches.get(doc_id, 0.0), score)
+            position += 1
+        return matches
+
+    def search(self, query: str, kind: Optional[str] = None, category: Optional[str] = None,
+               limit: int = EDUCATION_SEARCH_LIMIT) -> List[Dict[str, Any]]:
+        """Terms and tips containing every query word, best matches first"""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        scores: Optional[Dict[tuple, float]] = None
+        for position, token in enumerate(tokens):
+            matches = self._token_postings(token, prefix=position == len(tokens) - 1)
+            if scores is None:
+                scores = dict(matches)
+            else:
+                scores = {doc_id: score + matches[doc_id] for doc_id, score in scores.items() if doc_id in matches}
+            if not scores:
+                return []
+
+        exact = ("term", normalize_term(query))
+        if exact in scores:
+            scores[exact] += EXACT_TERM_BOOST
+
+        results = []
+        for (doc_kind, doc_key), score in scores.items():
+            if kind and doc_kind != kind:
+                continue
+            if doc_kind == "term":
+                document = self.terms_by_key[doc_key]
+                result = {"type": "term", "id": doc_key, "title": document["term"],
+                          "summary": document["definition"], "category": document["category"]}
+            else:
+                document = self.tips_by_id[doc_key]
+                result = {"type": "tip", "id": doc_key, "title": document["title"],
+                          "summary": document["content"], "category": document["category"]}
+            if category and result["category"] != category:
+                continue
+            result["score"] = round(score, 4)
+            results.append(result)
+
+        results.sort(key=lambda result: (-result["score"], result["title"].casefold()))
+        return results[:limit]
+
+    def stats(self) -> Dict[str, int]:
+        return {"terms": len(self.terms), "tips": len(self.tips), "tokens": len(self.vocabulary)}
+
+
+class EducationContent:
+    """Versioned education content snapshot and the index built from it"""
+
+    def __init__(self, path: str = EDUCATION_CONTENT_PATH, snapshot_path: Optional[str] = EDUCATION_SNAPSHOT_PATH,
+                 rebuild_delay: float = EDUCATION_REBUILD_DELAY):
+        self.path = path
+        self.snapshot_path = snapshot_path
+        self.rebuild_delay = rebuild_delay
+        self._lock = threading.RLock()
+        self._index: Optional[EducationIndex] = None
+        self._collections: Dict[str, Dict[str, Any]] = {}
+        # Collections currently mirrored from the database
+        self._remote: set = set()
+        self._listeners: List[Any] = []
+        self._rebuild_timer: Optional[threading.Timer] = None
+        self._content_hash: Optional[str] = None
+        self.version = 0
+        self.index_version = 0
+        self.source: Optional[str] = None
+        self.updated_at: Optional[int] = None
+        self.rebuilds = 0
+
+    @property
+    def index(self) -> EducationIndex:
+        index = self._index
+        if index is None:
+            with self._lock:
+                if self._index is None:
+                    self._load()
+                index = self._index
+        return index
+
+    # Loading
+    def _read_content_file(self) -> Dict[str, Dict[str, Any]]:
+        with open(self.path, "rb") as content_file:
+            raw = content_file.read()
+        self._content_hash = hashlib.sha256(raw).hexdigest()
+        return content_collections(json.loads(raw))
+
+    def _load(self) -> None:
+        collections = self._read_content_file()
+        snapshot = self._read_snapshot()
+        if snapshot is not None:
+            try:
+                index = EducationIndex(snapshot["collections"], strict=False)
+            except ValueError as e:
+                logger.warning(f"Ignoring education snapshot {self.snapshot_path}: {str(e)}")
+            else:
+                self._collections = snapshot["collections"]
+                self._swap(index, snapshot["version"], "snapshot")
+                self.updated_at = snapshot.get("updated_at")
+                return
+        self._collections = collections
+        self._swap(EducationIndex(collections), self.version + 1, "file")
+
+    def _snapshot_file(self) -> str:
+        """The snapshot path ("" when disabled), creating the data directory for the default one"""
+        if self.snapshot_path is None:
+            self.snapshot_path = data_path("education-snapshot.json")
+        return self.snapshot_path
+
+    def _read_snapshot(self) -> Optional[Dict[str, Any]]:
+        """Saved snapshot, unless it is missing, unreadable or built on a different content file"""
+        try:
+            if not self._snapshot_file() or not os.path.exists(self.snapshot_path):
+                return None
+            # Only trust a file no other user could have written
+            check_private(self.snapshot_path)
+            with open(self.snapshot_path, encoding="utf-8") as snapshot_file:
+                snapshot = json.load(snapshot_file)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to read education snapshot {self.snapshot_path}: {str(e)}")
+            return None
+        if snapshot.get("format") != SNAPSHOT_FORMAT or snapshot.get("content_hash") != self._content_hash:
+            return None
+        return snapshot
+
+    def _save_snapshot(self, collections: Dict[str, Any], version: int) -> None:
+        """Write the snapshot atomically so a crash never leaves a torn file behind"""
+        try:
+            if not self._snapshot_file():
+                return
+        except OSError as e:
+            logger.warning(f"No private data directory for the education snapshot: {str(e)}")
+            return
+        snapshot = {
+            "format": SNAPSHOT_FORMAT,
+            "version": version,
+            "updated_at": self.updated_at,
+            "content_hash": self._content_hash,
+            "collections": collections,
+        }
+        try:
+            directory = os.path.dirname(os.path.abspath(self.snapshot_path))
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+            with tempfile.NamedTemporaryFile("w", dir=directory, delete=False, suffix=".tmp", encoding="utf-8") as tmp:
+                json.dump(snapshot, tmp, ensure_ascii=False)
+            os.replace(tmp.name, self.snapshot_path)
+        except OSError as e:
+            logger.warning(f"Failed to save education snapshot to {self.snapshot_path}: {str(e)}")
+
+    def _swap(self, index: EducationIndex, version: int, source: str) -> None:
+        self._index = index
+        self.version = max(self.version, version)
+        self.index_version = version
+        self.source = source
+        self.rebuilds += 1
+
+    def reload(self) -> Dict[str, Any]:
+        """Re-read the content file for every collection not mirrored from the database.
+        The previous index stays live if the file is invalid."""
+        with self._lock:
+            collections = {**self._collections}
+            for name, collection in self._read_content_file().items():
+                if name not in self._remote:
+                    collections[name] = collection
+            index = EducationIndex(collections, strict=not self._remote)
+            self._collections = collections
+            self.updated_at = int(time.time() * 1000)
+            self._swap(index, self.version + 1, "firebase" if self._remote else "file")
+            version = self.version
+        self._save_snapshot(collections, version)
+        logger.info(f"Reloaded education content from {self.path}: {index.stats()}")
+        return self.status()
+
+    # Live updates
+    def start_stream(self, hub) -> None:
+        """Mirror the education collections through stream hub listeners"""
+        self.index  # load the local content before the first change arrives
+        with self._lock:
+            if self._listeners:
+                return
+            for name in EDUCATION_COLLECTIONS:
+                self._listeners.append(hub.listen(name, lambda event, name=name: self._on_change(name, event)))
+        logger.info("Education content listening for database changes")
+
+    def stop_stream(self) -> None:
+        """Stop listening and apply any change still waiting for a rebuild"""
+        with self._lock:
+            listeners, self._listeners = self._listeners, []
+            timer, self._rebuild_timer = self._rebuild_timer, None
+            self._remote.clear()
+        for listener in listeners:
+            listener.close()
+        if timer is not None:
+            timer.cancel()
+            self._rebuild()
+
+    def _on_change(self, name: str, event: Dict[str, Any]) -> None:
+        parts = split_path(event["path"])
+        with self._lock:
+            if not parts and event["data"] is None and name not in self._remote:
+                logger.warning(f"No /{name} in the database, keeping local education content for it")
+                return
+            self._remote.add(name)
+            if not parts and event["data"] == self._collections.get(name):
+                # The initial snapshot matches what was loaded from disk
+                self.source = "firebase"
+                return
+            collection = assign_path(self._collections.get(name), parts, copy.deepcopy(event["data"]))
+            self._collections[name] = collection if isinstance(collection, dict) else {}
+            self.version += 1
+            self.updated_at = int(time.time() * 1000)
+            if self.rebuild_delay > 0:
+                # Changes arriving before the timer fires ride along with this rebuild
+                if self._rebuild_timer is None:
+                    self._rebuild_timer = threading.Timer(self.rebuild_delay, self._rebuild)
+                    self._rebuild_timer.daemon = True
+                    self._rebuild_timer.start()
+                return
+        self._rebuild()
+
+    def _rebuild(self) -> None:
+        """Build a new index from a copy of the snapshot, swap it in and persist the snapshot"""
+        with self._lock:
+            self._rebuild_timer = None
+            collections = copy.deepcopy(self._collections)
+            version = self.version
+        try:
+            index = EducationIndex(collections, strict=False)
+        except ValueError as e:
+            logger.error(f"Failed to rebuild education content version {version}: {str(e)}")
+            return
+        with self._lock:
+            if version <= self.index_version:
+                return  # a newer rebuild already landed
+            self._swap(index, version, "firebase")
+        self._save_snapshot(collections, version)
+        logger.info(f"Education content updated to version {version}: {index.stats()}")
+
+    def status(self) -> Dict[str, Any]:
+        index = self.index
+        return {
+            "version": self.index_version,
+            "pending_version": self.version if self.version != self.index_version else None,
+            "source": self.source,
+            "updated_at": self.updated_at,
+            "live": bool(self._listeners),
+            "mirrored_collections": sorted(self._remote),
+            "rebuilds": self.rebuilds,
+            **index.stats(),
+        }
+
+
+# Create a singleton instance
+education_content = EducationContent()
@@ -1,19 +1,15 @@
-import firebase_admin
-from firebase_admin import credentials, db, auth
 import logging
-import sys
-from typing import Dict, Any, Optional, Callable, TypeVar
+import threading
+from collections.abc import KeysView
+from typing import Dict, Any, List, Optional, Callable, TypeVar
 from ..config.firebase_config import firebase_config
+from ..config.database_indexes import database_indexes
+from .token_cache import TokenCache
+from .write_batch import WriteBatch
 
-# Import pyrebase for real-time data operations
-try:
-    import pyrebase
-except ImportError:
-    print("Error: pyrebase4 is required. Install it using 'pip install pyrebase4'")
-    sys.exit(1)
+# The Firebase SDKs, Pyrebase and the in-memory backend are imported when the
+# service is first created rather than when the API is imported
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Define type variables and custom types
@@ -29,12 +25,40 @@ StreamType = Any  # Pyrebase stream type
 CallbackType = Callable[[Dict[str, Any]], None]
 
 
+def page_from_entries(entries: Dict[str, Any], limit: int, after: Optional[str]) -> Dict[str, Any]:
+    """Trim a key-ordered query result fetched for query_page into a page and cursor"""
+    entries = dict(entries)
+    if after is not None:
+        entries.pop(after, None)
+    keys = list(entries)[:limit]
+    next_cursor = keys[-1] if len(entries) > limit else None
+    return {"items": {key: entries[key] for key in keys}, "next_cursor": next_cursor}
+
+
 class FirebaseService:
-    def __init__(self):
+    def __init__(self, backend: Optional[str] = None):
         """Initialize Firebase Admin SDK and Pyrebase for different operations"""
         # Get the firebase configuration
         self.database_url: str = firebase_config.get('databaseURL')
         self.project_id: str = firebase_config.get('projectId')
+        self.backend: str = backend or firebase_config.get('backend') or "firebase"
+        self.token_cache = TokenCache()
+        self.memory_db = None
+        # Push keys come from the one shared builder, which remembers the last key it made
+        self._key_lock = threading.Lock()
+
+        if self.backend == "memory":
+            self._init_memory_backend()
+            return
+
+        # Import pyrebase for real-time data operations
+        try:
+            import pyrebase
+        except ImportError:
+            raise ValueError("pyrebase4 is required. Install it using 'pip install pyrebase4'")
+        import firebase_admin
+        from firebase_admin import credentials, db, auth
+        from .connection_pool import mount_pooled_adapter
         
         # Find service account file
         service_account_path: str = firebase_config.get('serviceAccount')
@@ -80,14 +104,37 @@ class FirebaseService:
             }
             
             self.pyrebase_app = pyrebase.initialize_app(pyrebase_config)
-            self.rtdb = self.pyrebase_app.database()
+            self._new_query = self.pyrebase_app.database
+            self.rtdb = self._new_query()
             self.pyrebase_auth = self.pyrebase_app.auth()
             logger.info("Pyrebase initialized successfully for real-time operations")
+
+            # Route all RTDB traffic through shared keep-alive connection pools, keeping
+            # each session's retry policy
+            mount_pooled_adapter(self.pyrebase_app.requests, "pyrebase")
+            admin_client = self.admin_db.reference("/", app=self.admin_app)._client
+            mount_pooled_adapter(admin_client.session, "admin")
             
         except Exception as e:
             logger.error(f"Error initializing Firebase: {str(e)}")
             raise ValueError(f"Failed to initialize Firebase: {str(e)}")
     
+    def _init_memory_backend(self) -> None:
+        """Serve every Firebase call from the in-process stand-in (no credentials or network)"""
+        from .memory_backend import (
+            MemoryDatabase, MemoryQuery, MemoryAdminDatabase, MemoryAuth, MemoryApp, MEMORY_DATABASE_URL
+        )
+        self.memory_db = MemoryDatabase(indexes=database_indexes)
+        self.database_url = MEMORY_DATABASE_URL
+        self.admin_app = MemoryApp(self.project_id)
+        self.admin_db = MemoryAdminDatabase(self.memory_db)
+        self.admin_auth = MemoryAuth(self.admin_app.project_id)
+        self.pyrebase_app = None
+        self._new_query = lambda: MemoryQuery(self.memory_db)
+        self.rtdb = self._new_query()
+        self.pyrebase_auth = self.admin_auth
+        logger.warning("Using the in-memory Firebase backend - data is not persisted")
+
     # Admin operations using Firebase Admin SDK
     def admin_get_data(self, path: PathType) -> Optional[Dict[str, Any]]:
         """Retrieve data from specified path using Admin SDK"""
@@ -109,36 +156,142 @@ class FirebaseService:
         ref = self.admin_db.reference(path)
         return ref.delete()
     
+    def transaction(self, path: PathType, update: Callable[[Any], Any]) -> Any:
+        """Replace the value at path with update(current value), retrying if it changes meanwhile.
+
+        The Admin SDK writes with the ETag of the value it read, so a concurrent write
+        makes it call update again; an exception raised by update aborts the transaction.
+        """
+        return self.admin_db.reference(path).transaction(update)
+
+    def pool_stats(self) -> Dict[str, Dict[str, int]]:
+        """Connection pool counters for the Pyrebase and Admin SDK sessions"""
+        from .connection_pool import pool_stats
+        return pool_stats()
+
     # Real-time operations using Pyrebase
+    def _query(self, path: PathType = ""):
+        """A fresh Pyrebase query builder, at path.
+
+        Pyrebase's Database keeps the path and query being built in attributes and
+        only clears them when a request is sent, so one builder shared between
+        threads mixes up their paths; every call builds its own.
+        """
+        query = self._new_query()
+        return query.child(path) if path else query
+
     def get_data(self, path: PathType) -> Optional[Dict[str, Any]]:
         """Retrieve data from specified path using Pyrebase"""
         try:
-            return self.rtdb.child(path).get().val()
+            return self._query(path).get().val()
         except Exception as e:
             logger.error(f"Network error while getting data from {path}: {str(e)}")
             # Consider whether to raise or return None based on your error handling strategy
             return None
     
+    def query_data(
+        self,
+        path: PathType,
+        order_by: str = "$key",
+        start_at: Any = None,
+        end_at: Any = None,
+        limit_to_first: Optional[int] = None,
+        limit_to_last: Optional[int] = None,
+        equal_to: Any = None
+    ) -> Optional[Dict[str, Any]]:
+        """Retrieve an ordered range of children at path using Pyrebase
+
+        order_by is "$key", "$value" or a child name (which needs an entry in
+        config/database_indexes.py). equal_to keeps only children whose ordered
+        value matches.
+        """
+        if equal_to is not None:
+            start_at = end_at = equal_to
+        query = self._query(path)
+        if order_by == "$key":
+            query = query.order_by_key()
+        elif order_by == "$value":
+            query = query.order_by_value()
+        else:
+            query = query.order_by_child(order_by)
+        if start_at is not None:
+            query = query.start_at(start_at)
+        if end_at is not None:
+            query = query.end_at(end_at)
+        if limit_to_first is not None:
+            query = query.limit_to_first(limit_to_first)
+        if limit_to_last is not None:
+            query = query.limit_to_last(limit_to_last)
+        try:
+            return query.get().val() or None
+        except Exception as e:
+            logger.error(f"Network error while querying {path}: {str(e)}")
+            return None
+
+    def get_keys(self, path: PathType) -> List[str]:
+        """Child keys at path without downloading their values (a shallow read)"""
+        try:
+            keys = self._query(path).shallow().get().val()
+        except Exception as e:
+            logger.error(f"Network error while listing keys at {path}: {str(e)}")
+            return []
+        return sorted(keys) if isinstance(keys, (dict, KeysView)) else []
+
+    def query_page(
+        self,
+        path: PathType,
+        limit: int = 50,
+        after: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """One page of children in key order, starting after the `after` key.
+
+        Returns {"items": {key: value}, "next_cursor": key or None}; pass next_cursor
+        back as `after` to fetch the following page.
+        """
+        # One extra child tells whether another page follows; the cursor itself comes back too
+        fetch = limit + 1 + (after is not None)
+        entries = self.query_data(path, start_at=after, limit_to_first=fetch) or {}
+        return page_from_entries(entries, limit, after)
+
     def set_data(self, path: PathType, data: DataType) -> PyrebaseResponse:
         """Set data at specified path using Pyrebase"""
-        return self.rtdb.child(path).set(data)
+        return self._query(path).set(data)
     
     def push_data(self, path: PathType, data: DataType) -> PyrebaseResponse:
         """Push data to specified path using Pyrebase (generates unique key)"""
-        return self.rtdb.child(path).push(data)
+        return self._query(path).push(data)
     
     def update_data(self, path: PathType, data: DataType) -> PyrebaseResponse:
         """Update data at specified path using Pyrebase"""
-        return self.rtdb.child(path).update(data)
+        return self._query(path).update(data)
     
     def delete_data(self, path: PathType) -> PyrebaseResponse:
         """Delete data at specified path using Pyrebase"""
-        return self.rtdb.child(path).remove()
+        return self._query(path).remove()
     
     def stream_data(self, path: PathType, callback: CallbackType) -> StreamType:
         """Stream data updates from specified path using Pyrebase"""
-        return self.rtdb.child(path).stream(callback)
-    
+        return self._query(path).stream(callback)
+
+    def multi_path_update(self, updates: Dict[PathType, Any]) -> PyrebaseResponse:
+        """Atomically write several paths in one request (a None value deletes the path)"""
+        return self._query().update(updates)
+
+    def batch(self) -> WriteBatch:
+        """Start a batch of writes to be applied atomically with commit_batch"""
+        return WriteBatch(generate_key=self.generate_key)
+
+    def commit_batch(self, batch: WriteBatch) -> Optional[PyrebaseResponse]:
+        """Apply every write in the batch in one multi-path update"""
+        if not batch.updates:
+            return None
+        return self.multi_path_update(batch.updates)
+
+    def generate_key(self) -> str:
+        """Generate a chronologically ordered push key without a network round trip"""
+        with self._key_lock:
+            return self.rtdb.generate_key()
+
     # User Authentication Methods
     def create_user(self, email: str, password: str) -> UserRecord:
         """Create a new user with Firebase Authentication"""
@@ -172,6 +325,7 @@ class FirebaseService:
     
     def disable_user(self, user_id: UserIdType) -> UserRecord:
         """Disable a user account"""
+        self.token_cache.invalidate_user(user_id)
         return self.admin_auth.update_user(user_id, disabled=True)
     
     def enable_user(self, user_id: UserIdType) -> UserRecord:
@@ -180,16 +334,52 @@ class FirebaseService:
     
     def delete_user(self, user_id: UserIdType) -> None:
         """Delete a user account from Firebase Authentication"""
+        self.token_cache.invalidate_user(user_id)
         return self.admin_auth.delete_user(user_id)
     
     def set_custom_user_claims(self, user_id: UserIdType, custom_claims: Dict[str, Any]) -> None:
         """Set custom claims on a user"""
         return self.admin_auth.set_custom_user_claims(user_id, custom_claims)
     
-    def verify_id_token(self, id_token: TokenType) -> Dict[str, Any]:
-        """Verify an ID token using Firebase Admin SDK"""
+    # Batch user operations (one Admin SDK request per call, within its per-call limits)
+    def get_users(self, uids: List[UserIdType] = (), emails: List[str] = ()) -> Any:
+        """Look up at most 100 users by uid or email; returns users and not_found identifiers"""
+        from firebase_admin import auth
+        identifiers = [auth.UidIdentifier(uid) for uid in uids] + [auth.EmailIdentifier(email) for email in emails]
+        return self.admin_auth.get_users(identifiers)
+
+    def import_users(self, users: List[Any], hash_alg: Any = None) -> Any:
+        """Create or overwrite at most 1000 users from ImportUserRecords"""
+        return self.admin_auth.import_users(users, hash_alg=hash_alg)
+
+    def delete_users(self, user_ids: List[UserIdType]) -> Any:
+        """Delete at most 1000 users; reports failures by index"""
+        for user_id in user_ids:
+            self.token_cache.invalidate_user(user_id)
+        return self.admin_auth.delete_users(user_ids)
+
+    def revoke_refresh_tokens(self, user_id: UserIdType) -> None:
+        """Revoke a user's refresh tokens and drop their cached ID tokens"""
+        self.token_cache.invalidate_user(user_id)
+        return self.admin_auth.revoke_refresh_tokens(user_id)
+
+    def verify_id_token(self, id_token: TokenType, check_revoked: bool = False) -> Dict[str, Any]:
+        """Verify an ID token using Firebase Admin SDK.
+
+        Verified tokens are cached until they expire. With check_revoked the cache is
+        bypassed and the user's revocation status is looked up on every call.
+        """
+        from firebase_admin import auth
+        if not check_revoked:
+            cached = self.token_cache.get(id_token)
+            if cached is not None:
+                return cached
         try:
-            return self.admin_auth.verify_id_token(id_token, clock_skew_seconds=30)
+            decoded_token = self.admin_auth.verify_id_token(
+                id_token, check_revoked=check_revoked, clock_skew_seconds=30
+            )
+            self.token_cache.put(id_token, decoded_token)
+            return decoded_token
         except auth.ExpiredIdTokenError:
             logger.warning("Token expired - rejecting request")
             raise
@@ -249,5 +439,32 @@ class FirebaseService:
             logger.error(f"Error deleting user {user_id}: {str(e)}")
             raise e
 
-# Create a singleton instance
-firebase_service = FirebaseService()
\ No newline at end of file
+
+class LazyFirebaseService:
+    """Stands in for the FirebaseService singleton and creates it on first use.
+
+    Creating the service imports the SDKs and loads credentials, so it is deferred
+    until a request or the startup checks need it instead of slowing every import.
+    """
+
+    def __init__(self):
+        self._service: Optional[FirebaseService] = None
+        self._lock = threading.Lock()
+
+    @property
+    def initialized(self) -> bool:
+        return self._service is not None
+
+    def get(self) -> FirebaseService:
+        """Return the service, creating it if this is the first call"""
+        if self._service is None:
+            with self._lock:
+                if self._service is None:
+                    self._service = FirebaseService()
+        return self._service
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.get(), name)
+
+# Create a singleton instance (initialized on first use)
+firebase_service = LazyFirebaseService()
\ No newline at end of file
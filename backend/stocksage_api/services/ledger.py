@@ -0,0 +1,113 @@
+"""Append-only transaction ledger with periodic portfolio snapshots.
+
+Firebase layout:
+
+    /transactions/{portfolio_id}/{seq_key}   one entry per trade, never rewritten
+    /snapshots/{portfolio_id}/{seq_key}      cash, realized P&L and positions after
+                                             every `snapshot_interval` entries
+
+Sequence keys are zero-padded with a prefix ("s0000000042") so key order is
+sequence order and RTDB never mistakes them for array indexes. Point-in-time
+queries load the nearest snapshot and replay only the entries after it.
+"""
+import logging
+import os
+from typing import Any, Dict, Iterator, List, Optional
+
+from .portfolio import Portfolio
+
+logger = logging.getLogger(__name__)
+
+# Number of ledger entries between portfolio snapshots
+SNAPSHOT_INTERVAL = int(os.getenv("LEDGER_SNAPSHOT_INTERVAL", 50))
+
+
+def sequence_key(seq: int) -> str:
+    """Ledger key for a sequence number"""
+    return f"s{seq:010d}"
+
+
+def parse_sequence_key(key: str) -> int:
+    """Sequence number for a ledger key"""
+    if not key.startswith("s") or not key[1:].isdigit():
+        raise ValueError(f"Invalid ledger key '{key}'")
+    return int(key[1:])
+
+
+class TransactionLedger:
+    def __init__(self, firebase, snapshot_interval: int = SNAPSHOT_INTERVAL):
+        self.firebase = firebase
+        self.snapshot_interval = snapshot_interval
+
+    def append_updates(self, portfolio: Portfolio, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Multi-path updates that append `entry` (already applied to `portfolio`).
+
+        The entry takes the portfolio's new version as its sequence number, and a
+        snapshot is added every `snapshot_interval` entries.
+        """
+        seq = portfolio.version
+        key = sequence_key(seq)
+        entry["id"] = key
+        entry["seq"] = seq
+
+        updates = {f"transactions/{portfolio.id}/{key}": entry}
+        if seq % self.snapshot_interval == 0:
+            updates[f"snapshots/{portfolio.id}/{key}"] = portfolio.snapshot_record(entry["timestamp"])
+        return updates
+
+    def page(self, portfolio_id: str, limit: int = 50, before: Optional[str] = None) -> Dict[str, Any]:
+        """A page of entries, newest first, ending just before the `before` key"""
+        end_at = None
+        if before:
+            seq = parse_sequence_key(before)
+            # Nothing comes before the first entry (sequence numbers start at 1)
+            if seq <= 1:
+                return {"transactions": [], "next_cursor": None}
+            end_at = sequence_key(seq - 1)
+
+        entries = self.firebase.query_data(
+            f"transactions/{portfolio_id}", end_at=end_at, limit_to_last=limit
+        ) or {}
+        transactions = list(reversed(list(entries.values())))
+        next_cursor = None
+        if len(transactions) == limit and transactions[-1]["seq"] > 1:
+            next_cursor = transactions[-1]["id"]
+        return {"transactions": transactions, "next_cursor": next_cursor}
+
+    def _entries_after(self, portfolio_id: str, seq: int) -> Iterator[Dict[str, Any]]:
+        """Entries with a sequence number above `seq`, fetched in snapshot-sized pages"""
+        while True:
+            entries = self.firebase.query_data(
+                f"transactions/{portfolio_id}",
+                start_at=sequence_key(seq + 1),
+                limit_to_first=self.snapshot_interval
+            ) or {}
+            for entry in entries.values():
+                yield entry
+                seq = entry["seq"]
+            if len(entries) < self.snapshot_interval:
+                return
+
+    def nearest_snapshot(self, portfolio_id: str, timestamp: int) -> Optional[Dict[str, Any]]:
+        """The latest snapshot taken at or before `timestamp`"""
+        snapshots = self.firebase.query_data(
+            f"snapshots/{portfolio_id}", order_by="timestamp", end_at=timestamp, limit_to_last=1
+        ) or {}
+        return next(iter(snapshots.values()), None)
+
+    def state_at(self, portfolio: Portfolio, timestamp: int) -> Portfolio:
+        """Rebuild the portfolio as it stood at `timestamp` (milliseconds)"""
+        snapshot = self.nearest_snapshot(portfolio.id, timestamp)
+        state = portfolio.from_snapshot(snapshot)
+        replayed = 0
+        for entry in self._entries_after(portfolio.id, state.version):
+            if entry["timestamp"] > timestamp:
+                break
+            state.replay(entry)
+            replayed += 1
+        logger.debug(f"Rebuilt portfolio {portfolio.id} at {timestamp} from seq {state.version - replayed} (+{replayed} entries)")
+        return state
+
+    def entries(self, portfolio_id: str, after_seq: int = 0) -> List[Dict[str, Any]]:
+        """All entries after a sequence number, oldest first"""
+        return list(self._entries_after(portfolio_id, after_seq))
@@ -0,0 +1,175 @@
+"""Market data cache used by the stock routes and the market data services.
+
+Keys are namespaced by data type (`stock:AAPL`, `price:AAPL`, ...). Expired
+entries are kept as the fallback when a fetch fails.
+"""
+import logging
+import time
+
+from . import shared_cache as shared_cache_tier, tracing
+from .metrics import cache_evictions, cache_namespace, cache_requests
+
+logger = logging.getLogger(__name__)
+
+# Cache configuration: this process's entries, in front of the cross-process tier
+# in services/shared_cache.py when MARKET_CACHE_PATH is set (multi-worker mode)
+cache = {}
+cache_expiry = {}
+CACHE_DURATION = 300  # 5 minutes
+
+
+def _store_fetched(key, data, now):
+    """Cache freshly fetched data here and in the shared tier; returns the value to serve"""
+    expires_at = now + CACHE_DURATION
+    store = shared_cache_tier.shared_cache
+    if store is not None:
+        newer = store.put_if_newer(key, data, time.time(), expires_at)
+        if newer is not None:
+            # Another worker stored a fresher value while this one was fetching
+            data, _, expires_at = newer
+    cache[key] = data
+    cache_expiry[key] = expires_at
+    return data
+
+
+def _shared_entry(key):
+    store = shared_cache_tier.shared_cache
+    return store.get(key) if store is not None else None
+
+
+def get_cached_or_fetch(key, fetch_func):
+    """Get data from cache or fetch it"""
+    now = time.time()
+    namespace = cache_namespace(key)
+    with tracing.span(f"cache {namespace}", "cache", key=key) as span:
+        if key in cache and cache_expiry.get(key, 0) > now:
+            cache_requests.inc(namespace, "hit")
+            span.set("result", "hit")
+            return cache[key]
+
+        shared = _shared_entry(key)
+        if shared is not None and shared[2] > now:
+            # Fetched by another worker
+            cache_requests.inc(namespace, "shared_hit")
+            span.set("result", "shared_hit")
+            cache[key], cache_expiry[key] = shared[0], shared[2]
+            return shared[0]
+
+        try:
+            # Fetch fresh data
+            data = fetch_func()
+            cache_requests.inc(namespace, "miss")
+            span.set("result", "miss")
+            if key in cache:
+                cache_evictions.inc(namespace)
+            return _store_fetched(key, data, now)
+        except Exception as e:
+            logger.error(f"Error fetching data for {key}: {str(e)}")
+            # If we have cached data but it's expired, still return it rather than failing
+            if key in cache or shared is not None:
+                logger.info(f"Using expired cache for {key}")
+                cache_requests.inc(namespace, "stale")
+                span.set("result", "stale")
+                return cache[key] if key in cache else shared[0]
+            cache_requests.inc(namespace, "miss")
+            span.set("result", "miss")
+            raise e
+
+
+def get_cached_or_fetch_many(keys, fetch_many):
+    """Get several keys from cache, fetching all misses with a single call.
+
+    `fetch_many` receives the list of missing keys and returns a dict of key -> data.
+    Keys that could not be fetched fall back to expired cache entries or are left out.
+    """
+    now = time.time()
+    results = {key: cache[key] for key in keys if key in cache and cache_expiry.get(key, 0) > now}
+    for key in results:
+        cache_requests.inc(cache_namespace(key), "hit")
+    shared = {}
+    for key in keys:
+        if key not in results:
+            entry = _shared_entry(key)
+            if entry is None:
+                continue
+            shared[key] = entry
+            if entry[2] > now:
+                cache_requests.inc(cache_namespace(key), "shared_hit")
+                cache[key], cache_expiry[key] = entry[0], entry[2]
+                results[key] = entry[0]
+    missing = [key for key in keys if key not in results]
+    if not missing:
+        return results
+
+    try:
+        with tracing.span("cache fetch_many", "cache", keys=len(keys), hits=len(results), misses=len(missing)):
+            fetched = fetch_many(missing)
+    except Exception as e:
+        logger.error(f"Error fetching data for {len(missing)} keys: {str(e)}")
+        fetched = {}
+
+    for key in missing:
+        namespace = cache_namespace(key)
+        if key in fetched:
+            cache_requests.inc(namespace, "miss")
+            if key in cache:
+                cache_evictions.inc(namespace)
+            results[key] = _store_fetched(key, fetched[key], now)
+        elif key in cache or key in shared:
+            logger.info(f"Using expired cache for {key}")
+            cache_requests.inc(namespace, "stale")
+            results[key] = cache[key] if key in cache else shared[key][0]
+        else:
+            cache_requests.inc(namespace, "miss")
+    return results
+
+
+# How to re-fetch a cache key without the request that first fetched it, by key
+# namespace: fetch(key) -> data, or fetch_many(keys) -> {key: data} for batch APIs.
+# Used to refresh expired entries restored from a snapshot (services/cache_snapshot.py)
+refreshers = {}
+
+
+def register_refresher(namespace, fetch=None, fetch_many=None):
+    refreshers[namespace] = (fetch, fetch_many)
+
+
+def refresh_cached(keys):
+    """Re-fetch expired cache entries in the background; returns how many were refreshed.
+
+    Entries another worker already refreshed are taken from the shared tier, and
+    keys whose namespace has no refresher are skipped.
+    """
+    now = time.time()
+    by_namespace = {}
+    refreshed = 0
+    for key in keys:
+        if cache_expiry.get(key, 0) > now:
+            # Already fetched again by a request
+            continue
+        shared = _shared_entry(key)
+        if shared is not None and shared[2] > now:
+            cache[key], cache_expiry[key] = shared[0], shared[2]
+            refreshed += 1
+        elif cache_namespace(key) in refreshers:
+            by_namespace.setdefault(cache_namespace(key), []).append(key)
+
+    for namespace, missing in by_namespace.items():
+        fetch, fetch_many = refreshers[namespace]
+        if fetch_many is not None:
+            try:
+                fetched = fetch_many(missing)
+            except Exception as e:
+                logger.warning(f"Could not refresh {len(missing)} {namespace} entries: {str(e)}")
+                continue
+        else:
+            fetched = {}
+            for key in missing:
+                try:
+                    fetched[key] = fetch(key)
+                except Exception as e:
+                    logger.warning(f"Could not refresh {key}: {str(e)}")
+        for key, data in fetched.items():
+            _store_fetched(key, data, time.time())
+            refreshed += 1
+    return refreshed
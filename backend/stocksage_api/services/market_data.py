@@ -0,0 +1,280 @@
+import logging
+from datetime import date, datetime, timedelta
+from typing import Dict, List, NamedTuple, Tuple
+
+import numpy as np
+# yfinance is imported where it is used to keep it off the startup path
+
+from .market_cache import get_cached_or_fetch, get_cached_or_fetch_many, register_refresher
+from .metrics import mock_fallbacks, track_upstream
+
+logger = logging.getLogger(__name__)
+
+# Mock data for fallback when API fails
+mock_stocks = [
+    {"symbol": "AAPL", "name": "Apple Inc.", "price": 175.34, "change": 2.34},
+    {"symbol": "MSFT", "name": "Microsoft Corporation", "price": 328.79, "change": -1.23},
+    {"symbol": "GOOGL", "name": "Alphabet Inc.", "price": 142.56, "change": 0.78},
+    {"symbol": "AMZN", "name": "Amazon.com, Inc.", "price": 178.12, "change": 3.45},
+    {"symbol": "TSLA", "name": "Tesla, Inc.", "price": 193.57, "change": -2.67},
+]
+
+# Company information mock data for fallback
+company_info = {
+    "AAPL": {
+        "symbol": "AAPL",
+        "name": "Apple Inc.",
+        "description": "Apple Inc. designs, manufactures, and markets smartphones, personal computers, tablets, wearables, and accessories worldwide. The company offers iPhone, a line of smartphones...",
+        "sector": "Technology",
+        "industry": "Consumer Electronics",
+        "employees": 154000,
+        "headquarters": "Cupertino, California",
+        "founded": 1976,
+        "ceo": "Tim Cook",
+        "website": "https://www.apple.com"
+    },
+    "MSFT": {
+        "symbol": "MSFT",
+        "name": "Microsoft Corporation",
+        "description": "Microsoft Corporation develops, licenses, and supports software, services, devices, and solutions worldwide. The company operates in three segments: Productivity and Business Processes, Intelligent Cloud, and More Personal Computing...",
+        "sector": "Technology",
+        "industry": "Software—Infrastructure",
+        "employees": 181000,
+        "headquarters": "Redmond, Washington",
+        "founded": 1975,
+        "ceo": "Satya Nadella",
+        "website": "https://www.microsoft.com"
+    },
+    "GOOGL": {
+        "symbol": "GOOGL",
+        "name": "Alphabet Inc.",
+        "description": "Alphabet Inc. provides various products and platforms in the United States, Europe, the Middle East, Africa, the Asia-Pacific, Canada, and Latin America. It operates through Google Services, Google Cloud, and Other Bets segments...",
+        "sector": "Technology",
+        "industry": "Internet Content & Information",
+        "employees": 156000,
+        "headquarters": "Mountain View, California",
+        "founded": 1998,
+        "ceo": "Sundar Pichai",
+        "website": "https://www.abc.xyz"
+    },
+    "AMZN": {
+        "symbol": "AMZN",
+        "name": "Amazon.com, Inc.",
+        "description": "Amazon.com, Inc. engages in the retail sale of consumer products and subscriptions through online and physical stores in North America and internationally. It operates through three segments: North America, International, and Amazon Web Services (AWS)...",
+        "sector": "Consumer Cyclical",
+        "industry": "Internet Retail",
+        "employees": 1540000,
+        "headquarters": "Seattle, Washington",
+        "founded": 1994,
+        "ceo": "Andy Jassy",
+        "website": "https://www.amazon.com"
+    },
+    "TSLA": {
+        "symbol": "TSLA",
+        "name": "Tesla, Inc.",
+        "description": "Tesla, Inc. designs, develops, manufactures, leases, and sells electric vehicles, and energy generation and storage systems in the United States, China, and internationally...",
+        "sector": "Consumer Cyclical",
+        "industry": "Auto Manufacturers",
+        "employees": 127855,
+        "headquarters": "Austin, Texas",
+        "founded": 2003,
+        "ceo": "Elon Musk",
+        "website": "https://www.tesla.com"
+    }
+}
+
+
+def fetch_stock_data(symbol: str):
+    """Fetch real stock data from yfinance"""
+    try:
+        import yfinance as yf
+        ticker = yf.Ticker(symbol)
+        with track_upstream("yfinance", "info"):
+            info = ticker.info
+
+        # Check if essential data is available
+        if not info.get("shortName") and not info.get("regularMarketPrice"):
+            logger.warning(f"Incomplete data received for {symbol}")
+            raise ValueError(f"Incomplete data for {symbol}")
+
+        return {
+            "symbol": symbol,
+            "name": info.get("shortName", "Unknown"),
+            "price": info.get("regularMarketPrice", info.get("currentPrice", 0)),
+            "change": info.get("regularMarketChangePercent", 0),
+            "volume": info.get("regularMarketVolume", 0),
+            "market_cap": info.get("marketCap", 0),
+            "pe_ratio": info.get("trailingPE", 0),
+            "dividend_yield": info.get("dividendYield", 0) * 100 if info.get("dividendYield") else 0
+        }
+    except Exception as e:
+        logger.error(f"Error fetching data for {symbol}: {str(e)}")
+        raise Exception(f"Could not fetch data for {symbol}: {str(e)}")
+
+
+def fetch_history_data(symbol: str, days: int):
+    """Fetch daily closing prices and volumes for the last `days` days from yfinance"""
+    import yfinance as yf
+    ticker = yf.Ticker(symbol)
+    end_date = datetime.now()
+    start_date = end_date - timedelta(days=days)
+
+    # Get historical data
+    with track_upstream("yfinance", "history"):
+        history = ticker.history(start=start_date, end=end_date)
+
+    # Format the response
+    result = []
+    for index, row in history.iterrows():
+        result.append({
+            "date": index.strftime("%Y-%m-%d"),
+            "price": round(float(row["Close"]), 2),
+            "volume": int(row["Volume"])
+        })
+
+    return result
+
+
+def fetch_company_data(symbol: str):
+    """Fetch company details from yfinance"""
+    import yfinance as yf
+    ticker = yf.Ticker(symbol)
+    with track_upstream("yfinance", "info"):
+        info = ticker.info
+
+    if not info or "shortName" not in info:
+        raise ValueError(f"No company info available for {symbol}")
+
+    return {
+        "symbol": symbol,
+        "name": info.get("shortName", "Unknown"),
+        "description": info.get("longBusinessSummary", "No description available"),
+        "sector": info.get("sector", "Unknown"),
+        "industry": info.get("industry", "Unknown"),
+        "employees": info.get("fullTimeEmployees", 0),
+        "headquarters": f"{info.get('city', 'Unknown')}, {info.get('state', '')}",
+        "founded": info.get("startDate", "Unknown"),
+        "ceo": info.get("companyOfficers", [{}])[0].get("name", "Unknown") if info.get("companyOfficers") else "Unknown",
+        "website": info.get("website", "")
+    }
+
+
+class PriceMatrix(NamedTuple):
+    """Daily closing prices aligned on a common date axis"""
+    dates: np.ndarray    # datetime64[D], shape (n_dates,)
+    symbols: List[str]
+    closes: np.ndarray   # float64, shape (n_dates, n_symbols)
+
+
+def _download_close_history(symbol: str, start: date, end: date) -> Tuple[np.ndarray, np.ndarray]:
+    import yfinance as yf
+    with track_upstream("yfinance", "history"):
+        history = yf.Ticker(symbol).history(start=start.isoformat(), end=end.isoformat())
+    if history.empty:
+        raise ValueError(f"No price history available for {symbol}")
+    dates = np.asarray(history.index.strftime("%Y-%m-%d"), dtype="datetime64[D]")
+    closes = history["Close"].to_numpy(dtype=np.float64)
+    return dates, closes
+
+
+def fetch_close_history(symbol: str, start: date, end: date) -> Tuple[np.ndarray, np.ndarray]:
+    """Fetch daily closing prices for one symbol as (dates, closes) arrays, using the cache"""
+    symbol = symbol.upper()
+    return get_cached_or_fetch(
+        f"closes:{symbol}:{start.isoformat()}:{end.isoformat()}",
+        lambda: _download_close_history(symbol, start, end),
+    )
+
+
+def forward_fill(values: np.ndarray) -> np.ndarray:
+    """Forward-fill NaNs down each column; leading NaNs are left in place"""
+    rows = np.arange(values.shape[0])[:, None]
+    last_valid = np.where(np.isnan(values), 0, rows)
+    np.maximum.accumulate(last_valid, axis=0, out=last_valid)
+    return values[last_valid, np.arange(values.shape[1])]
+
+
+def align_histories(histories: Dict[str, Tuple[np.ndarray, np.ndarray]]) -> PriceMatrix:
+    """Align per-symbol histories on the union of their dates.
+
+    Gaps are forward-filled and dates before every symbol has a price are dropped.
+    """
+    symbols = list(histories)
+    all_dates = np.unique(np.concatenate([dates for dates, _ in histories.values()]))
+    closes = np.full((len(all_dates), len(symbols)), np.nan)
+    for column, (dates, values) in enumerate(histories.values()):
+        closes[np.searchsorted(all_dates, dates), column] = values
+
+    closes = forward_fill(closes)
+    complete = ~np.isnan(closes).any(axis=1)
+    if not complete.any():
+        raise ValueError("Price histories do not overlap")
+    first = int(np.argmax(complete))
+    return PriceMatrix(all_dates[first:], symbols, closes[first:])
+
+
+def load_price_matrix(symbols: List[str], start: date, end: date) -> PriceMatrix:
+    """Load and align closing prices for several symbols over a date range"""
+    histories = {}
+    missing = []
+    for symbol in symbols:
+        try:
+            histories[symbol.upper()] = fetch_close_history(symbol, start, end)
+        except Exception as e:
+            logger.warning(f"No price history for {symbol}: {str(e)}")
+            missing.append(symbol.upper())
+
+    if missing:
+        raise ValueError(f"No price history available for: {', '.join(missing)}")
+
+    return align_histories(histories)
+
+
+def _download_last_closes(keys: List[str]) -> Dict[str, float]:
+    """Fetch the latest close for every `price:{SYMBOL}` key with one yfinance request"""
+    symbols = [key.split(":", 1)[1] for key in keys]
+    import yfinance as yf
+    with track_upstream("yfinance", "download"):
+        data = yf.download(symbols, period="5d", progress=False, auto_adjust=True)
+    if data.empty:
+        return {}
+    last_closes = data["Close"].ffill().iloc[-1]
+    return {
+        f"price:{symbol}": float(last_closes[symbol])
+        for symbol in symbols
+        if symbol in last_closes and not np.isnan(last_closes[symbol])
+    }
+
+
+def get_latest_prices(symbols: List[str], allow_mock: bool = True) -> Dict[str, float]:
+    """Latest prices for several symbols from one batch lookup against the quote cache.
+
+    Symbols without a live or cached price fall back to mock data unless
+    allow_mock is False (trades must never execute at a made-up price); symbols
+    with no price at all are left out of the result.
+    """
+    symbols = [symbol.upper() for symbol in symbols]
+    cached = get_cached_or_fetch_many([f"price:{symbol}" for symbol in symbols], _download_last_closes)
+
+    prices = {}
+    mock_prices = {stock["symbol"]: stock["price"] for stock in mock_stocks}
+    for symbol in symbols:
+        price = cached.get(f"price:{symbol}")
+        if not price and allow_mock and mock_prices.get(symbol):
+            mock_fallbacks.inc("prices")
+            price = mock_prices[symbol]
+        if price:
+            prices[symbol] = float(price)
+    return prices
+
+
+def _refresh_close_history(key: str) -> Tuple[np.ndarray, np.ndarray]:
+    _, symbol, start, end = key.split(":")
+    return _download_close_history(symbol, date.fromisoformat(start), date.fromisoformat(end))
+
+
+register_refresher("stock", fetch=lambda key: fetch_stock_data(key.split(":")[1]))
+register_refresher("history", fetch=lambda key: fetch_history_data(key.split(":")[1], int(key.split(":")[2])))
+register_refresher("company", fetch=lambda key: fetch_company_data(key.split(":")[1]))
+register_refresher("closes", fetch=_refresh_close_history)
+register_refresher("price", fetch_many=_download_last_closes)
@@ -0,0 +1,743 @@
+"""In-process stand-in for the Firebase Realtime Database and Authentication.
+
+Selected with FIREBASE_BACKEND=memory, it lets the whole API, the test suite
+and benchmarks run without credentials or network access. MemoryDatabase
+keeps the data tree and implements get/set/update/push/delete, shallow and
+ordered queries (rejecting unindexed child orderings the way the real database
+does), multi-path updates and streaming callbacks with the same event
+shapes Pyrebase delivers. Thin facades expose it through the Pyrebase, Admin
+SDK and RTDB REST interfaces FirebaseService already uses, so service code runs
+unchanged. RTDB_LATENCY_MS and RTDB_LATENCY_JITTER_MS add a delay to every
+database operation to simulate a remote database.
+
+Tokens issued here are unsigned and only meant for local use.
+"""
+import asyncio
+import base64
+import copy
+import hashlib
+import hmac
+import json
+import logging
+import os
+import random
+import secrets
+import threading
+import time
+import types
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+from firebase_admin import auth
+
+from ..config.database_indexes import is_indexed
+
+logger = logging.getLogger(__name__)
+
+RTDB_LATENCY_MS = float(os.getenv("RTDB_LATENCY_MS", 0))
+RTDB_LATENCY_JITTER_MS = float(os.getenv("RTDB_LATENCY_JITTER_MS", 0))
+
+PUSH_CHARS = "-0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz"
+MEMORY_DATABASE_URL = "http://memory.localhost"
+TOKEN_PREFIX = "memory."
+
+
+def _parts(path: str) -> List[str]:
+    return [part for part in (path or "").split("/") if part]
+
+
+def _clean(value: Any) -> Any:
+    """Copy a value the way the database stores it: no nulls and no empty objects"""
+    if isinstance(value, dict):
+        cleaned = {str(key): _clean(child) for key, child in value.items()}
+        cleaned = {key: child for key, child in cleaned.items() if child is not None}
+        return cleaned or None
+    return copy.deepcopy(value)
+
+
+def _key_order(key: str) -> Tuple:
+    # Integer-like keys sort numerically before all other keys
+    return (0, int(key), "") if key.isdigit() else (1, 0, key)
+
+
+def _value_order(value: Any) -> Tuple:
+    # null < false < true < numbers < strings < objects
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (1, int(value))
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, str):
+        return (3, value)
+    return (4, 0)
+
+
+class MemoryStream:
+    """Handle for a streaming listener (mirrors Pyrebase's Stream.close)"""
+
+    def __init__(self, database: "MemoryDatabase", parts: List[str], callback: Callable[[Dict[str, Any]], None]):
+        self.database = database
+        self.parts = parts
+        self.callback = callback
+        self.closed = False
+
+    def close(self) -> None:
+        self.closed = True
+        self.database._remove_stream(self)
+
+
+class MemoryDatabase:
+    """Thread-safe in-memory data tree with Realtime Database semantics"""
+
+    def __init__(
+        self,
+        latency_ms: float = RTDB_LATENCY_MS,
+        jitter_ms: float = RTDB_LATENCY_JITTER_MS,
+        indexes: Optional[Dict[str, List[str]]] = None
+    ):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        # With an index table, ordering by an unlisted child fails like it does in RTDB
+        self.indexes = indexes
+        self.operations = 0
+        self._root: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+        self._streams: List[MemoryStream] = []
+        self._last_push_time = 0
+        self._last_push_random: List[int] = []
+
+    # Latency injection
+    def delay(self) -> float:
+        """Simulated round-trip time for one operation, in seconds"""
+        return self.latency + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+
+    def wait(self) -> None:
+        delay = self.delay()
+        if delay:
+            time.sleep(delay)
+
+    # Reads
+    def _node(self, parts: List[str]) -> Any:
+        node = self._root
+        for part in parts:
+            if not isinstance(node, dict) or part not in node:
+                return None
+            node = node[part]
+        return node
+
+    def get(self, path: str, shallow: bool = False) -> Any:
+        """Value at path (None when absent); shallow returns only child keys"""
+        with self._lock:
+            self.operations += 1
+            value = self._node(_parts(path))
+            if shallow and isinstance(value, dict):
+                return {key: True for key in value}
+            return copy.deepcopy(value) if value != {} else None
+
+    def query(
+        self,
+        path: str,
+        order_by: str = "$key",
+        start_at: Any = None,
+        end_at: Any = None,
+        limit_to_first: Optional[int] = None,
+        limit_to_last: Optional[int] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Ordered, filtered and limited children of path"""
+        if order_by not in ("$key", "$value") and self.indexes is not None \
+                and not is_indexed(path, order_by, self.indexes):
+            raise ValueError(f'Index not defined, add ".indexOn": "{order_by}", for path "/{path.strip("/")}", to the rules')
+        with self._lock:
+            self.operations += 1
+            node = self._node(_parts(path))
+            items = list(copy.deepcopy(node).items()) if isinstance(node, dict) else []
+
+        if order_by == "$key":
+            order = lambda item: _key_order(item[0])
+            bound = lambda value: _key_order(str(value))
+        elif order_by == "$value":
+            order = lambda item: (_value_order(item[1]), _key_order(item[0]))
+            bound = lambda value: (_value_order(value),)
+        else:
+            child = lambda item: item[1].get(order_by) if isinstance(item[1], dict) else None
+            order = lambda item: (_value_order(child(item)), _key_order(item[0]))
+            bound = lambda value: (_value_order(value),)
+
+        items.sort(key=order)
+        if start_at is not None:
+            items = [item for item in items if order(item)[:len(bound(start_at))] >= bound(start_at)]
+        if end_at is not None:
+            items = [item for item in items if order(item)[:len(bound(end_at))] <= bound(end_at)]
+        if limit_to_first is not None:
+            items = items[:limit_to_first]
+        if limit_to_last is not None:
+            items = items[-limit_to_last:] if limit_to_last else []
+        return dict(items) or None
+
+    # Writes
+    def _write(self, parts: List[str], value: Any) -> None:
+        value = _clean(value)
+        if not parts:
+            self._root = value if isinstance(value, dict) else {}
+            return
+        node, trail = self._root, []
+        for part in parts[:-1]:
+            child = node.get(part)
+            if not isinstance(child, dict):
+                if value is None:
+                    return
+                child = node[part] = {}
+            trail.append((node, part))
+            node = child
+        if value is None:
+            node.pop(parts[-1], None)
+        else:
+            node[parts[-1]] = value
+        # Parents left without children disappear, as in the real database
+        for parent, key in reversed(trail):
+            if parent[key]:
+                break
+            del parent[key]
+
+    def set(self, path: str, value: Any) -> None:
+        """Replace the value at path (None deletes it)"""
+        parts = _parts(path)
+        with self._lock:
+            self.operations += 1
+            self._write(parts, value)
+            events = self._events_for_set(parts, value)
+        self._dispatch(events)
+
+    def update(self, path: str, data: Dict[str, Any]) -> None:
+        """Write each child of data below path atomically; keys may be nested paths"""
+        parts = _parts(path)
+        writes = [(parts + _parts(key), value) for key, value in data.items()]
+        with self._lock:
+            self.operations += 1
+            for write_parts, value in writes:
+                self._write(write_parts, value)
+            events = self._events_for_update(parts, data, writes)
+        self._dispatch(events)
+
+    def transaction(self, path: str, update: Callable[[Any], Any]) -> Any:
+        """Replace the value at path with update(value) atomically; exceptions from update abort it"""
+        parts = _parts(path)
+        with self._lock:
+            self.operations += 1
+            value = update(copy.deepcopy(self._node(parts)))
+            self._write(parts, value)
+            events = self._events_for_set(parts, value)
+        self._dispatch(events)
+        return value
+
+    def push(self, path: str, value: Any) -> str:
+        """Add value under a generated, chronologically ordered key"""
+        key = self.generate_key()
+        self.set(f"{path}/{key}", value)
+        return key
+
+    def delete(self, path: str) -> None:
+        self.set(path, None)
+
+    def generate_key(self) -> str:
+        """Push key: 8 characters of timestamp then 12 random characters, incremented on ties"""
+        now = int(time.time() * 1000)
+        with self._lock:
+            if now == self._last_push_time and self._last_push_random:
+                for i in range(11, -1, -1):
+                    if self._last_push_random[i] != 63:
+                        self._last_push_random[i] += 1
+                        break
+                    self._last_push_random[i] = 0
+            else:
+                self._last_push_random = [random.randrange(64) for _ in range(12)]
+            self._last_push_time = now
+            random_part = "".join(PUSH_CHARS[i] for i in self._last_push_random)
+        time_part = ""
+        for _ in range(8):
+            time_part = PUSH_CHARS[now % 64] + time_part
+            now //= 64
+        return time_part + random_part
+
+    # Streaming
+    def stream(self, path: str, callback: Callable[[Dict[str, Any]], None]) -> MemoryStream:
+        """Call callback with the current value, then with every change below path"""
+        stream = MemoryStream(self, _parts(path), callback)
+        with self._lock:
+            self._streams.append(stream)
+            initial = copy.deepcopy(self._node(stream.parts))
+        self._dispatch([(stream, {"event": "put", "path": "/", "data": initial})])
+        return stream
+
+    def _remove_stream(self, stream: MemoryStream) -> None:
+        with self._lock:
+            if stream in self._streams:
+                self._streams.remove(stream)
+
+    @staticmethod
+    def _relative(parts: List[str], root: List[str]) -> str:
+        return "/" + "/".join(parts[len(root):])
+
+    def _events_for_set(self, parts: List[str], value: Any) -> List[Tuple[MemoryStream, Dict[str, Any]]]:
+        events = []
+        for stream in self._streams:
+            if parts[:len(stream.parts)] == stream.parts:
+                data = _clean(value)
+                events.append((stream, {"event": "put", "path": self._relative(parts, stream.parts), "data": data}))
+            elif stream.parts[:len(parts)] == parts:
+                data = copy.deepcopy(self._node(stream.parts))
+                events.append((stream, {"event": "put", "path": "/", "data": data}))
+        return events
+
+    def _events_for_update(
+        self,
+        parts: List[str],
+        data: Dict[str, Any],
+        writes: List[Tuple[List[str], Any]]
+    ) -> List[Tuple[MemoryStream, Dict[str, Any]]]:
+        events = []
+        for stream in self._streams:
+            if parts[:len(stream.parts)] == stream.parts:
+                # An update at or below the listener arrives as one patch
+                events.append((stream, {
+                    "event": "patch",
+                    "path": self._relative(parts, stream.parts),
+                    "data": {key: _clean(value) for key, value in data.items()},
+                }))
+                continue
+            for write_parts, value in writes:
+                if write_parts[:len(stream.parts)] == stream.parts:
+                    message = {"event": "put", "path": self._relative(write_parts, stream.parts), "data": _clean(value)}
+                    events.append((stream, message))
+                elif stream.parts[:len(write_parts)] == write_parts:
+                    data_at_root = copy.deepcopy(self._node(stream.parts))
+                    events.append((stream, {"event": "put", "path": "/", "data": data_at_root}))
+        return events
+
+    @staticmethod
+    def _dispatch(events: List[Tuple[MemoryStream, Dict[str, Any]]]) -> None:
+        # Delivered outside the lock so callbacks can read the database
+        for stream, message in events:
+            if stream.closed:
+                continue
+            try:
+                stream.callback(message)
+            except Exception as e:
+                logger.error(f"Stream callback failed: {str(e)}")
+
+    # REST interface for the async service
+    async def handle_request(self, request: httpx.Request) -> httpx.Response:
+        """Serve an RTDB REST request (path.json with query parameters)"""
+        path = request.url.path
+        if not path.endswith(".json"):
+            return httpx.Response(404, json={"error": "Not found"})
+        path = path[:-len(".json")]
+        params = request.url.params
+        body = json.loads(request.content) if request.content else None
+
+        delay = self.delay()
+        if delay:
+            await asyncio.sleep(delay)
+
+        if request.method == "GET":
+            if "orderBy" in params:
+                arguments = {
+                    name: json.loads(params[param]) for name, param in (
+                        ("start_at", "startAt"), ("end_at", "endAt"),
+                        ("limit_to_first", "limitToFirst"), ("limit_to_last", "limitToLast"),
+                    ) if param in params
+                }
+                try:
+                    result = self.query(path, order_by=json.loads(params["orderBy"]), **arguments)
+                except ValueError as e:
+                    return httpx.Response(400, json={"error": str(e)})
+            else:
+                result = self.get(path, shallow=params.get("shallow") == "true")
+        elif request.method == "PUT":
+            self.set(path, body)
+            result = body
+        elif request.method == "POST":
+            result = {"name": self.push(path, body)}
+        elif request.method == "PATCH":
+            self.update(path, body or {})
+            result = body
+        elif request.method == "DELETE":
+            self.delete(path)
+            result = None
+        else:
+            return httpx.Response(405, json={"error": "Method not allowed"})
+        # json=None would send an empty body; the database answers with a literal null
+        return httpx.Response(200, content=json.dumps(result).encode("utf-8"),
+                              headers={"Content-Type": "application/json"})
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle_request)
+
+
+# Pyrebase-style facade
+class MemoryResponse:
+    def __init__(self, value: Any):
+        self.value = value
+
+    def val(self) -> Any:
+        return self.value
+
+
+class MemoryQuery:
+    """Stand-in for Pyrebase's Database query builder, with the same shared state.
+
+    Like Pyrebase, child() and the query methods change this builder and return it,
+    and sending a request clears its path and query. A builder must therefore not
+    be shared between threads, which the stand-in lets tests catch.
+    """
+
+    def __init__(self, database: MemoryDatabase):
+        self.database = database
+        self.path = ""
+        self.build_query: Dict[str, Any] = {}
+
+    def child(self, *args: str) -> "MemoryQuery":
+        new_path = "/".join(str(arg) for arg in args)
+        self.path = f"{self.path}/{new_path}" if self.path else new_path.lstrip("/")
+        return self
+
+    def order_by_key(self) -> "MemoryQuery":
+        self.build_query["order_by"] = "$key"
+        return self
+
+    def order_by_value(self) -> "MemoryQuery":
+        self.build_query["order_by"] = "$value"
+        return self
+
+    def order_by_child(self, child: str) -> "MemoryQuery":
+        self.build_query["order_by"] = child
+        return self
+
+    def start_at(self, value: Any) -> "MemoryQuery":
+        self.build_query["start_at"] = value
+        return self
+
+    def end_at(self, value: Any) -> "MemoryQuery":
+        self.build_query["end_at"] = value
+        return self
+
+    def limit_to_first(self, limit: int) -> "MemoryQuery":
+        self.build_query["limit_to_first"] = limit
+        return self
+
+    def limit_to_last(self, limit: int) -> "MemoryQuery":
+        self.build_query["limit_to_last"] = limit
+        return self
+
+    def shallow(self) -> "MemoryQuery":
+        self.build_query["shallow"] = True
+        return self
+
+    def _request(self) -> Tuple[str, Dict[str, Any]]:
+        # Pyrebase reads and clears the builder when it sends, before waiting for the response
+        path, query = "/".join(_parts(self.path)), self.build_query
+        self.path, self.build_query = "", {}
+        self.database.wait()
+        return path, query
+
+    def get(self) -> MemoryResponse:
+        path, query = self._request()
+        if query.pop("shallow", False):
+            return MemoryResponse(self.database.get(path, shallow=True))
+        if query:
+            return MemoryResponse(self.database.query(path, **query))
+        return MemoryResponse(self.database.get(path))
+
+    def set(self, data: Any) -> Any:
+        path, _ = self._request()
+        self.database.set(path, data)
+        return data
+
+    def push(self, data: Any) -> Dict[str, str]:
+        path, _ = self._request()
+        return {"name": self.database.push(path, data)}
+
+    def update(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        path, _ = self._request()
+        self.database.update(path, data)
+        return data
+
+    def remove(self) -> None:
+        path, _ = self._request()
+        self.database.delete(path)
+
+    def stream(self, callback: Callable[[Dict[str, Any]], None]) -> MemoryStream:
+        path, self.path, self.build_query = "/".join(_parts(self.path)), "", {}
+        return self.database.stream(path, callback)
+
+    def generate_key(self) -> str:
+        return self.database.generate_key()
+
+
+# Admin SDK-style facade
+class MemoryReference:
+    def __init__(self, database: MemoryDatabase, path: str):
+        self.database = database
+        self.path = path
+
+    def get(self) -> Any:
+        self.database.wait()
+        return self.database.get(self.path)
+
+    def set(self, value: Any) -> None:
+        self.database.wait()
+        self.database.set(self.path, value)
+
+    def update(self, value: Dict[str, Any]) -> None:
+        self.database.wait()
+        self.database.update(self.path, value)
+
+    def delete(self) -> None:
+        self.database.wait()
+        self.database.delete(self.path)
+
+    def transaction(self, transaction_update: Callable[[Any], Any]) -> Any:
+        self.database.wait()
+        return self.database.transaction(self.path, transaction_update)
+
+
+class MemoryAdminDatabase:
+    """Stand-in for the firebase_admin.db module"""
+
+    def __init__(self, database: MemoryDatabase):
+        self.database = database
+
+    def reference(self, path: str = "/", app: Any = None, url: Optional[str] = None) -> MemoryReference:
+        return MemoryReference(self.database, path)
+
+
+# Authentication
+class MemoryUserRecord:
+    """Subset of firebase_admin.auth.UserRecord used by the API"""
+
+    def __init__(self, uid: str, email: Optional[str], password: Optional[str], display_name: Optional[str] = None):
+        now = int(time.time() * 1000)
+        self.uid = uid
+        self.email = email
+        self.password = password
+        self.display_name = display_name
+        self.photo_url = None
+        self.phone_number = None
+        self.disabled = False
+        self.email_verified = False
+        self.custom_claims: Optional[Dict[str, Any]] = None
+        self.tokens_valid_after_timestamp = now // 1000 * 1000
+        self.user_metadata = types.SimpleNamespace(creation_timestamp=now, last_sign_in_timestamp=None)
+        # Set instead of password for users imported with a PBKDF2_SHA256 hash
+        self.password_hash: Optional[bytes] = None
+        self.password_salt: Optional[bytes] = None
+        self.hash_rounds = 0
+
+    def check_password(self, password: str) -> bool:
+        if self.password_hash is not None:
+            candidate = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), self.password_salt or b"", self.hash_rounds)
+            return hmac.compare_digest(candidate, self.password_hash)
+        return self.password is not None and self.password == password
+
+
+class MemoryAccessToken(types.SimpleNamespace):
+    pass
+
+
+class MemoryCredential:
+    """Credential whose access tokens the in-memory REST transport accepts"""
+
+    def get_access_token(self) -> MemoryAccessToken:
+        return MemoryAccessToken(access_token="memory-access-token", expiry=datetime.now() + timedelta(hours=1))
+
+
+class MemoryApp:
+    def __init__(self, project_id: Optional[str]):
+        self.name = "[MEMORY]"
+        self.project_id = project_id or "stocksage-memory"
+        self.credential = MemoryCredential()
+
+
+class MemoryAuth:
+    """Stand-in for the firebase_admin.auth module with unsigned local tokens"""
+
+    UPDATABLE_FIELDS = ("email", "password", "display_name", "photo_url", "phone_number", "disabled", "email_verified")
+
+    def __init__(self, project_id: Optional[str] = None):
+        self.project_id = project_id or "stocksage-memory"
+        self._users: Dict[str, MemoryUserRecord] = {}
+        self._refresh_tokens: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    # Users
+    def create_user(self, email: Optional[str] = None, password: Optional[str] = None,
+                    display_name: Optional[str] = None, uid: Optional[str] = None, **kwargs) -> MemoryUserRecord:
+        with self._lock:
+            if email and any(user.email == email for user in self._users.values()):
+                raise auth.EmailAlreadyExistsError(f"The user with the provided email already exists ({email}).", None, None)
+            user = MemoryUserRecord(uid or secrets.token_hex(14), email, password, display_name)
+            for field, value in kwargs.items():
+                if field in self.UPDATABLE_FIELDS:
+                    setattr(user, field, value)
+            self._users[user.uid] = user
+            return user
+
+    def get_user(self, uid: str, app: Any = None) -> MemoryUserRecord:
+        user = self._users.get(uid)
+        if user is None:
+            raise auth.UserNotFoundError(f"No user record found for the provided user ID: {uid}.")
+        return user
+
+    def get_user_by_email(self, email: str, app: Any = None) -> MemoryUserRecord:
+        for user in list(self._users.values()):
+            if user.email == email:
+                return user
+        raise auth.UserNotFoundError(f"No user record found for the provided email: {email}.")
+
+    def update_user(self, uid: str, **kwargs) -> MemoryUserRecord:
+        user = self.get_user(uid)
+        for field, value in kwargs.items():
+            if field in self.UPDATABLE_FIELDS:
+                setattr(user, field, value)
+        return user
+
+    def delete_user(self, uid: str, app: Any = None) -> None:
+        with self._lock:
+            if self._users.pop(uid, None) is None:
+                raise auth.UserNotFoundError(f"No user record found for the provided user ID: {uid}.")
+
+    # Batch operations (same per-call limits and result shapes as the Admin SDK)
+    def get_users(self, identifiers: List[Any], app: Any = None) -> types.SimpleNamespace:
+        if len(identifiers) > 100:
+            raise ValueError("`identifiers` parameter must have <= 100 entries.")
+        users, not_found = [], []
+        for identifier in identifiers:
+            try:
+                if hasattr(identifier, "uid"):
+                    user = self.get_user(identifier.uid)
+                else:
+                    user = self.get_user_by_email(identifier.email)
+            except auth.UserNotFoundError:
+                not_found.append(identifier)
+                continue
+            if user not in users:
+                users.append(user)
+        return types.SimpleNamespace(users=users, not_found=not_found)
+
+    def import_users(self, users: List[Any], hash_alg: Any = None, app: Any = None) -> types.SimpleNamespace:
+        if len(users) > 1000:
+            raise ValueError("Users list must not have more than 1000 elements.")
+        settings = hash_alg.to_dict() if hash_alg is not None else {}
+        if any(record.password_hash for record in users) and settings.get("hashAlgorithm") != "PBKDF2_SHA256":
+            raise ValueError("The in-memory backend only imports PBKDF2_SHA256 password hashes.")
+        errors = []
+        with self._lock:
+            for index, record in enumerate(users):
+                owner = next((u for u in self._users.values() if record.email and u.email == record.email), None)
+                if owner is not None and owner.uid != record.uid:
+                    errors.append(types.SimpleNamespace(index=index, reason="The email address is already in use by another account."))
+                    continue
+                user = MemoryUserRecord(record.uid, record.email, None, record.display_name)
+                user.disabled = bool(record.disabled)
+                user.email_verified = bool(record.email_verified)
+                user.custom_claims = record.custom_claims
+                if record.password_hash:
+                    user.password_hash = record.password_hash
+                    user.password_salt = record.password_salt
+                    user.hash_rounds = settings.get("rounds", 0)
+                self._users[user.uid] = user
+        return types.SimpleNamespace(success_count=len(users) - len(errors), failure_count=len(errors), errors=errors)
+
+    def delete_users(self, uids: List[str], app: Any = None) -> types.SimpleNamespace:
+        if len(uids) > 1000:
+            raise ValueError("`uids` parameter must have <= 1000 entries.")
+        with self._lock:
+            for uid in uids:
+                # Like the Admin SDK, deleting a missing user counts as a success
+                self._users.pop(uid, None)
+        return types.SimpleNamespace(success_count=len(uids), failure_count=0, errors=[])
+
+    def set_custom_user_claims(self, uid: str, custom_claims: Optional[Dict[str, Any]], app: Any = None) -> None:
+        self.get_user(uid).custom_claims = custom_claims
+
+    def revoke_refresh_tokens(self, uid: str, app: Any = None) -> None:
+        # Tokens issued in the same second as the revocation are revoked too
+        self.get_user(uid).tokens_valid_after_timestamp = (int(time.time()) + 1) * 1000
+
+    # Tokens
+    def issue_id_token(self, uid: str, expires_in: int = 3600) -> str:
+        """Unsigned ID token for a local user"""
+        user = self.get_user(uid)
+        now = int(time.time())
+        claims = {
+            "iss": f"https://securetoken.google.com/{self.project_id}",
+            "aud": self.project_id,
+            "auth_time": now,
+            "iat": now,
+            "exp": now + expires_in,
+            "sub": uid,
+            "user_id": uid,
+            "uid": uid,
+            "email": user.email,
+            **(user.custom_claims or {}),
+        }
+        payload = base64.urlsafe_b64encode(json.dumps(claims).encode("utf-8")).decode("ascii")
+        return TOKEN_PREFIX + payload
+
+    def verify_id_token(self, id_token: str, app: Any = None, check_revoked: bool = False,
+                        clock_skew_seconds: int = 0) -> Dict[str, Any]:
+        if not isinstance(id_token, str) or not id_token.startswith(TOKEN_PREFIX):
+            raise auth.InvalidIdTokenError("Token was not issued by the in-memory backend")
+        try:
+            claims = json.loads(base64.urlsafe_b64decode(id_token[len(TOKEN_PREFIX):].encode("ascii")))
+        except ValueError as e:
+            raise auth.InvalidIdTokenError(f"Malformed token: {str(e)}")
+        if claims["exp"] + clock_skew_seconds < time.time():
+            raise auth.ExpiredIdTokenError("Token expired", None)
+        if check_revoked:
+            user = self.get_user(claims["uid"])
+            if user.disabled:
+                raise auth.UserDisabledError("The user record is disabled.")
+            if claims["iat"] * 1000 < user.tokens_valid_after_timestamp:
+                raise auth.RevokedIdTokenError("The Firebase ID token has been revoked.")
+        return claims
+
+    # Sign-in (Pyrebase auth API shapes)
+    def sign_in_with_email_and_password(self, email: str, password: str) -> Dict[str, Any]:
+        try:
+            user = self.get_user_by_email(email)
+        except auth.UserNotFoundError:
+            raise ValueError("EMAIL_NOT_FOUND")
+        if not user.check_password(password):
+            raise ValueError("INVALID_PASSWORD")
+        user.user_metadata.last_sign_in_timestamp = int(time.time() * 1000)
+        refresh_token = secrets.token_urlsafe(24)
+        self._refresh_tokens[refresh_token] = user.uid
+        return {
+            "localId": user.uid,
+            "email": user.email,
+            "displayName": user.display_name or "",
+            "idToken": self.issue_id_token(user.uid),
+            "refreshToken": refresh_token,
+            "expiresIn": "3600",
+            "registered": True,
+        }
+
+    def get_account_info(self, id_token: str) -> Dict[str, Any]:
+        user = self.get_user(self.verify_id_token(id_token)["uid"])
+        return {"users": [{
+            "localId": user.uid,
+            "email": user.email,
+            "displayName": user.display_name,
+            "emailVerified": user.email_verified,
+            "disabled": user.disabled,
+            "createdAt": str(user.user_metadata.creation_timestamp),
+        }]}
+
+    def refresh(self, refresh_token: str) -> Dict[str, Any]:
+        uid = self._refresh_tokens.get(refresh_token)
+        if uid is None:
+            raise ValueError("INVALID_REFRESH_TOKEN")
+        return {"userId": uid, "idToken": self.issue_id_token(uid), "refreshToken": refresh_token}
@@ -0,0 +1,277 @@
+"""In-process metrics rendered in the Prometheus text exposition format.
+
+Instrumentation sits on every request, so it has to stay cheap:
+
+- a labelled series is created once, on first use, and recording into it is a dict
+  lookup plus integer additions; nothing takes a lock
+- histograms preallocate their bucket counts and find the bucket with bisect
+- values held elsewhere (cache sizes, hit counters of the profile and token
+  caches) are read by collector callbacks only when /metrics is scraped
+
+Recording from the event loop is exact. An increment from a worker thread can
+very rarely be lost when two threads update the same series at once, which is
+acceptable for monitoring and avoids a lock on the hot path.
+"""
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from . import profiling, tracing
+
+# Latency buckets in seconds, from cache hits to slow upstream calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Monotonic count per label set"""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+                for labels, value in list(self._values.items())]
+
+
+class Gauge(Counter):
+    """Value that goes up and down"""
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[labels] = value
+
+
+class _HistogramSeries:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.total = 0.0
+        self.count = 0
+
+
+class Histogram(_Metric):
+    """Distribution of observed values over fixed, preallocated buckets"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelValues, _HistogramSeries] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            # One extra slot for values above the largest bound (the +Inf bucket)
+            series = self._series.setdefault(labels, _HistogramSeries(len(self.buckets) + 1))
+        series.counts[bisect_left(self.buckets, value)] += 1
+        series.total += value
+        series.count += 1
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def snapshot(self, *labels: str) -> Optional[Dict[str, float]]:
+        series = self._series.get(labels)
+        if series is None:
+            return None
+        return {"count": series.count, "sum": series.total}
+
+    def render(self) -> List[str]:
+        lines = []
+        for labels, series in list(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), list(series.counts)):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(series.total)}")
+            lines.append(f"{self.name}_count{label_text} {series.count}")
+        return lines
+
+
+class _Collected(_Metric):
+    """Samples produced by a callback at scrape time"""
+
+    def __init__(self, name: str, documentation: str, kind: str, collect: Callable[[], Iterable[Sample]]):
+        super().__init__(name, documentation)
+        self.kind = kind
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        lines = []
+        for suffix, labels, value in self.collect():
+            lines.append(f"{self.name}{suffix}{_format_labels(list(labels), list(labels.values()))} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def collector(self, name: str, documentation: str, kind: str, collect: Callable[[], Iterable[Sample]]) -> None:
+        """Register a callback returning (suffix, labels, value) samples when metrics are scraped"""
+        self._register(_Collected(name, documentation, kind, collect))
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            try:
+                samples = metric.render()
+            except Exception:
+                continue  # one broken collector must not take down the whole scrape
+            if samples:
+                lines.extend(metric.header())
+                lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# HTTP server
+http_requests = registry.counter(
+    "stocksage_http_requests_total", "HTTP requests by route template, method and status code",
+    ("method", "route", "status"))
+http_request_duration = registry.histogram(
+    "stocksage_http_request_duration_seconds", "Time to complete an HTTP response by route template",
+    ("method", "route"))
+http_requests_in_flight = registry.gauge(
+    "stocksage_http_requests_in_flight", "HTTP requests currently being handled")
+
+# Market data cache (get_cached_or_fetch), namespaced by the key prefix: stock, history, price, ...
+cache_requests = registry.counter(
+    "stocksage_cache_requests_total", "Market data cache lookups by namespace and result (hit, shared_hit, miss, stale)",
+    ("namespace", "result"))
+cache_evictions = registry.counter(
+    "stocksage_cache_evictions_total", "Expired market data cache entries replaced by a fresh fetch",
+    ("namespace",))
+
+# Upstream services
+upstream_requests = registry.counter(
+    "stocksage_upstream_requests_total", "Calls to upstream services by operation and outcome (ok, error)",
+    ("service", "operation", "outcome"))
+upstream_duration = registry.histogram(
+    "stocksage_upstream_request_duration_seconds", "Upstream call latency by service and operation",
+    ("service", "operation"))
+mock_fallbacks = registry.counter(
+    "stocksage_mock_fallbacks_total", "Responses served from mock data because market data was unavailable",
+    ("endpoint",))
+
+
+@contextmanager
+def track_upstream(service: str, operation: str) -> Iterator[None]:
+    """Count and time one upstream call, recording whether it raised (and its spans if the request is traced or profiled)"""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        with tracing.span(f"{service} {operation}", service, tracing.CLIENT, operation=operation):
+            yield
+        outcome = "ok"
+    finally:
+        elapsed = time.perf_counter() - start
+        upstream_duration.observe(elapsed, service, operation)
+        upstream_requests.inc(service, operation, outcome)
+        profiling.record_span(service, elapsed)
+
+
+def cache_namespace(key: str) -> str:
+    return key.split(":", 1)[0]
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request counts, latency and in-flight requests per route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_in_flight.dec()
+            # The matched route's template keeps /api/stocks/AAPL and /api/stocks/MSFT in one series
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope["method"]
+            http_request_duration.observe(time.perf_counter() - start, method, route)
+            http_requests.inc(method, route, str(status_code))
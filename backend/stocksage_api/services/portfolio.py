@@ -0,0 +1,186 @@
+"""In-memory portfolio state with incremental position and P&L maintenance.
+
+Each buy or sell updates cash, the affected position and its average cost in
+O(1); nothing is recomputed from the transaction history.
+"""
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, Optional
+import time
+
+
+class TradeError(ValueError):
+    """Raised when a trade cannot be applied to a portfolio"""
+
+
+@dataclass
+class Position:
+    symbol: str
+    quantity: float = 0.0
+    average_buy_price: float = 0.0
+    current_price: float = 0.0
+
+    @property
+    def cost_basis(self) -> float:
+        return self.quantity * self.average_buy_price
+
+    def to_record(self) -> Dict[str, Any]:
+        return {
+            "quantity": self.quantity,
+            "average_buy_price": self.average_buy_price,
+            "current_price": self.current_price,
+        }
+
+
+@dataclass
+class Portfolio:
+    id: str
+    user_id: str
+    name: str
+    initial_balance: float
+    current_balance: float
+    start_date: str
+    created_at: int
+    realized_pnl: float = 0.0
+    version: int = 0
+    positions: Dict[str, Position] = field(default_factory=dict)
+
+    @classmethod
+    def from_records(
+        cls,
+        record: Dict[str, Any],
+        positions: Optional[Dict[str, Dict[str, Any]]] = None
+    ) -> "Portfolio":
+        """Build a portfolio from its /portfolios and /positions records"""
+        return cls(
+            id=record["id"],
+            user_id=record["user_id"],
+            name=record.get("name", ""),
+            initial_balance=float(record.get("initial_balance", 0)),
+            current_balance=float(record.get("current_balance", record.get("initial_balance", 0))),
+            start_date=record.get("start_date", ""),
+            created_at=int(record.get("created_at", 0)),
+            realized_pnl=float(record.get("realized_pnl", 0)),
+            version=int(record.get("version", 0)),
+            positions={
+                symbol: Position(
+                    symbol=symbol,
+                    quantity=float(data.get("quantity", 0)),
+                    average_buy_price=float(data.get("average_buy_price", 0)),
+                    current_price=float(data.get("current_price", 0)),
+                )
+                for symbol, data in (positions or {}).items()
+                if data
+            },
+        )
+
+    def to_record(self) -> Dict[str, Any]:
+        """The /portfolios/{id} record (positions are stored separately)"""
+        record = asdict(self)
+        record.pop("positions")
+        return record
+
+    @property
+    def cost_basis(self) -> float:
+        return sum(position.cost_basis for position in self.positions.values())
+
+    def snapshot_record(self, timestamp: int) -> Dict[str, Any]:
+        """The /snapshots record of the state after ledger entry `version`"""
+        return {
+            "seq": self.version,
+            "timestamp": timestamp,
+            "cash": self.current_balance,
+            "realized_pnl": self.realized_pnl,
+            "positions": {symbol: position.to_record() for symbol, position in self.positions.items()},
+        }
+
+    def from_snapshot(self, snapshot: Optional[Dict[str, Any]] = None) -> "Portfolio":
+        """A copy of this portfolio restored to a snapshot (or to its opening state if None)"""
+        if snapshot is None:
+            snapshot = {"seq": 0, "cash": self.initial_balance, "realized_pnl": 0.0, "positions": {}}
+        record = {
+            **self.to_record(),
+            "current_balance": snapshot["cash"],
+            "realized_pnl": snapshot.get("realized_pnl", 0.0),
+            "version": snapshot["seq"],
+        }
+        return Portfolio.from_records(record, snapshot.get("positions"))
+
+    def replay(self, entry: Dict[str, Any]) -> None:
+        """Apply one ledger entry; entries must be replayed in sequence order"""
+        if entry["seq"] != self.version + 1:
+            raise TradeError(f"Ledger gap: expected entry {self.version + 1}, got {entry['seq']}")
+        self.apply_trade(entry["type"], entry["symbol"], entry["quantity"], entry["price"])
+
+    def apply_trade(self, side: str, symbol: str, quantity: float, price: float) -> Position:
+        """Apply a buy or sell and return the updated position.
+
+        A sold-out position is returned with zero quantity and removed from the portfolio.
+        """
+        if quantity <= 0:
+            raise TradeError("Quantity must be positive")
+        if price <= 0:
+            raise TradeError(f"Invalid price for {symbol}")
+
+        position = self.positions.get(symbol) or Position(symbol=symbol)
+        amount = quantity * price
+
+        if side == "buy":
+            if amount > self.current_balance + 1e-9:
+                raise TradeError(
+                    f"Insufficient funds: buying {quantity} {symbol} costs {amount:.2f}, "
+                    f"available cash is {self.current_balance:.2f}"
+                )
+            total_quantity = position.quantity + quantity
+            position.average_buy_price = (position.cost_basis + amount) / total_quantity
+            position.quantity = total_quantity
+            self.current_balance -= amount
+        elif side == "sell":
+            if quantity > position.quantity + 1e-9:
+                raise TradeError(f"Insufficient shares: holding {position.quantity} {symbol}, tried to sell {quantity}")
+            self.realized_pnl += (price - position.average_buy_price) * quantity
+            position.quantity = max(0.0, position.quantity - quantity)
+            self.current_balance += amount
+        else:
+            raise TradeError(f"Unknown trade type '{side}'")
+
+        position.current_price = price
+        if position.quantity > 1e-9:
+            self.positions[symbol] = position
+        else:
+            position.quantity = 0.0
+            self.positions.pop(symbol, None)
+
+        self.version += 1
+        return position
+
+    def valuation(self, prices: Dict[str, float]) -> Dict[str, Any]:
+        """Value the portfolio with the given prices (falls back to the last known price)"""
+        positions = []
+        market_value = 0.0
+        for symbol, position in self.positions.items():
+            price = prices.get(symbol) or position.current_price or position.average_buy_price
+            value = position.quantity * price
+            market_value += value
+            positions.append({
+                "symbol": symbol,
+                "quantity": position.quantity,
+                "average_buy_price": round(position.average_buy_price, 4),
+                "current_price": round(price, 4),
+                "market_value": round(value, 2),
+                "unrealized_pnl": round(value - position.cost_basis, 2),
+            })
+
+        total_value = self.current_balance + market_value
+        unrealized = market_value - self.cost_basis
+        return {
+            "portfolio_id": self.id,
+            "cash": round(self.current_balance, 2),
+            "market_value": round(market_value, 2),
+            "total_value": round(total_value, 2),
+            "cost_basis": round(self.cost_basis, 2),
+            "unrealized_pnl": round(unrealized, 2),
+            "realized_pnl": round(self.realized_pnl, 2),
+            "total_return": round(total_value / self.initial_balance - 1, 6) if self.initial_balance else 0.0,
+            "positions": positions,
+            "timestamp": int(time.time() * 1000),
+        }
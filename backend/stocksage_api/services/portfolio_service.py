@@ -0,0 +1,486 @@
+import asyncio
+import copy
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .firebase_service import firebase_service, FirebaseService
+from .ledger import TransactionLedger
+from .market_cache import CACHE_DURATION
+from .market_data import PriceMatrix, get_latest_prices, load_price_matrix
+from .monte_carlo import chunk_sizes, simulate_chunk, summarize
+from .portfolio import Portfolio, Position, TradeError
+from .process_pool import run_in_process_pool
+from .risk import portfolio_risk
+from .valuation import compare_portfolios
+
+logger = logging.getLogger(__name__)
+
+# Number of memoized risk and simulation results kept in memory
+RESULT_CACHE_SIZE = 1024
+# Attempts at a trade while other processes keep changing the portfolio first
+TRADE_ATTEMPTS = 5
+# Seconds to wait before the second attempt (growing linearly after that)
+TRADE_RETRY_DELAY = 0.05
+# Seconds after which a trade claimed by a process that never wrote it is finished by the next load
+TRADE_CLAIM_TIMEOUT = float(os.getenv("TRADE_CLAIM_TIMEOUT", 30))
+
+
+class PortfolioNotFoundError(LookupError):
+    """Raised when a portfolio does not exist or belongs to another user"""
+
+
+class PortfolioConflictError(RuntimeError):
+    """Raised when a portfolio changed in Firebase since it was loaded"""
+
+
+def caches_portfolios() -> bool:
+    """Whether portfolios may be kept in memory, which is only safe in the only API process.
+
+    stocksage_api.server exports API_WORKERS to its workers; with several of them,
+    every request loads the portfolio from Firebase.
+    """
+    return int(os.getenv("API_WORKERS", os.getenv("WEB_CONCURRENCY", 1))) <= 1
+
+
+class PortfolioEngine:
+    """Keeps portfolios in memory and commits every trade with a conditional write.
+
+    Portfolios are loaded from Firebase on first access (on every access when several
+    workers serve the API). Trades are applied incrementally and only commit if the
+    stored version is still the one they started from; otherwise the portfolio is
+    reloaded and the trade tried again. That check is what keeps concurrent trades
+    apart, so the engine's lock only guards its in-memory maps and is never held
+    across a Firebase round trip.
+    """
+
+    def __init__(self, firebase: FirebaseService):
+        self.firebase = firebase
+        self.ledger = TransactionLedger(firebase)
+        self._portfolios: Dict[str, Portfolio] = {}
+        self._user_portfolios: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+        # Read on the event loop, so it has its own lock rather than sharing the portfolios'
+        self._result_lock = threading.Lock()
+        self._result_cache: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+
+    # Memoized results
+    def _cached_result(self, key: tuple) -> Optional[Dict[str, Any]]:
+        with self._result_lock:
+            if key in self._result_cache:
+                self._result_cache.move_to_end(key)
+                return self._result_cache[key]
+        return None
+
+    def _remember_result(self, key: tuple, result: Dict[str, Any]) -> None:
+        with self._result_lock:
+            self._result_cache[key] = result
+            if len(self._result_cache) > RESULT_CACHE_SIZE:
+                self._result_cache.popitem(last=False)
+
+    def _known_last_bar(self, symbols: List[str], start: date, end: date) -> Optional[str]:
+        """Last bar of a price window as of its latest load, while that load's closes are still cached"""
+        entry = self._cached_result(("last_bar", tuple(symbols), start, end))
+        if entry is not None and entry["expires_at"] > time.time():
+            return entry["as_of"]
+        return None
+
+    async def _load_prices(self, symbols: List[str], start: date, end: date) -> PriceMatrix:
+        """Load a price window in a worker thread and remember its last bar"""
+        prices = await asyncio.to_thread(load_price_matrix, symbols, start, end)
+        self._remember_result(("last_bar", tuple(symbols), start, end),
+                              {"as_of": str(prices.dates[-1]), "expires_at": time.time() + CACHE_DURATION})
+        return prices
+
+    def _holdings_weights(self, portfolio: Portfolio, symbols: List[str], last_closes: np.ndarray):
+        """Value weights of the holdings at the given prices, and the total value"""
+        quantities = np.array([portfolio.positions[symbol].quantity for symbol in symbols])
+        holdings_value = quantities * last_closes
+        total_value = portfolio.current_balance + holdings_value.sum()
+        weights = holdings_value / total_value if total_value > 0 else np.zeros(len(symbols))
+        return weights, float(total_value)
+
+    # Loading
+    def _from_records(self, record: Dict[str, Any], positions: Dict[str, Any]) -> Portfolio:
+        """A portfolio from its records, including a trade whose position is not written yet"""
+        portfolio = Portfolio.from_records(record, positions)
+        pending = record.get("pending_trade")
+        if pending:
+            symbol = pending["entry"]["symbol"]
+            if pending["position"]["quantity"]:
+                portfolio.positions[symbol] = Position(symbol=symbol, **pending["position"])
+            else:
+                portfolio.positions.pop(symbol, None)
+        return portfolio
+
+    def _load(self, portfolio_id: str) -> Optional[Portfolio]:
+        record = self.firebase.get_data(f"portfolios/{portfolio_id}")
+        if not record:
+            return None
+        positions = self.firebase.get_data(f"positions/{portfolio_id}") or {}
+        portfolio = self._from_records(record, positions)
+        pending = record.get("pending_trade")
+        if pending and time.time() * 1000 - pending["entry"]["timestamp"] > TRADE_CLAIM_TIMEOUT * 1000:
+            # The process that claimed this trade stopped before writing it
+            logger.warning(f"Portfolio {portfolio_id}: finishing abandoned trade {pending['entry']['id']}")
+            try:
+                self._finish_trade(portfolio, pending)
+            except Exception as e:
+                logger.error(f"Failed to finish trade {pending['entry']['id']} of portfolio {portfolio_id}: {str(e)}")
+        return portfolio
+
+    def _keep(self, portfolio: Portfolio) -> Portfolio:
+        """Cache a loaded or traded portfolio unless the same or a newer version is cached already"""
+        with self._lock:
+            cached = self._portfolios.get(portfolio.id)
+            if cached is not None and cached.version >= portfolio.version:
+                return cached
+            self._portfolios[portfolio.id] = portfolio
+            return portfolio
+
+    def get_portfolio(self, portfolio_id: str, user_id: str) -> Portfolio:
+        """Return a portfolio owned by the user, loading it on first access"""
+        if not caches_portfolios():
+            portfolio = self._load(portfolio_id)
+        else:
+            with self._lock:
+                portfolio = self._portfolios.get(portfolio_id)
+            if portfolio is None:
+                portfolio = self._load(portfolio_id)
+                if portfolio is not None:
+                    portfolio = self._keep(portfolio)
+
+        if portfolio is None or portfolio.user_id != user_id:
+            raise PortfolioNotFoundError(f"Portfolio {portfolio_id} not found")
+        return portfolio
+
+    def list_portfolios(self, user_id: str) -> List[Portfolio]:
+        """Return all portfolios owned by the user"""
+        if not caches_portfolios():
+            records = self.firebase.query_data("portfolios", order_by="user_id", equal_to=user_id) or {}
+            return [
+                self._from_records(record, self.firebase.get_data(f"positions/{portfolio_id}") or {})
+                for portfolio_id, record in records.items()
+            ]
+        with self._lock:
+            ids = self._user_portfolios.get(user_id)
+            if ids is not None:
+                portfolios = [self._portfolios.get(portfolio_id) for portfolio_id in ids]
+                if None not in portfolios:
+                    return portfolios
+
+        # Indexed on user_id, so only this user's portfolios are transferred
+        records = self.firebase.query_data("portfolios", order_by="user_id", equal_to=user_id) or {}
+        portfolios = []
+        for portfolio_id, record in records.items():
+            with self._lock:
+                portfolio = self._portfolios.get(portfolio_id)
+            if portfolio is None:
+                positions = self.firebase.get_data(f"positions/{portfolio_id}") or {}
+                portfolio = self._keep(self._from_records(record, positions))
+            portfolios.append(portfolio)
+        with self._lock:
+            self._user_portfolios[user_id] = [portfolio.id for portfolio in portfolios]
+        return portfolios
+
+    # Writes
+    def create_portfolio(
+        self,
+        user_id: str,
+        name: str,
+        initial_balance: float,
+        start_date: Optional[date] = None
+    ) -> Portfolio:
+        """Create and persist a new portfolio with all of its balance in cash"""
+        portfolio = Portfolio(
+            id=self.firebase.generate_key(),
+            user_id=user_id,
+            name=name,
+            initial_balance=initial_balance,
+            current_balance=initial_balance,
+            start_date=(start_date or date.today()).isoformat(),
+            created_at=int(time.time() * 1000),
+        )
+        self.firebase.set_data(f"portfolios/{portfolio.id}", portfolio.to_record())
+
+        if caches_portfolios():
+            with self._lock:
+                self._portfolios[portfolio.id] = portfolio
+                if user_id in self._user_portfolios:
+                    self._user_portfolios[user_id] = self._user_portfolios[user_id] + [portfolio.id]
+        return portfolio
+
+    def execute_trade(
+        self,
+        portfolio_id: str,
+        user_id: str,
+        side: str,
+        symbol: str,
+        quantity: float
+    ) -> Dict[str, Any]:
+        """Buy or sell at the latest price, retrying when another process changed the portfolio first"""
+        symbol = symbol.upper()
+        self.get_portfolio(portfolio_id, user_id)
+        # Only a live or cached market price; mock prices are for display
+        price = get_latest_prices([symbol], allow_mock=False).get(symbol)
+        if not price:
+            raise TradeError(f"No market price available for {symbol}")
+
+        for attempt in range(TRADE_ATTEMPTS):
+            portfolio = self.get_portfolio(portfolio_id, user_id)
+            try:
+                transaction = self._trade(portfolio, side, symbol, quantity, price)
+                break
+            except PortfolioConflictError as e:
+                # Drop the stale copy so the next attempt starts from the stored state
+                with self._lock:
+                    if self._portfolios.get(portfolio_id) is portfolio:
+                        del self._portfolios[portfolio_id]
+                logger.info(f"{str(e)} (attempt {attempt + 1} of {TRADE_ATTEMPTS})")
+            time.sleep(TRADE_RETRY_DELAY * (attempt + 1))
+        else:
+            raise PortfolioConflictError(f"Portfolio {portfolio_id} is being changed by another request")
+
+        logger.info(f"Portfolio {portfolio_id}: {side} {quantity} {symbol} @ {price}")
+        return transaction
+
+    def _trade(self, portfolio: Portfolio, side: str, symbol: str, quantity: float, price: float) -> Dict[str, Any]:
+        """Apply a trade to a copy of the portfolio and commit it if the stored version is unchanged.
+
+        The trade commits with a transaction on /portfolios/{id} that writes the new cash,
+        P&L and version plus the trade itself as `pending_trade`, and aborts if the version
+        moved or another trade is still pending. The position and ledger entry follow in one
+        multi-path update that also clears `pending_trade`. Readers apply a pending trade
+        themselves, and one left behind by a stopped process is finished by the next load.
+        """
+        updated = copy.deepcopy(portfolio)
+        position = updated.apply_trade(side, symbol, quantity, price)
+        transaction = {
+            "portfolio_id": portfolio.id,
+            "symbol": symbol,
+            "type": side,
+            "quantity": quantity,
+            "price": price,
+            "timestamp": int(time.time() * 1000),
+        }
+        ledger_updates = self.ledger.append_updates(updated, transaction)
+        pending = {"entry": transaction, "position": position.to_record()}
+
+        def claim(record: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+            if not record:
+                raise PortfolioNotFoundError(f"Portfolio {portfolio.id} not found")
+            if record.get("version", 0) != portfolio.version or record.get("pending_trade"):
+                raise PortfolioConflictError(f"Portfolio {portfolio.id} changed since version {portfolio.version}")
+            record.update(
+                current_balance=updated.current_balance,
+                realized_pnl=updated.realized_pnl,
+                version=updated.version,
+                pending_trade=pending,
+            )
+            return record
+
+        self.firebase.transaction(f"portfolios/{portfolio.id}", claim)
+        if caches_portfolios():
+            self._keep(updated)
+        try:
+            self._finish_trade(updated, pending, ledger_updates)
+        except Exception as e:
+            # Committed already; the next load after TRADE_CLAIM_TIMEOUT writes it again
+            logger.error(f"Failed to write trade {transaction['id']} of portfolio {portfolio.id}: {str(e)}")
+        return transaction
+
+    def _finish_trade(self, portfolio: Portfolio, pending: Dict[str, Any],
+                      ledger_updates: Optional[Dict[str, Any]] = None) -> None:
+        """Write a committed trade's position and ledger entry, and clear it from the portfolio record"""
+        entry = pending["entry"]
+        if ledger_updates is None:
+            ledger_updates = self.ledger.append_updates(portfolio, dict(entry))
+        position = pending["position"]
+        self.firebase.multi_path_update({
+            f"positions/{portfolio.id}/{entry['symbol']}": position if position["quantity"] else None,
+            f"portfolios/{portfolio.id}/pending_trade": None,
+            **ledger_updates,
+        })
+
+    # Reads
+    def valuation(self, portfolio: Portfolio) -> Dict[str, Any]:
+        """Value every holding with one batch price lookup"""
+        prices = get_latest_prices(list(portfolio.positions)) if portfolio.positions else {}
+        return portfolio.valuation(prices)
+
+    def historical_valuation(self, portfolio: Portfolio, timestamp: int) -> Dict[str, Any]:
+        """Value the portfolio as it stood at `timestamp` using that day's closing prices"""
+        state = self.ledger.state_at(portfolio, timestamp)
+        prices = {}
+        if state.positions:
+            day = datetime.fromtimestamp(timestamp / 1000).date()
+            try:
+                history = load_price_matrix(list(state.positions), day - timedelta(days=10), day + timedelta(days=1))
+                prices = dict(zip(history.symbols, history.closes[-1].tolist()))
+            except ValueError as e:
+                logger.warning(f"Falling back to trade prices for portfolio {portfolio.id}: {str(e)}")
+        valuation = state.valuation(prices)
+        valuation["timestamp"] = timestamp
+        return valuation
+
+    async def risk(
+        self,
+        portfolio: Portfolio,
+        days: int = 365,
+        benchmark: str = "SPY",
+        confidence: float = 0.95
+    ) -> Dict[str, Any]:
+        """Risk metrics of the current holdings, memoized per (portfolio version, last bar)"""
+        benchmark = benchmark.upper()
+        symbols = sorted(portfolio.positions)
+        end = date.today() + timedelta(days=1)
+        start = end - timedelta(days=days)
+
+        def memo_key(last_bar):
+            return ("risk", portfolio.id, portfolio.version, last_bar, days, benchmark, confidence)
+
+        # A repeated request is answered without loading prices again
+        last_bar = self._known_last_bar(symbols + [benchmark], start, end)
+        cached = self._cached_result(memo_key(last_bar)) if last_bar else None
+        if cached is not None:
+            return cached
+
+        prices = await self._load_prices(symbols + [benchmark], start, end)
+        last_bar = str(prices.dates[-1])
+        key = memo_key(last_bar)
+        cached = self._cached_result(key)
+        if cached is not None:
+            return cached
+
+        # Weight holdings by their value at the last bar
+        closes = prices.closes[:, [prices.symbols.index(symbol) for symbol in symbols]]
+        weights, total_value = self._holdings_weights(portfolio, symbols, closes[-1])
+
+        metrics = portfolio_risk(
+            closes, prices.closes[:, prices.symbols.index(benchmark)], weights, confidence
+        )
+        result = {
+            "portfolio_id": portfolio.id,
+            "as_of": last_bar,
+            "benchmark": benchmark,
+            "lookback_days": days,
+            "confidence": confidence,
+            "portfolio_value": round(total_value, 2),
+            **{name: round(float(values[0]), 6) for name, values in metrics.items()},
+        }
+        self._remember_result(key, result)
+        return result
+
+    async def simulate(
+        self,
+        portfolio: Portfolio,
+        horizon_days: int = 252,
+        n_paths: int = 10000,
+        method: str = "bootstrap",
+        lookback_days: int = 730,
+        seed: int = 0,
+        target_value: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Monte Carlo projection of the current holdings, run in the compute process pool"""
+        symbols = sorted(portfolio.positions)
+        if not symbols:
+            raise TradeError("Portfolio has no holdings to simulate")
+
+        end = date.today() + timedelta(days=1)
+        start = end - timedelta(days=lookback_days)
+
+        def memo_key(last_bar):
+            return ("simulate", portfolio.id, portfolio.version, last_bar, horizon_days, n_paths,
+                    method, lookback_days, seed, target_value)
+
+        last_bar = self._known_last_bar(symbols, start, end)
+        cached = self._cached_result(memo_key(last_bar)) if last_bar else None
+        if cached is not None:
+            return cached
+
+        prices = await self._load_prices(symbols, start, end)
+        last_bar = str(prices.dates[-1])
+        key = memo_key(last_bar)
+        cached = self._cached_result(key)
+        if cached is not None:
+            return cached
+
+        closes = prices.closes[:, [prices.symbols.index(symbol) for symbol in symbols]]
+        weights, total_value = self._holdings_weights(portfolio, symbols, closes[-1])
+        historical_returns = (closes[1:] / closes[:-1] - 1.0) @ weights
+
+        # Each chunk gets its own random stream spawned from the seed
+        sizes = chunk_sizes(n_paths, horizon_days)
+        streams = np.random.SeedSequence(seed).spawn(len(sizes))
+        chunks = await asyncio.gather(*[
+            run_in_process_pool(simulate_chunk, historical_returns, size, horizon_days, method, stream)
+            for size, stream in zip(sizes, streams)
+        ])
+
+        result = {
+            "portfolio_id": portfolio.id,
+            "as_of": last_bar,
+            "method": method,
+            "horizon_days": horizon_days,
+            "n_paths": n_paths,
+            "seed": seed,
+            "initial_value": round(total_value, 2),
+            **summarize(np.vstack(chunks), horizon_days, total_value, target_value),
+        }
+        self._remember_result(key, result)
+        return result
+
+    def compare(
+        self,
+        portfolio_ids: List[str],
+        user_id: str,
+        days: int = 365,
+        benchmark: str = "SPY"
+    ) -> Dict[str, Any]:
+        """Equity curves and benchmark-relative performance for several portfolios"""
+        portfolios = [self.get_portfolio(portfolio_id, user_id) for portfolio_id in portfolio_ids]
+        specs = [
+            {
+                "id": portfolio.id,
+                "name": portfolio.name,
+                "initial_balance": portfolio.initial_balance,
+                "entries": self.ledger.entries(portfolio.id),
+            }
+            for portfolio in portfolios
+        ]
+        benchmark = benchmark.upper()
+        symbols = sorted({entry["symbol"] for spec in specs for entry in spec["entries"]})
+
+        # One aligned price matrix for every held symbol plus the benchmark
+        end = date.today() + timedelta(days=1)
+        prices = load_price_matrix(symbols + [benchmark], end - timedelta(days=days), end)
+        columns = [prices.symbols.index(symbol) for symbol in symbols]
+        benchmark_closes = prices.closes[:, prices.symbols.index(benchmark)]
+        return compare_portfolios(
+            prices.dates, symbols, prices.closes[:, columns], benchmark, benchmark_closes, specs
+        )
+
+    def get_state_at(self, portfolio_id: str, user_id: str, timestamp: int) -> Portfolio:
+        """Point-in-time cash, positions and cost basis from the nearest snapshot plus the tail"""
+        return self.ledger.state_at(self.get_portfolio(portfolio_id, user_id), timestamp)
+
+    def get_transactions(
+        self,
+        portfolio_id: str,
+        user_id: str,
+        limit: int = 50,
+        before: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Return a page of the portfolio's transactions, newest first"""
+        self.get_portfolio(portfolio_id, user_id)
+        return self.ledger.page(portfolio_id, limit, before)
+
+
+# Create a singleton instance
+portfolio_engine = PortfolioEngine(firebase_service)
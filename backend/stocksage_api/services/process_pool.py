@@ -0,0 +1,41 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Number of worker processes for CPU-heavy jobs (backtests, simulations)
+COMPUTE_POOL_WORKERS = int(os.getenv("COMPUTE_POOL_WORKERS", max(1, (os.cpu_count() or 2) - 1)))
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Return the shared process pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        # Spawn rather than fork so workers never inherit the server's threads or sockets
+        _pool = ProcessPoolExecutor(
+            max_workers=COMPUTE_POOL_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        logger.info(f"Started compute process pool with {COMPUTE_POOL_WORKERS} workers")
+    return _pool
+
+
+async def run_in_process_pool(func: Callable[..., Any], *args: Any) -> Any:
+    """Run a picklable function in the process pool without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_process_pool(), func, *args)
+
+
+def shutdown_process_pool() -> None:
+    """Shut down the process pool (called on application shutdown)"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+        logger.info("Compute process pool shut down")
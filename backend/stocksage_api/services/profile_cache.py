@@ -0,0 +1,140 @@
+"""Per-worker write-through cache of user profiles.
+
+Profile reads are served from memory. Writes made by this worker update the
+cache directly, and a Realtime Database stream on `users` applies or
+invalidates entries changed anywhere else (other workers, admin tools). A TTL
+bounds staleness if the stream drops.
+"""
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", 10000))
+PROFILE_CACHE_TTL = int(os.getenv("PROFILE_CACHE_TTL", 300))
+
+
+class ProfileCache:
+    """LRU of user profiles keyed by user id, kept fresh by stream events"""
+
+    def __init__(self, max_size: int = PROFILE_CACHE_SIZE, ttl: int = PROFILE_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # Bumped on every invalidation so a fill racing with one is discarded
+        self.version = 0
+        self.last_lag_ms: Optional[float] = None
+        self.max_lag_ms = 0.0
+        self._lag_total_ms = 0.0
+        self._lag_samples = 0
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Copy of the cached profile, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and time.monotonic() - entry[1] < self.ttl:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return copy.deepcopy(entry[0])
+            if entry is not None:
+                del self._entries[user_id]
+            self.misses += 1
+            return None
+
+    def put(self, user_id: str, profile: Dict[str, Any]) -> None:
+        with self._lock:
+            self._store(user_id, profile)
+
+    def fill(self, user_id: str, profile: Dict[str, Any], version: int) -> None:
+        """Cache a profile read from the database unless an invalidation arrived since `version`"""
+        with self._lock:
+            if version == self.version:
+                self._store(user_id, profile)
+
+    def replace(self, user_id: str, profile: Dict[str, Any]) -> None:
+        """Overwrite a cached profile with a newer copy (no-op when not cached)"""
+        with self._lock:
+            self.version += 1
+            if user_id in self._entries:
+                self._store(user_id, profile)
+
+    def _store(self, user_id: str, profile: Dict[str, Any]) -> None:
+        self._entries[user_id] = (copy.deepcopy(profile), time.monotonic())
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def merge(self, user_id: str, data: Dict[str, Any]) -> None:
+        """Apply a partial update to a cached profile (no-op when not cached)"""
+        with self._lock:
+            self.version += 1
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                self._entries[user_id] = ({**entry[0], **copy.deepcopy(data)}, entry[1])
+
+    def invalidate(self, user_id: str) -> None:
+        with self._lock:
+            self.version += 1
+            if self._entries.pop(user_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self.version += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def _record_lag(self, data: Any) -> None:
+        # Profiles carry updated_at in milliseconds when written through the API
+        if isinstance(data, dict) and isinstance(data.get("updated_at"), (int, float)):
+            lag = max(time.time() * 1000 - data["updated_at"], 0.0)
+            with self._lock:
+                self.last_lag_ms = lag
+                self.max_lag_ms = max(self.max_lag_ms, lag)
+                self._lag_total_ms += lag
+                self._lag_samples += 1
+
+    def handle_event(self, message: Dict[str, Any]) -> None:
+        """Apply a Pyrebase stream message from the `users` path"""
+        parts = [part for part in (message.get("path") or "/").split("/") if part]
+        data = message.get("data")
+        if not parts:
+            # Initial snapshot or a write to the whole tree; a patch lists the changed users
+            if message.get("event") == "patch" and isinstance(data, dict):
+                for key in data:
+                    self.invalidate(key.split("/")[0])
+            else:
+                self.clear()
+            return
+
+        user_id = parts[0]
+        self._record_lag(data)
+        if len(parts) == 1 and message.get("event") == "put" and isinstance(data, dict):
+            self.replace(user_id, data)
+        elif (len(parts) == 1 and message.get("event") == "patch" and isinstance(data, dict)
+              and not any("/" in key for key in data)):
+            self.merge(user_id, data)
+        else:
+            self.invalidate(user_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "invalidations": self.invalidations,
+                "last_invalidation_lag_ms": self.last_lag_ms,
+                "mean_invalidation_lag_ms": (
+                    round(self._lag_total_ms / self._lag_samples, 1) if self._lag_samples else None
+                ),
+                "max_invalidation_lag_ms": self.max_lag_ms,
+            }
@@ -0,0 +1,324 @@
+"""On-demand request profiling.
+
+A request is profiled when an administrator sends `X-Profile: 1` with their
+bearer token, or when it is picked by PROFILE_SAMPLE_RATE. For a profiled
+request the middleware:
+
+- times spans: yfinance and Firebase calls (recorded by metrics.track_upstream),
+  request validation and dependencies, the endpoint itself and response
+  serialization. Upstream spans overlap the phase they ran in
+- samples the event loop thread's stack every PROFILE_SAMPLE_INTERVAL_MS while
+  the request's own task is running, giving a statistical profile in the
+  collapsed-stack format flame graph tools read
+- keeps the last PROFILE_HISTORY profiles for download from the admin API and,
+  for header-requested profiles, returns a `Server-Timing` header and the
+  profile id in `X-Profile-Id`
+
+The phases are timed by the route class every router uses (routes/timed_route.py),
+which, like track_upstream, only looks for a profile while one is in progress. The
+sampler thread starts with the first profiled request. With PROFILING_ENABLED=false the middleware is not
+added at all.
+"""
+import asyncio
+import logging
+import os
+import random
+import secrets
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "true").lower() == "true"
+# Fraction of requests profiled without being asked (0 disables sampling)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", 2)) / 1000
+# Completed profiles kept for download
+PROFILE_HISTORY = int(os.getenv("PROFILE_HISTORY", 50))
+PROFILE_HEADER = b"x-profile"
+MAX_STACK_DEPTH = 64
+
+_current: ContextVar[Optional["RequestProfile"]] = ContextVar("request_profile", default=None)
+# True while at least one request is being profiled; checked before the context variable
+active = False
+_active_count = 0
+_active_lock = threading.Lock()
+
+
+class RequestProfile:
+    """Spans and stack samples collected for one request"""
+
+    def __init__(self, method: str, path: str, reason: str):
+        self.id = secrets.token_hex(8)
+        self.method = method
+        self.path = path
+        self.route: Optional[str] = None
+        self.reason = reason
+        self.started_at = time.time()
+        self.status: Optional[int] = None
+        self.duration: Optional[float] = None
+        self.spans: Dict[str, float] = defaultdict(float)
+        self.span_calls: Dict[str, int] = defaultdict(int)
+        self.samples: Counter = Counter()
+        # perf_counter() start and end of the endpoint call, set by endpoint_phase
+        self.endpoint_window: Optional[Tuple[float, float]] = None
+        self._start = time.perf_counter()
+
+    def add(self, span: str, seconds: float) -> None:
+        self.spans[span] += seconds
+        self.span_calls[span] += 1
+
+    def finish(self, status: Optional[int], route: Optional[str]) -> None:
+        self.duration = time.perf_counter() - self._start
+        self.status = status
+        self.route = route
+
+    def server_timing(self) -> str:
+        """Server-Timing header value (durations in milliseconds)"""
+        entries = [f"total;dur={self._elapsed() * 1000:.1f}"]
+        for span, seconds in self.spans.items():
+            entries.append(f'{span};dur={seconds * 1000:.1f};desc="{self.span_calls[span]} calls"')
+        return ", ".join(entries)
+
+    def _elapsed(self) -> float:
+        return self.duration if self.duration is not None else time.perf_counter() - self._start
+
+    def collapsed(self) -> str:
+        """Stack samples as "root;...;leaf count" lines (flamegraph.pl and speedscope format)"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "reason": self.reason,
+            "status": self.status,
+            "started_at": int(self.started_at * 1000),
+            "duration_ms": round(self._elapsed() * 1000, 2),
+            "spans_ms": {span: round(seconds * 1000, 2) for span, seconds in self.spans.items()},
+            "span_calls": dict(self.span_calls),
+            "samples": sum(self.samples.values()),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        top = Counter()
+        for stack, count in self.samples.items():
+            top[stack.rsplit(";", 1)[-1]] += count
+        return {
+            **self.summary(),
+            "sample_interval_ms": PROFILE_SAMPLE_INTERVAL * 1000,
+            "top_frames": [{"frame": frame, "samples": count} for frame, count in top.most_common(20)],
+            "stacks": dict(self.samples.most_common()),
+        }
+
+
+def current_profile() -> Optional[RequestProfile]:
+    return _current.get() if active else None
+
+
+def record_span(span: str, seconds: float) -> None:
+    """Add time to a span of the request being profiled, if any"""
+    if active:
+        profile = _current.get()
+        if profile is not None:
+            profile.add(span, seconds)
+
+
+# Request phases, timed by the routes' TimedRoute (routes/timed_route.py)
+def time_phases(handler: Callable[[Any], Awaitable[Any]]) -> Callable[[Any], Awaitable[Any]]:
+    """Wrap a route handler to split a profiled request into validation, endpoint and serialization.
+
+    Validation covers reading the body and solving the dependencies before the
+    endpoint starts; serialization is everything after it returns.
+    """
+    async def timed_handler(request):
+        profile = current_profile()
+        if profile is None:
+            return await handler(request)
+        profile.endpoint_window = None
+        started = time.perf_counter()
+        try:
+            return await handler(request)
+        finally:
+            finished = time.perf_counter()
+            window = profile.endpoint_window
+            if window is None:
+                profile.add("validation", finished - started)
+            else:
+                profile.add("validation", window[0] - started)
+                profile.add("endpoint", window[1] - window[0])
+                profile.add("serialization", finished - window[1])
+    return timed_handler
+
+
+@contextmanager
+def endpoint_phase() -> Iterator[None]:
+    """Mark the endpoint's start and end for time_phases"""
+    profile = current_profile()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if profile is not None:
+            profile.endpoint_window = (start, time.perf_counter())
+
+
+class _Sampler:
+    """Daemon thread sampling the event loop thread's stack for every request being profiled"""
+
+    def __init__(self, interval: float = PROFILE_SAMPLE_INTERVAL):
+        self.interval = interval
+        self._targets: Dict[RequestProfile, tuple] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, profile: RequestProfile, loop: asyncio.AbstractEventLoop, task: Optional[asyncio.Task]) -> None:
+        with self._lock:
+            self._targets[profile] = (loop, threading.get_ident(), task)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+
+    def remove(self, profile: RequestProfile) -> None:
+        with self._lock:
+            self._targets.pop(profile, None)
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                targets = list(self._targets.items())
+                if not targets:
+                    self._thread = None
+                    return
+            frames = sys._current_frames()
+            for profile, (loop, thread_id, task) in targets:
+                frame = frames.get(thread_id)
+                # Only count samples taken while this request's task is the one running
+                if frame is None or (task is not None and asyncio.current_task(loop) is not task):
+                    continue
+                profile.samples[_collapse(frame)] += 1
+
+
+def _collapse(frame) -> str:
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+sampler = _Sampler()
+
+
+class ProfileStore:
+    """The most recent profiles, oldest dropped first"""
+
+    def __init__(self, size: int = PROFILE_HISTORY):
+        self.size = size
+        self._profiles: "OrderedDict[str, RequestProfile]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, profile: RequestProfile) -> None:
+        with self._lock:
+            self._profiles[profile.id] = profile
+            while len(self._profiles) > self.size:
+                self._profiles.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[RequestProfile]:
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            profiles = list(self._profiles.values())
+        return [profile.summary() for profile in reversed(profiles)]
+
+
+profile_store = ProfileStore()
+
+
+def _begin() -> None:
+    global active, _active_count
+    with _active_lock:
+        _active_count += 1
+        active = True
+
+
+def _end() -> None:
+    global active, _active_count
+    with _active_lock:
+        _active_count -= 1
+        active = _active_count > 0
+
+
+def _header(scope: Dict[str, Any], name: bytes) -> Optional[bytes]:
+    for key, value in scope.get("headers") or ():
+        if key == name:
+            return value
+    return None
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling requests that ask for it (admins only) or are sampled"""
+
+    def __init__(self, app, authorize: Callable[[str], Awaitable[bool]], sample_rate: float = PROFILE_SAMPLE_RATE):
+        self.app = app
+        self.authorize = authorize
+        self.sample_rate = sample_rate
+
+    async def _requested(self, scope: Dict[str, Any]) -> bool:
+        if _header(scope, PROFILE_HEADER) not in (b"1", b"true"):
+            return False
+        authorization = (_header(scope, b"authorization") or b"").decode("latin-1")
+        scheme, _, token = authorization.partition(" ")
+        return scheme.lower() == "bearer" and bool(token) and await self.authorize(token.strip())
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if await self._requested(scope):
+            reason = "header"
+        elif self.sample_rate and random.random() < self.sample_rate:
+            reason = "sample"
+        else:
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"], reason)
+        status_code = None
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if reason == "header":
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", profile.server_timing().encode("latin-1")))
+                    headers.append((b"x-profile-id", profile.id.encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        token = _current.set(profile)
+        _begin()
+        sampler.add(profile, asyncio.get_running_loop(), asyncio.current_task())
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            sampler.remove(profile)
+            _end()
+            _current.reset(token)
+            profile.finish(status_code, getattr(scope.get("route"), "path", None))
+            profile_store.add(profile)
+            logger.info(f"Profiled {profile.method} {profile.path} ({reason}): {profile.summary()['spans_ms']} "
+                        f"in {profile.duration * 1000:.1f} ms, id {profile.id}")
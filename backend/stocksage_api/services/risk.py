@@ -0,0 +1,71 @@
+"""Vectorized portfolio risk analytics.
+
+Risk is measured for the portfolio's current holdings over a lookback window of
+daily closes. Holdings are given as a (portfolios x symbols) weight matrix, so
+one call computes the metrics for any number of portfolios with matrix products.
+
+This module only depends on NumPy.
+"""
+from statistics import NormalDist
+from typing import Dict
+
+import numpy as np
+
+TRADING_DAYS_PER_YEAR = 252
+
+
+def portfolio_risk(
+    closes: np.ndarray,
+    benchmark_closes: np.ndarray,
+    weights: np.ndarray,
+    confidence: float = 0.95
+) -> Dict[str, np.ndarray]:
+    """Risk metrics for each row of `weights` (P x S) over `closes` (D x S).
+
+    Weights are fractions of total portfolio value; any remainder is cash with a
+    zero return. VaR and CVaR are one-day losses expressed as positive fractions.
+    """
+    weights = np.atleast_2d(weights)
+    returns = closes[1:] / closes[:-1] - 1.0                 # (D-1, S)
+    portfolio_returns = returns @ weights.T                   # (D-1, P)
+    bench_returns = benchmark_closes[1:] / benchmark_closes[:-1] - 1.0
+    n = portfolio_returns.shape[0]
+    ddof = 1 if n > 1 else 0
+
+    mean = portfolio_returns.mean(axis=0)
+    std = portfolio_returns.std(axis=0, ddof=ddof)
+
+    # Beta from the covariance with the benchmark
+    centered = portfolio_returns - mean
+    bench_centered = bench_returns - bench_returns.mean()
+    bench_variance = bench_centered @ bench_centered / max(n - ddof, 1)
+    covariance = bench_centered @ centered / max(n - ddof, 1)
+    beta = covariance / bench_variance if bench_variance > 0 else np.zeros_like(mean)
+
+    # Historical VaR/CVaR from the empirical loss distribution
+    cutoff = np.quantile(portfolio_returns, 1.0 - confidence, axis=0)
+    tail = portfolio_returns <= cutoff
+    tail_count = np.maximum(tail.sum(axis=0), 1)
+    historical_var = -cutoff
+    historical_cvar = -(portfolio_returns * tail).sum(axis=0) / tail_count
+
+    # Parametric (normal) VaR/CVaR
+    normal = NormalDist()
+    z = normal.inv_cdf(confidence)
+    parametric_var = -(mean - z * std)
+    parametric_cvar = -(mean - std * normal.pdf(z) / (1.0 - confidence))
+
+    # Drawdown of the holdings' simulated value path
+    path = np.cumprod(1.0 + portfolio_returns, axis=0)
+    path = np.vstack([np.ones((1, path.shape[1])), path])
+    max_drawdown = (path / np.maximum.accumulate(path, axis=0) - 1.0).min(axis=0)
+
+    return {
+        "volatility": std * np.sqrt(TRADING_DAYS_PER_YEAR),
+        "beta": beta,
+        "historical_var": np.maximum(historical_var, 0.0),
+        "historical_cvar": np.maximum(historical_cvar, 0.0),
+        "parametric_var": np.maximum(parametric_var, 0.0),
+        "parametric_cvar": np.maximum(parametric_cvar, 0.0),
+        "max_drawdown": max_drawdown,
+    }
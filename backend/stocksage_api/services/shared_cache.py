@@ -0,0 +1,184 @@
+"""Market data cache shared by the worker processes on one host.
+
+Each worker keeps its in-process `cache` dict for hits that cost nothing, and
+checks this SQLite tier before calling yfinance, so a quote fetched by one
+worker serves all of them until it expires. SQLite in WAL mode lets any number
+of processes read while one writes, and survives a worker being killed
+mid-write.
+
+Writes are put-if-newer: one upsert that only replaces a row when the incoming
+value was fetched later, so two workers racing on the same key cannot replace
+fresher data with older data. The loser gets the stored value back and serves
+that instead.
+
+Expired rows stay around for MARKET_CACHE_STALE_TTL seconds as the fallback
+when yfinance fails, then are pruned. Connections are opened per process and
+thread, so the cache can be created before workers are forked.
+
+Values are stored with services/cache_codec.py rather than pickle, and the
+file is kept in the API's private data directory and created readable only by
+its user, since every worker loads whatever it finds there.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from ..config.paths import check_private, data_path
+from . import cache_codec
+
+logger = logging.getLogger(__name__)
+
+# SQLite file shared by the workers (empty keeps the cache per process)
+MARKET_CACHE_PATH = os.getenv("MARKET_CACHE_PATH", "")
+# How long expired entries are kept as a fallback for failed fetches
+MARKET_CACHE_STALE_TTL = float(os.getenv("MARKET_CACHE_STALE_TTL", 24 * 3600))
+# Writes between prunes of long-expired entries
+PRUNE_EVERY = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    fetched_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+)
+"""
+
+PUT_IF_NEWER = """
+INSERT INTO entries (key, value, fetched_at, expires_at) VALUES (?, ?, ?, ?)
+ON CONFLICT(key) DO UPDATE SET
+    value = excluded.value, fetched_at = excluded.fetched_at, expires_at = excluded.expires_at
+WHERE excluded.fetched_at > entries.fetched_at
+"""
+
+Entry = Tuple[Any, float, float]
+
+
+def default_path(port: int) -> str:
+    return data_path(f"market-cache-{port}.sqlite3")
+
+
+class SharedCache:
+    """Cross-process key-value store of (value, fetched_at, expires_at) entries"""
+
+    def __init__(self, path: str, stale_ttl: float = MARKET_CACHE_STALE_TTL):
+        self.path = path
+        self.stale_ttl = stale_ttl
+        self._local = threading.local()
+        self._writes = 0
+        self.errors = 0
+        # Create the file (owner-only; SQLite gives its WAL files the same mode) and table now,
+        # failing early, without keeping a connection across a fork
+        check_private(path)
+        os.close(os.open(path, os.O_RDWR | os.O_CREAT, 0o600))
+        self._open().close()
+
+    def _open(self) -> sqlite3.Connection:
+        # isolation_level=None: every statement commits on its own, so each upsert is atomic
+        connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(SCHEMA)
+        return connection
+
+    def _connect(self) -> sqlite3.Connection:
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():
+            local.connection = self._open()
+            local.pid = os.getpid()
+        return local.connection
+
+    def get(self, key: str) -> Optional[Entry]:
+        """(value, fetched_at, expires_at) for key, expired or not, or None"""
+        try:
+            row = self._connect().execute(
+                "SELECT value, fetched_at, expires_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"Shared cache read of {key} failed: {str(e)}")
+            return None
+        if row is None:
+            return None
+        try:
+            return cache_codec.loads(row[0]), row[1], row[2]
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Shared cache entry {key} is unreadable: {str(e)}")
+            return None
+
+    def put_if_newer(self, key: str, value: Any, fetched_at: float, expires_at: float) -> Optional[Entry]:
+        """Store the entry unless a newer one exists; returns the newer entry when it does"""
+        try:
+            cursor = self._connect().execute(
+                PUT_IF_NEWER, (key, cache_codec.dumps(value), fetched_at, expires_at)
+            )
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Shared cache write of {key} failed: {str(e)}")
+            return None
+        self._writes += 1
+        if self._writes % PRUNE_EVERY == 0:
+            self.prune()
+        if cursor.rowcount:
+            return None
+        return self.get(key)
+
+    def prune(self, now: Optional[float] = None) -> int:
+        """Delete entries that expired more than stale_ttl seconds ago"""
+        cutoff = (now if now is not None else time.time()) - self.stale_ttl
+        try:
+            return self._connect().execute("DELETE FROM entries WHERE expires_at < ?", (cutoff,)).rowcount
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"Shared cache prune failed: {str(e)}")
+            return 0
+
+    def entries(self) -> Iterator[Tuple[str, Any, float, float]]:
+        """Every readable (key, value, fetched_at, expires_at), expired or not"""
+        try:
+            rows = self._connect().execute("SELECT key, value, fetched_at, expires_at FROM entries").fetchall()
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"Shared cache scan failed: {str(e)}")
+            return
+        for key, value, fetched_at, expires_at in rows:
+            try:
+                yield key, cache_codec.loads(value), fetched_at, expires_at
+            except Exception:
+                self.errors += 1
+
+    def clear(self) -> None:
+        self._connect().execute("DELETE FROM entries")
+
+    def stats(self) -> Dict[str, Any]:
+        try:
+            entries, fresh = self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(expires_at > ?), 0) FROM entries", (time.time(),)
+            ).fetchone()
+        except sqlite3.Error:
+            entries = fresh = 0
+        return {"path": self.path, "entries": entries, "fresh": fresh, "errors": self.errors}
+
+
+shared_cache: Optional[SharedCache] = None
+
+
+def enable(path: str) -> Optional[SharedCache]:
+    """Use the cache at path for market data in this process and the workers it forks"""
+    global shared_cache
+    try:
+        shared_cache = SharedCache(path)
+    except (OSError, sqlite3.Error) as e:
+        logger.error(f"Cannot open the shared market data cache at {path}, caching per process: {str(e)}")
+        shared_cache = None
+        return None
+    logger.info(f"Sharing the market data cache through {path}")
+    return shared_cache
+
+
+if MARKET_CACHE_PATH:
+    enable(MARKET_CACHE_PATH)
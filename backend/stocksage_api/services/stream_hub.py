@@ -0,0 +1,491 @@
+"""Shared Realtime Database change streams fanned out to in-process subscribers.
+
+Every Pyrebase stream holds its own HTTP connection and thread, so opening one
+per client session does not scale. StreamHub opens one upstream stream per
+subscribed path, shared by every later subscriber at or below it and closed
+when the last one leaves. Only that subtree is downloaded and mirrored; paths
+below a prefix listed in STREAM_WATCHED_PREFIXES share one stream on the whole
+prefix instead. The hub parses each event once and routes the changes to every
+subscriber below it:
+
+- subscriptions (SSE/WebSocket handlers) read from a bounded per-subscriber
+  queue with a drop_oldest, drop_newest or coalesce overflow policy
+- listeners are called directly on the stream thread, like stream_data callbacks
+
+Events keep Pyrebase's shape ({"event", "path", "data"}) with paths relative to
+the subscribed path, plus "stream_id" naming that path. Event data is shared
+between subscribers and with the hub's mirror, and must not be modified.
+
+Upstreams that die or are cancelled by the server are reopened with exponential
+backoff. The database resends the whole tree after a reconnect; the hub diffs it
+against its mirror so subscribers only receive what changed while disconnected.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Prefixes streamed as a whole for all subscribers below them (none by default)
+STREAM_WATCHED_PREFIXES = [
+    prefix.strip("/") for prefix in os.getenv("STREAM_WATCHED_PREFIXES", "").split(",")
+    if prefix.strip("/")
+]
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", 100))
+STREAM_CHECK_INTERVAL = float(os.getenv("STREAM_CHECK_INTERVAL", 5))
+STREAM_RECONNECT_DELAY = float(os.getenv("STREAM_RECONNECT_DELAY", 1))
+STREAM_RECONNECT_MAX_DELAY = float(os.getenv("STREAM_RECONNECT_MAX_DELAY", 60))
+
+OVERFLOW_POLICIES = ("drop_oldest", "drop_newest", "coalesce")
+
+Parts = Tuple[str, ...]
+
+
+def split_path(path: str) -> Parts:
+    """Database path as a tuple of keys ("/portfolios/p1/" -> ("portfolios", "p1"))"""
+    return tuple(part for part in path.split("/") if part)
+
+
+def _path(parts: Parts) -> str:
+    return "/" + "/".join(parts)
+
+
+def _extract(value: Any, parts: Parts) -> Any:
+    for part in parts:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def assign_path(tree: Any, parts: Parts, value: Any) -> Any:
+    """Write value at parts inside tree (in place where possible) and return the new tree"""
+    if not parts:
+        return value
+    if not isinstance(tree, dict):
+        if value is None:
+            return tree
+        tree = {}
+    head, rest = parts[0], parts[1:]
+    child = assign_path(tree.get(head), rest, value)
+    if child is None or child == {}:
+        tree.pop(head, None)
+    else:
+        tree[head] = child
+    return tree or None
+
+
+def _replaced(tree: Any, parts: Parts, value: Any) -> Any:
+    """Copy of tree with value written at parts; only the dicts along parts are copied"""
+    if not parts:
+        return value
+    if not isinstance(tree, dict):
+        if value is None:
+            return tree
+        tree = {}
+    head, rest = parts[0], parts[1:]
+    tree = dict(tree)
+    child = _replaced(tree.get(head), rest, value)
+    if child is None or child == {}:
+        tree.pop(head, None)
+    else:
+        tree[head] = child
+    return tree or None
+
+
+def _diff(old: Any, new: Any, parts: Parts) -> List[Tuple[Parts, Any]]:
+    """Smallest set of puts that turns old into new"""
+    if old == new:
+        return []
+    if isinstance(old, dict) and isinstance(new, dict):
+        changes = []
+        for key in list(old) + [key for key in new if key not in old]:
+            changes.extend(_diff(old.get(key), new.get(key), parts + (key,)))
+        return changes
+    return [(parts, new)]
+
+
+class _Subscriber:
+    def __init__(self, hub: "StreamHub", paths: Iterable[str]):
+        self.hub = hub
+        self.paths: List[Parts] = list(dict.fromkeys(split_path(path) for path in paths))
+        self.closed = False
+
+    def deliver(self, event: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self.hub._detach(self)
+
+
+class Listener(_Subscriber):
+    """Callback subscriber, called on the upstream stream's thread"""
+
+    def __init__(self, hub: "StreamHub", path: str, callback: Callable[[Dict[str, Any]], None]):
+        super().__init__(hub, [path])
+        self.callback = callback
+
+    def deliver(self, event: Dict[str, Any]) -> None:
+        try:
+            self.callback(event)
+        except Exception as e:
+            logger.error(f"Stream listener on {event['stream_id']} failed: {str(e)}")
+
+
+class Subscription(_Subscriber):
+    """Bounded queue of change events for one async consumer.
+
+    When the queue is full, drop_oldest discards the oldest event, drop_newest the
+    incoming one, and coalesce replaces the backlog with a fresh snapshot of every
+    subscribed path so the consumer catches up without missing a change. Under
+    coalesce a put also supersedes queued events at or below its path.
+    """
+
+    def __init__(
+        self,
+        hub: "StreamHub",
+        paths: Iterable[str],
+        loop: asyncio.AbstractEventLoop,
+        max_queue: int = STREAM_QUEUE_SIZE,
+        policy: str = "coalesce"
+    ):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy '{policy}'")
+        super().__init__(hub, paths)
+        self.loop = loop
+        self.max_queue = max_queue
+        self.policy = policy
+        self.delivered = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.resyncs = 0
+        self._queue: Deque[Dict[str, Any]] = deque()
+        self._ready = asyncio.Event()
+
+    def deliver(self, event: Dict[str, Any]) -> None:
+        try:
+            self.loop.call_soon_threadsafe(self._offer, event)
+        except RuntimeError:
+            # The consumer's event loop has gone away
+            self.close()
+
+    def _offer(self, event: Dict[str, Any]) -> None:
+        if self.closed:
+            return
+        self.delivered += 1
+        if self.policy == "coalesce" and event["event"] == "put":
+            superseded = split_path(event["path"])
+            kept = [
+                queued for queued in self._queue
+                if queued["stream_id"] != event["stream_id"]
+                or split_path(queued["path"])[:len(superseded)] != superseded
+            ]
+            self.coalesced += len(self._queue) - len(kept)
+            self._queue = deque(kept)
+
+        if len(self._queue) >= self.max_queue:
+            if self.policy == "drop_newest":
+                self.dropped += 1
+                return
+            if self.policy == "coalesce":
+                self._resync()
+                return
+            self._queue.popleft()
+            self.dropped += 1
+        self._queue.append(event)
+        self._ready.set()
+
+    def _resync(self) -> None:
+        self.coalesced += len(self._queue) + 1
+        self.resyncs += 1
+        self._queue = deque(self.hub.snapshot_events(self))
+        self._ready.set()
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Next event, or None on timeout or once the subscription is closed"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._queue:
+            if self.closed:
+                return None
+            self._ready.clear()
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return None
+            try:
+                await asyncio.wait_for(self._ready.wait(), remaining)
+            except asyncio.TimeoutError:
+                return None
+        return self._queue.popleft()
+
+    def __aiter__(self) -> "Subscription":
+        return self
+
+    async def __anext__(self) -> Dict[str, Any]:
+        event = await self.get()
+        if event is None:
+            raise StopAsyncIteration
+        return event
+
+    def close(self) -> None:
+        super().close()
+        try:
+            self.loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "paths": [_path(parts) for parts in self.paths],
+            "policy": self.policy,
+            "queued": len(self._queue),
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "resyncs": self.resyncs,
+        }
+
+
+class _Upstream:
+    """One Pyrebase stream and the mirrored data below its root"""
+
+    def __init__(self, root: Parts):
+        self.root = root
+        self.stream: Any = None
+        self.generation = 0
+        self.mirror: Any = None
+        self.synced = False
+        self.failed = False
+        self.failures = 0
+        self.next_attempt = 0.0
+        self.events = 0
+        self.reconnects = 0
+        self.subscribers: Dict[Parts, Set[_Subscriber]] = {}
+
+    def is_alive(self) -> bool:
+        if self.stream is None or self.failed:
+            return False
+        # Pyrebase runs each stream on a thread that exits when the connection dies
+        thread = getattr(self.stream, "thread", None)
+        return thread is None or thread.is_alive()
+
+
+class StreamHub:
+    """Multiplexes Realtime Database streams over one upstream per watched prefix"""
+
+    def __init__(self, firebase, prefixes: Iterable[str] = STREAM_WATCHED_PREFIXES):
+        self.firebase = firebase
+        self.prefixes = [split_path(prefix) for prefix in prefixes]
+        self._upstreams: Dict[Parts, _Upstream] = {}
+        self._lock = threading.RLock()
+
+    # Subscribing
+    def subscribe(
+        self,
+        paths: Union[str, Iterable[str]],
+        max_queue: int = STREAM_QUEUE_SIZE,
+        policy: str = "coalesce"
+    ) -> Subscription:
+        """Queue changes at or below paths for the calling event loop.
+
+        The first event for each path is a put at "/" with its current value.
+        """
+        paths = [paths] if isinstance(paths, str) else list(paths)
+        subscription = Subscription(self, paths, asyncio.get_running_loop(), max_queue, policy)
+        self._attach(subscription)
+        return subscription
+
+    def listen(self, path: str, callback: Callable[[Dict[str, Any]], None]) -> Listener:
+        """Call callback on the stream thread with changes at or below path"""
+        listener = Listener(self, path, callback)
+        self._attach(listener)
+        return listener
+
+    def _root_for(self, parts: Parts) -> Parts:
+        candidates = [root for root in list(self._upstreams) + self.prefixes if parts[:len(root)] == root]
+        return min(candidates, key=len) if candidates else parts
+
+    def _attach(self, subscriber: _Subscriber) -> None:
+        with self._lock:
+            for parts in subscriber.paths:
+                root = self._root_for(parts)
+                upstream = self._upstreams.get(root)
+                if upstream is None:
+                    upstream = self._upstreams[root] = _Upstream(root)
+                    self._open(upstream)
+                upstream.subscribers.setdefault(parts, set()).add(subscriber)
+                if upstream.synced:
+                    subscriber.deliver(self._snapshot_event(upstream, parts))
+
+    def _detach(self, subscriber: _Subscriber) -> None:
+        with self._lock:
+            for upstream in list(self._upstreams.values()):
+                for parts in subscriber.paths:
+                    subscribers = upstream.subscribers.get(parts)
+                    if subscribers is not None:
+                        subscribers.discard(subscriber)
+                        if not subscribers:
+                            del upstream.subscribers[parts]
+                if not upstream.subscribers:
+                    del self._upstreams[upstream.root]
+                    self._close_stream(upstream)
+
+    def _snapshot_event(self, upstream: _Upstream, parts: Parts) -> Dict[str, Any]:
+        # The mirror is replaced, never modified, so its nodes can be handed out as they are
+        data = _extract(upstream.mirror, parts[len(upstream.root):])
+        return {"event": "put", "path": "/", "data": data, "stream_id": _path(parts)}
+
+    def snapshot_events(self, subscriber: _Subscriber) -> List[Dict[str, Any]]:
+        """Current value of each of the subscriber's paths as put events"""
+        with self._lock:
+            events = []
+            for parts in subscriber.paths:
+                upstream = self._upstreams.get(self._root_for(parts))
+                if upstream is not None and upstream.synced:
+                    events.append(self._snapshot_event(upstream, parts))
+            return events
+
+    # Upstream streams
+    def _open(self, upstream: _Upstream) -> None:
+        upstream.generation += 1
+        upstream.failed = False
+        generation = upstream.generation
+        try:
+            upstream.stream = self.firebase.stream_data(
+                "/".join(upstream.root), lambda message: self._on_message(upstream, generation, message)
+            )
+            logger.info(f"Opened stream on {_path(upstream.root)}")
+        except Exception as e:
+            upstream.stream = None
+            upstream.failed = True
+            logger.warning(f"Failed to open stream on {_path(upstream.root)}: {str(e)}")
+
+    @staticmethod
+    def _close_stream(upstream: _Upstream) -> None:
+        stream, upstream.stream = upstream.stream, None
+        if stream is not None:
+            # Pyrebase's close() joins the stream thread, so never wait for it here
+            threading.Thread(target=stream.close, daemon=True).start()
+
+    def _on_message(self, upstream: _Upstream, generation: int, message: Dict[str, Any]) -> None:
+        event = message.get("event")
+        location = upstream.root + split_path(message.get("path") or "/")
+        # Freshly parsed for this stream, so it goes into the mirror uncopied
+        data = message.get("data")
+        while True:
+            with self._lock:
+                if generation != upstream.generation or upstream.failed:
+                    return  # a stream that has ended or been replaced
+                if event in ("cancel", "auth_revoked"):
+                    logger.warning(f"Stream on {_path(upstream.root)} ended by the server ({event})")
+                    upstream.failed = True
+                    self._close_stream(upstream)
+                    return
+                if event not in ("put", "patch"):
+                    return
+                mirror, synced = upstream.mirror, upstream.synced
+
+            # Diff and build the new mirror without the lock, so subscribers attaching
+            # from the event loop never wait for a large tree to be processed
+            if event == "patch" and isinstance(data, dict):
+                changes = [(location + split_path(key), value) for key, value in data.items()]
+            elif location == upstream.root and synced:
+                # The whole tree is resent after a reconnect; only pass on what changed
+                changes = _diff(mirror, data, upstream.root)
+            else:
+                changes = [(location, data)]
+            updated = mirror
+            for parts, value in changes:
+                updated = _replaced(updated, parts[len(upstream.root):], value)
+
+            with self._lock:
+                if generation != upstream.generation or upstream.failed:
+                    return
+                if upstream.mirror is not mirror:
+                    continue  # another message was applied meanwhile; diff against it instead
+                for parts, value in changes:
+                    self._route(upstream, parts, value, not synced)
+                upstream.mirror = updated
+                upstream.synced = True
+                upstream.events += 1
+                upstream.failures = 0
+                return
+
+    def _route(self, upstream: _Upstream, parts: Parts, value: Any, initial: bool) -> None:
+        """Deliver one change to every subscriber whose path overlaps it"""
+        for subscribed, subscribers in upstream.subscribers.items():
+            if parts[:len(subscribed)] == subscribed:
+                path, data = _path(parts[len(subscribed):]), value
+            elif subscribed[:len(parts)] == parts:
+                data = _extract(value, subscribed[len(parts):])
+                old = _extract(upstream.mirror, subscribed[len(upstream.root):])
+                if data == old and not initial:
+                    continue
+                path = "/"
+            else:
+                continue
+            event = {"event": "put", "path": path, "data": data, "stream_id": _path(subscribed)}
+            for subscriber in list(subscribers):
+                subscriber.deliver(event)
+
+    def check_upstreams(self) -> None:
+        """Reopen dead upstream streams whose backoff has elapsed"""
+        now = time.monotonic()
+        with self._lock:
+            for upstream in list(self._upstreams.values()):
+                if upstream.is_alive() or now < upstream.next_attempt:
+                    continue
+                delay = min(STREAM_RECONNECT_DELAY * 2 ** upstream.failures, STREAM_RECONNECT_MAX_DELAY)
+                upstream.failures += 1
+                upstream.next_attempt = now + delay
+                upstream.reconnects += 1
+                logger.info(f"Reconnecting stream on {_path(upstream.root)} (attempt {upstream.failures})")
+                self._close_stream(upstream)
+                self._open(upstream)
+
+    async def supervise(self, interval: float = STREAM_CHECK_INTERVAL) -> None:
+        """Keep upstream streams connected (run as a background task)"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.check_upstreams)
+            except Exception as e:
+                logger.warning(f"Stream supervision failed: {str(e)}")
+
+    def close(self) -> None:
+        """Close every upstream stream and end all subscriptions"""
+        with self._lock:
+            subscribers = {
+                subscriber for upstream in self._upstreams.values()
+                for group in upstream.subscribers.values() for subscriber in group
+            }
+        for subscriber in subscribers:
+            subscriber.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            upstreams = []
+            subscriptions = set()
+            for upstream in self._upstreams.values():
+                subscribers = {s for group in upstream.subscribers.values() for s in group}
+                subscriptions.update(s for s in subscribers if isinstance(s, Subscription))
+                upstreams.append({
+                    "path": _path(upstream.root),
+                    "connected": upstream.is_alive(),
+                    "synced": upstream.synced,
+                    "subscribers": len(subscribers),
+                    "events": upstream.events,
+                    "reconnects": upstream.reconnects,
+                })
+            return {
+                "upstreams": upstreams,
+                "subscriptions": len(subscriptions),
+                "queued": sum(len(s._queue) for s in subscriptions),
+                "dropped": sum(s.dropped for s in subscriptions),
+                "coalesced": sum(s.coalesced for s in subscriptions),
+            }
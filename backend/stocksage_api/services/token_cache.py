@@ -0,0 +1,77 @@
+"""Bounded in-memory cache of verified Firebase ID tokens.
+
+Verifying an ID token checks an RSA signature and may fetch Google's signing
+certificates. A token's claims cannot change before it expires, so the decoded
+claims are cached under a hash of the token until shortly before its `exp`.
+Only the hash is stored, never the raw token. Every caller gets its own copy of
+the claims, so one request changing them cannot affect another.
+"""
+import copy
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
+# Stop serving a cached token this many seconds before it expires
+TOKEN_CACHE_SKEW = int(os.getenv("TOKEN_CACHE_SKEW", 30))
+
+
+class TokenCache:
+    """LRU cache of decoded token claims, each valid until its token's expiry"""
+
+    def __init__(self, max_size: int = TOKEN_CACHE_SIZE, skew: int = TOKEN_CACHE_SKEW):
+        self.max_size = max_size
+        self.skew = skew
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        """Cached claims for `token`, or None if absent or about to expire"""
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() < entry[1]:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(entry[0])
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, token: str, claims: Dict[str, Any]) -> None:
+        """Cache verified claims until the token's `exp` minus the skew"""
+        expires_at = claims.get("exp", 0) - self.skew
+        if expires_at <= time.time():
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (copy.deepcopy(claims), expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id: str) -> int:
+        """Drop every cached token of a user (after revocation, disabling or deletion)"""
+        with self._lock:
+            keys = [key for key, (claims, _) in self._entries.items() if claims.get("uid") == user_id]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
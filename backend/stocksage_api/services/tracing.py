@@ -0,0 +1,382 @@
+"""In-process request tracing.
+
+Every HTTP request gets a trace whose root span covers the whole response. Child
+spans cover the endpoint handler, market data cache lookups, each yfinance and
+Firebase call (through metrics.track_upstream) and ID token verification. All
+spans of a request share its trace id, which is returned in `X-Trace-Id` and
+taken from an incoming W3C `traceparent` header when there is one.
+
+Finished traces go to a ring buffer of the last TRACE_BUFFER_SIZE requests that
+the admin API queries for slow traces and a per-component breakdown of where
+their time went. With TRACE_EXPORT_PATH set they are also appended to that file
+as OTLP/JSON lines (one ExportTraceServiceRequest per trace), the format the
+OpenTelemetry Collector's `otlpjsonfile` receiver reads. The file is written by
+a background thread so requests never wait on disk.
+
+Outside a request (startup, streams, background tasks) span() returns a shared
+no-op object, so instrumented code costs one context variable lookup there.
+"""
+import json
+import logging
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+from collections import defaultdict, deque
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+# Finished traces kept in memory for the admin API
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", 1000))
+# Spans recorded per trace; further spans are counted as dropped
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", 200))
+# OTLP/JSON lines file to export traces to (empty disables export)
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "")
+TRACE_EXPORT_QUEUE = int(os.getenv("TRACE_EXPORT_QUEUE", 1000))
+SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "stocksage-api")
+
+# OTLP span kinds
+INTERNAL, SERVER, CLIENT = 1, 2, 3
+
+_TRACEPARENT = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class Trace:
+    """Spans recorded for one request"""
+
+    def __init__(self, trace_id: Optional[str] = None):
+        self.trace_id = trace_id or secrets.token_hex(16)
+        self.spans: List["Span"] = []
+        self.dropped = 0
+        self.root: Optional["Span"] = None
+
+    @property
+    def duration(self) -> float:
+        return self.root.duration if self.root else 0.0
+
+    def breakdown(self) -> Dict[str, float]:
+        """Self time per component in milliseconds: each span's duration minus its children's"""
+        children = defaultdict(float)
+        for span in self.spans:
+            if span.parent_id:
+                children[span.parent_id] += span.duration
+        totals = defaultdict(float)
+        for span in self.spans:
+            # Children running in parallel can add up to more than their parent
+            totals[span.component] += max(span.duration - children[span.span_id], 0.0)
+        return {component: round(seconds * 1000, 2) for component, seconds in totals.items()}
+
+    def summary(self) -> Dict[str, Any]:
+        root = self.root
+        slowest = max((span for span in self.spans if span is not root), key=lambda span: span.duration, default=None)
+        return {
+            "trace_id": self.trace_id,
+            "name": root.name if root else None,
+            "route": root.attributes.get("http.route") if root else None,
+            "status": root.attributes.get("http.status_code") if root else None,
+            "started_at": root.start_ns // 1_000_000 if root else None,
+            "duration_ms": round(self.duration * 1000, 2),
+            "span_count": len(self.spans),
+            "dropped_spans": self.dropped,
+            "slowest_span": {"name": slowest.name, "duration_ms": round(slowest.duration * 1000, 2)} if slowest else None,
+            "breakdown_ms": self.breakdown(),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**self.summary(), "spans": [span.to_dict() for span in self.spans]}
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """The trace as an OTLP/JSON ExportTraceServiceRequest"""
+        return {"resourceSpans": [{
+            "resource": {"attributes": [_otlp_attribute("service.name", SERVICE_NAME)]},
+            "scopeSpans": [{"scope": {"name": "stocksage_api"}, "spans": [span.to_otlp() for span in self.spans]}],
+        }]}
+
+
+class Span:
+    """A timed operation; use as a context manager"""
+    __slots__ = ("trace", "name", "component", "kind", "span_id", "parent_id", "attributes",
+                 "start_ns", "end_ns", "error", "_token")
+
+    def __init__(self, trace: Trace, name: str, component: str, kind: int = INTERNAL,
+                 parent_id: Optional[str] = None, attributes: Optional[Dict[str, Any]] = None):
+        self.trace = trace
+        self.name = name
+        self.component = component
+        self.kind = kind
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = attributes or {}
+        self.start_ns = 0
+        self.end_ns = 0
+        self.error: Optional[str] = None
+        self._token = None
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    @property
+    def duration(self) -> float:
+        end_ns = self.end_ns or time.time_ns()
+        return (end_ns - self.start_ns) / 1e9
+
+    def __enter__(self) -> "Span":
+        self.start_ns = time.time_ns()
+        self._token = _current_span.set(self)
+        self.trace.spans.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.end_ns = time.time_ns()
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.error = exc_type.__name__
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "component": self.component,
+            "start_offset_ms": round((self.start_ns - self.trace.root.start_ns) / 1e6, 2) if self.trace.root else 0,
+            "duration_ms": round(self.duration * 1000, 2),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or time.time_ns()),
+            "attributes": [_otlp_attribute("component", self.component)]
+                          + [_otlp_attribute(key, value) for key, value in self.attributes.items()],
+            # 1 = OK, 2 = ERROR
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+class _NoopSpan:
+    """Stands in for a span when no request is being traced"""
+    __slots__ = ()
+
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def span(name: str, component: str, kind: int = INTERNAL, **attributes: Any):
+    """Child span of the current span, or a no-op outside a traced request"""
+    parent = _current_span.get()
+    if parent is None:
+        return NOOP_SPAN
+    trace = parent.trace
+    if len(trace.spans) >= TRACE_MAX_SPANS:
+        trace.dropped += 1
+        return NOOP_SPAN
+    return Span(trace, name, component, kind, parent.span_id, attributes)
+
+
+def current_trace_id() -> Optional[str]:
+    current = _current_span.get()
+    return current.trace.trace_id if current else None
+
+
+class TraceBuffer:
+    """Ring buffer of the most recent finished traces"""
+
+    def __init__(self, size: int = TRACE_BUFFER_SIZE):
+        self._traces: deque = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, trace: Trace) -> None:
+        with self._lock:
+            self._traces.append(trace)
+
+    def _matching(self, route: Optional[str]) -> List[Trace]:
+        with self._lock:
+            traces = list(self._traces)
+        if route:
+            traces = [trace for trace in traces if trace.root and trace.root.attributes.get("http.route") == route]
+        return traces
+
+    def get(self, trace_id: str) -> Optional[Trace]:
+        with self._lock:
+            return next((trace for trace in reversed(self._traces) if trace.trace_id == trace_id), None)
+
+    def slowest(self, min_duration_ms: float = 0, route: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        traces = [trace for trace in self._matching(route) if trace.duration * 1000 >= min_duration_ms]
+        traces.sort(key=lambda trace: trace.duration, reverse=True)
+        return [trace.summary() for trace in traces[:limit]]
+
+    def breakdown(self, route: Optional[str] = None, percentile: float = 95) -> Dict[str, Any]:
+        """Mean self time per component over all buffered traces and over those at or above the percentile"""
+        traces = sorted(self._matching(route), key=lambda trace: trace.duration)
+        if not traces:
+            return {"traces": 0, "threshold_ms": None, "all": {}, "tail": {}}
+        threshold = traces[min(int(len(traces) * percentile / 100), len(traces) - 1)].duration
+        tail = [trace for trace in traces if trace.duration >= threshold]
+        return {
+            "traces": len(traces),
+            "threshold_ms": round(threshold * 1000, 2),
+            "all": _mean_breakdown(traces),
+            "tail": _mean_breakdown(tail),
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._traces.clear()
+
+
+def _mean_breakdown(traces: List[Trace]) -> Dict[str, Any]:
+    totals = defaultdict(float)
+    for trace in traces:
+        for component, ms in trace.breakdown().items():
+            totals[component] += ms
+    return {
+        "count": len(traces),
+        "mean_duration_ms": round(sum(trace.duration for trace in traces) * 1000 / len(traces), 2),
+        "mean_component_ms": {component: round(ms / len(traces), 2)
+                              for component, ms in sorted(totals.items(), key=lambda item: -item[1])},
+    }
+
+
+trace_buffer = TraceBuffer()
+
+
+class TraceExporter:
+    """Appends finished traces to a file as OTLP/JSON lines from a background thread"""
+
+    def __init__(self, path: str, max_queue: int = TRACE_EXPORT_QUEUE):
+        self.path = path
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, trace: Trace) -> None:
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        with open(self.path, "a", encoding="utf-8") as export_file:
+            while True:
+                trace = self._queue.get()
+                if trace is None:
+                    return
+                try:
+                    export_file.write(json.dumps(trace.to_otlp(), default=str) + "\n")
+                    if self._queue.empty():
+                        export_file.flush()
+                except Exception as e:
+                    logger.warning(f"Failed to export trace {trace.trace_id}: {str(e)}")
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Write the queued traces and stop the thread"""
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+
+exporter: Optional[TraceExporter] = None
+
+
+def start_exporter(path: str = TRACE_EXPORT_PATH) -> Optional[TraceExporter]:
+    global exporter
+    if path and exporter is None:
+        exporter = TraceExporter(path)
+        logger.info(f"Exporting traces to {path}")
+    return exporter
+
+
+def shutdown() -> None:
+    global exporter
+    if exporter is not None:
+        exporter.close()
+        exporter = None
+
+
+def _parent_from_traceparent(scope: Dict[str, Any]):
+    for key, value in scope.get("headers") or ():
+        if key == b"traceparent":
+            match = _TRACEPARENT.match(value.decode("latin-1").strip().lower())
+            if match and match.group(1) != "0" * 32:
+                return match.group(1), match.group(2)
+    return None, None
+
+
+class TracingMiddleware:
+    """ASGI middleware opening a trace per HTTP request and storing it when the response is done"""
+
+    def __init__(self, app, buffer: TraceBuffer = trace_buffer):
+        self.app = app
+        self.buffer = buffer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace_id, parent_id = _parent_from_traceparent(scope)
+        trace = Trace(trace_id)
+        root = Span(trace, f"{scope['method']} {scope['path']}", "http", SERVER, parent_id,
+                    {"http.method": scope["method"], "http.target": scope["path"]})
+        trace.root = root
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message = {**message, "headers": [*message.get("headers", []),
+                                                  (b"x-trace-id", trace.trace_id.encode("latin-1"))]}
+            await send(message)
+
+        try:
+            with root:
+                await self.app(scope, receive, send_wrapper)
+        finally:
+            route = getattr(scope.get("route"), "path", None)
+            if route:
+                root.name = f"{scope['method']} {route}"
+                root.set("http.route", route)
+            root.set("http.status_code", status_code)
+            if status_code >= 500 and root.error is None:
+                root.error = f"HTTP {status_code}"
+            self.buffer.add(trace)
+            if exporter is not None:
+                exporter.export(trace)
@@ -0,0 +1,234 @@
+"""Bulk user administration on top of the Admin SDK's batch endpoints.
+
+Each operation splits its input into the largest batches the Admin SDK accepts
+(get_users: 100 identifiers, import_users and delete_users: 1000 users) and
+writes or removes the matching /users profiles with one multi-path update per
+batch. Every requested user gets its own result entry so partial failures are
+reported instead of aborting the whole request.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import secrets
+import time
+from typing import Any, Dict, List, Sequence
+
+from .async_firebase_service import AsyncFirebaseService, async_firebase_service
+
+logger = logging.getLogger(__name__)
+
+# Admin SDK per-call limits
+GET_USERS_BATCH_SIZE = 100
+IMPORT_USERS_BATCH_SIZE = 1000
+DELETE_USERS_BATCH_SIZE = 1000
+# Passwords are imported as PBKDF2-SHA256 hashes (Firebase accepts up to 120000 rounds)
+USER_IMPORT_HASH_ROUNDS = int(os.getenv("USER_IMPORT_HASH_ROUNDS", 10000))
+# Passwords hashed per worker thread task during an import
+PASSWORD_HASH_CHUNK = 50
+
+DEFAULT_PREFERENCES = {"theme": "dark", "notifications_enabled": True, "default_view": "dashboard"}
+
+
+def _chunks(items: Sequence[Any], size: int) -> List[Sequence[Any]]:
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+def hash_passwords(passwords: Sequence[str], rounds: int) -> List[tuple]:
+    """(hash, salt) pairs for PBKDF2-SHA256 password import"""
+    hashed = []
+    for password in passwords:
+        salt = secrets.token_bytes(16)
+        hashed.append((hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, rounds), salt))
+    return hashed
+
+
+def _user_summary(user: Any) -> Dict[str, Any]:
+    metadata = getattr(user, "user_metadata", None)
+    return {
+        "uid": user.uid,
+        "email": user.email,
+        "display_name": user.display_name,
+        "disabled": bool(user.disabled),
+        "email_verified": bool(user.email_verified),
+        "custom_claims": user.custom_claims or None,
+        "created_at": getattr(metadata, "creation_timestamp", None),
+        "last_sign_in_at": getattr(metadata, "last_sign_in_timestamp", None),
+    }
+
+
+def _report(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    succeeded = sum(1 for result in results if result["status"] == "ok")
+    return {
+        "requested": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "results": results,
+    }
+
+
+class UserAdmin:
+    def __init__(self, firebase: AsyncFirebaseService, hash_rounds: int = USER_IMPORT_HASH_ROUNDS):
+        self.firebase = firebase
+        self.hash_rounds = hash_rounds
+
+    async def import_users(self, users: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Create accounts and profiles for users ({email, password, name, preferences, disabled})"""
+        from firebase_admin import auth
+
+        results: List[Dict[str, Any]] = [
+            {"index": index, "uid": None, "email": user["email"], "status": "ok", "error": None}
+            for index, user in enumerate(users)
+        ]
+        seen = set()
+        pending = []
+        for index, user in enumerate(users):
+            email = user["email"].lower()
+            if email in seen:
+                results[index].update(status="failed", error="Duplicate email in request")
+            else:
+                seen.add(email)
+                pending.append(index)
+
+        hash_alg = auth.UserImportHash.pbkdf2_sha256(rounds=self.hash_rounds)
+        profile_writes = []
+        for batch in _chunks(pending, IMPORT_USERS_BATCH_SIZE):
+            # pbkdf2_hmac releases the GIL, so hashing spreads across the worker threads
+            hashed = await asyncio.gather(*(
+                asyncio.to_thread(hash_passwords, [users[index]["password"] for index in part], self.hash_rounds)
+                for part in _chunks(batch, PASSWORD_HASH_CHUNK)
+            ))
+            hashes = [pair for part in hashed for pair in part]
+
+            records = []
+            for index, (password_hash, salt) in zip(batch, hashes):
+                uid = secrets.token_hex(14)
+                results[index]["uid"] = uid
+                records.append(auth.ImportUserRecord(
+                    uid,
+                    email=users[index]["email"],
+                    display_name=users[index].get("name") or None,
+                    disabled=bool(users[index].get("disabled")),
+                    password_hash=password_hash,
+                    password_salt=salt,
+                ))
+
+            try:
+                outcome = await self.firebase.import_users(records, hash_alg)
+            except Exception as e:
+                logger.error(f"Failed to import {len(records)} users: {str(e)}")
+                for index in batch:
+                    results[index].update(uid=None, status="failed", error=str(e))
+                continue
+            for error in outcome.errors:
+                results[batch[error.index]].update(uid=None, status="failed", error=error.reason)
+
+            created = [index for index in batch if results[index]["status"] == "ok"]
+            if created:
+                profile_writes.append(self._write_profiles(users, results, created))
+
+        # Profiles for all imported batches are written concurrently
+        await asyncio.gather(*profile_writes)
+        return _report(results)
+
+    async def _write_profiles(self, users: List[Dict[str, Any]], results: List[Dict[str, Any]], indexes: List[int]) -> None:
+        now = int(time.time() * 1000)
+        batch = self.firebase.batch()
+        profiles = {}
+        for index in indexes:
+            uid = results[index]["uid"]
+            profiles[uid] = {
+                "id": uid,
+                "email": users[index]["email"],
+                "name": users[index].get("name") or "",
+                "created_at": now,
+                "preferences": users[index].get("preferences") or DEFAULT_PREFERENCES,
+            }
+            batch.set(f"users/{uid}", profiles[uid])
+        try:
+            await self.firebase.commit_batch(batch)
+        except Exception as e:
+            logger.error(f"Failed to write {len(indexes)} imported user profiles: {str(e)}")
+            for index in indexes:
+                results[index].update(status="failed", error=f"Account created but profile write failed: {str(e)}")
+            return
+        for uid, profile in profiles.items():
+            self.firebase.profile_cache.put(uid, profile)
+
+    async def lookup(self, uids: List[str] = (), emails: List[str] = ()) -> Dict[str, Any]:
+        """Account details for the given uids and emails, plus the identifiers with no account"""
+        identifiers = [("uid", uid) for uid in dict.fromkeys(uids)] + [("email", email) for email in dict.fromkeys(emails)]
+        responses = await asyncio.gather(*(
+            self.firebase.get_users(
+                [value for kind, value in batch if kind == "uid"],
+                [value for kind, value in batch if kind == "email"],
+            )
+            for batch in _chunks(identifiers, GET_USERS_BATCH_SIZE)
+        ))
+        users: Dict[str, Dict[str, Any]] = {}
+        not_found = []
+        for response in responses:
+            for user in response.users:
+                users[user.uid] = _user_summary(user)
+            for identifier in response.not_found:
+                uid = getattr(identifier, "uid", None)
+                not_found.append({"uid": uid} if uid is not None else {"email": identifier.email})
+        return {"users": list(users.values()), "not_found": not_found}
+
+    async def set_disabled(self, uids: List[str], disabled: bool = True) -> Dict[str, Any]:
+        """Disable or re-enable accounts (the Admin SDK has no batch update, so calls run in parallel)"""
+        uids = list(dict.fromkeys(uids))
+
+        async def update(uid: str) -> Dict[str, Any]:
+            try:
+                if disabled:
+                    await self.firebase.disable_user(uid)
+                else:
+                    await self.firebase.enable_user(uid)
+            except Exception as e:
+                return {"uid": uid, "status": "failed", "error": str(e)}
+            return {"uid": uid, "status": "ok", "error": None}
+
+        # Concurrency is bounded by the Firebase executor's worker count
+        return _report(list(await asyncio.gather(*(update(uid) for uid in uids))))
+
+    async def delete_users(self, uids: List[str], delete_profiles: bool = True) -> Dict[str, Any]:
+        """Delete accounts, then the profiles of every account that was deleted"""
+        uids = list(dict.fromkeys(uids))
+        results = {uid: {"uid": uid, "status": "ok", "error": None} for uid in uids}
+
+        # delete_users is rate limited per project, so batches go one at a time
+        for batch in _chunks(uids, DELETE_USERS_BATCH_SIZE):
+            try:
+                outcome = await self.firebase.delete_users(list(batch))
+            except Exception as e:
+                logger.error(f"Failed to delete {len(batch)} users: {str(e)}")
+                for uid in batch:
+                    results[uid].update(status="failed", error=str(e))
+                continue
+            for error in outcome.errors:
+                results[batch[error.index]].update(status="failed", error=error.reason)
+
+        deleted = [uid for uid in uids if results[uid]["status"] == "ok"]
+        if delete_profiles and deleted:
+            await asyncio.gather(*(
+                self._delete_profiles(batch, results) for batch in _chunks(deleted, DELETE_USERS_BATCH_SIZE)
+            ))
+        return _report(list(results.values()))
+
+    async def _delete_profiles(self, uids: Sequence[str], results: Dict[str, Dict[str, Any]]) -> None:
+        batch = self.firebase.batch()
+        for uid in uids:
+            batch.delete(f"users/{uid}")
+        try:
+            await self.firebase.commit_batch(batch)
+        except Exception as e:
+            logger.error(f"Failed to delete {len(uids)} user profiles: {str(e)}")
+            for uid in uids:
+                results[uid].update(status="failed", error=f"Account deleted but profile removal failed: {str(e)}")
+        for uid in uids:
+            self.firebase.profile_cache.invalidate(uid)
+
+
+# Create a singleton instance
+user_admin = UserAdmin(async_firebase_service)
@@ -0,0 +1,147 @@
+"""Vectorized time-series valuation and comparison of portfolios.
+
+Prices form a (dates x symbols) matrix built once from cached history. Ledger
+entries of every portfolio are scattered into a (portfolios x dates x symbols)
+tensor of share changes and accumulated along the date axis, so equity curves
+for all portfolios come out of a single tensor contraction with the price matrix.
+
+This module only depends on NumPy.
+"""
+from typing import Any, Dict, List
+
+import numpy as np
+
+TRADING_DAYS_PER_YEAR = 252
+
+
+def holdings_tensor(
+    dates: np.ndarray,
+    symbols: List[str],
+    portfolios: List[Dict[str, Any]]
+) -> Dict[str, np.ndarray]:
+    """Shares held (P x D x S) and cash (P x D) at each close for every portfolio.
+
+    Each portfolio is a dict with `initial_balance` and ledger `entries`. Trades
+    before the first date count from the first date; trades on non-trading days
+    count from the next trading day.
+    """
+    n_portfolios, n_dates, n_symbols = len(portfolios), len(dates), len(symbols)
+    columns = {symbol: i for i, symbol in enumerate(symbols)}
+
+    entries = [(p, entry) for p, portfolio in enumerate(portfolios) for entry in portfolio["entries"]]
+    share_changes = np.zeros((n_portfolios, n_dates, n_symbols))
+    cash_changes = np.zeros((n_portfolios, n_dates))
+    if entries:
+        owner = np.fromiter((p for p, _ in entries), dtype=np.int64, count=len(entries))
+        column = np.fromiter((columns[e["symbol"]] for _, e in entries), dtype=np.int64, count=len(entries))
+        sign = np.fromiter((1.0 if e["type"] == "buy" else -1.0 for _, e in entries), dtype=np.float64, count=len(entries))
+        quantity = np.fromiter((e["quantity"] for _, e in entries), dtype=np.float64, count=len(entries))
+        price = np.fromiter((e["price"] for _, e in entries), dtype=np.float64, count=len(entries))
+        timestamps = np.fromiter((e["timestamp"] for _, e in entries), dtype=np.int64, count=len(entries))
+
+        trade_days = timestamps.astype("datetime64[ms]").astype("datetime64[D]")
+        day = np.minimum(np.searchsorted(dates, trade_days, side="left"), n_dates - 1)
+        # Trades after the last date are outside the window and ignored
+        in_window = trade_days <= dates[-1]
+
+        np.add.at(share_changes, (owner[in_window], day[in_window], column[in_window]),
+                  (sign * quantity)[in_window])
+        np.add.at(cash_changes, (owner[in_window], day[in_window]),
+                  (-sign * quantity * price)[in_window])
+
+    initial = np.array([float(p["initial_balance"]) for p in portfolios])
+    shares = np.cumsum(share_changes, axis=1)
+    cash = initial[:, None] + np.cumsum(cash_changes, axis=1)
+    return {"shares": shares, "cash": cash}
+
+
+def equity_curves(closes: np.ndarray, shares: np.ndarray, cash: np.ndarray) -> np.ndarray:
+    """Portfolio values (P x D) from prices (D x S), shares (P x D x S) and cash (P x D)"""
+    return np.einsum("pds,ds->pd", shares, closes) + cash
+
+
+def max_drawdowns(values: np.ndarray) -> np.ndarray:
+    """Largest peak-to-trough decline of each row"""
+    return (values / np.maximum.accumulate(values, axis=-1) - 1.0).min(axis=-1)
+
+
+def relative_metrics(values: np.ndarray, benchmark: np.ndarray) -> Dict[str, np.ndarray]:
+    """Return and risk metrics of each portfolio (rows of `values`) against a benchmark series"""
+    returns = values[:, 1:] / values[:, :-1] - 1.0          # (P, D-1)
+    bench_returns = benchmark[1:] / benchmark[:-1] - 1.0     # (D-1,)
+    n = bench_returns.shape[0]
+    annualize = np.sqrt(TRADING_DAYS_PER_YEAR)
+
+    total_return = values[:, -1] / values[:, 0] - 1.0
+    bench_total = benchmark[-1] / benchmark[0] - 1.0
+
+    centered = returns - returns.mean(axis=1, keepdims=True)
+    bench_centered = bench_returns - bench_returns.mean()
+    ddof = max(n - 1, 1)
+    covariance = centered @ bench_centered / ddof
+    bench_variance = bench_centered @ bench_centered / ddof
+    std = np.sqrt((centered ** 2).sum(axis=1) / ddof)
+
+    active = returns - bench_returns
+    tracking_error = active.std(axis=1, ddof=1) * annualize if n > 1 else np.zeros(len(values))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        beta = np.where(bench_variance > 0, covariance / bench_variance, 0.0)
+        correlation = np.where(std * np.sqrt(bench_variance) > 0, covariance / (std * np.sqrt(bench_variance)), 0.0)
+        information_ratio = np.where(
+            tracking_error > 0, active.mean(axis=1) * TRADING_DAYS_PER_YEAR / tracking_error, 0.0
+        )
+
+    return {
+        "total_return": total_return,
+        "volatility": std * annualize,
+        "max_drawdown": max_drawdowns(values),
+        "excess_return": total_return - bench_total,
+        "beta": beta,
+        "correlation": correlation,
+        "tracking_error": tracking_error,
+        "information_ratio": information_ratio,
+    }
+
+
+def compare_portfolios(
+    dates: np.ndarray,
+    symbols: List[str],
+    closes: np.ndarray,
+    benchmark_symbol: str,
+    benchmark_closes: np.ndarray,
+    portfolios: List[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """Equity curves and benchmark-relative metrics for many portfolios at once.
+
+    Each portfolio is a dict with `id`, `name`, `initial_balance` and ledger `entries`.
+    """
+    holdings = holdings_tensor(dates, symbols, portfolios)
+    values = equity_curves(closes, holdings["shares"], holdings["cash"])
+    metrics = relative_metrics(values, benchmark_closes)
+
+    date_labels = [str(day) for day in dates]
+    rounded_values = np.round(values, 2).tolist()
+    bench_metrics = relative_metrics(benchmark_closes[None, :], benchmark_closes)
+
+    return {
+        "start_date": date_labels[0],
+        "end_date": date_labels[-1],
+        "benchmark": {
+            "symbol": benchmark_symbol,
+            "total_return": round(float(bench_metrics["total_return"][0]), 6),
+            "volatility": round(float(bench_metrics["volatility"][0]), 6),
+            "max_drawdown": round(float(bench_metrics["max_drawdown"][0]), 6),
+        },
+        "portfolios": [
+            {
+                "portfolio_id": portfolio["id"],
+                "name": portfolio.get("name", ""),
+                "metrics": {name: round(float(values_[p]), 6) for name, values_ in metrics.items()},
+                "equity_curve": [
+                    {"date": day, "value": value} for day, value in zip(date_labels, rounded_values[p])
+                ],
+            }
+            for p, portfolio in enumerate(portfolios)
+        ],
+    }
@@ -0,0 +1,186 @@
+"""Batched and coalesced Realtime Database writes.
+
+A WriteBatch collects set/update/push/delete operations on any number of paths
+and flattens them into a single multi-path update, so they are applied
+atomically in one round trip. A WriteBehindBuffer does the same across
+callers: updates arriving within a short window are merged per path and
+flushed together. It is off unless WRITE_BEHIND_WINDOW_MS is set.
+"""
+import asyncio
+import copy
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Milliseconds updates wait to be merged with others before they are written (0 disables it)
+WRITE_BEHIND_WINDOW = float(os.getenv("WRITE_BEHIND_WINDOW_MS", 0)) / 1000
+
+
+def _normalize(path: str) -> str:
+    return "/".join(part for part in path.split("/") if part)
+
+
+def _merge_into(updates: Dict[str, Any], path: str, value: Any) -> None:
+    """Add `path: value` to flat multi-path updates without overlapping paths.
+
+    The database rejects an update that lists both a path and one of its
+    ancestors, so writes below an already-listed path are folded into its value
+    and writes above listed paths replace them.
+    """
+    path = _normalize(path)
+    parts = path.split("/")
+    for depth in range(len(parts) - 1, 0, -1):
+        ancestor = "/".join(parts[:depth])
+        if ancestor in updates:
+            node = updates[ancestor]
+            if not isinstance(node, dict):
+                node = updates[ancestor] = {}
+            for part in parts[depth:-1]:
+                child = node.get(part)
+                if not isinstance(child, dict):
+                    child = node[part] = {}
+                node = child
+            if value is None:
+                node.pop(parts[-1], None)
+            else:
+                node[parts[-1]] = copy.deepcopy(value)
+            return
+
+    prefix = path + "/"
+    for listed in [listed for listed in updates if listed.startswith(prefix)]:
+        del updates[listed]
+    updates[path] = copy.deepcopy(value)
+
+
+class WriteBatch:
+    """Collects writes to many paths and applies them as one atomic multi-path update"""
+
+    def __init__(self, generate_key: Optional[Callable[[], str]] = None):
+        self.updates: Dict[str, Any] = {}
+        self.operations = 0
+        self._generate_key = generate_key
+
+    def __len__(self) -> int:
+        return self.operations
+
+    def set(self, path: str, data: Any) -> "WriteBatch":
+        """Replace the value at path"""
+        _merge_into(self.updates, path, data)
+        self.operations += 1
+        return self
+
+    def update(self, path: str, data: Dict[str, Any]) -> "WriteBatch":
+        """Overwrite only the given children of path"""
+        for key, value in data.items():
+            _merge_into(self.updates, f"{path}/{key}", value)
+        self.operations += 1
+        return self
+
+    def delete(self, path: str) -> "WriteBatch":
+        """Remove the value at path"""
+        _merge_into(self.updates, path, None)
+        self.operations += 1
+        return self
+
+    def push(self, path: str, data: Any) -> str:
+        """Add a child under a generated key and return the key"""
+        if self._generate_key is None:
+            raise ValueError("This batch cannot generate push keys")
+        key = self._generate_key()
+        self.set(f"{path}/{key}", data)
+        return key
+
+
+class WriteBehindBuffer:
+    """Merges updates issued within a short window into one multi-path flush.
+
+    `update` and `set` return a future that resolves once the merged write has been
+    applied. A failed flush is logged and raised to every caller awaiting it.
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[Dict[str, Any]], Awaitable[Any]],
+        window: float = WRITE_BEHIND_WINDOW
+    ):
+        self._flush = flush
+        self.window = window
+        self._pending: Dict[str, Any] = {}
+        self._waiters: List[asyncio.Future] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self.writes = 0
+        self.flushes = 0
+        self.failures = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    def update(self, path: str, data: Dict[str, Any]) -> "asyncio.Future":
+        """Queue an update of path's children, merged with other pending writes"""
+        for key, value in data.items():
+            _merge_into(self._pending, f"{path}/{key}", value)
+        return self._queued()
+
+    def set(self, path: str, data: Any) -> "asyncio.Future":
+        """Queue a replacement of the value at path"""
+        _merge_into(self._pending, path, data)
+        return self._queued()
+
+    def _queued(self) -> "asyncio.Future":
+        loop = asyncio.get_running_loop()
+        self.writes += 1
+        waiter = loop.create_future()
+        self._waiters.append(waiter)
+        if self._timer is None:
+            self._timer = loop.call_later(self.window, self._start_flush)
+        return waiter
+
+    def _start_flush(self) -> None:
+        self._timer = None
+        self._flush_task = asyncio.ensure_future(self.flush())
+
+    async def flush(self) -> None:
+        """Write everything pending now"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        updates, waiters = self._pending, self._waiters
+        self._pending, self._waiters = {}, []
+        self.flushes += 1
+        try:
+            await self._flush(updates)
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"Write-behind flush of {len(updates)} paths failed: {str(e)}")
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_exception(e)
+                    # Logged above; callers that await the future still get the exception
+                    waiter.exception()
+            return
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def close(self) -> None:
+        """Write what is pending and wait for a flush already under way (on shutdown)"""
+        await self.flush()
+        if self._flush_task is not None:
+            await self._flush_task
+            self._flush_task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "writes": self.writes,
+            "flushes": self.flushes,
+            "failures": self.failures,
+            "pending_paths": len(self._pending),
+            "round_trips_saved": self.writes - self.flushes - len(self._waiters),
+        }